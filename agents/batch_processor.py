@@ -0,0 +1,224 @@
+"""
+Batch processing of many workbooks on a shared process pool
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import time
+from config.config import ProcessingConfig
+from utils.excel_utils import ExcelParser
+from utils.memory_admission import MemoryBudget, estimate_job_memory
+
+# Threads probing workbook sizes before scheduling
+PROBE_WORKERS = 8
+# Times a file is retried on a new pool after the pool broke (a worker died) while the file was in flight
+BROKEN_POOL_RETRIES = 1
+
+# Per-process workflow, created once by the pool initializer and reused for every file
+_worker_workflow = None
+
+def _init_worker(environment: Dict[str, str]) -> None:
+    """
+    Set up a pool worker: the parent's environment, then a compiled workflow on the shared agent
+
+    Workers started from a fork server do not see environment changes made in the parent after
+    the server started, so the parent's environment is passed along explicitly.
+    """
+    global _worker_workflow
+    os.environ.update(environment)
+    from agents.langgraph_agent import ExcelProcessingWorkflow
+    _worker_workflow = ExcelProcessingWorkflow()
+    # Compile the graph now rather than on the first file
+    _worker_workflow.app
+
+def _process_file(index: int, file_path: str, task_description: str, config: ProcessingConfig) -> Dict[str, Any]:
+    """Process one workbook in a pool worker"""
+    started = time.time()
+    start = time.perf_counter()
+    try:
+        final_state = _worker_workflow.run(file_path, task_description, config)
+        # The graph's message reducer turns the step messages into SystemMessage objects
+        errors = [message.content for message in final_state.get("messages", [])
+                  if str(message.content).startswith("Error")]
+        output = final_state.get("formatted_output", "Error: No output generated")
+        if errors:
+            result = {"status": "error", "output": output, "message": f"Failed to process {file_path}: {'; '.join(errors)}"}
+        else:
+            result = {"status": "success", "output": output}
+    except Exception as e:
+        result = {"status": "error", "output": None, "message": f"Failed to process {file_path}: {str(e)}"}
+    result.update({
+        "index": index,
+        "file_path": file_path,
+        "task_description": task_description,
+        "started": started,
+        "seconds": time.perf_counter() - start,
+        "worker": os.getpid()
+    })
+    return result
+
+def _workbook_size(file_path: str) -> int:
+    """Cells in a workbook according to its probe metadata; -1 if it cannot be probed"""
+    try:
+        return sum(sheet["rows"] * sheet["columns"] for sheet in ExcelParser.probe_workbook(file_path))
+    except Exception:
+        return -1
+
+def _available_cpus() -> int:
+    """CPUs this process may run on, which can be fewer than os.cpu_count() in containers"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def _pool_context():
+    """
+    Start workers from a fork server that has already imported the agent, where available
+
+    Forking the caller directly is unsafe once it runs background threads (such as the HTTP
+    client loop), and spawning would import the whole stack again in every worker.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["agents.langgraph_agent"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=_pool_context(),
+        initializer=_init_worker,
+        initargs=(dict(os.environ),)
+    )
+
+def process_many(files: Sequence[str],
+                 tasks: Union[str, Sequence[str]],
+                 config: ProcessingConfig,
+                 max_workers: Optional[int] = None,
+                 memory_budget: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Process many Excel files on a pool of worker processes, yielding results as they complete
+
+    Files are probed first and submitted largest first, so the longest runs start early and
+    small files fill in around them. Every worker keeps one compiled workflow, so compression
+    plans, HTTP connection pools and the LLM dispatcher stay warm across the files it processes.
+    Callers must guard their entry point with if __name__ == "__main__", since workers are not
+    forked from the calling process.
+
+    With a memory budget, a file is handed to a worker only while the estimated peak memory
+    of the files in progress stays under it (see utils.memory_admission); a file that does
+    not fit waits, or runs in chunk-pipelined mode when that fits.
+
+    A worker that dies (e.g. killed for memory) breaks the whole pool. The pool is then
+    replaced, the files not started yet go to the new one, and the files that were in
+    flight are retried BROKEN_POOL_RETRIES times before they are reported as failed.
+
+    Args:
+        files: Paths to the Excel files
+        tasks: One task description for all files, or one per file
+        config: Processing configuration used for every file
+        max_workers: Worker processes (defaults to the number of CPUs available)
+        memory_budget: Bytes of estimated peak memory the files in progress may take together
+            (None disables admission control)
+
+    Yields:
+        One dict per file, in completion order, with "status" ("success", or "error" when any
+        workflow step failed), "output" (formatted context content; None if the worker failed),
+        "message" (on error), "index" (position in
+        files), "file_path", "task_description", "seconds" (processing time), "queued_seconds"
+        (time from the start of the batch until a worker picked the file up), "elapsed" (time
+        from the start of the batch until the result was yielded), "worker" (process id) and,
+        under a memory budget, "memory_mode" ("full" or "pipelined")
+    """
+    if isinstance(tasks, str):
+        tasks = [tasks] * len(files)
+    if len(tasks) != len(files):
+        raise ValueError(f"Got {len(tasks)} tasks for {len(files)} files")
+    if not files:
+        return
+
+    batch_started = time.time()
+    batch_start = time.perf_counter()
+    budget = MemoryBudget(memory_budget) if memory_budget else None
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as probe_executor:
+        if budget is None:
+            sizes: List[int] = list(probe_executor.map(_workbook_size, files))
+        else:
+            estimates = list(probe_executor.map(lambda file_path: estimate_job_memory(file_path, config), files))
+            sizes = [estimate.cells for estimate in estimates]
+    order = sorted(range(len(files)), key=lambda i: sizes[i], reverse=True)
+
+    workers = max(1, min(max_workers or _available_cpus(), len(files)))
+    executor = _new_pool(workers)
+    # Pools replaced so far; a broken pool is replaced once, however many of its files fail
+    generation = 0
+    retries = [0] * len(files)
+    pending = list(reversed(order))
+    futures: Dict[Any, Any] = {}
+    try:
+        while pending or futures:
+            # A file is handed over only when a worker is free (and, with a budget, its memory is
+            # admitted), largest first; files not handed over yet survive a broken pool
+            while pending and len(futures) < workers:
+                i = pending[-1]
+                admission = budget.try_admit(estimates[i], config) if budget is not None else None
+                if budget is not None and admission is None:
+                    break
+                pending.pop()
+                file_config = admission.config if admission is not None else config
+                try:
+                    future = executor.submit(_process_file, i, files[i], tasks[i], file_config)
+                except BrokenProcessPool:
+                    # The pool broke since the last check; its futures are requeued as they fail
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    executor = _new_pool(workers)
+                    generation += 1
+                    future = executor.submit(_process_file, i, files[i], tasks[i], file_config)
+                futures[future] = (i, admission, generation)
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, admission, future_generation = futures.pop(future)
+                if admission is not None:
+                    budget.release(admission)
+                # Cancelled: still queued in a broken pool that was shut down, so it never started
+                started = not future.cancelled()
+                if not started or (isinstance(future.exception(), BrokenProcessPool) and retries[i] < BROKEN_POOL_RETRIES):
+                    retries[i] += started
+                    pending.append(i)
+                    if future_generation == generation:
+                        executor.shutdown(wait=True, cancel_futures=True)
+                        executor = _new_pool(workers)
+                        generation += 1
+                    continue
+                yield _completed_result(future, i, files, tasks, admission, batch_started, batch_start)
+    finally:
+        # Also reached when the caller stops iterating early: drop the files not started yet
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _completed_result(future, i: int, files: Sequence[str], tasks: Sequence[str], admission,
+                      batch_started: float, batch_start: float) -> Dict[str, Any]:
+    """Result dict of a finished file, with the batch timing fields"""
+    try:
+        result = future.result()
+    except Exception as e:
+        # The worker died (e.g. killed for memory); report the file instead of ending the batch
+        result = {
+            "status": "error",
+            "output": None,
+            "message": f"Failed to process {files[i]}: worker failed: {str(e)}",
+            "index": i,
+            "file_path": files[i],
+            "task_description": tasks[i],
+            "started": batch_started,
+            "seconds": 0.0,
+            "worker": None
+        }
+    result["queued_seconds"] = max(0.0, result.pop("started") - batch_started)
+    result["elapsed"] = time.perf_counter() - batch_start
+    if admission is not None:
+        result["memory_mode"] = admission.mode
+    return result
@@ -1,11 +1,18 @@
-from langchain.agents import AgentExecutor, ZeroShotAgent
-from langchain.chains import SequentialChain
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator
+import threading
 from tools.excel_parser_tool import ExcelParseTool
 from tools.data_compression_tool import DataCompressionTool
 from tools.format_adapter_tool import FormatAdapterTool
 from chains.excel_processing_chain import ExcelProcessingChain
 from config.config import ProcessingConfig
+from utils.stage_memo import StageMemo
+
+# Memoized stage outputs kept per agent for feedback re-runs (up to three per processed configuration)
+STAGE_MEMO_ENTRIES = 12
+# Estimated size of the memoized outputs kept per agent, and of a single output: stages of
+# workbooks above roughly 160k cells are recomputed rather than kept alive between runs
+STAGE_MEMO_BYTES = 64 * 1024 * 1024
+STAGE_MEMO_ENTRY_BYTES = 16 * 1024 * 1024
 
 class ExcelProcessingAgent:
     """Main agent that orchestrates the Excel processing workflow"""
@@ -16,14 +23,20 @@ class ExcelProcessingAgent:
         self.compression_tool = DataCompressionTool()
         self.format_tool = FormatAdapterTool()
         
-        # Initialize chain
-        self.processing_chain = ExcelProcessingChain()
+        # Initialize chain with the same tool instances
+        self.processing_chain = ExcelProcessingChain(self.parser_tool, self.compression_tool, self.format_tool)
+        
+        # Parse, compression and insight outputs of recent runs, reused by optimize_output
+        self.stage_memo = StageMemo(STAGE_MEMO_ENTRIES, STAGE_MEMO_BYTES, STAGE_MEMO_ENTRY_BYTES)
         
         # For a more sophisticated implementation using LangChain's AgentExecutor:
         # self._create_agent()
     
     def _create_agent(self):
         """Create agent with tools"""
+        # Imported here: langchain.agents takes seconds to import and only this sketch uses it
+        from langchain.agents import AgentExecutor, ZeroShotAgent
+        
         tools = [self.parser_tool, self.compression_tool, self.format_tool]
         
         # Create prompt template (simplified)
@@ -61,36 +74,89 @@ class ExcelProcessingAgent:
             password: Password for encrypted files
             
         Returns:
-            Formatted context content for LLM
+            Formatted context content for LLM, plus the "file_path" and "task_description" it was
+            produced for and the "stages" that were computed or reused
         """
-        # Use the processing chain
+        # Use the processing chain; stage outputs are memoized so feedback re-runs can reuse them
         result = self.processing_chain.run(
             file_path=file_path,
             task_description=task_description,
             config=config,
-            password=password
+            password=password,
+            memo=self.stage_memo
         )
+        result.update({"file_path": file_path, "task_description": task_description})
         
         return result
     
+    def stream_process_excel(self, 
+                             file_path: str, 
+                             task_description: str,
+                             config: ProcessingConfig,
+                             password: Optional[str] = None) -> Iterator[str]:
+        """
+        Streaming version of process_excel
+        
+        Args:
+            file_path: Path to the Excel file
+            task_description: Description of the task to guide processing
+            config: Processing configuration
+            password: Password for encrypted files
+            
+        Yields:
+            Chunks of formatted context content for LLM, header and indicators first
+        """
+        return self.processing_chain.stream(
+            file_path=file_path,
+            task_description=task_description,
+            config=config,
+            password=password
+        )
+    
     def optimize_output(self, 
                        current_output: Dict[str, Any],
                        feedback: str,
-                       config: ProcessingConfig) -> Dict[str, Any]:
+                       config: ProcessingConfig,
+                       task_description: Optional[str] = None,
+                       password: Optional[str] = None) -> Dict[str, Any]:
         """
         Optimize output based on feedback
         
+        Re-runs the pipeline for the same file with the configuration adjusted for the feedback,
+        recomputing only the stages whose inputs changed: a new max_output_length only repacks
+        the output, and a new compression_intensity reuses the parse.
+        
         Args:
-            current_output: Current formatted output
-            feedback: Feedback on the output
-            config: Processing configuration
+            current_output: Current formatted output, as returned by process_excel
+            feedback: Feedback on the output, recorded in the "feedback" history of the result
+            config: Processing configuration adjusted for the feedback
+            task_description: New task description; defaults to the one of current_output
+            password: Password for encrypted files
             
         Returns:
             Optimized output
         """
-        # This would implement the feedback optimization mechanism
-        # For now, we'll just return the current output
-        # A full implementation would adjust compression parameters
-        # and re-run the pipeline
+        if "file_path" not in current_output:
+            # Not produced by process_excel, so there is nothing to re-run
+            return current_output
         
-        return current_output
\ No newline at end of file
+        result = self.process_excel(
+            file_path=current_output["file_path"],
+            task_description=task_description or current_output["task_description"],
+            config=config,
+            password=password
+        )
+        result["feedback"] = current_output.get("feedback", []) + [feedback]
+        
+        return result
+    
+_shared_agent_lock = threading.Lock()
+_shared_agent: Optional[ExcelProcessingAgent] = None
+
+def get_shared_agent() -> ExcelProcessingAgent:
+    """Process-wide agent; its tools are stateless and safe to use from several threads at once"""
+    global _shared_agent
+    with _shared_agent_lock:
+        if _shared_agent is None:
+            _shared_agent = ExcelProcessingAgent()
+        return _shared_agent
\ No newline at end of file
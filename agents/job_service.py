@@ -0,0 +1,446 @@
+"""
+Job queue with warm worker processes for the long-running processing service
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import heapq
+import itertools
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from agents.batch_processor import _available_cpus, _init_worker, _pool_context, _process_file
+from config.config import ProcessingConfig
+from utils.memory_admission import Admission, MemoryBudget, MemoryEstimate, estimate_job_memory
+
+# Seconds to wait before starting a replacement for a worker that failed to start
+WORKER_RESTART_DELAY = 1.0
+JOB_STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the queue holds max_queue jobs"""
+
+class ServiceClosedError(RuntimeError):
+    """Raised when a job is submitted to a service that is shutting down"""
+
+def _worker_main(conn, environment: Dict[str, str], quiet: bool) -> None:
+    """
+    Worker process: warm up once, then process the jobs sent over the pipe until told to stop
+
+    The worker reports "ready" after the workflow is compiled, then answers every
+    (index, file_path, task_description, config) message with the batch processor's result dict.
+    """
+    # Ctrl-C in the service's terminal reaches the whole process group; the service decides what stops
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    _init_worker(environment)
+    conn.send("ready")
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        conn.send(_process_file(*message))
+
+class _Worker:
+    """A worker process and the pipe to it"""
+
+    def __init__(self, context, environment: Dict[str, str], quiet: bool):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, environment, quiet),
+                                       name="excel-service-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Ask the worker to exit after its current job, terminating it if it does not"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self) -> None:
+        self.process.terminate()
+        self.process.join()
+
+class Job:
+    """One processing request and its state"""
+
+    def __init__(self, file_path: str, task_description: str, config: ProcessingConfig, priority: int, sequence: int):
+        self.id = uuid.uuid4().hex
+        self.file_path = file_path
+        self.task_description = task_description
+        self.config = config
+        self.priority = priority
+        self.sequence = sequence
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.message: Optional[str] = None
+        self.cancel_requested = False
+        self.estimate: Optional[MemoryEstimate] = None  # under a memory budget
+        self.estimated_bytes: Optional[int] = None
+        self.memory_mode: Optional[str] = None  # "full" or "pipelined" once admitted under a memory budget
+        self._worker: Optional[_Worker] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def to_dict(self, include_output: bool = True) -> Dict[str, Any]:
+        """
+        JSON-serializable view of the job
+
+        Args:
+            include_output: Whether to include the formatted output of a finished job
+
+        Returns:
+            Dict with "id", "status", "priority", "file_path", "task_description", the submit,
+            start and finish times, "queued_seconds", "seconds" (processing time in the
+            worker), "estimated_bytes" and "memory_mode" (under a memory budget), "message"
+            (on failure or cancellation) and "output"
+        """
+        job = {
+            "id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "file_path": self.file_path,
+            "task_description": self.task_description,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queued_seconds": (self.started_at - self.submitted_at) if self.started_at is not None else None,
+            "seconds": self.result["seconds"] if self.result is not None else None,
+            "estimated_bytes": self.estimated_bytes,
+            "memory_mode": self.memory_mode,
+            "message": self.message
+        }
+        if include_output:
+            job["output"] = self.result.get("output") if self.result is not None else None
+        return job
+
+class JobService:
+    """
+    Priority job queue served by a pool of pre-warmed worker processes
+
+    Each worker compiles the workflow once at start-up and then processes jobs one at a
+    time, so a job costs only its processing time: compression plans, HTTP connection
+    pools and the LLM dispatcher stay warm in the worker across jobs. Higher priorities
+    run first, jobs of equal priority in submission order. With a memory budget, a job
+    starts only once its estimated peak memory fits next to the running jobs; a free worker
+    takes the highest-priority job that fits, so a job waiting for memory holds no worker and
+    does not hold up smaller jobs. Cancelling a queued job drops
+    it; cancelling a running job terminates its worker, which is replaced by a new one.
+    """
+
+    def __init__(self,
+                 workers: int = 0,
+                 max_queue: int = 100,
+                 max_finished_jobs: int = 1000,
+                 quiet: bool = True,
+                 memory_budget: int = 0):
+        """
+        Args:
+            workers: Worker processes (0 uses one per available CPU)
+            max_queue: Queued jobs before submit raises QueueFullError
+            max_finished_jobs: Finished jobs kept for status polling; the oldest are forgotten first
+            quiet: Discard the workers' progress output
+            memory_budget: Bytes of estimated peak memory the running jobs may take together;
+                jobs that do not fit wait or run in chunk-pipelined mode (0 disables)
+        """
+        self.workers = workers if workers > 0 else _available_cpus()
+        self.max_queue = max_queue
+        self.max_finished_jobs = max_finished_jobs
+        self.quiet = quiet
+        self.memory_budget = MemoryBudget(memory_budget) if memory_budget > 0 else None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: List[Any] = []
+        self._queued = 0
+        self._running = 0
+        self._ready = 0
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._closing = False
+        self._threads: List[threading.Thread] = []
+        self._context = None
+        self._environment: Dict[str, str] = {}
+        self._stats = {"submitted": 0, "succeeded": 0, "failed": 0, "cancelled": 0, "rejected": 0, "worker_restarts": 0}
+
+    def start(self) -> "JobService":
+        """Start the workers; they warm up in the background (see wait_ready)"""
+        self._context = _pool_context()
+        # Workers get the environment as it is now, like process_many's workers
+        self._environment = dict(os.environ)
+        for slot in range(self.workers):
+            thread = threading.Thread(target=self._run_slot, args=(slot,), name=f"excel-service-slot-{slot}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every worker has compiled its workflow; False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._ready >= self.workers or self._closing, timeout)
+
+    def submit(self, file_path: str, task_description: str, config: Optional[ProcessingConfig] = None, priority: int = 0) -> Job:
+        """
+        Queue a job
+
+        Args:
+            file_path: Path to the Excel file, as seen by the service
+            task_description: Description of the task to guide processing
+            config: Processing configuration (defaults to ProcessingConfig())
+            priority: Higher priorities run first
+
+        Returns:
+            The queued job
+
+        Raises:
+            QueueFullError: max_queue jobs are already waiting
+            ServiceClosedError: The service is shutting down
+        """
+        config = config or ProcessingConfig()
+        # Estimated before taking the lock: probing reads the workbook
+        estimate = estimate_job_memory(file_path, config) if self.memory_budget is not None else None
+        with self._condition:
+            if self._closing:
+                raise ServiceClosedError("Service is shutting down")
+            if self._queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise QueueFullError(f"Job queue is full ({self.max_queue} jobs waiting)")
+            job = Job(file_path, task_description, config, priority, next(self._sequence))
+            if estimate is not None:
+                job.estimate = estimate
+                job.estimated_bytes = estimate.full_bytes
+            self._jobs[job.id] = job
+            heapq.heappush(self._queue, (-priority, job.sequence, job))
+            self._queued += 1
+            self._stats["submitted"] += 1
+            self._condition.notify_all()
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        """
+        Wait for a job to finish
+
+        Returns:
+            The job, finished unless the timeout expired first; None for an unknown job
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._condition.wait_for(lambda: job.finished, timeout)
+            return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job
+
+        A queued job is cancelled at once. A running job's worker is terminated; the job is
+        reported as cancelled once the worker has exited (unless it finished first).
+
+        Returns:
+            The job, or None for an unknown job
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel_requested = True
+            if job.status == "queued":
+                # Left in the heap; _next_job skips it
+                self._queued -= 1
+                self._finish(job, "cancelled", message="Cancelled before it started")
+                return job
+            # Still under the lock, so the worker cannot have moved on to another job
+            job._worker.process.terminate()
+            return job
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        """Summaries of the known jobs, oldest first"""
+        with self._condition:
+            return [job.to_dict(include_output=False) for job in self._jobs.values()]
+
+    def stats(self) -> Dict[str, Any]:
+        """Job counters, worker and queue state, and the memory budget's counters when there is one"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                "workers": self.workers,
+                "workers_ready": self._ready,
+                "queued": self._queued,
+                "running": self._running,
+                "max_queue": self.max_queue
+            })
+        if self.memory_budget is not None:
+            stats["memory"] = self.memory_budget.stats()
+        return stats
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Stop the service: queued jobs are cancelled, then the workers exit
+
+        Args:
+            wait: Let running jobs finish; otherwise they are cancelled and their workers terminated
+        """
+        with self._condition:
+            if self._closing:
+                return
+            self._closing = True
+            for job in [job for job in self._jobs.values() if job.status == "queued"]:
+                self._queued -= 1
+                self._finish(job, "cancelled", message="Service shut down")
+            self._queue.clear()
+            running = [job for job in self._jobs.values() if job.status == "running"]
+            self._condition.notify_all()
+        if not wait:
+            for job in running:
+                self.cancel(job.id)
+        for thread in self._threads:
+            thread.join()
+
+    def _next_job(self) -> Tuple[Optional[Job], Optional[Admission]]:
+        """
+        Block until a job is due, take it off the queue and admit its memory
+
+        Without a memory budget the due job is the highest-priority one. With one, it is the
+        highest-priority job the budget admits now: a job that does not fit stays queued
+        (and cancellable as such), and is looked at again whenever a job finishes.
+
+        Returns:
+            The job and its admission (None without a budget); (None, None) when the service is closing
+        """
+        with self._condition:
+            while True:
+                if self._closing:
+                    return None, None
+                # Cancelled jobs are left in the heap by cancel; drop them now
+                self._queue = [entry for entry in self._queue if entry[2].status == "queued"]
+                heapq.heapify(self._queue)
+                if self._queue and self.memory_budget is None:
+                    return heapq.heappop(self._queue)[2], None
+                for entry in sorted(self._queue):
+                    job = entry[2]
+                    admission = self.memory_budget.try_admit(job.estimate, job.config)
+                    if admission is not None:
+                        self._queue.remove(entry)
+                        heapq.heapify(self._queue)
+                        return job, admission
+                self._condition.wait()
+
+    def _start_job(self, job: Job, worker: _Worker, admission: Optional[Admission]) -> bool:
+        """Mark the job running on the worker; False if it was cancelled meanwhile"""
+        with self._condition:
+            if job.status != "queued":
+                if admission is not None:
+                    self.memory_budget.release(admission)
+                    self._condition.notify_all()
+                return False
+            job.status = "running"
+            job.started_at = time.time()
+            job._worker = worker
+            if admission is not None:
+                job.config = admission.config
+                job.memory_mode = admission.mode
+            self._queued -= 1
+            self._running += 1
+            return True
+
+    def _start_worker(self) -> Optional[_Worker]:
+        """Start a worker and wait until it is warm; None if the service closes meanwhile"""
+        while True:
+            with self._condition:
+                if self._closing:
+                    return None
+            worker = _Worker(self._context, self._environment, self.quiet)
+            try:
+                if worker.conn.recv() == "ready":
+                    with self._condition:
+                        self._ready += 1
+                        self._condition.notify_all()
+                    return worker
+            except (EOFError, OSError):
+                pass
+            worker.kill()
+            time.sleep(WORKER_RESTART_DELAY)
+
+    def _run_slot(self, slot: int) -> None:
+        """Feed jobs to one worker process, replacing it when it dies or is terminated"""
+        worker = None
+        try:
+            while True:
+                if worker is None:
+                    worker = self._start_worker()
+                    if worker is None:
+                        return
+                job, admission = self._next_job()
+                if job is None:
+                    return
+                if not self._start_job(job, worker, admission):
+                    continue
+                result = None
+                try:
+                    worker.conn.send((job.sequence, job.file_path, job.task_description, job.config))
+                    result = worker.conn.recv()
+                except (EOFError, OSError):
+                    pass
+                with self._condition:
+                    if admission is not None:
+                        # Under the condition, so the slots waiting for memory see the release in _finish
+                        self.memory_budget.release(admission)
+                    job._worker = None
+                    self._running -= 1
+                    if result is not None:
+                        self._finish(job, "succeeded" if result["status"] == "success" else "failed", result, result.get("message"))
+                    elif job.cancel_requested:
+                        self._finish(job, "cancelled", message="Cancelled while running")
+                    else:
+                        self._finish(job, "failed", message=f"Worker exited with code {worker.process.exitcode} while processing {job.file_path}")
+                    if result is not None and not job.cancel_requested:
+                        continue
+                    # The worker died or was terminated (a cancel can arrive just after the result)
+                    self._ready -= 1
+                    self._stats["worker_restarts"] += 1
+                worker.kill()
+                worker.conn.close()
+                worker = None
+        finally:
+            if worker is not None:
+                worker.stop()
+                with self._condition:
+                    self._ready -= 1
+
+    def _finish(self, job: Job, status: str, result: Optional[Dict[str, Any]] = None, message: Optional[str] = None) -> None:
+        """Record a job's outcome and forget the oldest finished jobs; call with the condition held"""
+        job.status = status
+        job.result = result
+        job.message = message
+        job.finished_at = time.time()
+        self._stats[status] += 1
+        finished = [job_id for job_id, known in self._jobs.items() if known.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+        self._condition.notify_all()
+
+    def __enter__(self) -> "JobService":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -2,16 +2,26 @@
 LangGraph-based implementation of the Excel processing agent
 """
 
-from typing import Annotated, Literal, TypedDict, List, Dict, Any
+from typing import Annotated, Literal, TypedDict, List, Dict, Any, Iterator, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from langchain_core.runnables import RunnableLambda
+from langgraph.constants import Send
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from dotenv import load_dotenv
+import asyncio
+import operator
 import os
-from agents.excel_processing_agent import ExcelProcessingAgent
+import threading
+from agents.excel_processing_agent import ExcelProcessingAgent, get_shared_agent
 from config.config import ProcessingConfig
-
-# Load environment variables
-load_dotenv()
+from utils.checkpoint import CheckpointStore, checkpoint_id
+from utils.chunk_pipeline import run_sheet_pipeline
+from utils.excel_utils import ExcelParser
+from utils.instrumentation import begin_run, bind_context, iterate_in, span
+from utils.memory_admission import MemoryBudget, estimate_job_memory
+from utils.profiling import profile_node
+from utils.result_cache import ResultCache, get_result_cache, result_cache_key
 
 class ExcelProcessingState(TypedDict):
     """State definition for the Excel processing workflow"""
@@ -21,71 +31,348 @@ class ExcelProcessingState(TypedDict):
     parsed_data: Dict[str, Any]
     compressed_data: Dict[str, Any]
     formatted_output: str
+    insights_source: str  # "llm" or "rules", set by format_output
+    sheets: List[Dict[str, Any]]  # probe results, one entry per sheet to process
+    checkpoint_id: str  # run identifier for per-sheet checkpoints, empty when not checkpointing
+    sheet_results: Annotated[List[Dict[str, Any]], operator.add]  # appended to by the per-sheet branches
     messages: Annotated[list, add_messages]
     next_action: Literal["parse", "compress", "format", "end"]
 
 class ExcelProcessingWorkflow:
     """LangGraph-based workflow for Excel processing"""
     
-    def __init__(self):
-        self.agent = ExcelProcessingAgent()
-        self.workflow = self._create_workflow()
+    # Graph compiled once for all workflows on the shared agent
+    _shared_app = None
+    _shared_app_lock = threading.Lock()
+    
+    def __init__(self, agent: Optional[ExcelProcessingAgent] = None, memory_budget: Optional[MemoryBudget] = None):
+        """
+        Args:
+            agent: Agent whose tools run the nodes; defaults to the process-wide shared agent
+            memory_budget: Admission control shared by concurrent calls (and by other workflows
+                given the same budget): a run starts only once its estimated peak memory fits,
+                in chunk-pipelined mode if only that fits; None runs every call at once
+        """
+        self.agent = agent if agent is not None else get_shared_agent()
+        self.memory_budget = memory_budget
+        self._workflow = None
+        self._app = None
+        self._app_lock = threading.Lock()
+    
+    @property
+    def workflow(self) -> StateGraph:
+        """Graph definition, built on first use"""
+        if self._workflow is None:
+            self._workflow = self._create_workflow()
+        return self._workflow
+    
+    @property
+    def app(self):
+        """
+        Compiled graph, reused by every call
+        
+        Nodes only use the agent's stateless tools, so one compiled graph serves concurrent
+        invocations from several threads, and all workflows on the shared agent share one graph.
+        """
+        if self._app is None:
+            if self.agent is get_shared_agent():
+                with ExcelProcessingWorkflow._shared_app_lock:
+                    if ExcelProcessingWorkflow._shared_app is None:
+                        ExcelProcessingWorkflow._shared_app = self.workflow.compile()
+                    self._app = ExcelProcessingWorkflow._shared_app
+            else:
+                with self._app_lock:
+                    if self._app is None:
+                        self._app = self.workflow.compile()
+        return self._app
     
     def _create_workflow(self) -> StateGraph:
-        """Create the LangGraph workflow"""
+        """
+        Create the LangGraph workflow
+        
+        A probe step lists the sheets, then every sheet is parsed, profiled and compressed
+        in its own branch. Branches run in parallel, so a large sheet no longer holds up the
+        others, and a merge step joins their results in workbook order before formatting.
+        Under ainvoke the nodes await the tools' async versions, so the event loop is never
+        blocked by parsing, compression or LLM calls.
+        """
         workflow = StateGraph(ExcelProcessingState)
         
         # Add nodes
-        workflow.add_node("parse_excel", self._parse_excel)
-        workflow.add_node("compress_data", self._compress_data)
-        workflow.add_node("format_output", self._format_output)
+        # Each node has a sync and an async implementation: invoke runs the first, ainvoke the second
+        workflow.add_node("probe_workbook", self._node("probe_workbook", self._probe_workbook, self._aprobe_workbook))
+        workflow.add_node("process_sheet", self._node("process_sheet", self._process_sheet, self._aprocess_sheet))
+        workflow.add_node("merge_sheets", self._node("merge_sheets", self._merge_sheets))
+        workflow.add_node("format_output", self._node("format_output", self._format_output, self._aformat_output))
         
         # Add edges
-        workflow.add_edge(START, "parse_excel")
-        workflow.add_edge("parse_excel", "compress_data")
-        workflow.add_edge("compress_data", "format_output")
+        workflow.add_edge(START, "probe_workbook")
+        workflow.add_conditional_edges("probe_workbook", self._fan_out_sheets, ["process_sheet", "merge_sheets"])
+        workflow.add_edge("process_sheet", "merge_sheets")
+        workflow.add_edge("merge_sheets", "format_output")
         workflow.add_edge("format_output", END)
         
         return workflow
     
-    def _parse_excel(self, state: ExcelProcessingState) -> Dict[str, Any]:
-        """Parse Excel file"""
-        print("Parsing Excel file...")
-        result = self.agent.parser_tool._run(
-            file_path=state["file_path"],
-            include_sheets=state["config"].include_sheets,
-            password=None  # Not implemented in this example
-        )
+    def _node(self, name: str, func, afunc=None) -> RunnableLambda:
+        """Graph node that runs under the profiler when the run's config.profile_dir asks for it"""
+        def run(state: Dict[str, Any]) -> Dict[str, Any]:
+            return self._run_node(name, func, state)
         
-        if result["status"] == "success":
-            return {
-                "parsed_data": result,
-                "messages": [{"role": "system", "content": "Excel file parsed successfully"}]
-            }
-        else:
+        async def arun(state: Dict[str, Any]) -> Dict[str, Any]:
+            with profile_node(state["config"], name, state["file_path"], state.get("sheet", {}).get("name")):
+                return await afunc(state)
+        
+        return RunnableLambda(run, afunc=arun if afunc is not None else None)
+    
+    @staticmethod
+    def _run_node(name: str, func, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a node function, profiled if the run's configuration asks for it"""
+        with profile_node(state["config"], name, state["file_path"], state.get("sheet", {}).get("name")):
+            return func(state)
+    
+    def _probe_workbook(self, state: ExcelProcessingState) -> Dict[str, Any]:
+        """List the sheets to process without reading their data"""
+        print("Probing Excel file...")
+        try:
+            with span("probe") as probe_span:
+                sheets = ExcelParser.probe_workbook(state["file_path"], state["config"].include_sheets)
+                probe_span.set(sheets=len(sheets), cells=sum(sheet["rows"] * sheet["columns"] for sheet in sheets))
+        except Exception as e:
             return {
-                "messages": [{"role": "system", "content": f"Error parsing Excel: {result['message']}"}],
+                "sheets": [],
+                "messages": [{"role": "system", "content": f"Error parsing Excel: Failed to parse Excel file: {str(e)}"}],
                 "next_action": "end"
             }
+        
+        messages = [{"role": "system", "content": f"Found {len(sheets)} sheets"}]
+        run_id = self._checkpoint_id(state, sheets)
+        store = self._checkpoint_store(state["config"]) if run_id else None
+        if store is not None and not store.trusted():
+            # Checkpoints are unpickled, so they are not read from a directory others can write to
+            messages.append({"role": "system", "content": f"Checkpointing disabled: {store.directory} must belong "
+                                                          f"to the current user and not be writable by group or others"})
+            run_id = ""
+        elif store is not None:
+            # Left behind by runs that crashed or whose workbook has changed since
+            store.prune(keep=run_id)
+            completed = store.completed_sheets(run_id)
+            if completed:
+                messages.append({"role": "system", "content": f"Resuming with {len(completed)} of {len(sheets)} sheets checkpointed"})
+        
+        return {
+            "sheets": sheets,
+            "checkpoint_id": run_id,
+            "messages": messages
+        }
     
-    def _compress_data(self, state: ExcelProcessingState) -> Dict[str, Any]:
-        """Compress parsed data"""
-        print("Compressing data...")
-        result = self.agent.compression_tool._run(
-            data=state["parsed_data"],
-            config=state["config"]
+    @staticmethod
+    def _checkpoint_store(config: ProcessingConfig) -> CheckpointStore:
+        """Checkpoint store of a run's configuration"""
+        return CheckpointStore(config.checkpoint_dir, config.checkpoint_max_age, config.checkpoint_max_bytes)
+    
+    @staticmethod
+    def _checkpoint_id(state: ExcelProcessingState, sheets: List[Dict[str, Any]]) -> str:
+        """Checkpoint run identifier when checkpointing is on and the workbook is big enough, else empty"""
+        config = state["config"]
+        if not config.checkpoint_dir or sum(sheet["rows"] * sheet["columns"] for sheet in sheets) < config.checkpoint_min_cells:
+            return ""
+        try:
+            return checkpoint_id(state["file_path"], config)
+        except OSError:
+            return ""
+    
+    async def _aprobe_workbook(self, state: ExcelProcessingState) -> Dict[str, Any]:
+        """Async version of _probe_workbook; the probe reads the file in the loop's default executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, bind_context(self._probe_workbook), state)
+    
+    def _fan_out_sheets(self, state: ExcelProcessingState) -> Union[str, List[Send]]:
+        """Start one process_sheet branch per sheet, largest first so it starts before the small ones"""
+        sheets = state.get("sheets", [])
+        if not sheets:
+            return "merge_sheets"
+        
+        order = sorted(range(len(sheets)), key=lambda i: sheets[i]["rows"] * sheets[i]["columns"], reverse=True)
+        return [
+            Send("process_sheet", {
+                "file_path": state["file_path"],
+                "config": state["config"],
+                "sheet": sheets[i],
+                "index": i,
+                "checkpoint_id": state.get("checkpoint_id", "")
+            })
+            for i in order
+        ]
+    
+    def _process_sheet(self, branch: Dict[str, Any]) -> Dict[str, Any]:
+        """Process a single sheet, or restore it from its checkpoint"""
+        with self._sheet_span(branch) as sheet_span:
+            resumed = self._load_checkpoint(branch)
+            sheet_span.set(resumed=resumed is not None)
+            if resumed is not None:
+                return resumed
+            update = self._run_sheet(branch)
+            self._save_checkpoint(branch, update)
+            return update
+    
+    async def _aprocess_sheet(self, branch: Dict[str, Any]) -> Dict[str, Any]:
+        """Async version of _process_sheet"""
+        loop = asyncio.get_running_loop()
+        with self._sheet_span(branch) as sheet_span:
+            resumed = None
+            if branch.get("checkpoint_id"):
+                resumed = await loop.run_in_executor(None, self._load_checkpoint, branch)
+            sheet_span.set(resumed=resumed is not None)
+            if resumed is not None:
+                return resumed
+            update = await self._arun_sheet(branch)
+            if branch.get("checkpoint_id"):
+                await loop.run_in_executor(None, self._save_checkpoint, branch, update)
+            return update
+    
+    @staticmethod
+    def _sheet_span(branch: Dict[str, Any]):
+        """Span covering one sheet branch, sized from the probe"""
+        sheet = branch["sheet"]
+        return span("sheet", sheet=sheet["name"], rows=sheet["rows"], cells=sheet["rows"] * sheet["columns"],
+                    pipelined=bool(branch["config"].pipeline_chunk_rows))
+    
+    def _load_checkpoint(self, branch: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """State update from the sheet's checkpoint, or None if it has none"""
+        if not branch.get("checkpoint_id"):
+            return None
+        sheet_result = self._checkpoint_store(branch["config"]).load_sheet(branch["checkpoint_id"], branch["index"])
+        if sheet_result is None or sheet_result["name"] != branch["sheet"]["name"]:
+            return None
+        print(f"Restored sheet {sheet_result['name']} from checkpoint")
+        return {"sheet_results": [sheet_result]}
+    
+    def _save_checkpoint(self, branch: Dict[str, Any], update: Dict[str, Any]) -> None:
+        """Checkpoint a successfully processed sheet; checkpointing failures never fail the run"""
+        sheet_result = update["sheet_results"][0]
+        if not branch.get("checkpoint_id") or sheet_result.get("error"):
+            return
+        try:
+            self._checkpoint_store(branch["config"]).save_sheet(branch["checkpoint_id"], sheet_result)
+        except Exception as e:
+            print(f"Could not checkpoint sheet {sheet_result['name']}: {str(e)}")
+    
+    def _discard_checkpoints(self, state: ExcelProcessingState) -> None:
+        """Remove the checkpoints of a run that produced its output"""
+        if state.get("checkpoint_id"):
+            self._checkpoint_store(state["config"]).discard(state["checkpoint_id"])
+    
+    def _run_sheet(self, branch: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse, profile and compress a single sheet, as a chunk pipeline if pipeline_chunk_rows is set"""
+        sheet_name = branch["sheet"]["name"]
+        print(f"Processing sheet {sheet_name}...")
+        sheet_result = {"index": branch["index"], "name": sheet_name, "parsed": None, "compressed": None}
+        
+        if branch["config"].pipeline_chunk_rows:
+            compression_tool = self.agent.compression_tool
+            try:
+                parsed_sheet, compressed_sheet = run_sheet_pipeline(
+                    branch["file_path"],
+                    sheet_name,
+                    branch["config"],
+                    compression_tool.get_compression_plan,
+                    compression_tool._compress_frame
+                )
+            except Exception as e:
+                sheet_result["error"] = f"Error parsing Excel: Failed to parse Excel file: {str(e)}"
+                return {"sheet_results": [sheet_result]}
+            if compressed_sheet is not None:
+                sheet_result["parsed"] = parsed_sheet
+                sheet_result["compressed"] = compressed_sheet
+                return {"sheet_results": [sheet_result]}
+            # The partial aggregates do not fit the plan resolved on the whole sheet; compress it in full
+        
+        parsed = self.agent.parser_tool._run(
+            file_path=branch["file_path"],
+            include_sheets=[sheet_name],
+            password=None  # Not implemented in this example
         )
+        if not self._record_parsed(sheet_result, parsed):
+            return {"sheet_results": [sheet_result]}
         
-        if result["status"] == "success":
-            return {
-                "compressed_data": result,
-                "messages": [{"role": "system", "content": "Data compressed successfully"}]
-            }
-        else:
-            return {
-                "messages": [{"role": "system", "content": f"Error compressing data: {result['message']}"}],
-                "next_action": "end"
-            }
+        compressed = self.agent.compression_tool._run(
+            data=parsed,
+            config=branch["config"]
+        )
+        self._record_compressed(sheet_result, compressed)
+        
+        return {"sheet_results": [sheet_result]}
+    
+    async def _arun_sheet(self, branch: Dict[str, Any]) -> Dict[str, Any]:
+        """Async version of _run_sheet"""
+        if branch["config"].pipeline_chunk_rows:
+            # The chunk pipeline runs its own reader and profiler threads; keep it off the event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, bind_context(self._run_sheet), branch)
+        
+        sheet_name = branch["sheet"]["name"]
+        print(f"Processing sheet {sheet_name}...")
+        sheet_result = {"index": branch["index"], "name": sheet_name, "parsed": None, "compressed": None}
+        
+        parsed = await self.agent.parser_tool._arun(
+            file_path=branch["file_path"],
+            include_sheets=[sheet_name],
+            password=None  # Not implemented in this example
+        )
+        if not self._record_parsed(sheet_result, parsed):
+            return {"sheet_results": [sheet_result]}
+        
+        compressed = await self.agent.compression_tool._arun(
+            data=parsed,
+            config=branch["config"]
+        )
+        self._record_compressed(sheet_result, compressed)
+        
+        return {"sheet_results": [sheet_result]}
+    
+    @staticmethod
+    def _record_parsed(sheet_result: Dict[str, Any], parsed: Dict[str, Any]) -> bool:
+        """Store a parser tool result in a sheet result; False if parsing failed"""
+        if parsed["status"] != "success":
+            sheet_result["error"] = f"Error parsing Excel: {parsed['message']}"
+            return False
+        sheet_result["parsed"] = parsed["sheets"].get(sheet_result["name"])
+        return True
+    
+    @staticmethod
+    def _record_compressed(sheet_result: Dict[str, Any], compressed: Dict[str, Any]) -> None:
+        """Store a compression tool result in a sheet result"""
+        if compressed["status"] != "success":
+            sheet_result["error"] = f"Error compressing data: {compressed['message']}"
+            return
+        sheet_result["compressed"] = compressed["sheets"].get(sheet_result["name"])
+    
+    def _merge_sheets(self, state: ExcelProcessingState) -> Dict[str, Any]:
+        """Join the per-sheet results, in workbook order, into parsed and compressed data"""
+        sheet_results = sorted(state.get("sheet_results", []), key=lambda result: result["index"])
+        parsed_sheets = {result["name"]: result["parsed"] for result in sheet_results if result["parsed"] is not None}
+        compressed_sheets = {result["name"]: result["compressed"] for result in sheet_results if result["compressed"] is not None}
+        messages = [{"role": "system", "content": result["error"]} for result in sheet_results if result.get("error")]
+        
+        if state.get("next_action") == "end":
+            # The probe failed; format_output reports an empty result as before
+            return {"messages": messages}
+        
+        messages.append({"role": "system", "content": f"Processed {len(compressed_sheets)} of {len(sheet_results)} sheets"})
+        return {
+            "parsed_data": {
+                "status": "success",
+                "sheets": parsed_sheets,
+                "message": f"Successfully parsed {len(parsed_sheets)} sheets"
+            },
+            "compressed_data": {
+                "status": "success",
+                "sheets": compressed_sheets,
+                "message": f"Successfully compressed {len(compressed_sheets)} sheets"
+            },
+            "messages": messages
+        }
     
     def _format_output(self, state: ExcelProcessingState) -> Dict[str, Any]:
         """Format compressed data"""
@@ -95,10 +382,29 @@ class ExcelProcessingWorkflow:
             task_description=state["task_description"],
             config=state["config"]
         )
-        
+        if result["status"] == "success":
+            self._discard_checkpoints(state)
+        return self._format_update(result)
+    
+    async def _aformat_output(self, state: ExcelProcessingState) -> Dict[str, Any]:
+        """Async version of _format_output"""
+        print("Formatting output...")
+        result = await self.agent.format_tool._arun(
+            data=state["compressed_data"],
+            task_description=state["task_description"],
+            config=state["config"]
+        )
+        if result["status"] == "success":
+            await asyncio.get_running_loop().run_in_executor(None, self._discard_checkpoints, state)
+        return self._format_update(result)
+    
+    @staticmethod
+    def _format_update(result: Dict[str, Any]) -> Dict[str, Any]:
+        """State update for a format tool result"""
         if result["status"] == "success":
             return {
                 "formatted_output": result["formatted_content"],
+                "insights_source": result["insights_source"],
                 "messages": [{"role": "system", "content": "Output formatted successfully"}]
             }
         else:
@@ -107,6 +413,77 @@ class ExcelProcessingWorkflow:
                 "next_action": "end"
             }
     
+    @staticmethod
+    def _initial_state(file_path: str, task_description: str, config: ProcessingConfig) -> ExcelProcessingState:
+        """Initial state"""
+        return ExcelProcessingState(
+            file_path=file_path,
+            task_description=task_description,
+            config=config,
+            parsed_data={},
+            compressed_data={},
+            formatted_output="",
+            insights_source="",
+            sheets=[],
+            checkpoint_id="",
+            sheet_results=[],
+            messages=[],
+            next_action="parse"
+        )
+    
+    def run(self, 
+            file_path: str, 
+            task_description: str,
+            config: ProcessingConfig) -> Dict[str, Any]:
+        """
+        Run the workflow and return its final state
+        
+        Args:
+            file_path: Path to the Excel file
+            task_description: Description of the task to guide processing
+            config: Processing configuration
+            
+        Returns:
+            Final workflow state, including "formatted_output" and the step "messages"
+        """
+        with begin_run("workflow", file=file_path, intensity=config.compression_intensity), \
+                self._admitted(file_path, config) as config:
+            initial_state = self._initial_state(file_path, task_description, config)
+            
+            # Execute the workflow on the compiled graph; max_concurrency bounds the parallel sheet branches
+            return self.app.invoke(initial_state, {"max_concurrency": max(1, config.max_parallel_sheets)})
+    
+    @contextmanager
+    def _admitted(self, file_path: str, config: ProcessingConfig) -> Iterator[ProcessingConfig]:
+        """Wait for the memory budget to admit a run; yields the configuration to run with"""
+        if self.memory_budget is None:
+            yield config
+            return
+        with span("admission") as admission_span:
+            admission = self.memory_budget.admit(estimate_job_memory(file_path, config), config)
+            admission_span.set(mode=admission.mode, reserved_bytes=admission.reserved_bytes)
+        try:
+            yield admission.config
+        finally:
+            self.memory_budget.release(admission)
+    
+    @asynccontextmanager
+    async def _aadmitted(self, file_path: str, config: ProcessingConfig):
+        """Async version of _admitted; probing runs in an executor, waiting on the event loop"""
+        if self.memory_budget is None:
+            yield config
+            return
+        loop = asyncio.get_running_loop()
+        with span("admission") as admission_span:
+            estimate = await loop.run_in_executor(None, estimate_job_memory, file_path, config)
+            # Not in an executor: waiting jobs would take the threads the admitted ones need to finish
+            admission = await self.memory_budget.aadmit(estimate, config)
+            admission_span.set(mode=admission.mode, reserved_bytes=admission.reserved_bytes)
+        try:
+            yield admission.config
+        finally:
+            self.memory_budget.release(admission)
+    
     def process_excel(self, 
                      file_path: str, 
                      task_description: str,
@@ -122,25 +499,154 @@ class ExcelProcessingWorkflow:
         Returns:
             Formatted context content for LLM
         """
-        # Compile the workflow
-        app = self.workflow.compile()
+        with begin_run("process_excel", file=file_path) as root:
+            cache = get_result_cache()
+            key = self._result_cache_key(cache, file_path, task_description, config)
+            compute = lambda: self._result(self.run(file_path, task_description, config))
+            if key is None:
+                return compute()["output"]
+            
+            # Identical requests are answered from the result cache; concurrent misses share one run
+            result, status = cache.get_or_compute(key, compute, cacheable=lambda result: result["complete"])
+            root.set(result_cache=status)
+            return result["output"]
+    
+    async def aprocess_excel(self, 
+                             file_path: str, 
+                             task_description: str,
+                             config: ProcessingConfig) -> str:
+        """
+        Async version of process_excel, for use from an event loop
         
-        # Initial state
-        initial_state = ExcelProcessingState(
-            file_path=file_path,
-            task_description=task_description,
-            config=config,
-            parsed_data={},
-            compressed_data={},
-            formatted_output="",
-            messages=[],
-            next_action="parse"
-        )
+        Parsing and compression run in executors and LLM calls on the async HTTP client, so one
+        event loop can serve many concurrent calls.
+        
+        Args:
+            file_path: Path to the Excel file
+            task_description: Description of the task to guide processing
+            config: Processing configuration
+            
+        Returns:
+            Formatted context content for LLM
+        """
+        async def acompute():
+            with span("workflow", file=file_path, intensity=config.compression_intensity):
+                async with self._aadmitted(file_path, config) as run_config:
+                    initial_state = self._initial_state(file_path, task_description, run_config)
+                    final_state = await self.app.ainvoke(initial_state, {"max_concurrency": max(1, run_config.max_parallel_sheets)})
+            return self._result(final_state)
+        
+        with begin_run("aprocess_excel", file=file_path) as root:
+            cache = get_result_cache()
+            if cache is None:
+                return (await acompute())["output"]
+            # Hashing a workbook seen for the first time reads the whole file
+            loop = asyncio.get_running_loop()
+            key = await loop.run_in_executor(None, self._result_cache_key, cache, file_path, task_description, config)
+            if key is None:
+                return (await acompute())["output"]
+            
+            result, status = await cache.aget_or_compute(
+                key,
+                acompute,
+                lambda: self._result(self.run(file_path, task_description, config)),
+                cacheable=lambda result: result["complete"]
+            )
+            root.set(result_cache=status)
+            return result["output"]
+    
+    @staticmethod
+    def _result_cache_key(cache: Optional[ResultCache], file_path: str, task_description: str, config: ProcessingConfig) -> Optional[str]:
+        """Result cache key of a request; None when caching is disabled, the run is profiled or the file cannot be read"""
+        if cache is None or config.profile_dir:
+            # A profiled run has to run to be profiled; profile settings are not part of the key
+            return None
+        try:
+            return result_cache_key(file_path, task_description, config)
+        except OSError:
+            # Not cached; the workflow reports the missing or unreadable file
+            return None
+    
+    @staticmethod
+    def _result(final_state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Output of a run, and whether it is complete enough to cache: no step failed and the
+        insights came from the LLM rather than the rule-based fallback
+        """
+        failed = any(str(message.content).startswith("Error") for message in final_state.get("messages", []))
+        return {
+            "output": final_state.get("formatted_output", "Error: No output generated"),
+            "complete": not failed and final_state.get("insights_source") == "llm"
+        }
+    
+    def stream_process_excel(self, 
+                             file_path: str, 
+                             task_description: str,
+                             config: ProcessingConfig) -> Iterator[str]:
+        """
+        Process Excel file, streaming the formatted output as it is produced
+        
+        The header is emitted before parsing starts, the rule-based indicators as soon as
+        every sheet is compressed (sheets are processed in parallel, as in the graph), and
+        the LLM insights line by line.
+        
+        Args:
+            file_path: Path to the Excel file
+            task_description: Description of the task to guide processing
+            config: Processing configuration
+            
+        Yields:
+            Chunks of formatted context content for LLM
+        """
+        # The root span is current only while the run computes a chunk, not while the caller consumes it
+        root = begin_run("stream_process_excel", file=file_path, intensity=config.compression_intensity)
+        try:
+            yield from iterate_in(root, self._stream_run(file_path, task_description, config))
+        except Exception as e:
+            root.finish(e)
+            raise
+        finally:
+            root.finish()
+    
+    def _stream_run(self, file_path: str, task_description: str, config: ProcessingConfig) -> Iterator[str]:
+        """Body of stream_process_excel"""
+        format_tool = self.agent.format_tool
+        yield format_tool.format_header(task_description)
+        
+        with self._admitted(file_path, config) as config:
+            yield from self._stream_admitted(file_path, task_description, config)
+    
+    def _stream_admitted(self, file_path: str, task_description: str, config: ProcessingConfig) -> Iterator[str]:
+        """Body of stream_process_excel after the header, once the run is admitted"""
+        format_tool = self.agent.format_tool
+        state = self._initial_state(file_path, task_description, config)
+        
+        # Run the nodes up to formatting directly; the format node is replaced by the streaming formatter
+        state.update(self._run_node("probe_workbook", self._probe_workbook, state))
+        if state["next_action"] == "end":
+            yield state["messages"][-1]["content"]
+            return
         
-        # Execute the workflow
-        final_state = app.invoke(initial_state)
+        branches = self._fan_out_sheets(state)
+        if isinstance(branches, list):
+            with ThreadPoolExecutor(max_workers=max(1, config.max_parallel_sheets)) as executor:
+                futures = [executor.submit(bind_context(self._run_node), "process_sheet", self._process_sheet, branch.arg)
+                           for branch in branches]
+                for future in futures:
+                    state["sheet_results"].extend(future.result()["sheet_results"])
+        state.update(self._run_node("merge_sheets", self._merge_sheets, state))
         
-        return final_state.get("formatted_output", "Error: No output generated")
+        format_span = span("format", sheets=len(state["compressed_data"].get("sheets", {})), stream=True)
+        try:
+            yield from iterate_in(format_span, format_tool.stream(
+                data=state["compressed_data"],
+                task_description=task_description,
+                config=config,
+                include_header=False
+            ))
+        finally:
+            format_span.finish()
+        self._discard_checkpoints(state)
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+"""
+Benchmark concurrent requests served from one event loop
+
+Runs the same batch of requests three ways: one after another with
+process_excel, concurrently on one event loop with the previous async entry
+point (a coroutine that calls the blocking process_excel), and concurrently
+with aprocess_excel. A heartbeat task measures how long the event loop was
+blocked, which is what other requests on an asyncio server would wait for.
+"""
+
+from mock_deepseek_server import MockDeepSeekServer
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+SAMPLE_WORKBOOKS = ("complex_sample_data.xlsx", "sample_data.xlsx", "simple_sample_data.xlsx")
+
+async def _serve(requests, handler):
+    """Run the requests concurrently while a heartbeat measures event loop stalls"""
+    gaps = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            gaps.append(now - last - 0.01)
+            last = now
+
+    beat = asyncio.ensure_future(heartbeat())
+    start = time.perf_counter()
+    await asyncio.gather(*[handler(*request) for request in requests])
+    elapsed = time.perf_counter() - start
+    done.set()
+    await beat
+    return elapsed, max(gaps, default=0.0)
+
+def run_benchmark(copies: int = 2, latency: float = 0.3, intensity: str = "medium"):
+    """Print wall time and the longest event loop stall for each way of serving the requests"""
+    from agents.langgraph_agent import ExcelProcessingWorkflow
+    from config.config import ProcessingConfig
+    from utils.http_client import close_http_clients
+    from utils.llm_cache import configure_llm_cache
+
+    config = ProcessingConfig(compression_intensity=intensity)
+    requests = [(path, "Analyze profit trends", config) for path in SAMPLE_WORKBOOKS if os.path.exists(path)] * copies
+
+    with MockDeepSeekServer(latency=latency) as server:
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark-key")
+        close_http_clients()
+        configure_llm_cache(None)
+        workflow = ExcelProcessingWorkflow()
+
+        async def blocking_handler(file_path, task_description, config):
+            # What the tools' _arun did before: call the blocking implementation on the loop
+            return workflow.process_excel(file_path, task_description, config)
+
+        print(f"=== Async workflow benchmark: {len(requests)} requests, simulated LLM latency {latency}s ===\n")
+        print(f"{'mode':<34}{'wall s':>8}{'max loop stall ms':>20}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for request in requests:
+                workflow.process_excel(*request)
+            sequential = time.perf_counter() - start
+            blocking = asyncio.run(_serve(requests, blocking_handler))
+            concurrent = asyncio.run(_serve(requests, workflow.aprocess_excel))
+        print(f"{'process_excel, one at a time':<34}{sequential:>8.2f}{'-':>20}")
+        print(f"{'blocking coroutine (previous)':<34}{blocking[0]:>8.2f}{blocking[1] * 1000:>20.0f}")
+        print(f"{'aprocess_excel':<34}{concurrent[0]:>8.2f}{concurrent[1] * 1000:>20.0f}")
+        close_http_clients()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--copies", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--intensity", default="medium", choices=["low", "medium", "high"])
+    args = parser.parse_args()
+    run_benchmark(args.copies, args.latency, args.intensity)
@@ -0,0 +1,86 @@
+"""
+Benchmark batch processing of many workbooks against a one-file-at-a-time loop
+
+The loop calls ExcelProcessingWorkflow.process_excel for each file in turn, as
+a nightly job would without the batch API; the batch run uses process_many.
+Both run against the mock DeepSeek server with the response cache disabled, so
+every file pays for its LLM calls.
+"""
+
+from mock_deepseek_server import MockDeepSeekServer
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+SAMPLE_WORKBOOKS = ("complex_sample_data.xlsx", "sample_data.xlsx", "simple_sample_data.xlsx")
+
+@contextlib.contextmanager
+def _quiet_fd_stdout():
+    """Silence stdout at the descriptor level, so worker processes started inside are quiet too"""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+def run_benchmark(copies: int = 4, workers: int = 4, latency: float = 0.5, intensity: str = "medium"):
+    """Print wall time and throughput of the sequential loop and of process_many"""
+    from agents.batch_processor import process_many
+    from agents.langgraph_agent import ExcelProcessingWorkflow
+    from config.config import ProcessingConfig
+    from utils.http_client import close_http_clients
+    from utils.llm_cache import configure_llm_cache
+
+    files = [path for path in SAMPLE_WORKBOOKS if os.path.exists(path)] * copies
+    config = ProcessingConfig(compression_intensity=intensity)
+    task = "Analyze profit trends"
+
+    with MockDeepSeekServer(latency=latency) as server:
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark-key")
+        # Workers read the cache settings from the environment
+        os.environ.pop("DEEPSEEK_CACHE_PATH", None)
+        close_http_clients()
+        configure_llm_cache(None)
+
+        print(f"=== Batch benchmark: {len(files)} workbooks, {workers} workers, {os.cpu_count()} CPUs, "
+              f"simulated LLM latency {latency}s ===\n")
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            workflow = ExcelProcessingWorkflow()
+            for file_path in files:
+                workflow.process_excel(file_path, task, config)
+        sequential = time.perf_counter() - start
+        print(f"{'one file at a time':<22} {sequential:7.2f}s   {len(files) / sequential:6.2f} files/s")
+
+        start = time.perf_counter()
+        with _quiet_fd_stdout():
+            results = list(process_many(files, task, config, max_workers=workers))
+        batch = time.perf_counter() - start
+        print(f"{'process_many':<22} {batch:7.2f}s   {len(files) / batch:6.2f} files/s")
+
+        seconds = [result["seconds"] for result in results]
+        print(f"\nPer file in workers: mean {statistics.mean(seconds):.2f}s, max {max(seconds):.2f}s; "
+              f"first result after {min(result['elapsed'] for result in results):.2f}s")
+        print(f"Failed files: {sum(result['status'] != 'success' for result in results)}")
+        close_http_clients()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--copies", type=int, default=4, help="times each sample workbook is processed")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--intensity", default="medium", choices=["low", "medium", "high"])
+    args = parser.parse_args()
+    run_benchmark(args.copies, args.workers, args.latency, args.intensity)
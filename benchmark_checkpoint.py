@@ -0,0 +1,48 @@
+"""
+Benchmark per-sheet checkpoints against plain JSON serialization
+
+For every sheet of a workbook, reports the size and the write and read time of
+a checkpoint (compact columnar pickle, compressed with zstd when zstandard is
+installed, zlib otherwise) next to the same sheet result dumped as JSON.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+def _timed(func, repeats: int):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+    return value, best
+
+def run_benchmark(file_path: str = "complex_sample_data.xlsx", repeats: int = 3):
+    """Print checkpoint and JSON size and timings per sheet"""
+    from tools.excel_parser_tool import ExcelParseTool
+    from utils import checkpoint
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        parsed = ExcelParseTool()._run(file_path)
+    codec = "zstd" if checkpoint.zstandard is not None else "zlib"
+
+    print(f"=== Checkpoint benchmark: {file_path} ({codec}) ===\n")
+    print(f"{'sheet':<22}{'cells':>9}{'json KB':>10}{'ckpt KB':>10}{'json write ms':>15}{'ckpt write ms':>15}{'ckpt read ms':>14}")
+    for index, (name, sheet) in enumerate(parsed["sheets"].items()):
+        result = {"index": index, "name": name, "parsed": sheet, "compressed": None}
+        text, json_write = _timed(lambda: json.dumps(result, default=str), repeats)
+        blob, ckpt_write = _timed(lambda: checkpoint.encode_sheet_result(result), repeats)
+        _, ckpt_read = _timed(lambda: checkpoint.decode_sheet_result(blob), repeats)
+        cells = sheet["shape"][0] * sheet["shape"][1]
+        print(f"{name:<22}{cells:>9}{len(text.encode('utf-8')) / 1024:>10.1f}{len(blob) / 1024:>10.1f}"
+              f"{json_write * 1000:>15.1f}{ckpt_write * 1000:>15.1f}{ckpt_read * 1000:>14.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", default="complex_sample_data.xlsx")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    run_benchmark(args.file, args.repeats)
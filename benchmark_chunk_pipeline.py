@@ -0,0 +1,76 @@
+"""
+Benchmark pipelined chunk processing of a sheet against whole-sheet processing
+
+Whole-sheet processing parses the sheet with the excel_parser tool and then
+compresses it with the data_compressor tool; the pipelined run streams row
+chunks through run_sheet_pipeline. Reports wall time and peak traced memory
+(tracemalloc, so both runs are slowed down alike) with the rule-based
+compression plan, so no LLM is involved.
+"""
+
+from typing import Callable
+import argparse
+import contextlib
+import io
+import time
+import tracemalloc
+
+def _measure(run: Callable):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = run()
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, duration, peak
+
+def run_benchmark(file_path: str = "complex_sample_data.xlsx",
+                  sheet_name: str = "Sales_Data",
+                  chunk_rows: int = 1000,
+                  intensity: str = "high"):
+    """Print time and peak memory of both modes for one sheet"""
+    import pandas as pd
+    from config.config import ProcessingConfig
+    from tools.data_compression_tool import DataCompressionTool
+    from tools.excel_parser_tool import ExcelParseTool
+    from utils.chunk_pipeline import run_sheet_pipeline
+    from utils.compression_rules import default_compression_plan
+
+    parser_tool = ExcelParseTool()
+    compression_tool = DataCompressionTool()
+    config = ProcessingConfig(compression_intensity=intensity, pipeline_chunk_rows=chunk_rows)
+
+    def plan_for(df, sheet_data, config):
+        if config.compression_intensity == "low":
+            return None
+        return default_compression_plan(sheet_data["data_types"], config.task_type)
+
+    def whole_sheet():
+        parsed = parser_tool._run(file_path, [sheet_name])["sheets"][sheet_name]
+        df = pd.DataFrame.from_dict(parsed["data"])
+        return compression_tool._compress_frame(df, parsed, plan_for(df, parsed, config), config)
+
+    def pipelined():
+        return run_sheet_pipeline(file_path, sheet_name, config, plan_for, compression_tool._compress_frame)[1]
+
+    print(f"=== Chunk pipeline benchmark: {file_path} / {sheet_name}, {intensity} compression, {chunk_rows} rows per chunk ===\n")
+    results = {}
+    for label, run in (("whole sheet", whole_sheet), ("pipelined", pipelined)):
+        results[label], duration, peak = _measure(run)
+        print(f"{label:<14} {duration:7.3f}s   peak {peak / 1024 / 1024:8.1f} MiB   output {results[label]['shape']}")
+    try:
+        # Partial sums are added in a different order, so allow for float rounding
+        pd.testing.assert_frame_equal(pd.DataFrame(results["whole sheet"]["data"]), pd.DataFrame(results["pipelined"]["data"]), rtol=1e-9)
+        print("\nSame output (up to float rounding): True")
+    except AssertionError as e:
+        print(f"\nSame output: False\n{e}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", default="complex_sample_data.xlsx")
+    parser.add_argument("--sheet", default="Sales_Data")
+    parser.add_argument("--chunk-rows", type=int, default=1000)
+    parser.add_argument("--intensity", default="high", choices=["low", "medium", "high"])
+    args = parser.parse_args()
+    run_benchmark(args.file, args.sheet, args.chunk_rows, args.intensity)
@@ -0,0 +1,76 @@
+"""
+Benchmark token cost and render time of the sheet context encodings
+
+For every sheet of the sample workbooks, renders the first rows in each context
+format (plus the original iterrows-based layout as a baseline) and reports
+tokens per row and render time. Token counts use tiktoken when installed and a
+characters-per-token estimate otherwise.
+"""
+
+from utils.context_encoders import CONTEXT_FORMATS, encode_sample
+from utils.output_packer import count_tokens, tiktoken
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import time
+
+SAMPLE_WORKBOOKS = ("simple_sample_data.xlsx", "sample_data.xlsx", "complex_sample_data.xlsx")
+
+def _iterrows_baseline(df, significant_digits=None):
+    """The summary layout as it was rendered before the vectorized encoders"""
+    lines = []
+    for i, row in df.iterrows():
+        row_data = ", ".join([f"{col}: {val}" for col, val in row.items()][:5])
+        lines.append(f"    Row {i}: {row_data}...")
+    return lines
+
+def _time_render(render, df, significant_digits, repeats: int):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        lines = render(df, significant_digits)
+        durations.append(time.perf_counter() - start)
+    return "\n".join(lines), statistics.median(durations)
+
+def run_benchmark(rows: int = 100, significant_digits: int = 4, repeats: int = 20):
+    """Print tokens per row and render time for every format on every sample sheet"""
+    import pandas as pd
+    from tools.excel_parser_tool import ExcelParseTool
+
+    counter = "tiktoken" if tiktoken is not None else "estimate"
+    print(f"=== Context format benchmark: first {rows} rows per sheet, tokens via {counter} ===\n")
+
+    renderers = [("iterrows (baseline)", _iterrows_baseline, None)]
+    for context_format in CONTEXT_FORMATS:
+        renderers.append((context_format, lambda df, digits, f=context_format: encode_sample(df, f, digits), None))
+    for context_format in CONTEXT_FORMATS[1:]:
+        renderers.append((f"{context_format} ({significant_digits} digits)",
+                          lambda df, digits, f=context_format: encode_sample(df, f, digits), significant_digits))
+
+    for file_path in SAMPLE_WORKBOOKS:
+        if not os.path.exists(file_path):
+            print(f"Skipping {file_path}: not found\n")
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            parsed = ExcelParseTool()._run(file_path)
+
+        for sheet_name, sheet_data in parsed.get("sheets", {}).items():
+            df = pd.DataFrame.from_dict(sheet_data.get("data", {})).head(rows)
+            if df.empty:
+                continue
+            print(f"{file_path} / {sheet_name}: {len(df)} rows x {len(df.columns)} columns")
+            print(f"  {'format':<24}{'tokens/row':>12}{'render ms':>12}")
+            for label, render, digits in renderers:
+                text, duration = _time_render(render, df, digits, repeats)
+                print(f"  {label:<24}{count_tokens(text) / len(df):>12.1f}{duration * 1000:>12.3f}")
+            print()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--significant-digits", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.significant_digits, args.repeats)
@@ -0,0 +1,52 @@
+"""
+Benchmark start-up time of the command-line entry points
+
+Each command runs in a fresh interpreter, as a shell or cron job would run it,
+and the median wall time is reported next to a bare interpreter. Light commands
+(help, probe) should stay close to the bare interpreter; importing the LangGraph
+workflow shows what process, batch and serve pay up front. With --max-ms the
+script exits non-zero when a light command gets slower than the threshold, so a
+new top-level import of a heavy library is caught.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+def _median_ms(command, runs: int) -> float:
+    walls = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, capture_output=True, check=True)
+        walls.append(time.perf_counter() - start)
+    return statistics.median(walls) * 1000
+
+def run_benchmark(file_path: str = "complex_sample_data.xlsx", runs: int = 5, max_ms: float = 0) -> bool:
+    """Print median start-up times; returns False if a light command exceeds max_ms"""
+    commands = [
+        ("python -c pass", [sys.executable, "-c", "pass"], False),
+        ("cli.py --help", [sys.executable, "cli.py", "--help"], True),
+        ("cli.py probe", [sys.executable, "cli.py", "probe", file_path], True),
+        ("cli.py probe --estimate", [sys.executable, "cli.py", "probe", file_path, "--estimate"], False),
+        ("import langgraph_agent", [sys.executable, "-c", "import agents.langgraph_agent"], False),
+    ]
+
+    print(f"=== Start-up benchmark: median of {runs} runs ===\n")
+    print(f"{'command':<28}{'wall p50 ms':>12}")
+    within_limit = True
+    for label, command, light in commands:
+        ms = _median_ms(command, runs)
+        over = light and max_ms and ms > max_ms
+        within_limit = within_limit and not over
+        print(f"{label:<28}{ms:>12.1f}{'  over --max-ms' if over else ''}")
+    return within_limit
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", default="complex_sample_data.xlsx")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=0, help="Fail if help or probe takes longer (0 to disable)")
+    args = parser.parse_args()
+    sys.exit(0 if run_benchmark(args.file, args.runs, args.max_ms) else 1)
@@ -0,0 +1,70 @@
+"""
+Benchmark the overhead of per-stage tracing and print a stage breakdown
+
+The same workbook is processed repeatedly with tracing off, with spans recorded
+(timings, rows, cells, LLM tokens), and with memory high-water marks on top.
+Compression plans are cached after the first run, so every mode measures the
+same work. The breakdown lists the spans of one traced run.
+"""
+
+from mock_deepseek_server import MockDeepSeekServer
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import time
+
+def run_benchmark(file_path: str = "complex_sample_data.xlsx", runs: int = 5, latency: float = 0.05, intensity: str = "high"):
+    """Print median run time per tracing mode and the spans of one traced run"""
+    from agents.langgraph_agent import ExcelProcessingWorkflow
+    from config.config import ProcessingConfig
+    from utils.instrumentation import configure_tracing, start_trace
+    from utils.llm_cache import configure_llm_cache
+
+    task = "Analyze profit trends"
+    with MockDeepSeekServer(latency=latency) as mock:
+        os.environ["DEEPSEEK_BASE_URL"] = mock.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark-key")
+        configure_llm_cache(None)
+        configure_tracing(None)
+        workflow = ExcelProcessingWorkflow()
+        config = ProcessingConfig(compression_intensity=intensity)
+
+        def timed(mode: str) -> float:
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                if mode == "off":
+                    workflow.process_excel(file_path, task, config)
+                else:
+                    with start_trace("benchmark", memory=mode == "memory"):
+                        workflow.process_excel(file_path, task, config)
+                return time.perf_counter() - start
+
+        # Warm up: compile the graph and cache the compression plans
+        timed("off")
+
+        print(f"=== Instrumentation benchmark: {file_path}, {runs} runs, simulated LLM latency {latency}s ===\n")
+        print(f"{'mode':<20}{'p50 ms':>10}{'overhead':>10}")
+        baseline = None
+        for mode in ("off", "spans", "memory"):
+            median = statistics.median(timed(mode) for _ in range(runs))
+            baseline = baseline or median
+            print(f"{mode:<20}{median * 1000:>10.1f}{(median / baseline - 1) * 100:>9.1f}%")
+
+        with contextlib.redirect_stdout(io.StringIO()), start_trace("benchmark") as trace:
+            workflow.process_excel(file_path, task, config)
+        print(f"\n{'span':<28}{'ms':>10}{'cells/s':>14}")
+        for span in trace.to_dict()["spans"]:
+            label = span["name"] + (f" {span['attributes']['sheet']}" if "sheet" in span["attributes"] else "")
+            throughput = f"{span['cells_per_second']:,.0f}" if "cells_per_second" in span else ""
+            print(f"{label[:27]:<28}{span['duration'] * 1000:>10.1f}{throughput:>14}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", default="complex_sample_data.xlsx")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--intensity", default="high")
+    args = parser.parse_args()
+    run_benchmark(args.file, args.runs, args.latency, args.intensity)
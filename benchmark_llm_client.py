@@ -0,0 +1,77 @@
+"""
+Benchmark per-call latency of the pooled LLM client against fresh connections
+
+Runs against the local mock server, so the numbers isolate connection set-up
+cost from model latency. Against the real API over TLS the savings per call are
+larger, since every fresh connection also pays a TLS handshake.
+"""
+
+from mock_deepseek_server import MockDeepSeekServer
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+def _summarize(label: str, durations):
+    durations_ms = [d * 1000 for d in durations]
+    p50 = statistics.median(durations_ms)
+    p95 = sorted(durations_ms)[int(len(durations_ms) * 0.95) - 1]
+    print(f"{label:<30} mean {statistics.mean(durations_ms):7.3f} ms   p50 {p50:7.3f} ms   p95 {p95:7.3f} ms")
+    return statistics.mean(durations_ms)
+
+def run_benchmark(calls: int = 300):
+    """Compare fresh httpx.post calls with pooled sync and async LLM calls"""
+    import httpx
+    from utils.llm_utils import call_deepseek_llm, acall_deepseek_llm
+    from utils.http_client import close_http_clients
+    from utils.llm_cache import configure_llm_cache
+    from utils.llm_dispatcher import configure_llm_dispatcher
+    from config.config import LLMDispatcherConfig
+
+    with MockDeepSeekServer() as server:
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark-key")
+        close_http_clients()
+        # Measure connection cost only: no response cache, no rate limiting
+        configure_llm_cache(None)
+        configure_llm_dispatcher(LLMDispatcherConfig(rate_limit=0))
+
+        print(f"=== LLM client benchmark: {calls} calls against {server.url} ===\n")
+
+        # Baseline: the previous implementation, one new connection per request
+        url = f"{server.url}/v1/chat/completions"
+        body = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "ping"}]}
+        fresh = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            httpx.post(url, json=body, timeout=30.0).raise_for_status()
+            fresh.append(time.perf_counter() - start)
+
+        pooled = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            response = call_deepseek_llm("ping")
+            pooled.append(time.perf_counter() - start)
+        assert not response.startswith("Error calling LLM"), response
+
+        async def _async_calls():
+            durations = []
+            for _ in range(calls):
+                start = time.perf_counter()
+                await acall_deepseek_llm("ping")
+                durations.append(time.perf_counter() - start)
+            return durations
+        pooled_async = asyncio.run(_async_calls())
+
+        fresh_mean = _summarize("fresh httpx.post", fresh)
+        pooled_mean = _summarize("call_deepseek_llm (pooled)", pooled)
+        async_mean = _summarize("acall_deepseek_llm (pooled)", pooled_async)
+        print(f"\nSaved per call: {fresh_mean - pooled_mean:.3f} ms (sync), {fresh_mean - async_mean:.3f} ms (async)")
+
+        close_http_clients()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300)
+    run_benchmark(parser.parse_args().calls)
@@ -0,0 +1,97 @@
+"""
+Offline load test of the end-to-end pipeline against the mock DeepSeek server
+
+Runs process_excel repeatedly from several threads while the mock server
+simulates LLM latency and errors, then splits the cost per run into time spent
+waiting on the (simulated) LLM and CPU time spent in our own code.
+"""
+
+from mock_deepseek_server import MockDeepSeekServer, LATENCY_DISTRIBUTIONS
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import time
+
+def run_load_test(file_path: str = "simple_sample_data.xlsx",
+                  runs: int = 20,
+                  concurrency: int = 4,
+                  intensity: str = "medium",
+                  latency: float = 0.5,
+                  distribution: str = "lognormal",
+                  jitter: float = 0.25,
+                  error_rate: float = 0.0,
+                  rate_limit_rate: float = 0.0,
+                  seed: int = 7):
+    """Run the pipeline `runs` times with `concurrency` workers and print a latency breakdown"""
+    from agents.langgraph_agent import ExcelProcessingWorkflow
+    from config.config import ProcessingConfig
+    from utils.http_client import close_http_clients
+    from utils.llm_cache import configure_llm_cache
+
+    server = MockDeepSeekServer(
+        latency=latency,
+        latency_distribution=distribution,
+        latency_jitter=jitter,
+        error_rate=error_rate,
+        rate_limit_rate=rate_limit_rate,
+        retry_after=0.1,
+        seed=seed
+    )
+    with server:
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark-key")
+        close_http_clients()
+        # Every run should pay for its LLM calls
+        configure_llm_cache(None)
+
+        config = ProcessingConfig(compression_intensity=intensity)
+
+        def _run_once(index: int) -> float:
+            start = time.perf_counter()
+            output = ExcelProcessingWorkflow().process_excel(file_path, f"Analyze profit trends #{index}", config)
+            assert output.startswith("Task:"), output[:200]
+            return time.perf_counter() - start
+
+        print(f"=== Pipeline load test: {runs} runs x {concurrency} workers against {server.url} ===")
+        print(f"Simulated LLM latency: {distribution} mean {latency}s jitter {jitter}s, "
+              f"error rate {error_rate}, 429 rate {rate_limit_rate}\n")
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        # The pipeline prints progress; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                durations = list(executor.map(_run_once, range(runs)))
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        stats = server.stats()
+
+        durations_ms = sorted(d * 1000 for d in durations)
+        p95 = durations_ms[max(0, int(len(durations_ms) * 0.95) - 1)]
+        print(f"Throughput:        {runs / wall:7.2f} runs/s ({wall:.2f}s wall)")
+        print(f"Run latency:       mean {statistics.mean(durations_ms):8.1f} ms   p50 {statistics.median(durations_ms):8.1f} ms   p95 {p95:8.1f} ms")
+        print(f"LLM requests:      {stats['requests_served']} ({stats['errors_injected']} injected errors)")
+        print(f"LLM time per run:  {stats['latency_seconds'] / runs * 1000:8.1f} ms simulated server latency")
+        print(f"CPU time per run:  {cpu / runs * 1000:8.1f} ms in this process (includes the mock server's own overhead)")
+
+        close_http_clients()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", default="simple_sample_data.xlsx")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--intensity", choices=("low", "medium", "high"), default="medium")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean simulated LLM latency in seconds")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-jitter", type=float, default=0.25)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run_load_test(args.file, args.runs, args.concurrency, args.intensity, args.latency,
+                  args.latency_distribution, args.latency_jitter, args.error_rate,
+                  args.rate_limit_rate, args.seed)
@@ -0,0 +1,66 @@
+"""
+Benchmark repeat requests with and without the end-to-end result cache
+
+Sends the same request several times, as dashboards refreshing a view do, and
+reports the latency of the first (cold) request and of the repeats, with the
+memory tier, the disk tier alone (as a freshly started process sees it), and
+no cache.
+"""
+
+from mock_deepseek_server import MockDeepSeekServer
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+def _time_requests(workflow, file_path: str, task: str, config, repeats: int):
+    durations = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats + 1):
+            start = time.perf_counter()
+            workflow.process_excel(file_path, task, config)
+            durations.append(time.perf_counter() - start)
+    return durations[0], statistics.median(durations[1:])
+
+def run_benchmark(file_path: str = "complex_sample_data.xlsx", repeats: int = 10, latency: float = 0.3):
+    """Print cold and repeat latency for each cache setup"""
+    from agents.langgraph_agent import ExcelProcessingWorkflow
+    from config.config import ProcessingConfig, ResultCacheConfig
+    from utils.http_client import close_http_clients
+    from utils.llm_cache import configure_llm_cache
+    from utils.result_cache import configure_result_cache
+
+    config = ProcessingConfig(compression_intensity="medium")
+    task = "Analyze profit trends"
+
+    with MockDeepSeekServer(latency=latency) as server, tempfile.TemporaryDirectory() as cache_dir:
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark-key")
+        close_http_clients()
+        configure_llm_cache(None)
+        workflow = ExcelProcessingWorkflow()
+
+        print(f"=== Result cache benchmark: {file_path}, {repeats} repeats, simulated LLM latency {latency}s ===\n")
+        print(f"{'setup':<28}{'first request ms':>18}{'repeat p50 ms':>16}")
+        setups = [
+            ("no cache", None),
+            ("memory + disk", ResultCacheConfig(memory_entries=64, directory=cache_dir)),
+            ("disk only (new process)", ResultCacheConfig(directory=cache_dir))
+        ]
+        for label, cache_config in setups:
+            configure_result_cache(cache_config)
+            first, repeat = _time_requests(workflow, file_path, task, config, repeats)
+            print(f"{label:<28}{first * 1000:>18.1f}{repeat * 1000:>16.2f}")
+        configure_result_cache(None)
+        close_http_clients()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", default="complex_sample_data.xlsx")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3)
+    args = parser.parse_args()
+    run_benchmark(args.file, args.repeats, args.latency)
@@ -0,0 +1,85 @@
+"""
+Benchmark per-request overhead of one-shot runs against the warm processing service
+
+A one-shot run starts a fresh interpreter per request, as calling main_langgraph.py
+from a script or cron job does, and pays for interpreter start-up, the pandas and
+langchain imports and graph compilation every time. The service answers the same
+requests from warm worker processes. Overhead is the request's wall time minus the
+time spent processing the workbook.
+"""
+
+from mock_deepseek_server import MockDeepSeekServer
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ONE_SHOT = """
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig
+workflow = ExcelProcessingWorkflow()
+config = ProcessingConfig(compression_intensity=sys.argv[3])
+with contextlib.redirect_stdout(io.StringIO()):
+    processing_start = time.perf_counter()
+    workflow.process_excel(sys.argv[1], sys.argv[2], config)
+    seconds = time.perf_counter() - processing_start
+print(json.dumps({"seconds": seconds}))
+"""
+
+def _summary(label: str, walls, seconds):
+    overheads = [wall - processed for wall, processed in zip(walls, seconds)]
+    print(f"{label:<22}{statistics.median(walls) * 1000:>12.1f}{statistics.median(seconds) * 1000:>16.1f}"
+          f"{statistics.median(overheads) * 1000:>14.1f}")
+
+def run_benchmark(file_path: str = "simple_sample_data.xlsx", requests: int = 5, latency: float = 0.2, intensity: str = "medium"):
+    """Print median wall time, processing time and overhead per request for both modes"""
+    from agents.job_service import JobService
+    from config.config import ProcessingConfig
+    from service import ExcelProcessingServer, ServiceClient
+
+    task = "Analyze profit trends"
+    with MockDeepSeekServer(latency=latency) as mock:
+        os.environ["DEEPSEEK_BASE_URL"] = mock.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark-key")
+        os.environ.pop("DEEPSEEK_CACHE_PATH", None)
+
+        print(f"=== Service benchmark: {file_path}, {requests} requests, simulated LLM latency {latency}s ===\n")
+        print(f"{'mode':<22}{'wall p50 ms':>12}{'processing ms':>16}{'overhead ms':>14}")
+
+        walls, seconds = [], []
+        for _ in range(requests):
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, "-c", ONE_SHOT, file_path, task, intensity],
+                                       capture_output=True, text=True, check=True)
+            walls.append(time.perf_counter() - start)
+            seconds.append(json.loads(completed.stdout.strip().splitlines()[-1])["seconds"])
+        _summary("one-shot process", walls, seconds)
+
+        start = time.perf_counter()
+        with JobService(workers=1) as service, ExcelProcessingServer(service) as server:
+            service.wait_ready()
+            startup = time.perf_counter() - start
+            client = ServiceClient(server.url)
+            config = ProcessingConfig(compression_intensity=intensity)
+            walls, seconds = [], []
+            for _ in range(requests):
+                start = time.perf_counter()
+                job = client.process(file_path, task, config)
+                walls.append(time.perf_counter() - start)
+                seconds.append(job["seconds"])
+            _summary("warm service", walls, seconds)
+        print(f"\nService start-up (paid once): {startup * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", default="simple_sample_data.xlsx")
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--intensity", default="medium")
+    args = parser.parse_args()
+    run_benchmark(args.file, args.requests, args.latency, args.intensity)
@@ -0,0 +1,76 @@
+"""
+Benchmark the per-sheet fan-out of the LangGraph workflow against a linear run
+
+The linear run parses the whole workbook, then compresses every sheet, then
+formats, as the workflow did before it fanned out per sheet. The fan-out run is
+ExcelProcessingWorkflow.process_excel. Compression plans are cleared before
+every run so each sheet pays for its rule generation against the mock server.
+"""
+
+from mock_deepseek_server import MockDeepSeekServer
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import time
+
+def run_benchmark(file_path: str = "complex_sample_data.xlsx",
+                  runs: int = 5,
+                  intensity: str = "medium",
+                  latency: float = 0.5):
+    """Print mean and best wall time per run for the linear and fan-out pipelines"""
+    from agents.langgraph_agent import ExcelProcessingWorkflow
+    from config.config import ProcessingConfig
+    from tools import data_compression_tool
+    from utils.excel_utils import ExcelParser
+    from utils.http_client import close_http_clients
+    from utils.llm_cache import configure_llm_cache
+
+    with MockDeepSeekServer(latency=latency) as server:
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        workflow = ExcelProcessingWorkflow()
+        agent = workflow.agent
+        config = ProcessingConfig(compression_intensity=intensity)
+        task = "Analyze profit trends"
+
+        def linear():
+            parsed = agent.parser_tool._run(file_path=file_path, include_sheets=config.include_sheets)
+            compressed = agent.compression_tool._run(data=parsed, config=config)
+            return agent.format_tool._run(data=compressed, task_description=task, config=config)["formatted_content"]
+
+        def fan_out():
+            return workflow.process_excel(file_path, task, config)
+
+        sheets = ExcelParser.probe_workbook(file_path)
+        print(f"=== Sheet fan-out benchmark: {file_path}, {len(sheets)} sheets, {runs} runs ===")
+        print("Sheets: " + ", ".join(f"{sheet['name']} ({sheet['rows']}x{sheet['columns']})" for sheet in sheets))
+        print(f"Simulated LLM latency {latency}s, compression plans regenerated every run\n")
+
+        outputs = {}
+        for label, run in (("linear (parse all, compress all)", linear), ("per-sheet fan-out", fan_out)):
+            durations = []
+            for _ in range(runs):
+                data_compression_tool._plan_cache.clear()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    outputs[label] = run()
+                durations.append(time.perf_counter() - start)
+            print(f"{label:<34} mean {statistics.mean(durations):6.3f}s   best {min(durations):6.3f}s")
+
+        first, second = outputs.values()
+        print(f"\nOutputs identical: {first == second}")
+        close_http_clients()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", default="complex_sample_data.xlsx")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--intensity", default="medium", choices=["low", "medium", "high"])
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    run_benchmark(args.file, args.runs, args.intensity, args.latency)
@@ -0,0 +1,52 @@
+"""
+Benchmark per-request setup cost of the LangGraph workflow
+
+Compares the previous pattern, where every request built a new agent (and the
+chain's duplicate set of tools) and compiled the graph again, with the shared
+agent and once-compiled graph. Only setup is timed; parsing, compression and
+LLM calls are the same in both cases.
+"""
+
+from agents.excel_processing_agent import ExcelProcessingAgent
+from agents.langgraph_agent import ExcelProcessingWorkflow
+import argparse
+import statistics
+import time
+
+def _time(label: str, setup, requests: int) -> float:
+    durations = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        setup()
+        durations.append(time.perf_counter() - start)
+    mean_ms = statistics.mean(durations) * 1000
+    print(f"{label:<46} mean {mean_ms:8.3f} ms   p50 {statistics.median(durations) * 1000:8.3f} ms")
+    return mean_ms
+
+def run_benchmark(requests: int = 200):
+    """Time the setup a request pays before its graph starts running"""
+    print(f"=== Workflow setup benchmark: {requests} requests ===\n")
+
+    def previous_setup():
+        # What process_excel used to do per request: new agent and tools, new graph, compile
+        workflow = ExcelProcessingWorkflow(agent=ExcelProcessingAgent())
+        return workflow.workflow.compile()
+
+    def new_workflow_per_request():
+        return ExcelProcessingWorkflow().app
+
+    shared = ExcelProcessingWorkflow()
+    shared.app  # warm up
+
+    def reused_workflow():
+        return shared.app
+
+    before = _time("new agent + compile per request (previous)", previous_setup, requests)
+    per_request = _time("ExcelProcessingWorkflow() per request (shared)", new_workflow_per_request, requests)
+    reused = _time("reused workflow instance", reused_workflow, requests)
+    print(f"\nSaved per request: {before - per_request:.3f} ms (new instance), {before - reused:.3f} ms (reused instance)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    run_benchmark(parser.parse_args().requests)
@@ -1,21 +1,28 @@
-from langchain.chains import SequentialChain
-from langchain.prompts import PromptTemplate
-from typing import Dict, Any, List, Optional
+from typing import TYPE_CHECKING, Dict, Any, Callable, Hashable, List, Optional, Iterator
 from tools.excel_parser_tool import ExcelParseTool
 from tools.data_compression_tool import DataCompressionTool
 from tools.format_adapter_tool import FormatAdapterTool
 from config.config import ProcessingConfig
+from utils.analysis_context import AnalysisContext
+from utils.stage_memo import StageMemo, stage_keys
+
+if TYPE_CHECKING:
+    # langchain.chains takes over a second to import and is only needed for the annotation
+    from langchain.chains import SequentialChain
 
 class ExcelProcessingChain:
     """Chain that orchestrates the Excel processing workflow"""
     
-    def __init__(self):
-        # Initialize tools
-        self.parser_tool = ExcelParseTool()
-        self.compression_tool = DataCompressionTool()
-        self.format_tool = FormatAdapterTool()
+    def __init__(self,
+                 parser_tool: Optional[ExcelParseTool] = None,
+                 compression_tool: Optional[DataCompressionTool] = None,
+                 format_tool: Optional[FormatAdapterTool] = None):
+        # Initialize tools, reusing the caller's instances when given; the tools keep no per-call state
+        self.parser_tool = parser_tool or ExcelParseTool()
+        self.compression_tool = compression_tool or DataCompressionTool()
+        self.format_tool = format_tool or FormatAdapterTool()
     
-    def create_chain(self) -> SequentialChain:
+    def create_chain(self) -> "SequentialChain":
         """Create the processing chain"""
         # This is a simplified version - a real implementation would use LangChain's
         # SequentialChain or other chain compositions
@@ -27,7 +34,8 @@ class ExcelProcessingChain:
             file_path: str, 
             task_description: str,
             config: ProcessingConfig,
-            password: Optional[str] = None) -> Dict[str, Any]:
+            password: Optional[str] = None,
+            memo: Optional[StageMemo] = None) -> Dict[str, Any]:
         """
         Run the complete Excel processing pipeline
         
@@ -36,35 +44,144 @@ class ExcelProcessingChain:
             task_description: Description of the task to guide processing
             config: Processing configuration
             password: Password for encrypted files
+            memo: Store of earlier stage outputs; stages whose inputs are unchanged are reused
+                from it instead of recomputed, and the result gets a "stages" entry recording
+                whether each stage was "reused" or "computed"
             
         Returns:
             Formatted context content for LLM
         """
+        keys = None
+        if memo is not None:
+            try:
+                keys = stage_keys(file_path, task_description, config)
+            except OSError:
+                # The parser reports the missing or unreadable file
+                memo = None
+        stages: Dict[str, str] = {}
         
         # Step 1: Parse Excel file
-        parse_result = self.parser_tool._run(
+        parse_result = self._stage(memo, keys, "parse", stages, lambda: self.parser_tool._run(
             file_path=file_path,
             include_sheets=config.include_sheets,
             password=password
-        )
+        ))
         
         if parse_result["status"] != "success":
             return parse_result
         
         # Step 2: Compress data
-        compression_result = self.compression_tool._run(
+        compression_result = self._stage(memo, keys, "compress", stages, lambda: self.compression_tool._run(
             data=parse_result,
             config=config
-        )
+        ))
         
         if compression_result["status"] != "success":
             return compression_result
         
         # Step 3: Format output
-        format_result = self.format_tool._run(
-            data=compression_result,
-            task_description=task_description,
+        if memo is None:
+            return self.format_tool._run(
+                data=compression_result,
+                task_description=task_description,
+                config=config
+            )
+        
+        # The LLM insights are memoized; packing them into the output budget always reruns
+        try:
+            prepared: Dict[str, Any] = {}
+            
+            def prepare_insights() -> Dict[str, Any]:
+                prepared.update(self.format_tool._prepare_insights(compression_result, task_description, config))
+                return {"key_insights": prepared["key_insights"], "rule_based_sections": prepared["rule_based_sections"]}
+            
+            insights = self._stage(
+                memo, keys, "insights", stages, prepare_insights,
+                # A failed or late LLM call is retried on the next run rather than reused
+                reusable=lambda insights: bool(insights["key_insights"]) and "Error calling LLM" not in insights["key_insights"]
+            )
+            # The context holds every sheet's DataFrame and belongs to one run, so it is not memoized
+            context = prepared.get("context") or AnalysisContext(compression_result)
+            format_result = self.format_tool._pack_output(context=context, task_description=task_description, config=config, **insights)
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Failed to format data: {str(e)}"
+            }
+        format_result["stages"] = stages
+        return format_result
+    
+    @staticmethod
+    def _stage(memo: Optional[StageMemo],
+               keys: Optional[Dict[str, Hashable]],
+               stage: str,
+               stages: Dict[str, str],
+               compute: Callable[[], Any],
+               reusable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Output of one stage, from the memo when available; successful results are stored"""
+        if memo is None:
+            return compute()
+        
+        result = memo.get(keys[stage])
+        if result is not None:
+            stages[stage] = "reused"
+            return result
+        
+        result = compute()
+        stages[stage] = "computed"
+        if reusable is None:
+            reusable = lambda result: result.get("status") == "success"
+        if reusable(result):
+            memo.put(keys[stage], result)
+        return result
+    
+    def stream(self, 
+               file_path: str, 
+               task_description: str,
+               config: ProcessingConfig,
+               password: Optional[str] = None) -> Iterator[str]:
+        """
+        Run the pipeline, streaming the formatted output as it is produced
+        
+        The task header is emitted before parsing starts, the rule-based indicators as soon as
+        compression finishes, and the LLM insights line by line.
+        
+        Args:
+            file_path: Path to the Excel file
+            task_description: Description of the task to guide processing
+            config: Processing configuration
+            password: Password for encrypted files
+            
+        Yields:
+            Chunks of formatted context content for LLM
+        """
+        yield self.format_tool.format_header(task_description)
+        
+        # Step 1: Parse Excel file
+        parse_result = self.parser_tool._run(
+            file_path=file_path,
+            include_sheets=config.include_sheets,
+            password=password
+        )
+        
+        if parse_result["status"] != "success":
+            yield f"Error: {parse_result['message']}"
+            return
+        
+        # Step 2: Compress data
+        compression_result = self.compression_tool._run(
+            data=parse_result,
             config=config
         )
         
-        return format_result
\ No newline at end of file
+        if compression_result["status"] != "success":
+            yield f"Error: {compression_result['message']}"
+            return
+        
+        # Step 3: Stream formatted output
+        yield from self.format_tool.stream(
+            data=compression_result,
+            task_description=task_description,
+            config=config,
+            include_header=False
+        )
\ No newline at end of file
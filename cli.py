@@ -0,0 +1,205 @@
+"""
+Command-line entry point for the Excel processing agent
+
+Every command imports only what it needs, so --help, probe and cache lookups
+start without loading pandas, LangChain or LangGraph; process, batch and serve
+load the full stack.
+
+Usage:
+    python cli.py probe data.xlsx
+    python cli.py process data.xlsx --task "Analyze profit trends" --intensity high
+    python cli.py cached data.xlsx --task "Analyze profit trends"
+    python cli.py batch q1.xlsx q2.xlsx --task "Analyze profit trends" --workers 4
+    python cli.py serve --port 8780
+"""
+
+from typing import List, Optional
+import argparse
+import json
+import os
+import sys
+
+def _add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options mapped onto ProcessingConfig; process and cached must build the same config"""
+    parser.add_argument("--task", "-t", required=True, help="Description of the task to guide processing")
+    parser.add_argument("--intensity", choices=("low", "medium", "high"), default="medium", help="Compression intensity")
+    parser.add_argument("--task-type", choices=("analysis", "summary", "inference"), default="analysis")
+    parser.add_argument("--max-output-length", type=int, default=2000)
+    parser.add_argument("--context-format", choices=("rows", "markdown", "csv", "dictionary"), default="rows")
+    parser.add_argument("--sheets", nargs="+", default=None, help="Only process these sheets")
+    parser.add_argument("--exclude-columns", nargs="+", default=None)
+
+def _add_trace_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--trace", metavar="FILE", help="Append a per-stage trace of every run to FILE (JSON lines)")
+    parser.add_argument("--trace-format", choices=("json", "otlp"), default=None)
+    parser.add_argument("--trace-memory", action="store_true", help="Also record memory high-water marks (slower)")
+
+def _add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--profile-dir", metavar="DIR", help="Write per-node profiles of the run to DIR")
+    parser.add_argument("--profiler", choices=("sampling", "cprofile"), default="sampling",
+                        help="sampling: collapsed stacks for flame graphs; cprofile: pstats files")
+    parser.add_argument("--profile-nodes", nargs="+", default=None, metavar="NODE",
+                        choices=("probe_workbook", "process_sheet", "merge_sheets", "format_output"),
+                        help="Only profile these graph nodes: probe_workbook, process_sheet, merge_sheets, format_output")
+    parser.add_argument("--profile-memory", action="store_true", help="Also write tracemalloc allocation diffs per node")
+
+def _enable_tracing(args: argparse.Namespace) -> None:
+    """Trace settings go through the environment so batch worker processes pick them up too"""
+    if args.trace:
+        os.environ["TRACE_PATH"] = args.trace
+    if args.trace_format:
+        os.environ["TRACE_FORMAT"] = args.trace_format
+    if args.trace_memory:
+        os.environ["TRACE_MEMORY"] = "true"
+
+def _config(args: argparse.Namespace):
+    from config.config import ProcessingConfig
+    return ProcessingConfig(
+        compression_intensity=args.intensity,
+        task_type=args.task_type,
+        max_output_length=args.max_output_length,
+        context_format=args.context_format,
+        include_sheets=args.sheets,
+        exclude_columns=args.exclude_columns,
+        profile_dir=getattr(args, "profile_dir", None),
+        profile_nodes=getattr(args, "profile_nodes", None),
+        profiler=getattr(args, "profiler", "sampling"),
+        profile_memory=getattr(args, "profile_memory", False)
+    )
+
+def _probe(args: argparse.Namespace) -> int:
+    from utils.xlsx_probe import probe_xlsx
+    try:
+        sheets = probe_xlsx(args.file, args.sheets)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.estimate:
+        # Sampling column types needs openpyxl
+        from config.config import ProcessingConfig
+        from utils.memory_admission import estimate_job_memory
+        estimate = estimate_job_memory(args.file, ProcessingConfig(include_sheets=args.sheets))
+    if args.json:
+        payload = {"file": args.file, "sheets": sheets}
+        if args.estimate:
+            payload["estimated_bytes"] = {"full": estimate.full_bytes, "pipelined": estimate.pipelined_bytes}
+        print(json.dumps(payload))
+        return 0
+    for sheet in sheets:
+        print(f"{sheet['name']:<32}{sheet['rows']:>10} rows{sheet['columns']:>6} columns")
+    print(f"{len(sheets)} sheets, {sum(sheet['rows'] * sheet['columns'] for sheet in sheets)} cells")
+    if args.estimate:
+        print(f"Estimated peak memory: {estimate.full_bytes / 2**20:.0f} MB "
+              f"({estimate.pipelined_bytes / 2**20:.0f} MB chunk-pipelined)")
+    return 0
+
+def _process(args: argparse.Namespace) -> int:
+    _enable_tracing(args)
+    from agents.langgraph_agent import ExcelProcessingWorkflow
+    workflow = ExcelProcessingWorkflow()
+    config = _config(args)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        # The workflow prints its progress; keep it off the output
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            if args.stream:
+                for chunk in workflow.stream_process_excel(args.file, args.task, config):
+                    out.write(chunk)
+                    out.flush()
+                out.write("\n")
+                return 0
+            output = workflow.process_excel(args.file, args.task, config)
+        finally:
+            sys.stdout = stdout
+        out.write(output + "\n")
+        return 1 if output.startswith("Error") else 0
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def _cached(args: argparse.Namespace) -> int:
+    from utils.result_cache import get_result_cache, result_cache_key
+    cache = get_result_cache()
+    if cache is None:
+        print("Result cache is disabled; set RESULT_CACHE_DIR", file=sys.stderr)
+        return 2
+    try:
+        key = result_cache_key(args.file, args.task, _config(args))
+    except OSError as e:
+        print(f"Cannot read {args.file}: {e}", file=sys.stderr)
+        return 2
+    value, status = cache.lookup(key)
+    if value is None:
+        print("miss", file=sys.stderr)
+        return 1
+    print(value["output"])
+    print(status, file=sys.stderr)
+    return 0
+
+def _batch(args: argparse.Namespace) -> int:
+    _enable_tracing(args)
+    from agents.batch_processor import process_many
+    memory_budget = args.memory_budget_mb * 2**20 if args.memory_budget_mb else None
+    failed = 0
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        for result in process_many(args.files, args.task, _config(args), args.workers, memory_budget):
+            failed += result["status"] != "success"
+            record = {key: result.get(key) for key in ("file_path", "status", "seconds", "message", "output")}
+            stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+            stdout.flush()
+    finally:
+        sys.stdout = stdout
+    return 1 if failed else 0
+
+def _serve(args: argparse.Namespace) -> int:
+    import service
+    service.main(args.service_args)
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Turn Excel workbooks into compact LLM context")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    probe = commands.add_parser("probe", help="List sheets and their sizes without reading cell data")
+    probe.add_argument("file")
+    probe.add_argument("--sheets", nargs="+", default=None, help="Only list these sheets")
+    probe.add_argument("--estimate", action="store_true", help="Also estimate peak processing memory")
+    probe.add_argument("--json", action="store_true", help="Print JSON")
+    probe.set_defaults(handler=_probe)
+
+    process = commands.add_parser("process", help="Process a workbook and print the formatted context")
+    process.add_argument("file")
+    _add_config_arguments(process)
+    process.add_argument("--stream", action="store_true", help="Print the output as it is produced")
+    process.add_argument("--output", "-o", help="Write the output to this file")
+    _add_trace_arguments(process)
+    _add_profile_arguments(process)
+    process.set_defaults(handler=_process)
+
+    cached = commands.add_parser("cached", help="Print the cached result of a request (exit 1 on a miss)")
+    cached.add_argument("file")
+    _add_config_arguments(cached)
+    cached.set_defaults(handler=_cached)
+
+    batch = commands.add_parser("batch", help="Process many workbooks on a process pool, one JSON line per file")
+    batch.add_argument("files", nargs="+")
+    _add_config_arguments(batch)
+    batch.add_argument("--workers", type=int, default=None)
+    batch.add_argument("--memory-budget-mb", type=int, default=0)
+    _add_trace_arguments(batch)
+    _add_profile_arguments(batch)
+    batch.set_defaults(handler=_batch)
+
+    serve = commands.add_parser("serve", help="Run the processing service (options as for service.py)", add_help=False)
+    serve.add_argument("service_args", nargs=argparse.REMAINDER)
+    serve.set_defaults(handler=_serve)
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
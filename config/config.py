@@ -1,17 +1,183 @@
 from dataclasses import dataclass
+import os
 from typing import Optional, Dict, Any, List
 
+_environment_loaded = False
+# Per-user directory, since checkpoints are unpickled on load and must not be writable by others
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "excel-agent", "checkpoints")
+
+def load_environment() -> None:
+    """
+    Load variables from a .env file into the environment, once per process
+    
+    Called by every reader of environment settings rather than at import time, so importing
+    the package stays cheap. Variables already set in the environment take precedence.
+    """
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _environment_loaded = True
+
 @dataclass
 class ProcessingConfig:
     """Configuration for the Excel processing pipeline"""
     compression_intensity: str = "medium"  # low, medium, high
     task_type: str = "analysis"  # analysis, summary, inference
     max_output_length: int = 2000
+    max_output_tokens: Optional[int] = None  # token budget for the formatted output, in addition to max_output_length
+    context_format: str = "rows"  # rows, markdown, csv, dictionary: encoding of sample rows sent to the LLM
+    significant_digits: Optional[int] = None  # round float values in the LLM context to this many digits
     exclude_columns: List[str] = None
     include_sheets: List[str] = None
+    rules_cache_dir: Optional[str] = None  # directory for compression plans reused across files
+    max_concurrent_llm_calls: int = 4  # LLM requests in flight at once during compression
+    compression_workers: int = 4  # threads for CPU-bound per-sheet compression
+    max_parallel_sheets: int = 4  # sheets parsed and compressed at once by the LangGraph workflow
+    pipeline_chunk_rows: Optional[int] = None  # rows per chunk for pipelined parse/profile/compress, None to disable
+    pipeline_queue_chunks: int = 4  # chunks buffered between pipeline stages before the producer waits
+    checkpoint_dir: Optional[str] = DEFAULT_CHECKPOINT_DIR  # directory for per-sheet checkpoints that let an interrupted run resume, None to disable
+    checkpoint_min_cells: int = 1_000_000  # only workbooks with at least this many cells are checkpointed
+    checkpoint_max_age: float = 7 * 24 * 3600.0  # seconds after which checkpoints of unfinished runs are removed
+    checkpoint_max_bytes: int = 2 * 1024 * 1024 * 1024  # the oldest runs' checkpoints are removed above this total size
+    llm_latency_budget: Optional[float] = None  # seconds to wait for LLM insights before using rule-based output
+    late_llm_result: str = "cache"  # cache, cancel: what happens to an LLM call that misses the budget
+    profile_dir: Optional[str] = None  # directory for per-node profiles of graph runs, None to disable profiling
+    profile_nodes: List[str] = None  # graph nodes to profile (probe_workbook, process_sheet, merge_sheets, format_output), empty for all
+    profiler: str = "sampling"  # sampling: collapsed stacks of all threads; cprofile: pstats of the node's thread
+    profile_interval: float = 0.005  # seconds between stack samples of the sampling profiler
+    profile_memory: bool = False  # also write tracemalloc allocation diffs per node
     
     def __post_init__(self):
         if self.exclude_columns is None:
             self.exclude_columns = []
         if self.include_sheets is None:
-            self.include_sheets = []
\ No newline at end of file
+            self.include_sheets = []
+        if self.profile_nodes is None:
+            self.profile_nodes = []
+
+@dataclass
+class HTTPClientConfig:
+    """Connection pool settings for the process-wide LLM HTTP clients"""
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0  # seconds an idle connection stays open
+    timeout: float = 30.0
+    connect_timeout: float = 10.0
+    http2: bool = False  # requires the optional h2 package
+    
+    @classmethod
+    def from_env(cls) -> "HTTPClientConfig":
+        """Build settings from DEEPSEEK_* environment variables, falling back to defaults"""
+        load_environment()
+        return cls(
+            max_connections=int(os.getenv("DEEPSEEK_MAX_CONNECTIONS", cls.max_connections)),
+            max_keepalive_connections=int(os.getenv("DEEPSEEK_MAX_KEEPALIVE_CONNECTIONS", cls.max_keepalive_connections)),
+            keepalive_expiry=float(os.getenv("DEEPSEEK_KEEPALIVE_EXPIRY", cls.keepalive_expiry)),
+            timeout=float(os.getenv("DEEPSEEK_TIMEOUT", cls.timeout)),
+            connect_timeout=float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", cls.connect_timeout)),
+            http2=os.getenv("DEEPSEEK_HTTP2", "false").lower() in ("1", "true", "yes")
+        )
+
+@dataclass
+class LLMCacheConfig:
+    """Settings for the persistent LLM response cache"""
+    path: Optional[str] = None  # SQLite file; the cache is disabled when unset
+    ttl: float = 7 * 24 * 3600.0  # seconds before an entry expires
+    max_bytes: int = 256 * 1024 * 1024  # least recently used entries are evicted above this size
+    
+    @classmethod
+    def from_env(cls) -> "LLMCacheConfig":
+        """Build settings from DEEPSEEK_CACHE_* environment variables, falling back to defaults"""
+        load_environment()
+        return cls(
+            path=os.getenv("DEEPSEEK_CACHE_PATH") or None,
+            ttl=float(os.getenv("DEEPSEEK_CACHE_TTL", cls.ttl)),
+            max_bytes=int(os.getenv("DEEPSEEK_CACHE_MAX_BYTES", cls.max_bytes))
+        )
+
+@dataclass
+class ResultCacheConfig:
+    """Settings for the end-to-end result cache of the LangGraph workflow"""
+    memory_entries: int = 0  # results kept in an in-process LRU, 0 disables the memory tier
+    directory: Optional[str] = None  # directory of results shared between processes; unset disables the disk tier
+    max_bytes: int = 1024 * 1024 * 1024  # least recently used results are removed from the disk tier above this size, 0 for no limit
+    ttl: float = 3600.0  # seconds a result is served as fresh
+    stale_while_revalidate: float = 0.0  # seconds after the ttl a result is still served while it is recomputed
+    
+    @classmethod
+    def from_env(cls) -> "ResultCacheConfig":
+        """Build settings from RESULT_CACHE_* environment variables, falling back to defaults"""
+        load_environment()
+        return cls(
+            memory_entries=int(os.getenv("RESULT_CACHE_MEMORY_ENTRIES", cls.memory_entries)),
+            directory=os.getenv("RESULT_CACHE_DIR") or None,
+            max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", cls.max_bytes)),
+            ttl=float(os.getenv("RESULT_CACHE_TTL", cls.ttl)),
+            stale_while_revalidate=float(os.getenv("RESULT_CACHE_STALE_WHILE_REVALIDATE", cls.stale_while_revalidate))
+        )
+
+@dataclass
+class TraceConfig:
+    """Settings for exporting per-stage traces of workflow runs"""
+    path: Optional[str] = None  # file traces are appended to, one per line; unset disables tracing
+    format: str = "json"  # json, otlp (OpenTelemetry OTLP/JSON)
+    memory: bool = False  # record memory high-water marks per span with tracemalloc, which slows processing down
+    
+    @classmethod
+    def from_env(cls) -> "TraceConfig":
+        """Build settings from TRACE_* environment variables, falling back to defaults"""
+        load_environment()
+        return cls(
+            path=os.getenv("TRACE_PATH") or None,
+            format=os.getenv("TRACE_FORMAT", cls.format),
+            memory=os.getenv("TRACE_MEMORY", "false").lower() in ("1", "true", "yes")
+        )
+
+@dataclass
+class ServiceConfig:
+    """Settings for the long-running processing service (service.py)"""
+    workers: int = 0  # warm worker processes, 0 uses one per available CPU
+    max_queue: int = 100  # queued jobs before new submissions are rejected
+    max_finished_jobs: int = 1000  # finished jobs kept for status polling
+    host: str = "127.0.0.1"
+    port: int = 8780
+    socket_path: Optional[str] = None  # serve on this Unix socket instead of host and port
+    memory_budget_mb: int = 0  # estimated peak memory of the running jobs together, 0 disables admission control
+    
+    @classmethod
+    def from_env(cls) -> "ServiceConfig":
+        """Build settings from SERVICE_* environment variables, falling back to defaults"""
+        load_environment()
+        return cls(
+            workers=int(os.getenv("SERVICE_WORKERS", cls.workers)),
+            max_queue=int(os.getenv("SERVICE_MAX_QUEUE", cls.max_queue)),
+            max_finished_jobs=int(os.getenv("SERVICE_MAX_FINISHED_JOBS", cls.max_finished_jobs)),
+            host=os.getenv("SERVICE_HOST", cls.host),
+            port=int(os.getenv("SERVICE_PORT", cls.port)),
+            socket_path=os.getenv("SERVICE_SOCKET") or None,
+            memory_budget_mb=int(os.getenv("SERVICE_MEMORY_BUDGET_MB", cls.memory_budget_mb))
+        )
+
+@dataclass
+class LLMDispatcherConfig:
+    """Rate limiting, concurrency and retry settings for LLM API calls"""
+    rate_limit: float = 20.0  # requests per second, 0 disables rate limiting
+    burst: int = 20  # requests that may be sent back to back before rate limiting applies
+    max_concurrency: int = 8  # requests in flight at once across the process
+    max_retries: int = 4  # retries on 429, 5xx and transport errors
+    backoff_base: float = 0.5  # seconds, doubled on every retry
+    backoff_max: float = 20.0
+    
+    @classmethod
+    def from_env(cls) -> "LLMDispatcherConfig":
+        """Build settings from DEEPSEEK_* environment variables, falling back to defaults"""
+        load_environment()
+        return cls(
+            rate_limit=float(os.getenv("DEEPSEEK_RATE_LIMIT", cls.rate_limit)),
+            burst=int(os.getenv("DEEPSEEK_BURST", cls.burst)),
+            max_concurrency=int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", cls.max_concurrency)),
+            max_retries=int(os.getenv("DEEPSEEK_MAX_RETRIES", cls.max_retries)),
+            backoff_base=float(os.getenv("DEEPSEEK_BACKOFF_BASE", cls.backoff_base)),
+            backoff_max=float(os.getenv("DEEPSEEK_BACKOFF_MAX", cls.backoff_max))
+        )
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Generate large synthetic workbooks for benchmarks and scaling tests
+
+Every sheet has a Date column followed by repeating Category, Quantity and
+Amount columns. Values are drawn column by column with NumPy from a seeded
+generator, so the same arguments always produce the same workbook, and a
+share of the cells can be left empty or turned into planted anomalies
+(Amount outliers 20-100 times their usual size, half of them negative).
+
+Sheets are streamed straight into the .xlsx archive in chunks of rows, so
+memory use does not grow with the row count. Each chunk is assembled as one
+NumPy byte matrix: every cell of a column is given the same width, numbers
+by padding them with leading zeros and other cells by whitespace between
+elements, so no Python code runs per cell. This is what makes a 10M-cell
+workbook take seconds; openpyxl's write-only mode needs minutes for it.
+
+Usage:
+    python generate_benchmark_data.py --rows 1000000 --columns 10 --output large.xlsx
+"""
+
+from typing import Any, Dict, List
+from xml.sax.saxutils import escape, quoteattr
+import argparse
+import time
+import zipfile
+import numpy as np
+
+CHUNK_ROWS = 65536
+COLUMN_KINDS = ("category", "quantity", "amount")
+# Excel serial number of 2023-01-01; rows are spread over two years from it in date order
+FIRST_DATE_SERIAL = 44927
+DATE_SPAN_DAYS = 730
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"><Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/><Default Extension="xml" ContentType="application/xml"/><Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/><Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>{overrides}</Types>"""
+ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>"""
+WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>{sheets}</sheets></workbook>"""
+WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{relationships}<Relationship Id="rIdStyles" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/></Relationships>"""
+# Cell style 1 shows a serial number as a date (built-in number format 14)
+STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts><fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills><borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders><cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs><cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs><cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>"""
+SHEET_START = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><dimension ref="A1:{last_cell}"/><sheetData>"""
+SHEET_END = "</sheetData></worksheet>"
+
+def _column_letter(index: int) -> str:
+    letters = ""
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+def _inline_string(text: str) -> str:
+    return f'<c t="inlineStr"><is><t>{escape(text)}</t></is></c>'
+
+def _literal(text: str, rows: int) -> np.ndarray:
+    return np.broadcast_to(np.frombuffer(text.encode(), dtype=np.uint8), (rows, len(text)))
+
+def _padded(fragments: List[str]) -> np.ndarray:
+    """Byte matrix of XML fragments, padded with spaces to one width"""
+    width = max(len(fragment) for fragment in fragments)
+    return np.frombuffer("".join(fragment.ljust(width) for fragment in fragments).encode(),
+                         dtype=np.uint8).reshape(len(fragments), width)
+
+def _write_part(archive: zipfile.ZipFile, name: str, text: str) -> None:
+    # Unlike writestr, open stamps parts with a fixed date, so equal arguments give identical files
+    with archive.open(name, "w") as f:
+        f.write(text.encode())
+
+def _number_cells(values: np.ndarray, decimals: int, missing: np.ndarray, style: str = "") -> np.ndarray:
+    """
+    Cells of integer-scaled numbers as one byte row per cell
+
+    Args:
+        values: Integers, the numbers times 10 ** decimals
+        decimals: Digits after the decimal point
+        missing: True for cells left empty
+        style: Attributes added to each <c> element
+
+    Returns:
+        uint8 array of shape (len(values), width)
+    """
+    rows = len(values)
+    magnitude = np.abs(values)
+    digits = max(len(str(int(magnitude.max()))) if rows else 1, decimals + 1)
+    powers = 10 ** np.arange(digits - 1, -1, -1, dtype=np.int64)
+    text = ((magnitude[:, None] // powers) % 10 + ord("0")).astype(np.uint8)
+    if decimals:
+        text = np.hstack([text[:, :-decimals], _literal(".", rows), text[:, -decimals:]])
+    if (values < 0).any():
+        text = np.hstack([np.where(values < 0, ord("-"), ord("0")).astype(np.uint8)[:, None], text])
+    cells = np.hstack([_literal(f"<c{style}><v>", rows), text, _literal("</v></c>", rows)])
+    if missing.any():
+        cells[missing] = np.frombuffer("<c/>".ljust(cells.shape[1]).encode(), dtype=np.uint8)
+    return cells
+
+def _sheet_chunk(rng: np.random.Generator, start: int, rows: int, total_rows: int, kinds: List[str],
+                 null_rate: float, category_cells: np.ndarray, anomaly_rate: float, counts: Dict[str, int]) -> bytes:
+    """
+    XML of rows start..start+rows of a sheet, drawn from rng
+
+    category_cells holds one byte row per category value, then one for an empty
+    cell. Planted anomalies and empty cells are added to counts.
+    """
+    cardinality = len(category_cells) - 1
+    days = (np.arange(start, start + rows, dtype=np.int64) * DATE_SPAN_DAYS) // max(total_rows, 1)
+    fields = [_literal("<row>", rows),
+              _number_cells(FIRST_DATE_SERIAL + days, 0, np.zeros(rows, dtype=bool), ' s="1"')]
+    for kind in kinds:
+        missing = rng.random(rows) < null_rate
+        counts["nulls"] += int(missing.sum())
+        if kind == "category":
+            codes = np.where(missing, cardinality, rng.integers(0, cardinality, rows))
+            fields.append(category_cells[codes])
+        elif kind == "quantity":
+            fields.append(_number_cells(rng.integers(1, 200, rows), 0, missing))
+        else:
+            amounts = rng.lognormal(mean=4.0, sigma=1.0, size=rows)
+            planted = (rng.random(rows) < anomaly_rate) & ~missing
+            factors = rng.uniform(20, 100, rows) * np.where(rng.random(rows) < 0.5, -1, 1)
+            amounts = np.where(planted, amounts * factors, amounts)
+            counts["anomalies"] += int(planted.sum())
+            fields.append(_number_cells(np.round(amounts * 100).astype(np.int64), 2, missing))
+    fields.append(_literal("</row>\n", rows))
+    return np.hstack(fields).tobytes()
+
+def generate_benchmark_workbook(output: str = "benchmark_data.xlsx", rows: int = 100_000, columns: int = 10,
+                                sheets: int = 1, null_rate: float = 0.02, cardinality: int = 50,
+                                anomaly_rate: float = 0.001, seed: int = 0) -> Dict[str, Any]:
+    """
+    Write a synthetic workbook
+
+    Args:
+        output: Path of the .xlsx file to write
+        rows: Data rows per sheet, below the header row
+        columns: Columns per sheet, including the Date column
+        sheets: Number of sheets, named Data_1, Data_2, ...
+        null_rate: Share of empty cells in every column but Date
+        cardinality: Distinct values of each Category column
+        anomaly_rate: Share of Amount cells turned into outliers
+        seed: Seed of the random generator; each sheet draws from its own stream
+
+    Returns:
+        Dict with "output", "cells", "seconds" and per sheet "name", "rows",
+        "columns", "nulls" and "anomalies"
+    """
+    if rows < 0 or columns < 1 or sheets < 1 or cardinality < 1:
+        raise ValueError("rows must be non-negative and columns, sheets and cardinality positive")
+    if not 0 <= null_rate <= 1 or not 0 <= anomaly_rate <= 1:
+        raise ValueError("null_rate and anomaly_rate must be between 0 and 1")
+
+    start_time = time.perf_counter()
+    kinds = [COLUMN_KINDS[index % len(COLUMN_KINDS)] for index in range(columns - 1)]
+    header = "<row>" + "".join(_inline_string(name) for name in
+                               ["Date"] + [f"{kind.title()}_{index // len(COLUMN_KINDS) + 1}" for index, kind in enumerate(kinds)]) + "</row>\n"
+    names = [f"Data_{index + 1}" for index in range(sheets)]
+    category_cells = _padded([_inline_string(f"Group {code}") for code in range(cardinality)] + ["<c/>"])
+    results = []
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        _write_part(archive, "[Content_Types].xml", CONTENT_TYPES.format(overrides="".join(
+            f'<Override PartName="/xl/worksheets/sheet{index + 1}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for index in range(sheets))))
+        _write_part(archive, "_rels/.rels", ROOT_RELS)
+        _write_part(archive, "xl/workbook.xml", WORKBOOK.format(sheets="".join(
+            f'<sheet name={quoteattr(name)} sheetId="{index + 1}" r:id="rId{index + 1}"/>' for index, name in enumerate(names))))
+        _write_part(archive, "xl/_rels/workbook.xml.rels", WORKBOOK_RELS.format(relationships="".join(
+            f'<Relationship Id="rId{index + 1}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{index + 1}.xml"/>' for index in range(sheets))))
+        _write_part(archive, "xl/styles.xml", STYLES)
+
+        for sheet_index, name in enumerate(names):
+            rng = np.random.default_rng([seed, sheet_index])
+            counts = {"nulls": 0, "anomalies": 0}
+            with archive.open(f"xl/worksheets/sheet{sheet_index + 1}.xml", "w", force_zip64=True) as f:
+                f.write(SHEET_START.format(last_cell=f"{_column_letter(columns)}{rows + 1}").encode())
+                f.write(header.encode())
+                for start in range(0, rows, CHUNK_ROWS):
+                    f.write(_sheet_chunk(rng, start, min(CHUNK_ROWS, rows - start), rows, kinds,
+                                         null_rate, category_cells, anomaly_rate, counts))
+                f.write(SHEET_END.encode())
+            results.append({"name": name, "rows": rows, "columns": columns, **counts})
+
+    return {
+        "output": output,
+        "cells": rows * columns * sheets,
+        "seconds": time.perf_counter() - start_time,
+        "sheets": results
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="benchmark_data.xlsx")
+    parser.add_argument("--rows", type=int, default=100_000, help="data rows per sheet")
+    parser.add_argument("--columns", type=int, default=10, help="columns per sheet, including Date")
+    parser.add_argument("--sheets", type=int, default=1)
+    parser.add_argument("--null-rate", type=float, default=0.02, help="share of empty cells outside the Date column")
+    parser.add_argument("--cardinality", type=int, default=50, help="distinct values per Category column")
+    parser.add_argument("--anomaly-rate", type=float, default=0.001, help="share of Amount cells planted as outliers")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    result = generate_benchmark_workbook(args.output, args.rows, args.columns, args.sheets, args.null_rate,
+                                         args.cardinality, args.anomaly_rate, args.seed)
+    for sheet in result["sheets"]:
+        print(f"{sheet['name']}: {sheet['rows']} rows x {sheet['columns']} columns, "
+              f"{sheet['nulls']} empty cells, {sheet['anomalies']} planted anomalies")
+    print(f"Wrote {result['cells']:,} cells to {result['output']} in {result['seconds']:.1f}s "
+          f"({result['cells'] / max(result['seconds'], 1e-9):,.0f} cells/s)")
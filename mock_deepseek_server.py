@@ -0,0 +1,354 @@
+"""
+Local stand-in for the DeepSeek chat completions API
+
+Serves /v1/chat/completions over HTTP/1.1 with keep-alive, both as plain JSON and
+as server-sent events when the request sets "stream": true, so the pipeline and
+the LLM client can be exercised and benchmarked without the real API. Response
+latency follows a configurable distribution, errors and 429s can be injected at
+a fixed rate, and responses are either canned or echo the prompt. With a seed,
+the sequence of latencies and injected errors is reproducible.
+
+Usage:
+    python mock_deepseek_server.py --port 8765 --latency 0.2
+    python mock_deepseek_server.py --latency 0.8 --latency-distribution lognormal --latency-jitter 0.4 \\
+        --error-rate 0.01 --rate-limit-rate 0.05 --seed 42
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8765 python main.py
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, List
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+
+DEFAULT_RESPONSE = "Mock insight: the data looks consistent."
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+RESPONSE_MODES = ("canned", "echo")
+
+def sample_latency(rng: random.Random, distribution: str, mean: float, jitter: float) -> float:
+    """
+    Draw one response latency
+    
+    Args:
+        rng: Random source
+        distribution: One of LATENCY_DISTRIBUTIONS
+        mean: Mean latency in seconds
+        jitter: Spread in seconds: half-width for uniform, standard deviation for normal and lognormal
+        
+    Returns:
+        Latency in seconds, never negative
+    """
+    if mean <= 0:
+        return 0.0
+    if distribution == "fixed" or (jitter <= 0 and distribution != "exponential"):
+        return mean
+    if distribution == "uniform":
+        value = rng.uniform(mean - jitter, mean + jitter)
+    elif distribution == "normal":
+        value = rng.gauss(mean, jitter)
+    elif distribution == "lognormal":
+        # Parameterised by the mean and standard deviation of the latency itself; long right tail
+        sigma = math.sqrt(math.log(1 + (jitter / mean) ** 2))
+        value = rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+    elif distribution == "exponential":
+        value = rng.expovariate(1 / mean)
+    else:
+        raise ValueError(f"Unknown latency distribution {distribution!r}; expected one of {LATENCY_DISTRIBUTIONS}")
+    return max(0.0, value)
+
+class _ChatCompletionsHandler(BaseHTTPRequestHandler):
+    """Request handler; settings are read from the owning server"""
+    protocol_version = "HTTP/1.1"  # keep connections alive between requests
+    disable_nagle_algorithm = True  # headers and body are written separately
+
+    def setup(self):
+        super().setup()
+        with self.server.settings._lock:
+            self.server.settings.connections_opened += 1
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the response (timeout, cancellation or truncated stream)
+            pass
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+
+        settings = self.server.settings
+        injected = settings._next_error()
+        if injected is not None:
+            status_code, retry_after = injected
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+            self._send_json(status_code, {"error": {"message": "Injected error", "code": status_code}}, headers)
+            return
+
+        latency = settings._next_latency()
+        if latency > 0:
+            time.sleep(latency)
+
+        content = settings.respond(request)
+        if request.get("stream"):
+            self._send_stream(content, request.get("model", "deepseek-chat"), settings.token_latency)
+            return
+
+        completion_tokens = len(content.split())
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in request.get("messages", []))
+        self._send_json(200, {
+            "id": "mock-completion",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "deepseek-chat"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        })
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, content: str, model: str, token_latency: float):
+        """Send the completion as server-sent events, one word per chunk, using chunked encoding"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        tokens = re.findall(r"\S+\s*|\s+", content)
+        for index, token in enumerate(tokens):
+            if token_latency > 0 and index > 0:
+                time.sleep(token_latency)
+            self._write_event({
+                "id": "mock-completion",
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+            })
+        self._write_event({
+            "id": "mock-completion",
+            "object": "chat.completion.chunk",
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+        })
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, payload: dict):
+        self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+class MockDeepSeekServer:
+    """Threaded mock server that can run in the background of a test or benchmark"""
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency: float = 0.0,
+                 response_text: str = DEFAULT_RESPONSE,
+                 token_latency: float = 0.0,
+                 latency_distribution: str = "fixed",
+                 latency_jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0,
+                 retry_after: Optional[float] = None,
+                 response_mode: str = "canned",
+                 canned_responses: Optional[Dict[str, str]] = None,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            latency: Mean seconds to wait before answering each request
+            response_text: Content returned when no canned response matches
+            token_latency: Seconds between tokens of a streamed completion
+            latency_distribution: How latency varies per request, one of LATENCY_DISTRIBUTIONS
+            latency_jitter: Spread of the latency distribution in seconds
+            error_rate: Fraction of requests answered with HTTP 503
+            rate_limit_rate: Fraction of requests answered with HTTP 429
+            retry_after: Retry-After seconds sent with random 429s
+            response_mode: "canned" returns canned_responses/response_text, "echo" returns the last user message
+            canned_responses: Maps a substring of the prompt to the content returned for it
+            seed: Seed for latencies and random errors, for reproducible runs
+        """
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {latency_distribution!r}; expected one of {LATENCY_DISTRIBUTIONS}")
+        if response_mode not in RESPONSE_MODES:
+            raise ValueError(f"Unknown response mode {response_mode!r}; expected one of {RESPONSE_MODES}")
+        self.latency = latency
+        self.response_text = response_text
+        self.token_latency = token_latency
+        self.latency_distribution = latency_distribution
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.response_mode = response_mode
+        self.canned_responses = dict(canned_responses or {})
+        self.connections_opened = 0
+        self.requests_served = 0
+        self.errors_injected = 0
+        self.latency_seconds = 0.0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._injected_errors = []
+        self._server = ThreadingHTTPServer((host, port), _ChatCompletionsHandler)
+        self._server.daemon_threads = True
+        self._server.settings = self
+        self._thread: Optional[threading.Thread] = None
+
+    def inject_errors(self, status_code: int, count: int = 1, retry_after: Optional[float] = None):
+        """Answer the next `count` requests with an error status (e.g. 429 or 503)"""
+        with self._lock:
+            self._injected_errors.extend([(status_code, retry_after)] * count)
+
+    def _next_error(self):
+        """Count the request and decide whether it gets an injected error"""
+        with self._lock:
+            self.requests_served += 1
+            if self._injected_errors:
+                injected = self._injected_errors.pop(0)
+            else:
+                roll = self._rng.random()
+                if roll < self.rate_limit_rate:
+                    injected = (429, self.retry_after)
+                elif roll < self.rate_limit_rate + self.error_rate:
+                    injected = (503, None)
+                else:
+                    injected = None
+            if injected is not None:
+                self.errors_injected += 1
+            return injected
+
+    def _next_latency(self) -> float:
+        with self._lock:
+            latency = sample_latency(self._rng, self.latency_distribution, self.latency, self.latency_jitter)
+            self.latency_seconds += latency
+            return latency
+
+    def respond(self, request: Dict[str, Any]) -> str:
+        """Content of the completion for a request"""
+        messages: List[Dict[str, Any]] = request.get("messages", [])
+        prompt = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+        if self.response_mode == "echo":
+            return prompt
+        for pattern, content in self.canned_responses.items():
+            if pattern in prompt:
+                return content
+        return self.response_text
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for separating server-side (simulated LLM) time from client-side cost"""
+        with self._lock:
+            return {
+                "connections_opened": self.connections_opened,
+                "requests_served": self.requests_served,
+                "errors_injected": self.errors_injected,
+                "latency_seconds": self.latency_seconds
+            }
+
+    @property
+    def url(self) -> str:
+        """Base URL to use as DEEPSEEK_BASE_URL"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockDeepSeekServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-deepseek", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def __enter__(self) -> "MockDeepSeekServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local DeepSeek-compatible mock server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean seconds to wait before each response")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Spread of the latency distribution in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--mode", choices=RESPONSE_MODES, default="canned", help="Return canned responses or echo the prompt")
+    parser.add_argument("--response", default=DEFAULT_RESPONSE, help="Content returned when no canned response matches")
+    parser.add_argument("--responses-file", help="JSON object mapping prompt substrings to canned responses")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible latencies and errors")
+    args = parser.parse_args()
+
+    canned_responses = None
+    if args.responses_file:
+        with open(args.responses_file, encoding="utf-8") as f:
+            canned_responses = json.load(f)
+
+    server = MockDeepSeekServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        response_text=args.response,
+        token_latency=args.token_latency,
+        latency_distribution=args.latency_distribution,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        response_mode=args.mode,
+        canned_responses=canned_responses,
+        seed=args.seed
+    )
+    print(f"Mock DeepSeek server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served: {server.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Long-running Excel processing service with warm workers and a job queue
+
+Serves a small JSON API over HTTP, on a TCP port or a Unix socket, in front of a
+JobService: a pool of worker processes that import the stack and compile the
+workflow once at start-up, so each request costs only its processing time.
+
+    POST   /jobs              {"file_path", "task_description", "config": {...}, "priority": 0}
+                              -> 202 with the job; 429 when the queue is full; 400 for config
+                              fields outside CLIENT_CONFIG_FIELDS or invalid values
+    GET    /jobs              summaries of the known jobs
+    GET    /jobs/<id>?wait=S  the job, waiting up to S seconds for it to finish
+    DELETE /jobs/<id>         cancel the job
+    GET    /health            worker and queue counters
+
+Usage:
+    python service.py --port 8780 --workers 4
+    python service.py --socket /tmp/excel-service.sock
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+from dataclasses import asdict, replace
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from agents.job_service import JobService, QueueFullError, ServiceClosedError
+from config.config import ProcessingConfig, ServiceConfig
+
+# Longest a single GET /jobs/<id>?wait= request may block
+MAX_WAIT_SECONDS = 60.0
+# ProcessingConfig fields a client may set. The others (checkpoint, profile and compression plan
+# directories and their options) are server-side settings: checkpoints are unpickled on load, and
+# the directories are written to, so they must not be chosen by whoever can reach the API.
+CLIENT_CONFIG_CHOICES = {
+    "compression_intensity": ("low", "medium", "high"),
+    "task_type": ("analysis", "summary", "inference"),
+    "context_format": ("rows", "markdown", "csv", "dictionary"),
+    "late_llm_result": ("cache", "cancel")
+}
+# Integer fields: lowest and highest accepted value (None for no bound) and whether null is accepted
+CLIENT_CONFIG_INTEGERS = {
+    "max_output_length": (1, None, False),
+    "max_output_tokens": (1, None, True),
+    "significant_digits": (1, 17, True),
+    "max_concurrent_llm_calls": (1, 32, False),
+    "compression_workers": (1, 32, False),
+    "max_parallel_sheets": (1, 32, False),
+    "pipeline_chunk_rows": (1, None, True),
+    "pipeline_queue_chunks": (1, 64, False)
+}
+CLIENT_CONFIG_FLOATS = {"llm_latency_budget": (0.0, None, True)}
+CLIENT_CONFIG_LISTS = ("exclude_columns", "include_sheets")
+CLIENT_CONFIG_FIELDS = (tuple(CLIENT_CONFIG_CHOICES) + tuple(CLIENT_CONFIG_INTEGERS)
+                        + tuple(CLIENT_CONFIG_FLOATS) + CLIENT_CONFIG_LISTS)
+
+def parse_client_config(fields: Any, base: Optional[ProcessingConfig] = None) -> ProcessingConfig:
+    """
+    Processing configuration of a job request
+
+    Args:
+        fields: The request's "config" object; only CLIENT_CONFIG_FIELDS are accepted
+        base: Server-side configuration the client's fields are applied to (defaults to ProcessingConfig())
+
+    Returns:
+        The job's configuration
+
+    Raises:
+        ValueError: For an unknown or server-side field, or a value of the wrong type or out of range
+    """
+    if not isinstance(fields, dict):
+        raise ValueError("config must be an object")
+    unknown = sorted(set(fields) - set(CLIENT_CONFIG_FIELDS))
+    if unknown:
+        raise ValueError(f"config fields {unknown} cannot be set by clients; allowed: {list(CLIENT_CONFIG_FIELDS)}")
+
+    for name, value in fields.items():
+        if name in CLIENT_CONFIG_CHOICES:
+            if value not in CLIENT_CONFIG_CHOICES[name]:
+                raise ValueError(f"{name} must be one of {list(CLIENT_CONFIG_CHOICES[name])}")
+        elif name in CLIENT_CONFIG_LISTS:
+            if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                raise ValueError(f"{name} must be a list of strings")
+        else:
+            integer = name in CLIENT_CONFIG_INTEGERS
+            low, high, optional = CLIENT_CONFIG_INTEGERS[name] if integer else CLIENT_CONFIG_FLOATS[name]
+            if value is None and optional:
+                continue
+            # JSON true and false parse as bool, which is an int subclass
+            numeric = (int,) if integer else (int, float)
+            if isinstance(value, bool) or not isinstance(value, numeric):
+                raise ValueError(f"{name} must be {'an integer' if integer else 'a number'}{' or null' if optional else ''}")
+            if value < low or (high is not None and value > high):
+                raise ValueError(f"{name} must be between {low} and {high}" if high is not None else f"{name} must be at least {low}")
+    return replace(base or ProcessingConfig(), **fields)
+
+class _JobsHandler(BaseHTTPRequestHandler):
+    """Request handler; the job service is read from the owning server"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        if self._route() != ["jobs"]:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            file_path = request["file_path"]
+            task_description = request.get("task_description", "")
+            config = parse_client_config(request.get("config", {}), self.server.base_config)
+            priority = int(request.get("priority", 0))
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_json(400, {"error": f"Invalid job request: {str(e)}"})
+            return
+
+        try:
+            job = self.server.service.submit(file_path, task_description, config, priority)
+        except QueueFullError as e:
+            self._send_json(429, {"error": str(e)}, {"Retry-After": "1"})
+            return
+        except ServiceClosedError as e:
+            self._send_json(503, {"error": str(e)})
+            return
+        self._send_json(202, job.to_dict(), {"Location": f"/jobs/{job.id}"})
+
+    def do_GET(self):
+        route = self._route()
+        service = self.server.service
+        if route == ["health"]:
+            self._send_json(200, service.stats())
+        elif route == ["jobs"]:
+            self._send_json(200, {"jobs": service.jobs()})
+        elif len(route) == 2 and route[0] == "jobs":
+            query = parse_qs(urlparse(self.path).query)
+            try:
+                wait = min(float(query.get("wait", ["0"])[0]), MAX_WAIT_SECONDS)
+            except ValueError:
+                self._send_json(400, {"error": "wait must be a number of seconds"})
+                return
+            job = service.wait(route[1], wait) if wait > 0 else service.get(route[1])
+            if job is None:
+                self._send_json(404, {"error": f"Unknown job {route[1]}"})
+            else:
+                self._send_json(200, job.to_dict())
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_DELETE(self):
+        route = self._route()
+        if len(route) != 2 or route[0] != "jobs":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        job = self.server.service.cancel(route[1])
+        if job is None:
+            self._send_json(404, {"error": f"Unknown job {route[1]}"})
+        else:
+            self._send_json(200, job.to_dict(include_output=False))
+
+    def _route(self) -> List[str]:
+        return [part for part in urlparse(self.path).path.split("/") if part]
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {format % args}\n")
+
+class _UnixJobsHandler(_JobsHandler):
+    # TCP_NODELAY does not apply to Unix sockets
+    disable_nagle_algorithm = False
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    """HTTP over a Unix socket"""
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("unix", 0)
+
+class ExcelProcessingServer:
+    """HTTP front end of a JobService that can run in the background of a test or benchmark"""
+
+    def __init__(self,
+                 service: JobService,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 socket_path: Optional[str] = None,
+                 verbose: bool = False,
+                 base_config: Optional[ProcessingConfig] = None):
+        """
+        Args:
+            service: Started job service to serve
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            socket_path: Serve on this Unix socket instead of host and port
+            verbose: Log every request to stderr
+            base_config: Configuration that requests' config fields are applied to; the fields
+                clients cannot set (see CLIENT_CONFIG_FIELDS) keep its values
+        """
+        self.service = service
+        self.socket_path = socket_path
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self._server = _UnixHTTPServer(socket_path, _UnixJobsHandler)
+        else:
+            self._server = ThreadingHTTPServer((host, port), _JobsHandler)
+            self._server.daemon_threads = True
+        self._server.service = service
+        self._server.verbose = verbose
+        self._server.base_config = base_config
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of a TCP server, or unix:// and the socket path"""
+        if self.socket_path:
+            return f"unix://{self.socket_path}"
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ExcelProcessingServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="excel-service-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def __enter__(self) -> "ExcelProcessingServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class ServiceError(RuntimeError):
+    """Error response from the service"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+class ServiceClient:
+    """Client of the processing service, over TCP or a Unix socket"""
+
+    def __init__(self, url: str = "http://127.0.0.1:8780", timeout: float = MAX_WAIT_SECONDS + 30.0):
+        """
+        Args:
+            url: Server URL, http://host:port or unix:///path/to/socket
+            timeout: Socket timeout in seconds
+        """
+        self.url = url
+        self.timeout = timeout
+
+    def _connection(self) -> http.client.HTTPConnection:
+        parsed = urlparse(self.url)
+        if parsed.scheme == "unix":
+            return _UnixHTTPConnection(parsed.path, self.timeout)
+        return http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=self.timeout)
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        connection = self._connection()
+        try:
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = json.loads(response.read() or b"{}")
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise ServiceError(response.status, data.get("error", response.reason))
+        return data
+
+    def submit(self, file_path: str, task_description: str, config: Optional[ProcessingConfig] = None, priority: int = 0) -> Dict[str, Any]:
+        """
+        Queue a job; raises ServiceError (status 429) when the queue is full
+
+        Only the config fields clients may set are sent; the others are the server's settings.
+        """
+        fields = asdict(config) if config is not None else {}
+        return self._request("POST", "/jobs", {
+            "file_path": file_path,
+            "task_description": task_description,
+            "config": {name: value for name, value in fields.items() if name in CLIENT_CONFIG_FIELDS},
+            "priority": priority
+        })
+
+    def get(self, job_id: str, wait: float = 0.0) -> Dict[str, Any]:
+        """The job, waiting up to `wait` seconds for it to finish"""
+        return self._request("GET", f"/jobs/{job_id}?wait={wait}" if wait > 0 else f"/jobs/{job_id}")
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Wait until the job has finished (or the timeout expired) and return it"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            remaining = MAX_WAIT_SECONDS if deadline is None else min(MAX_WAIT_SECONDS, deadline - time.monotonic())
+            job = self.get(job_id, wait=max(remaining, 0.001))
+            if job["status"] in ("succeeded", "failed", "cancelled") or (deadline is not None and time.monotonic() >= deadline):
+                return job
+
+    def process(self, file_path: str, task_description: str, config: Optional[ProcessingConfig] = None, priority: int = 0) -> Dict[str, Any]:
+        """Submit a job and wait for it to finish"""
+        return self.wait(self.submit(file_path, task_description, config, priority)["id"])
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        return self._request("DELETE", f"/jobs/{job_id}")
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        return self._request("GET", "/jobs")["jobs"]
+
+    def health(self) -> Dict[str, Any]:
+        return self._request("GET", "/health")
+
+def main(argv: Optional[List[str]] = None):
+    defaults = ServiceConfig.from_env()
+    parser = argparse.ArgumentParser(description="Run the Excel processing service")
+    parser.add_argument("--host", default=defaults.host)
+    parser.add_argument("--port", type=int, default=defaults.port)
+    parser.add_argument("--socket", default=defaults.socket_path, help="Serve on this Unix socket instead of host and port")
+    parser.add_argument("--workers", type=int, default=defaults.workers, help="Warm worker processes (0: one per CPU)")
+    parser.add_argument("--max-queue", type=int, default=defaults.max_queue, help="Queued jobs before submissions get HTTP 429")
+    parser.add_argument("--max-finished-jobs", type=int, default=defaults.max_finished_jobs, help="Finished jobs kept for polling")
+    parser.add_argument("--memory-budget-mb", type=int, default=defaults.memory_budget_mb,
+                        help="Estimated peak memory of the running jobs together (0: no admission control)")
+    parser.add_argument("--verbose", action="store_true", help="Log requests and show worker output")
+    args = parser.parse_args(argv)
+
+    service = JobService(args.workers, args.max_queue, args.max_finished_jobs, quiet=not args.verbose,
+                         memory_budget=args.memory_budget_mb * 1024 * 1024).start()
+    server = ExcelProcessingServer(service, args.host, args.port, args.socket, verbose=args.verbose)
+    print(f"Excel processing service listening on {server.url} with {service.workers} workers")
+    # Shut down the same way on SIGTERM as on Ctrl-C, so workers do not outlive the service
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        service.close(wait=False)
+        print(f"Stopped: {service.stats()}")
+
+if __name__ == "__main__":
+    main()
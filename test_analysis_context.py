@@ -0,0 +1,71 @@
+"""
+Test script for the shared per-run analysis context used by the formatter
+"""
+
+from tools.format_adapter_tool import FormatAdapterTool
+from utils.analysis_context import AnalysisContext
+import pandas as pd
+
+def test_analysis_context():
+    """Test that sheet frames and aggregates are built once per run"""
+
+    print("=== Testing Analysis Context ===\n")
+
+    data = {
+        "sheets": {
+            "Sales": {"data": {
+                "Region": {"0": "East", "1": "West", "2": "East", "3": "North"},
+                "Product": {"0": "Product A", "1": "Product C", "2": "Product C", "3": "Product B"},
+                "Profit": {"0": 1200.0, "1": -300.0, "2": 800.0, "3": 450.0},
+                "Total_Price": {"0": 5000.0, "1": 900.0, "2": 3100.0, "3": 2000.0},
+                "Quantity": {"0": 10, "1": 3, "2": 7, "3": 5}
+            }},
+            "Empty": {"data": {}}
+        }
+    }
+
+    # Count DataFrame reconstructions while formatting
+    original_from_dict = pd.DataFrame.from_dict
+    calls = []
+
+    def counting_from_dict(*args, **kwargs):
+        calls.append(1)
+        return original_from_dict(*args, **kwargs)
+
+    pd.DataFrame.from_dict = counting_from_dict
+    try:
+        # Test 1: One frame per non-empty sheet, shared by summary and extractors
+        print("Test 1: Frames built once")
+        print("-" * 25)
+
+        tool = FormatAdapterTool()
+        context = AnalysisContext(data)
+        summary = tool._create_data_summary(context)
+        lines = [line for section in tool._rule_based_sections(context) for line in section["lines"]]
+        print("\n".join(lines))
+        assert len(calls) == 1
+        assert "Sheet 'Sales': 4 rows, 5 columns" in summary
+        assert "- Total profit: 2 thousand yuan" in lines
+        assert "- East region: 2 thousand profit share" in lines
+        print("\n")
+    finally:
+        pd.DataFrame.from_dict = original_from_dict
+
+    # Test 2: Aggregates and column lookups are memoized
+    print("Test 2: Shared aggregates")
+    print("-" * 25)
+
+    sheet = context.sheet("Sales")
+    assert context.sheet("Empty") is None
+    assert sheet.group_sum("Region", "Profit") is sheet.group_sum("Region", "Profit")
+    assert sheet.group_sum("Region", "Profit")["East"] == 2000.0
+    assert sheet.total("Profit") == 2150.0
+    assert sheet.has_column_ci("profit") and sheet.has_columns("Region", "Profit")
+    assert not sheet.has_columns("region")
+    print("Group-by results reused across extractors")
+    print("\n")
+
+    print("=== Analysis Context Test Complete ===")
+
+if __name__ == "__main__":
+    test_analysis_context()
@@ -0,0 +1,114 @@
+"""
+Test script for the async tools and aprocess_excel
+"""
+
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils.llm_cache import configure_llm_cache
+from utils.http_client import close_http_clients
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+async def _gather_with_heartbeat(coros):
+    """Await the coroutines concurrently; also return the longest gap between heartbeat ticks"""
+    gaps = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    beat = asyncio.ensure_future(heartbeat())
+    results = await asyncio.gather(*coros)
+    done.set()
+    await beat
+    return results, max(gaps, default=0.0)
+
+def test_async_workflow():
+    """Test that the async path matches the sync one and keeps the event loop responsive"""
+
+    print("=== Testing Async Workflow ===\n")
+
+    files = [path for path in ("complex_sample_data.xlsx", "sample_data.xlsx", "simple_sample_data.xlsx")
+             if os.path.exists(path)]
+    if not files:
+        print("No sample workbooks found.")
+        return
+
+    with MockDeepSeekServer(latency=0.2, response_text="Insight: profit is stable.") as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        try:
+            workflow = ExcelProcessingWorkflow()
+            agent = workflow.agent
+            task = "Analyze profit trends"
+
+            # Test 1: Async tools return the same results as the sync ones
+            print("Test 1: Async tools")
+            print("-" * 30)
+            config = ProcessingConfig(compression_intensity="high")
+            with contextlib.redirect_stdout(io.StringIO()):
+                parsed = agent.parser_tool._run(files[0])
+                aparsed = asyncio.run(agent.parser_tool._arun(files[0]))
+                compressed = agent.compression_tool._run(parsed, config)
+                acompressed = asyncio.run(agent.compression_tool._arun(parsed, config))
+                formatted = agent.format_tool._run(compressed, task, config)
+                aformatted = asyncio.run(agent.format_tool._arun(compressed, task, config))
+            assert aparsed["status"] == "success" and aparsed["message"] == parsed["message"]
+            assert acompressed == compressed
+            assert aformatted == formatted
+            missing = asyncio.run(agent.parser_tool._arun("missing.xlsx"))
+            assert missing["status"] == "error"
+            print(f"Parsed, compressed and formatted {len(parsed['sheets'])} sheets; output {aformatted['length']} chars")
+            print("\n")
+
+            # Test 2: Concurrent aprocess_excel calls on one loop match process_excel
+            print("Test 2: Concurrent aprocess_excel")
+            print("-" * 30)
+            for config in (ProcessingConfig(compression_intensity="medium"),
+                           ProcessingConfig(compression_intensity="high", llm_latency_budget=5.0)):
+                requests = files * 2
+                with contextlib.redirect_stdout(io.StringIO()):
+                    expected = [workflow.process_excel(path, task, config) for path in requests]
+                    outputs, max_gap = asyncio.run(_gather_with_heartbeat(
+                        [workflow.aprocess_excel(path, task, config) for path in requests]
+                    ))
+                assert outputs == expected
+                # Parsing and compression hold the GIL in short slices only; the loop keeps ticking
+                assert max_gap < 1.0, f"event loop blocked for {max_gap:.2f}s"
+                print(f"{len(requests)} requests ({config.compression_intensity}): longest loop stall {max_gap * 1000:.0f} ms")
+            print("\n")
+
+            # Test 3: Errors surface as in the sync path
+            print("Test 3: Errors")
+            print("-" * 30)
+            config = ProcessingConfig()
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = workflow.process_excel("missing.xlsx", task, config)
+                output = asyncio.run(workflow.aprocess_excel("missing.xlsx", task, config))
+            assert output == expected
+            print(f"Missing file output: {output!r}")
+            print("\n")
+        finally:
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+            close_http_clients()
+
+    print("=== Async Workflow Test Complete ===")
+
+if __name__ == "__main__":
+    test_async_workflow()
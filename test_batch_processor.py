@@ -0,0 +1,110 @@
+"""
+Test script for batch processing of many workbooks on a process pool
+"""
+
+from agents.batch_processor import process_many
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils.llm_cache import configure_llm_cache
+from utils.http_client import close_http_clients
+import contextlib
+import io
+import os
+import signal
+
+def test_batch_processor():
+    """Test scheduling, streamed results, per-file timing and error handling of process_many"""
+
+    print("=== Testing Batch Processing ===\n")
+
+    files = [path for path in ("simple_sample_data.xlsx", "complex_sample_data.xlsx", "sample_data.xlsx")
+             if os.path.exists(path)]
+    if not files:
+        print("No sample workbooks found.")
+        return
+
+    with MockDeepSeekServer(latency=0.05, response_text="Insight: profit is stable.") as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        try:
+            config = ProcessingConfig(compression_intensity="medium")
+            batch = files + ["missing.xlsx"]
+            tasks = [f"Analyze file {i}" for i in range(len(batch))]
+
+            # Test 1: Every file comes back once, with its own task and timing
+            print("Test 1: Results and timing")
+            print("-" * 30)
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = list(process_many(batch, tasks, config, max_workers=2))
+            assert sorted(result["index"] for result in results) == list(range(len(batch)))
+            for result in results:
+                assert result["file_path"] == batch[result["index"]]
+                assert result["task_description"] == tasks[result["index"]]
+                assert result["seconds"] >= 0 and result["queued_seconds"] >= 0
+                assert result["elapsed"] >= result["seconds"]
+                print(f"{result['file_path']}: {result['status']} in {result['seconds']:.2f}s "
+                      f"(queued {result['queued_seconds']:.2f}s, worker {result['worker']})")
+            assert [result["elapsed"] for result in results] == sorted(result["elapsed"] for result in results)
+            print("\n")
+
+            # Test 2: Worker output matches a run in this process; a bad file does not stop the batch
+            print("Test 2: Output and errors")
+            print("-" * 30)
+            by_index = {result["index"]: result for result in results}
+            missing = by_index[len(batch) - 1]
+            assert missing["status"] == "error"
+            assert "missing.xlsx" in missing["message"] and "Error parsing Excel" in missing["message"]
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = ExcelProcessingWorkflow().process_excel(files[0], tasks[0], config)
+            assert by_index[0]["status"] == "success"
+            assert by_index[0]["output"] == expected
+            assert all(by_index[i]["output"].startswith(f"Task: {tasks[i]}") for i in range(len(files)))
+            print(f"Error reported: {missing['message']}")
+            print("\n")
+
+            # Test 3: Argument handling
+            print("Test 3: Arguments")
+            print("-" * 30)
+            assert list(process_many([], "Analyze", config)) == []
+            try:
+                list(process_many(files, ["only one task"] * (len(files) + 1), config))
+                assert False, "Expected ValueError for mismatched tasks"
+            except ValueError as e:
+                print(f"Mismatched tasks rejected: {e}")
+            print("\n")
+
+            # Test 4: A worker that dies breaks the pool; the batch continues on a new one
+            print("Test 4: Killed worker")
+            print("-" * 30)
+            batch = files * 3
+            killed = None
+            results = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                for result in process_many(batch, "Analyze sales", config, max_workers=2):
+                    results.append(result)
+                    if killed is None:
+                        # The other worker is busy with a file that now has to be retried
+                        killed = result["worker"]
+                        os.kill(killed, signal.SIGKILL)
+            assert sorted(result["index"] for result in results) == list(range(len(batch)))
+            assert all(result["status"] == "success" for result in results)
+            assert all(result["worker"] != killed for result in results[1:])
+            print(f"Killed worker {killed}; all {len(results)} files succeeded on "
+                  f"{len({result['worker'] for result in results})} workers")
+            print("\n")
+        finally:
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+            close_http_clients()
+
+    print("=== Batch Processing Test Complete ===")
+
+if __name__ == "__main__":
+    test_batch_processor()
@@ -0,0 +1,97 @@
+"""
+Test script for the synthetic benchmark workbook generator
+"""
+
+from tools.excel_parser_tool import ExcelParseTool
+from utils.xlsx_probe import probe_xlsx
+import generate_benchmark_data
+import contextlib
+import filecmp
+import io
+import os
+import pandas as pd
+import tempfile
+
+def test_benchmark_data():
+    """Test the generated values, reproducibility and that the readers in the pipeline accept the files"""
+
+    print("=== Testing Benchmark Data Generator ===\n")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "data.xlsx")
+
+        # Test 1: Shape, types, empty cells, cardinality and planted anomalies
+        print("Test 1: Generated values")
+        print("-" * 30)
+        result = generate_benchmark_data.generate_benchmark_workbook(
+            path, rows=5000, columns=8, sheets=2, null_rate=0.05, cardinality=7, anomaly_rate=0.01, seed=3)
+        assert result["cells"] == 5000 * 8 * 2
+        sheets = pd.read_excel(path, sheet_name=None)
+        assert list(sheets) == ["Data_1", "Data_2"]
+        for sheet in result["sheets"]:
+            df = sheets[sheet["name"]]
+            assert df.shape == (5000, 8)
+            assert list(df.columns) == ["Date", "Category_1", "Quantity_1", "Amount_1",
+                                        "Category_2", "Quantity_2", "Amount_2", "Category_3"]
+            assert pd.api.types.is_datetime64_any_dtype(df["Date"]) and df["Date"].is_monotonic_increasing
+            assert df["Date"].notna().all()
+            assert int(df.isna().sum().sum()) == sheet["nulls"]
+            assert abs(sheet["nulls"] / (5000 * 7) - 0.05) < 0.01
+            assert df["Category_1"].nunique() == 7
+            assert df["Quantity_1"].dropna().between(1, 199).all()
+            amounts = pd.concat([df["Amount_1"], df["Amount_2"]]).dropna()
+            # Only planted anomalies are negative
+            assert 0 < (amounts < 0).sum() <= sheet["anomalies"] < 0.02 * len(amounts)
+            print(f"{sheet['name']}: {sheet['nulls']} empty cells, {sheet['anomalies']} anomalies, "
+                  f"Amount range {amounts.min():.2f} to {amounts.max():.2f}")
+        print("\n")
+
+        # Test 2: The same arguments give the same file, a different seed different data
+        print("Test 2: Reproducibility")
+        print("-" * 30)
+        same_path = os.path.join(temp_dir, "same.xlsx")
+        other_path = os.path.join(temp_dir, "other.xlsx")
+        generate_benchmark_data.generate_benchmark_workbook(
+            same_path, rows=5000, columns=8, sheets=2, null_rate=0.05, cardinality=7, anomaly_rate=0.01, seed=3)
+        generate_benchmark_data.generate_benchmark_workbook(
+            other_path, rows=5000, columns=8, sheets=2, null_rate=0.05, cardinality=7, anomaly_rate=0.01, seed=4)
+        assert filecmp.cmp(path, same_path, shallow=False)
+        assert not pd.read_excel(path).equals(pd.read_excel(other_path))
+        print("Seeded output is byte-identical")
+        print("\n")
+
+        # Test 3: Chunk boundaries, sizes reported by the probe and the excel_parser tool
+        print("Test 3: Chunked sheets and readers")
+        print("-" * 30)
+        chunk_rows = generate_benchmark_data.CHUNK_ROWS
+        generate_benchmark_data.CHUNK_ROWS = 700
+        try:
+            generate_benchmark_data.generate_benchmark_workbook(path, rows=2500, columns=30, null_rate=0.0, seed=1)
+        finally:
+            generate_benchmark_data.CHUNK_ROWS = chunk_rows
+        assert probe_xlsx(path) == [{"name": "Data_1", "rows": 2501, "columns": 30}]
+        with contextlib.redirect_stdout(io.StringIO()):
+            parsed = ExcelParseTool()._run(path)
+        sheet = parsed["sheets"]["Data_1"]
+        df = pd.DataFrame.from_dict(sheet["data"])
+        assert df.shape == (2500, 30) and df.columns[-1] == "Quantity_10"
+        assert df.notna().all().all() and df["Date"].is_monotonic_increasing
+        print(f"Parsed {df.shape[0]} rows x {df.shape[1]} columns written in chunks of 700 rows")
+        print("\n")
+
+        # Test 4: Invalid arguments
+        print("Test 4: Argument validation")
+        print("-" * 30)
+        for arguments in ({"rows": -1}, {"columns": 0}, {"null_rate": 1.5}, {"cardinality": 0}):
+            try:
+                generate_benchmark_data.generate_benchmark_workbook(path, **arguments)
+                assert False, f"{arguments} accepted"
+            except ValueError:
+                pass
+        print("Invalid arguments rejected")
+        print("\n")
+
+    print("=== Benchmark Data Generator Test Complete ===")
+
+if __name__ == "__main__":
+    test_benchmark_data()
@@ -0,0 +1,223 @@
+"""
+Test script for per-sheet checkpointing and resuming of the LangGraph workflow
+"""
+
+from agents.excel_processing_agent import ExcelProcessingAgent
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import DEFAULT_CHECKPOINT_DIR, ProcessingConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils.checkpoint import CheckpointStore, checkpoint_id, decode_sheet_result, encode_sheet_result
+from utils.llm_cache import configure_llm_cache
+from utils.http_client import close_http_clients
+from dataclasses import replace
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import numpy as np
+
+def _quiet(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+def _dump(value) -> str:
+    return json.dumps(value, default=repr)
+
+def _workflow_failing_on(sheet_names, calls):
+    """
+    Workflow with its own graph whose run fails after losing the given sheets, recording the sheets processed
+
+    A lost sheet ends its branch with an error result, which is not checkpointed, and the merge step
+    raises. Raising in the branch itself is not deterministic: when another branch finishes in the same
+    step, langgraph can report a KeyError of its own instead of the branch's error.
+    """
+    workflow = ExcelProcessingWorkflow(agent=ExcelProcessingAgent())
+    run_sheet = workflow._run_sheet
+    merge_sheets = workflow._merge_sheets
+
+    def failing_run_sheet(branch):
+        calls.append(branch["sheet"]["name"])
+        if branch["sheet"]["name"] in sheet_names:
+            return {"sheet_results": [{"index": branch["index"], "name": branch["sheet"]["name"], "parsed": None,
+                                       "compressed": None, "error": f"worker lost while processing {branch['sheet']['name']}"}]}
+        return run_sheet(branch)
+
+    def failing_merge_sheets(state):
+        lost = [result["error"] for result in state.get("sheet_results", []) if result.get("error", "").startswith("worker lost")]
+        if lost:
+            raise RuntimeError(lost[0])
+        return merge_sheets(state)
+
+    arun_sheet = workflow._arun_sheet
+
+    async def failing_arun_sheet(branch):
+        calls.append(branch["sheet"]["name"])
+        return await arun_sheet(branch)
+
+    # The graph is built on first use, so it picks up these replacements
+    workflow._run_sheet = failing_run_sheet
+    workflow._arun_sheet = failing_arun_sheet
+    workflow._merge_sheets = failing_merge_sheets
+    return workflow
+
+def test_checkpoint():
+    """Test the binary encoding, resuming after a failure and cleanup after success"""
+
+    print("=== Testing Checkpoints ===\n")
+
+    file_path = "complex_sample_data.xlsx"
+    if not os.path.exists(file_path):
+        print(f"Test file {file_path} not found.")
+        return
+
+    with MockDeepSeekServer(latency=0.05, response_text="Insight: profit is stable.") as server, \
+            tempfile.TemporaryDirectory() as checkpoint_dir:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        try:
+            task = "Analyze profit trends"
+            config = ProcessingConfig(compression_intensity="high", checkpoint_dir=checkpoint_dir,
+                                      checkpoint_min_cells=0, max_parallel_sheets=1)
+            agent = ExcelProcessingAgent()
+
+            # Test 1: Sheet results round-trip exactly and are smaller than JSON
+            print("Test 1: Encoding")
+            print("-" * 30)
+            parsed = _quiet(agent.parser_tool._run, file_path)
+            compressed = _quiet(agent.compression_tool._run, parsed, config)
+            for name, sheet in parsed["sheets"].items():
+                sheet_result = {"index": 0, "name": name, "parsed": sheet, "compressed": compressed["sheets"][name]}
+                blob = encode_sheet_result(sheet_result)
+                # Compared as JSON, where NaN equals NaN
+                assert _dump(decode_sheet_result(blob)) == _dump(sheet_result)
+                json_size = len(_dump(sheet_result).encode("utf-8"))
+                print(f"{name}: {len(blob)} bytes vs {json_size} bytes of JSON")
+                if sheet["shape"][0] > 1000:
+                    assert len(blob) < json_size / 3
+            # Columns that a typed Series would change (None among numbers, mixed types) stay exact
+            mixed = {"index": 1, "name": "Mixed", "parsed": {"data": {
+                "a": {0: 1, 1: None}, "b": {0: 1, 1: 2.5}, "c": {0: "x", 1: 3}, "d": {0: np.nan, 1: 1.0}
+            }}, "compressed": None}
+            restored = decode_sheet_result(encode_sheet_result(mixed))
+            assert restored["parsed"]["data"]["a"] == {0: 1, 1: None}
+            assert type(restored["parsed"]["data"]["b"][0]) is int
+            assert restored["parsed"]["data"]["c"] == {0: "x", 1: 3}
+            print("\n")
+
+            # Test 2: A failed run keeps the finished sheets; the rerun only processes the rest
+            print("Test 2: Resume after a failure")
+            print("-" * 30)
+            expected = _quiet(ExcelProcessingWorkflow(agent=ExcelProcessingAgent()).process_excel,
+                              file_path, task, replace(config, checkpoint_dir=None))
+            calls = []
+            try:
+                # The lost sheet fails the run in the merge step, after the other sheets are checkpointed
+                _quiet(_workflow_failing_on({"Category_Summary"}, calls).process_excel, file_path, task, config)
+                assert False, "Expected the run to fail"
+            except RuntimeError as e:
+                print(f"First run failed: {e}")
+            run_id = checkpoint_id(file_path, config)
+            store = CheckpointStore(checkpoint_dir)
+            assert store.completed_sheets(run_id) == [0, 1, 2, 4]
+            assert os.stat(os.path.join(checkpoint_dir, run_id)).st_mode & 0o777 == 0o700
+            calls = []
+            output = _quiet(_workflow_failing_on(set(), calls).process_excel, file_path, task, config)
+            assert calls == ["Category_Summary"]
+            assert output == expected
+            # The run produced its output, so its checkpoints are gone
+            assert store.completed_sheets(run_id) == []
+            print(f"Resumed run processed only {calls}")
+            print("\n")
+
+            # Test 3: The async path resumes too; other inputs and small workbooks do not use checkpoints
+            print("Test 3: Async resume and eligibility")
+            print("-" * 30)
+            calls = []
+            try:
+                _quiet(_workflow_failing_on({"Regional_Summary"}, calls).process_excel, file_path, task, config)
+                assert False, "Expected the run to fail"
+            except RuntimeError:
+                pass
+            # The other branches still run to completion and are checkpointed
+            assert store.completed_sheets(run_id) == [0, 1, 3, 4]
+            assert checkpoint_id(file_path, replace(config, compression_intensity="medium")) != run_id
+            calls = []
+            workflow = _workflow_failing_on(set(), calls)
+            output = _quiet(asyncio.run, workflow.aprocess_excel(file_path, task, config))
+            assert calls == ["Regional_Summary"] and output == expected
+            calls = []
+            _quiet(_workflow_failing_on(set(), calls).process_excel, file_path, task, replace(config, checkpoint_min_cells=10 ** 9))
+            assert os.listdir(checkpoint_dir) == []
+            # Checkpointing is on by default, for workbooks of at least a million cells
+            default_config = ProcessingConfig()
+            assert default_config.checkpoint_dir == DEFAULT_CHECKPOINT_DIR
+            state = {"config": default_config, "file_path": file_path}
+            assert ExcelProcessingWorkflow._checkpoint_id(state, [{"rows": 8361, "columns": 8}]) == ""
+            assert ExcelProcessingWorkflow._checkpoint_id(state, [{"rows": 200_000, "columns": 8}]) != ""
+            assert ExcelProcessingWorkflow._checkpoint_id({**state, "config": replace(default_config, checkpoint_dir=None)},
+                                                          [{"rows": 200_000, "columns": 8}]) == ""
+            print("Async run resumed; small workbooks are not checkpointed")
+            print("\n")
+
+            # Test 4: Runs left behind are pruned by age and size; other users' directories are not read
+            print("Test 4: Pruning and directory ownership")
+            print("-" * 30)
+            sheet_result = {"index": 0, "name": "Sheet", "parsed": {"data": {"a": {0: 1}}}, "compressed": None}
+            store = CheckpointStore(checkpoint_dir, max_age=3600, max_bytes=10 ** 9)
+            for age, name in ((7200, "expired"), (600, "older"), (300, "newer")):
+                store.save_sheet(name, sheet_result)
+                then = time.time() - age
+                os.utime(os.path.join(checkpoint_dir, name), (then, then))
+            assert store.prune() == ["expired"]
+            size = store._run_size("newer")
+            # Over the size limit, the oldest runs go first, but never the one about to resume
+            store.max_bytes = size
+            assert store.prune(keep="older") == ["newer"]
+            assert sorted(os.listdir(checkpoint_dir)) == ["older"]
+            assert store.load_sheet("older", 0) is not None
+            # A stale crashed run is removed when a checkpointed run starts
+            store.save_sheet("crashed", sheet_result)
+            os.utime(os.path.join(checkpoint_dir, "crashed"), (0, 0))
+            _quiet(_workflow_failing_on(set(), []).process_excel, file_path, task, config)
+            assert "crashed" not in os.listdir(checkpoint_dir)
+            store.discard("older")
+
+            os.chmod(checkpoint_dir, 0o777)
+            try:
+                store.save_sheet("shared", sheet_result)
+                assert False, "Expected a group- and world-writable directory to be refused"
+            except PermissionError:
+                pass
+            os.chmod(checkpoint_dir, 0o700)
+            store.save_sheet("shared", sheet_result)
+            os.chmod(checkpoint_dir, 0o777)
+            assert not store.trusted() and store.completed_sheets("shared") == []
+            assert store.load_sheet("shared", 0) is None
+            messages = _quiet(ExcelProcessingWorkflow()._probe_workbook, {"file_path": file_path, "config": config})
+            assert messages["checkpoint_id"] == "" and "Checkpointing disabled" in messages["messages"][-1]["content"]
+            os.chmod(checkpoint_dir, 0o700)
+            os.chmod(os.path.join(checkpoint_dir, "shared"), 0o775)
+            assert store.trusted() and store.load_sheet("shared", 0) is None
+            os.chmod(os.path.join(checkpoint_dir, "shared"), 0o700)
+            assert store.load_sheet("shared", 0) is not None
+            store.discard("shared")
+            print("Expired and oversized runs pruned; shared directories refused")
+            print("\n")
+        finally:
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+            close_http_clients()
+
+    print("=== Checkpoint Test Complete ===")
+
+if __name__ == "__main__":
+    test_checkpoint()
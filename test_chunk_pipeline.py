@@ -0,0 +1,225 @@
+"""
+Test script for the chunk-pipelined parse, profile and compression of a sheet
+"""
+
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig
+from mock_deepseek_server import MockDeepSeekServer
+from tools.data_compression_tool import DataCompressionTool
+from tools.excel_parser_tool import ExcelParseTool
+from utils import chunk_pipeline
+from utils.chunk_pipeline import concat_chunks, read_sheet_chunks, run_sheet_pipeline, SheetProfile
+from tools import data_compression_tool
+from utils.compression_rules import CompressionPlan, default_compression_plan, header_types
+from utils.llm_cache import configure_llm_cache
+from utils.http_client import close_http_clients
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+def _edge_case_frame() -> pd.DataFrame:
+    """Rows with late nulls, blank rows, dates missing from the first rows and a sparse key"""
+    rng = np.random.default_rng(5)
+    rows = 60
+    df = pd.DataFrame({
+        "Date": pd.date_range("2024-01-01", periods=rows, freq="W"),
+        "Region": rng.choice(["North", "South", "East"], rows),
+        "Channel": rng.choice(["Online", "Store"], rows),
+        "Units": rng.integers(1, 50, rows),
+        "Profit": rng.normal(100, 30, rows).round(2)
+    })
+    df.loc[:11, "Date"] = pd.NaT
+    df.loc[40:, "Units"] = np.nan
+    df.loc[::3, "Channel"] = np.nan
+    df.loc[[20, 21]] = np.nan
+    df.loc[rows - 3:] = np.nan
+    return df
+
+def _compare(file_path: str, sheet_name: str, plan, config: ProcessingConfig):
+    """Compress a sheet in full and as a pipeline with the same plan"""
+    parsed = ExcelParseTool()._run(file_path, [sheet_name])["sheets"][sheet_name]
+    full = pd.DataFrame.from_dict(parsed["data"])
+    compression_tool = DataCompressionTool()
+    expected = compression_tool._compress_frame(full, parsed, plan, config)
+    profile, compressed = run_sheet_pipeline(file_path, sheet_name, config, lambda df, sheet_data, config: plan, compression_tool._compress_frame)
+    return parsed, expected, profile, compressed
+
+def test_chunk_pipeline():
+    """Test the chunk reader, mergeable profile and aggregates, and backpressure"""
+
+    print("=== Testing Chunk Pipeline ===\n")
+
+    file_path = "complex_sample_data.xlsx"
+    if not os.path.exists(file_path):
+        print(f"Test file {file_path} not found.")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        edge_path = os.path.join(tmp_dir, "edge_cases.xlsx")
+        _edge_case_frame().to_excel(edge_path, sheet_name="Edge", index=False)
+
+        # Test 1: Chunks read like pd.read_excel and profile like the parser tool
+        print("Test 1: Chunk reader and profile")
+        print("-" * 30)
+        for path, sheet_name, chunk_rows in ((edge_path, "Edge", 7), (file_path, "Sales_Data", 700), (file_path, "Monthly_Trend", 7)):
+            full = pd.read_excel(path, sheet_name=sheet_name)
+            chunks = list(read_sheet_chunks(path, sheet_name, chunk_rows))
+            profile = SheetProfile()
+            for chunk in chunks:
+                profile.update(chunk)
+            sheet_data = profile.finalize()
+            pd.testing.assert_frame_equal(concat_chunks(chunks, sheet_data["data_types"]), full)
+            parsed = ExcelParseTool()._run(path, [sheet_name])["sheets"][sheet_name]
+            assert sheet_data["data_types"] == parsed["data_types"], (sheet_data["data_types"], parsed["data_types"])
+            assert sheet_data["null_values"] == {col: int(count) for col, count in parsed["null_values"].items()}
+            assert sheet_data["outliers"] == parsed["outliers"]
+            assert sheet_data["shape"] == parsed["shape"]
+            print(f"{sheet_name}: {len(chunks)} chunks, profile matches")
+        print("\n")
+
+        # Test 2: Pipelined compression matches compressing the whole sheet
+        print("Test 2: Same compression as the full sheet")
+        print("-" * 30)
+        grouped = []
+        original_finalize = chunk_pipeline.ChunkAggregator.finalize
+        def _finalize(aggregator, *args):
+            grouped.append(aggregator.grouped)
+            return original_finalize(aggregator, *args)
+        chunk_pipeline.ChunkAggregator.finalize = _finalize
+        compact_rows = chunk_pipeline.COMPACT_ROWS
+        # Merge partials often so compaction is exercised too
+        chunk_pipeline.COMPACT_ROWS = 20
+        try:
+            cases = [(file_path, "Sales_Data", 900), (file_path, "Product_Summary", 2), (edge_path, "Edge", 9)]
+            for path, sheet_name, chunk_rows in cases:
+                data_types = ExcelParseTool()._run(path, [sheet_name])["sheets"][sheet_name]["data_types"]
+                numeric = [col for col, dtype in data_types.items() if dtype in ("int64", "float64")]
+                plans = [
+                    default_compression_plan(data_types, "analysis"),
+                    CompressionPlan.from_dict({
+                        "columns": {col: {"action": "aggregate", "agg": agg} for col, agg in zip(numeric, ["mean", "nunique", "max", "count"])},
+                        "sample": {"rows": 4, "seed": 1}
+                    })
+                ]
+                for intensity in ("low", "medium", "high"):
+                    for plan in (plans if intensity != "low" else [None]):
+                        config = ProcessingConfig(compression_intensity=intensity, pipeline_chunk_rows=chunk_rows, pipeline_queue_chunks=2)
+                        parsed, expected, profile, compressed = _compare(path, sheet_name, plan, config)
+                        assert profile["data"] == {} and profile["data_types"] == parsed["data_types"]
+                        if compressed is None:
+                            print(f"{sheet_name} {intensity}: plan changed after the null filter, full compression needed")
+                            continue
+                        pd.testing.assert_frame_equal(pd.DataFrame(compressed["data"]), pd.DataFrame(expected["data"]), rtol=1e-9)
+                        assert compressed["columns"] == expected["columns"] and compressed["shape"] == expected["shape"]
+        finally:
+            chunk_pipeline.ChunkAggregator.finalize = original_finalize
+            chunk_pipeline.COMPACT_ROWS = compact_rows
+        assert any(grouped) and not all(grouped)
+        print(f"{len(grouped)} pipelined compressions match, {sum(grouped)} from partial aggregates")
+        print("\n")
+
+        # Test 3: Bounded queues hold the reader back while the plan is generated
+        print("Test 3: Backpressure")
+        print("-" * 30)
+        produced = []
+        original_reader = chunk_pipeline.read_sheet_chunks
+        def _counting_reader(*args):
+            for chunk in original_reader(*args):
+                produced.append(chunk)
+                yield chunk
+        read_while_waiting = []
+        def _slow_plan(df, sheet_data, config):
+            time.sleep(0.5)
+            read_while_waiting.append(len(produced))
+            return None
+        chunk_pipeline.read_sheet_chunks = _counting_reader
+        try:
+            config = ProcessingConfig(compression_intensity="low", pipeline_chunk_rows=100, pipeline_queue_chunks=2)
+            profile, compressed = run_sheet_pipeline(file_path, "Sales_Data", config, _slow_plan, DataCompressionTool()._compress_frame)
+        finally:
+            chunk_pipeline.read_sheet_chunks = original_reader
+        # Two full queues, one chunk in the profiler, one waiting to be put, one with the aggregator
+        assert read_while_waiting[0] <= 2 * config.pipeline_queue_chunks + 3, read_while_waiting
+        assert len(produced) == -(-profile["shape"][0] // 100)
+        print(f"{read_while_waiting[0]} of {len(produced)} chunks read while the plan was pending")
+        print("\n")
+
+        # Test 4: A pipelined sheet looks up the plan of the same sheet loaded in full
+        print("Test 4: Plan signature")
+        print("-" * 30)
+        requests = []
+        async def counting_rules(data_description, task_type):
+            requests.append(task_type)
+            return json.dumps({"columns": {"Profit": {"action": "aggregate", "agg": "sum"}}, "group_by": ["Region"]})
+        generate_rules = data_compression_tool.agenerate_compression_rules
+        data_compression_tool.agenerate_compression_rules = counting_rules
+        data_compression_tool._plan_cache.clear()
+        try:
+            compression_tool = DataCompressionTool()
+            parsed = ExcelParseTool()._run(edge_path, ["Edge"])["sheets"]["Edge"]
+            full = pd.DataFrame.from_dict(parsed["data"])
+            # Late nulls change the first chunk's data types, but not the types of the sheet's first rows
+            chunks = list(read_sheet_chunks(edge_path, "Edge", 7))
+            first_chunk = SheetProfile()
+            first_chunk.update(chunks[0])
+            assert first_chunk.finalize()["data_types"] != parsed["data_types"]
+            assert header_types(pd.concat(chunks)) == header_types(full)
+            for chunk_rows in (7, 25, 1000):
+                config = ProcessingConfig(compression_intensity="high", pipeline_chunk_rows=chunk_rows)
+                run_sheet_pipeline(edge_path, "Edge", config, compression_tool.get_compression_plan, compression_tool._compress_frame)
+            assert compression_tool.get_compression_plan(full, parsed, config).source == "llm"
+            assert len(requests) == 1
+        finally:
+            data_compression_tool.agenerate_compression_rules = generate_rules
+            data_compression_tool._plan_cache.clear()
+        print(f"One plan generation for three chunk sizes and the full sheet: {header_types(full)}")
+        print("\n")
+
+    # Test 5: Errors in a stage stop the pipeline and reach the caller
+    print("Test 5: Errors")
+    print("-" * 30)
+    threads = threading.active_count()
+    try:
+        run_sheet_pipeline(file_path, "Missing", ProcessingConfig(pipeline_chunk_rows=10), lambda *args: None, DataCompressionTool()._compress_frame)
+        assert False, "missing sheet should raise"
+    except KeyError as e:
+        print(f"Raised: {e}")
+    assert threading.active_count() == threads
+    print("\n")
+
+    # Test 6: The workflow output is unchanged in pipelined mode
+    print("Test 6: Workflow")
+    print("-" * 30)
+    with MockDeepSeekServer(latency=0.05, response_text="Insight: profit is stable.") as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+        try:
+            workflow = ExcelProcessingWorkflow()
+            task = "Analyze profit trends"
+            for intensity in ("medium", "high"):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    regular = workflow.process_excel(file_path, task, ProcessingConfig(compression_intensity=intensity, task_type="summary"))
+                    pipelined = workflow.process_excel(file_path, task, ProcessingConfig(compression_intensity=intensity, task_type="summary", pipeline_chunk_rows=1000))
+                assert pipelined == regular
+            print("Pipelined and regular runs produce the same output")
+        finally:
+            close_http_clients()
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+    print("\n")
+
+    print("=== Chunk Pipeline Test Complete ===")
+
+if __name__ == "__main__":
+    test_chunk_pipeline()
@@ -0,0 +1,94 @@
+"""
+Test script for the command-line entry point and its lazy imports
+"""
+
+from mock_deepseek_server import MockDeepSeekServer
+from utils.excel_utils import ExcelParser
+from utils.xlsx_probe import probe_xlsx
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ("pandas", "openpyxl", "langchain", "langchain_core", "langgraph", "httpx")
+
+LOADED_MODULES = """
+import contextlib, io, json, sys
+import cli
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+        cli.main(sys.argv[1:])
+    except SystemExit:
+        pass
+print(json.dumps(sorted(name for name in sys.modules if name.split(".")[0] in %r)))
+""" % (HEAVY_MODULES,)
+
+def _cli(*args, env=None):
+    return subprocess.run([sys.executable, "cli.py", *args], capture_output=True, text=True, env=env, timeout=300)
+
+def test_cli():
+    """Test light commands, processing and cache lookups through the CLI"""
+
+    print("=== Testing Command-Line Interface ===\n")
+
+    if not os.path.exists("complex_sample_data.xlsx"):
+        print("Sample workbook not found.")
+        return
+
+    # Test 1: Light commands do not import the processing stack
+    print("Test 1: Imports of light commands")
+    print("-" * 30)
+    for args in (["--help"], ["probe", "complex_sample_data.xlsx"]):
+        completed = subprocess.run([sys.executable, "-c", LOADED_MODULES, *args],
+                                   capture_output=True, text=True, check=True)
+        loaded = json.loads(completed.stdout.strip().splitlines()[-1])
+        assert loaded == [], f"{args} loaded {loaded}"
+        print(f"{' '.join(args)}: no heavy modules loaded")
+    print("\n")
+
+    # Test 2: The stdlib probe matches the openpyxl one
+    print("Test 2: Probe")
+    print("-" * 30)
+    for file_path in ("simple_sample_data.xlsx", "complex_sample_data.xlsx"):
+        assert probe_xlsx(file_path) == ExcelParser.probe_workbook(file_path)
+    assert probe_xlsx("complex_sample_data.xlsx", ["Monthly_Trend", "Missing"]) == \
+        ExcelParser.probe_workbook("complex_sample_data.xlsx", ["Monthly_Trend", "Missing"])
+    completed = _cli("probe", "complex_sample_data.xlsx", "--json")
+    assert completed.returncode == 0
+    probed = json.loads(completed.stdout)
+    assert probed["sheets"] == ExcelParser.probe_workbook("complex_sample_data.xlsx")
+    completed = _cli("probe", "missing.xlsx")
+    assert completed.returncode == 1 and "Error probing Excel file" in completed.stderr
+    print(f"Sheets: {[sheet['name'] for sheet in probed['sheets']]}")
+    print("\n")
+
+    # Test 3: Process, then find the result in the cache
+    print("Test 3: Process and cached lookup")
+    print("-" * 30)
+    with MockDeepSeekServer(latency=0.05, response_text="Insight: profit is stable.") as server, \
+            tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, DEEPSEEK_BASE_URL=server.url, RESULT_CACHE_DIR=cache_dir)
+        env.setdefault("DEEPSEEK_API_KEY", "test-key")
+        env.pop("DEEPSEEK_CACHE_PATH", None)
+        task = ["complex_sample_data.xlsx", "--task", "Analyze sales", "--intensity", "high"]
+
+        completed = _cli("cached", *task, env=env)
+        assert completed.returncode == 1, completed.stderr
+        completed = _cli("process", *task, env=env)
+        assert completed.returncode == 0, completed.stderr
+        output = completed.stdout
+        assert output.startswith("Task: Analyze sales")
+        completed = _cli("cached", *task, env=env)
+        assert completed.returncode == 0, completed.stderr
+        assert completed.stdout == output
+        # A different configuration is a different request
+        assert _cli("cached", *task, "--task-type", "summary", env=env).returncode == 1
+        assert _cli("cached", *task, env=dict(env, RESULT_CACHE_DIR="")).returncode == 2
+        print(f"Processed {len(output)} characters; cached lookup returned the same output")
+    print("\n")
+
+    print("=== Command-Line Interface Test Complete ===")
+
+if __name__ == "__main__":
+    test_cli()
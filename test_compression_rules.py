@@ -0,0 +1,134 @@
+"""
+Test script for the structured compression rule DSL
+"""
+
+from config.config import ProcessingConfig
+from tools import data_compression_tool
+from tools.data_compression_tool import DataCompressionTool
+from utils.compression_rules import CompressionPlan, PlanCache, default_compression_plan, schema_signature
+from utils.excel_utils import ExcelParser
+import asyncio
+import os
+import tempfile
+
+def test_compression_rules():
+    """Test parsing, compiling and executing compression plans"""
+
+    print("=== Testing Compression Rule DSL ===\n")
+
+    file_path = "simple_sample_data.xlsx"
+
+    if not os.path.exists(file_path):
+        print(f"Test file {file_path} not found.")
+        return
+
+    df = next(iter(ExcelParser.parse_excel(file_path).values()))
+    data_types = ExcelParser.detect_data_types(df)
+
+    # Test 1: LLM-style JSON wrapped in a code fence
+    print("Test 1: Parse and execute LLM rules")
+    print("-" * 35)
+
+    llm_response = """```json
+    {
+      "columns": {
+        "Date": {"action": "bucket", "freq": "Q"},
+        "Profit": {"action": "aggregate", "agg": "sum"},
+        "Unit_Price": {"action": "drop"},
+        "Quantity": {"action": "drop"},
+        "Total_Price": {"action": "drop"},
+        "Category": {"action": "drop"},
+        "Month": {"action": "drop"},
+        "Region": {"action": "unknown_action"}
+      },
+      "group_by": ["Date", "Product"],
+      "sample": {"rows": 1000, "seed": 0}
+    }
+    ```"""
+    plan = CompressionPlan.from_json(llm_response)
+    assert plan is not None
+    assert plan.columns["Region"].action == "keep"
+
+    compiled = plan.compile(list(df.columns), data_types, exclude_columns=["Region"])
+    result = compiled.execute(df)
+    print(result.head())
+    assert list(result.columns) == ["Date", "Product", "Profit"]
+    assert abs(result["Profit"].sum() - df["Profit"].sum()) < 1e-6
+
+    # Compiled plans are memoized per column layout
+    assert plan.compile(list(df.columns), data_types, exclude_columns=["Region"]) is compiled
+    print("\n")
+
+    # Test 2: Unusable responses fall back to the rule-based plan
+    print("Test 2: Fallback plan")
+    print("-" * 20)
+
+    assert CompressionPlan.from_json("Error calling LLM: timed out") is None
+    fallback = default_compression_plan(data_types, "summary")
+    result = fallback.compile(list(df.columns), data_types).execute(df)
+    print(f"Fallback plan reduced {len(df)} rows to {len(result)} rows")
+    assert abs(result["Profit"].sum() - df["Profit"].sum()) < 1e-6
+    print("\n")
+
+    # Test 3: Plans persist across cache instances with the same schema
+    print("Test 3: Plan cache")
+    print("-" * 18)
+
+    signature = schema_signature(data_types, "analysis")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        PlanCache(cache_dir).put(signature, plan)
+        cached = PlanCache(cache_dir).get(signature)
+        assert cached is not None and cached.to_dict() == plan.to_dict()
+        print(f"Plan reloaded from disk for schema {signature[:12]}")
+    print("\n")
+
+    # Test 4: Aggregated groups are never sampled away, however many there are
+    print("Test 4: Totals of aggregated plans")
+    print("-" * 35)
+
+    if os.path.exists("complex_sample_data.xlsx"):
+        sales = ExcelParser.parse_excel("complex_sample_data.xlsx", ["Sales_Data"])["Sales_Data"]
+        sales_types = ExcelParser.detect_data_types(sales)
+        for task_type in ("analysis", "summary"):
+            fallback = default_compression_plan(sales_types, task_type)
+            result = fallback.compile(list(sales.columns), sales_types).execute(sales)
+            assert len(result) > fallback.sample_rows
+            assert abs(result["Profit"].sum() - sales["Profit"].sum()) < 1e-3 * abs(sales["Profit"].sum())
+            print(f"{task_type}: {len(result)} groups, total profit {result['Profit'].sum():,.2f}")
+
+        # Without aggregation, the row budget still applies
+        unaggregated = fallback.compile(list(sales.columns), sales_types, aggregate=False).execute(sales)
+        assert len(unaggregated) == fallback.sample_rows
+    print("\n")
+
+    # Test 5: Fallback plans are not cached, so an LLM outage does not stick to a schema
+    print("Test 5: Fallback plans are not cached")
+    print("-" * 37)
+
+    responses = ["Error calling LLM: connection refused", llm_response]
+    async def flaky_rules(data_description, task_type):
+        return responses.pop(0)
+
+    generate_rules = data_compression_tool.agenerate_compression_rules
+    data_compression_tool.agenerate_compression_rules = flaky_rules
+    data_compression_tool._plan_cache.clear()
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            config = ProcessingConfig(rules_cache_dir=cache_dir)
+            get_plan = lambda: asyncio.run(DataCompressionTool()._get_compression_plan(
+                df, {"data_types": data_types}, config, asyncio.Semaphore(1)))
+            assert get_plan().source == "rule-based"
+            assert os.listdir(cache_dir) == []
+            assert get_plan().source == "llm"
+            assert len(os.listdir(cache_dir)) == 1
+            assert get_plan().source == "llm" and not responses
+            print("Fallback plan served once, LLM plan cached after the outage")
+    finally:
+        data_compression_tool.agenerate_compression_rules = generate_rules
+        data_compression_tool._plan_cache.clear()
+    print("\n")
+
+    print("=== Compression Rule DSL Test Complete ===")
+
+if __name__ == "__main__":
+    test_compression_rules()
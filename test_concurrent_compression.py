@@ -0,0 +1,192 @@
+"""
+Test script for concurrent per-sheet compression in the data_compressor tool
+"""
+
+from config.config import ProcessingConfig, load_environment
+from tools import data_compression_tool
+from tools.data_compression_tool import DataCompressionTool
+from utils.compression_rules import default_compression_plan
+from utils.excel_utils import ExcelParser
+import asyncio
+import json
+import os
+import threading
+import time
+
+class _Concurrency:
+    """Counts calls in flight and remembers the most seen at once"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.current -= 1
+
+def _sheets(df, count):
+    """Parsed data with `count` sheets, each with its own column names so each needs its own plan"""
+    sheets = {}
+    for i in range(count):
+        # Later sheets are smaller, so they finish first when compressed concurrently
+        sheet = df.head(len(df) // (i + 1)).rename(columns=lambda column: f"{column}_{i}")
+        sheets[f"Sheet_{count - i}"] = {"data": sheet.to_dict(), "data_types": ExcelParser.detect_data_types(sheet)}
+    return {"status": "success", "sheets": sheets}
+
+def test_concurrent_compression():
+    """Test sheet order, the LLM call and worker limits, shared plan generation and credential checks"""
+
+    print("=== Testing Concurrent Compression ===\n")
+
+    file_path = "complex_sample_data.xlsx"
+    if not os.path.exists(file_path):
+        print(f"Test file {file_path} not found.")
+        return
+
+    df = ExcelParser.parse_excel(file_path)["Sales_Data"]
+    data = _sheets(df, 6)
+    tool = DataCompressionTool()
+    llm_calls = _Concurrency()
+    frames = _Concurrency()
+
+    async def slow_rules(data_description, task_type):
+        with llm_calls:
+            await asyncio.sleep(0.1)
+        # Not a valid plan: every sheet gets the uncached rule-based fallback, so each one calls the LLM
+        return "Error calling LLM: unavailable"
+
+    compress_frame = DataCompressionTool._compress_frame
+
+    def counted_compress_frame(self, *args):
+        with frames:
+            time.sleep(0.05)
+            return compress_frame(self, *args)
+
+    generate_rules = data_compression_tool.agenerate_compression_rules
+    previous_key = os.environ.get("DEEPSEEK_API_KEY")
+    os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+    data_compression_tool.agenerate_compression_rules = slow_rules
+    DataCompressionTool._compress_frame = counted_compress_frame
+    data_compression_tool._plan_cache.clear()
+    try:
+        # Test 1: Results keep the input sheet order and match a serial run
+        print("Test 1: Sheet order")
+        print("-" * 30)
+        config = ProcessingConfig(compression_intensity="high", max_concurrent_llm_calls=2, compression_workers=3)
+        result = tool._run(data, config)
+        assert result["status"] == "success"
+        assert list(result["sheets"]) == list(data["sheets"])
+        serial = tool._run(data, ProcessingConfig(compression_intensity="high", max_concurrent_llm_calls=1, compression_workers=1))
+        assert json.dumps(serial, default=str) == json.dumps(result, default=str)
+        assert list(asyncio.run(tool._arun(data, config))["sheets"]) == list(data["sheets"])
+        print(f"Sheets in input order: {list(result['sheets'])}")
+        print("\n")
+
+        # Test 2: LLM calls and compression threads stay within their limits
+        print("Test 2: Concurrency limits")
+        print("-" * 30)
+        for max_llm, workers in ((2, 3), (1, 1), (6, 6)):
+            llm_calls.peak = frames.peak = llm_calls.calls = 0
+            config = ProcessingConfig(compression_intensity="high", max_concurrent_llm_calls=max_llm, compression_workers=workers)
+            start = time.perf_counter()
+            assert tool._run(data, config)["status"] == "success"
+            seconds = time.perf_counter() - start
+            assert llm_calls.calls == 6
+            assert llm_calls.peak == max_llm and 1 <= frames.peak <= workers
+            print(f"max_concurrent_llm_calls={max_llm}, compression_workers={workers}: at most {llm_calls.peak} "
+                  f"LLM calls and {frames.peak} compressions at once, {seconds:.2f}s")
+        print("\n")
+    finally:
+        DataCompressionTool._compress_frame = compress_frame
+
+    # Sheets of one schema share a plan generation
+    sheet = next(iter(data["sheets"].values()))
+    frame = ExcelParser.parse_excel(file_path)["Sales_Data"].rename(columns=lambda column: f"{column}_0")
+    config = ProcessingConfig(compression_intensity="high")
+    rules = default_compression_plan(sheet["data_types"], config.task_type).to_dict()
+    rules.pop("source")
+    plan_json = json.dumps(rules)
+    attempts = []
+
+    def get_plan():
+        return tool._get_compression_plan(frame, sheet, config, asyncio.Semaphore(2))
+
+    try:
+        # Test 3: A cancelled generation does not fail the sheets waiting for it; they generate the plan
+        print("Test 3: Cancelled plan generation")
+        print("-" * 30)
+
+        async def cancellable_rules(data_description, task_type):
+            attempts.append(task_type)
+            if len(attempts) == 1:
+                await asyncio.sleep(10)
+            return plan_json
+
+        async def cancel_generator():
+            generator = asyncio.ensure_future(get_plan())
+            await asyncio.sleep(0.05)
+            waiter = asyncio.ensure_future(get_plan())
+            await asyncio.sleep(0.05)
+            generator.cancel()
+            plan = await waiter
+            assert generator.cancelled()
+            return plan
+
+        data_compression_tool.agenerate_compression_rules = cancellable_rules
+        data_compression_tool._plan_cache.clear()
+        plan = asyncio.run(cancel_generator())
+        assert plan.source == "llm" and len(attempts) == 2
+        assert not data_compression_tool._pending_plans
+        print(f"Waiter generated the plan itself after the cancellation ({len(attempts)} LLM calls)")
+        print("\n")
+
+        # Test 4: An error in the generation reaches every sheet waiting for it
+        print("Test 4: Failed plan generation")
+        print("-" * 30)
+
+        async def failing_rules(data_description, task_type):
+            await asyncio.sleep(0.05)
+            raise RuntimeError("rules failed")
+
+        async def concurrent_failures():
+            return await asyncio.gather(get_plan(), get_plan(), return_exceptions=True)
+
+        data_compression_tool.agenerate_compression_rules = failing_rules
+        data_compression_tool._plan_cache.clear()
+        errors = asyncio.run(concurrent_failures())
+        assert all(isinstance(error, RuntimeError) for error in errors)
+        assert not data_compression_tool._pending_plans
+        print(f"Both sheets failed with: {errors[0]}")
+        print("\n")
+
+        # Test 5: Missing credentials fail the sync and async versions alike
+        print("Test 5: Missing credentials")
+        print("-" * 30)
+        load_environment()
+        os.environ.pop("DEEPSEEK_API_KEY", None)
+        sync_result = tool._run(data, config)
+        async_result = asyncio.run(tool._arun(data, config))
+        assert sync_result["status"] == async_result["status"] == "error"
+        assert sync_result["message"] == async_result["message"]
+        print(f"Both versions: {sync_result['message']}")
+        print("\n")
+    finally:
+        data_compression_tool.agenerate_compression_rules = generate_rules
+        data_compression_tool._plan_cache.clear()
+        if previous_key is None:
+            os.environ.pop("DEEPSEEK_API_KEY", None)
+        else:
+            os.environ["DEEPSEEK_API_KEY"] = previous_key
+
+    print("=== Concurrent Compression Test Complete ===")
+
+if __name__ == "__main__":
+    test_concurrent_compression()
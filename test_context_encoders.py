@@ -0,0 +1,85 @@
+"""
+Test script for the compact sheet context encodings
+"""
+
+from config.config import ProcessingConfig
+from tools.format_adapter_tool import FormatAdapterTool
+from utils.analysis_context import AnalysisContext
+from utils.context_encoders import CONTEXT_FORMATS, encode_sample, round_significant
+from utils.output_packer import count_tokens
+import numpy as np
+import pandas as pd
+
+def test_context_encoders():
+    """Test each encoding, significant-digit rounding and the formatter integration"""
+
+    print("=== Testing Context Encoders ===\n")
+
+    df = pd.DataFrame({
+        "Region": ["East", "West", "East", None],
+        "Product": ["Product A", "Product B, large", "Product A", "Product C"],
+        "Quantity": [10, 3, 7, 5],
+        "Profit": [1234.5678, -300.25, np.nan, 2.0],
+        "Date": pd.to_datetime(["2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30"])
+    })
+
+    # Test 1: Every format renders every row without iterrows
+    print("Test 1: Formats")
+    print("-" * 15)
+
+    rendered = {}
+    for context_format in CONTEXT_FORMATS:
+        lines = encode_sample(df, context_format)
+        rendered[context_format] = lines
+        print(f"{context_format} ({count_tokens(chr(10).join(lines))} tokens):")
+        print("\n".join(lines))
+        print()
+
+    assert rendered["rows"][0] == "    Row 0: Region: East, Product: Product A, Quantity: 10, Profit: 1234.5678, Date: 2024-01-31..."
+    assert rendered["markdown"][:2] == ["| Region | Product | Quantity | Profit | Date |", "|---|---|---|---|---|"]
+    assert rendered["csv"] == [
+        "Region,Product,Quantity,Profit,Date",
+        "East,Product A,10,1234.5678,2024-01-31",
+        'West,"Product B, large",3,-300.25,2024-02-29',
+        "East,Product A,7,,2024-03-31",
+        ",Product C,5,2,2024-04-30"
+    ]
+    assert rendered["dictionary"][0] == "Legend Region: 0=East, 1=West"
+    assert rendered["dictionary"][2] == "0,Product A,10,1234.5678,2024-01-31"
+    try:
+        encode_sample(df, "yaml")
+        assert False, "unknown formats must be rejected"
+    except ValueError:
+        pass
+    print("\n")
+
+    # Test 2: Significant digits apply to floats only
+    print("Test 2: Significant digits")
+    print("-" * 26)
+
+    assert round_significant(np.array([1234.5678, -0.000123456, 0.0, 10.0 / 3 * 1e6]), 3).tolist() == [1230.0, -0.000123, 0.0, 3330000.0]
+    lines = encode_sample(df, "csv", significant_digits=2)
+    print("\n".join(lines))
+    assert lines[1] == "East,Product A,10,1200,2024-01-31"
+    assert lines[2] == 'West,"Product B, large",3,-300,2024-02-29'
+    print("\n")
+
+    # Test 3: The formatter summary uses the configured format
+    print("Test 3: Formatter summary")
+    print("-" * 25)
+
+    data = {"sheets": {"Sales": {"data": df.astype({"Date": str}).to_dict()}}}
+    tool = FormatAdapterTool()
+    context = AnalysisContext(data)
+    verbose = tool._create_data_summary(context, ProcessingConfig())
+    compact = tool._create_data_summary(context, ProcessingConfig(context_format="csv", significant_digits=3))
+    print(compact)
+    assert "  Columns: Region, Product, Quantity, Profit, Date" in verbose
+    assert "Region,Product,Quantity,Profit,Date" in compact and "1230" in compact
+    assert count_tokens(compact) < count_tokens(verbose)
+    print("\n")
+
+    print("=== Context Encoders Test Complete ===")
+
+if __name__ == "__main__":
+    test_context_encoders()
@@ -2,7 +2,7 @@
 Test case demonstrating feedback optimization for the Excel processing agent
 """
 
-from agents.langgraph_agent import ExcelProcessingWorkflow
+from agents.excel_processing_agent import ExcelProcessingAgent
 from config.config import ProcessingConfig
 import os
 
@@ -10,7 +10,7 @@ class FeedbackOptimizationTest:
     """Test class for demonstrating feedback optimization"""
     
     def __init__(self):
-        self.workflow = ExcelProcessingWorkflow()
+        self.agent = ExcelProcessingAgent()
         self.file_path = "simple_sample_data.xlsx"
         
     def run_feedback_test(self):
@@ -31,15 +31,14 @@ class FeedbackOptimizationTest:
             max_output_length=1000
         )
         
-        initial_result = self.workflow.process_excel(
+        initial_result = self.agent.process_excel(
             file_path=self.file_path,
             task_description="Analyze sales data for anomalies and trends",
             config=initial_config
         )
         
         print("Initial output:")
-        print(initial_result)
-        print(f"Length: {len(initial_result)} characters\n")
+        self._print_result(initial_result)
         
         # Simulate user feedback - "I need more details about regional performance"
         print("Step 2: Processing with feedback - 'I need more details about regional performance'")
@@ -53,15 +52,16 @@ class FeedbackOptimizationTest:
             # In a real implementation, we could also pass specific feedback to influence processing
         )
         
-        feedback_result = self.workflow.process_excel(
-            file_path=self.file_path,
-            task_description="Analyze sales data with focus on regional performance differences",
-            config=feedback_config
+        # Only the stages whose inputs changed are recomputed; the parse is reused
+        feedback_result = self.agent.optimize_output(
+            current_output=initial_result,
+            feedback="I need more details about regional performance",
+            config=feedback_config,
+            task_description="Analyze sales data with focus on regional performance differences"
         )
         
         print("Feedback-optimized output:")
-        print(feedback_result)
-        print(f"Length: {len(feedback_result)} characters\n")
+        self._print_result(feedback_result)
         
         # Simulate another feedback - "Make it more concise"
         print("Step 3: Processing with feedback - 'Make it more concise'")
@@ -73,22 +73,31 @@ class FeedbackOptimizationTest:
             max_output_length=500
         )
         
-        concise_result = self.workflow.process_excel(
-            file_path=self.file_path,
-            task_description="Provide a concise summary of sales performance",
-            config=concise_config
+        concise_result = self.agent.optimize_output(
+            current_output=feedback_result,
+            feedback="Make it more concise",
+            config=concise_config,
+            task_description="Provide a concise summary of sales performance"
         )
         
         print("Concise output:")
-        print(concise_result)
-        print(f"Length: {len(concise_result)} characters\n")
+        self._print_result(concise_result)
         
         print("=== Feedback Optimization Test Complete ===")
         print("\nKey Takeaways:")
         print("1. The agent can adapt to different compression levels based on user needs")
         print("2. Task type can be adjusted to focus on different aspects of the data")
         print("3. Output length can be controlled to meet specific requirements")
-        print("4. In a full implementation, specific feedback could be used to guide processing")
+        print("4. Feedback re-runs reuse the stages whose inputs did not change")
+    
+    def _print_result(self, result):
+        """Print the formatted output, its length and which stages were reused"""
+        if result["status"] != "success":
+            print(f"Error: {result['message']}\n")
+            return
+        print(result["formatted_content"])
+        print(f"Length: {result['length']} characters")
+        print(f"Stages: {result['stages']}\n")
 
 def main():
     test = FeedbackOptimizationTest()
@@ -0,0 +1,157 @@
+"""
+Test script for incremental recomputation in feedback re-runs (optimize_output)
+"""
+
+from agents.excel_processing_agent import ExcelProcessingAgent
+from config.config import ProcessingConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils.llm_cache import configure_llm_cache
+from utils.http_client import close_http_clients
+from utils.stage_memo import MEMO_CELL_BYTES, StageMemo, estimate_bytes
+from dataclasses import replace
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+
+INSIGHTS = "\n".join([
+    "1. Profit is stable across months.",
+    "2. The East region leads revenue.",
+    "3. Two products show unusually low margins.",
+    "4. Review pricing for the low-margin products."
+])
+
+def _quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+def test_incremental_feedback():
+    """Test which stages optimize_output reuses for each kind of configuration change"""
+
+    print("=== Testing Incremental Feedback Re-runs ===\n")
+
+    file_path = "complex_sample_data.xlsx"
+    if not os.path.exists(file_path):
+        print(f"Test file {file_path} not found.")
+        return
+
+    with MockDeepSeekServer(latency=0.2, response_text=INSIGHTS) as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        try:
+            agent = ExcelProcessingAgent()
+            task = "Analyze profit trends"
+            config = ProcessingConfig(compression_intensity="medium", max_output_length=2000)
+
+            def fresh(task_description, config):
+                # The same run without a memo, to check that reused stages change nothing
+                return _quiet(agent.processing_chain.run, file_path, task_description, config)
+
+            # Test 1: The first run computes every stage
+            print("Test 1: First run")
+            print("-" * 30)
+            start = time.perf_counter()
+            first = _quiet(agent.process_excel, file_path, task, config)
+            first_seconds = time.perf_counter() - start
+            assert first["status"] == "success"
+            assert first["stages"] == {"parse": "computed", "compress": "computed", "insights": "computed"}
+            assert first["formatted_content"] == fresh(task, config)["formatted_content"]
+            print(f"First run: {first_seconds:.2f}s, {first['length']} characters")
+            print("\n")
+
+            # Test 2: Only the output length changed, so only packing reruns
+            print("Test 2: New max_output_length")
+            print("-" * 30)
+            requests_before = server.stats()["requests_served"]
+            shorter = replace(config, max_output_length=100)
+            start = time.perf_counter()
+            second = _quiet(agent.optimize_output, first, "Make it more concise", shorter)
+            second_seconds = time.perf_counter() - start
+            assert second["stages"] == {"parse": "reused", "compress": "reused", "insights": "reused"}
+            assert server.stats()["requests_served"] == requests_before
+            assert second["formatted_content"] == fresh(task, shorter)["formatted_content"]
+            assert second["length"] <= 100 < first["length"]
+            assert second["feedback"] == ["Make it more concise"]
+            assert second_seconds < first_seconds / 4
+            print(f"Repacked in {second_seconds * 1000:.1f} ms ({second['length']} characters)")
+            print("\n")
+
+            # Test 3: A new compression intensity reuses the parse
+            print("Test 3: New compression_intensity")
+            print("-" * 30)
+            high = replace(config, compression_intensity="high")
+            third = _quiet(agent.optimize_output, second, "Summarize more", high)
+            assert third["stages"] == {"parse": "reused", "compress": "computed", "insights": "computed"}
+            assert third["formatted_content"] == fresh(task, high)["formatted_content"]
+            assert third["feedback"] == ["Make it more concise", "Summarize more"]
+            print(f"Stages: {third['stages']}")
+            print("\n")
+
+            # Test 4: A new task description only reruns the insights
+            print("Test 4: New task description")
+            print("-" * 30)
+            regional_task = "Analyze regional performance"
+            fourth = _quiet(agent.optimize_output, first, "Focus on regions", config, task_description=regional_task)
+            assert fourth["stages"] == {"parse": "reused", "compress": "reused", "insights": "computed"}
+            assert fourth["formatted_content"].startswith(f"Task: {regional_task}")
+            assert fourth["task_description"] == regional_task
+            print(f"Stages: {fourth['stages']}")
+            print("\n")
+
+            # Test 5: An edited file misses the memo; a missing file reports an error
+            print("Test 5: Edited and missing files")
+            print("-" * 30)
+            with tempfile.TemporaryDirectory() as tmp:
+                copy_path = os.path.join(tmp, "copy.xlsx")
+                shutil.copyfile(file_path, copy_path)
+                copied = _quiet(agent.process_excel, copy_path, task, config)
+                assert copied["stages"]["parse"] == "computed"
+                stat = os.stat(copy_path)
+                os.utime(copy_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+                edited = _quiet(agent.optimize_output, copied, "Re-run", config)
+                assert edited["stages"]["parse"] == "computed"
+            missing = _quiet(agent.process_excel, "missing.xlsx", task, config)
+            assert missing["status"] == "error" and "stages" not in missing
+            print(f"Missing file: {missing['message']}")
+            print("\n")
+
+            # Test 6: The memo is bounded
+            print("Test 6: Memo bounds")
+            print("-" * 30)
+            memo = StageMemo(max_entries=2)
+            for key in ("a", "b", "c"):
+                memo.put(key, key.upper())
+            assert len(memo) == 2 and memo.get("a") is None and memo.get("c") == "C"
+            # Sheet data is sized from its shape; outputs are evicted by size and too large ones never stored
+            sheet = {"data": {"x": {0: 1}}, "shape": (5, 2), "columns": ["x", "y"]}
+            assert estimate_bytes(sheet) >= 10 * MEMO_CELL_BYTES
+            memo = StageMemo(max_entries=10, max_bytes=1000, max_entry_bytes=600)
+            assert not memo.put("large", {"status": "success", "sheets": {"Sheet1": {"data": {}, "shape": (100, 1)}}})
+            assert memo.put("a", "a" * 400) and memo.put("b", "b" * 400) and memo.put("c", "c" * 400)
+            assert memo.get("large") is None and memo.get("a") is None and memo.get("c") == "c" * 400
+            assert len(memo) == 2 and memo.bytes == 800
+            assert len(agent.stage_memo) <= agent.stage_memo.max_entries
+            assert agent.stage_memo.bytes <= agent.stage_memo.max_bytes
+            assert not agent.stage_memo.put("huge", {"data": {}, "shape": (1_000_000, 10)})
+            # Only the insights text and rule-based sections are kept, not the run's sheet frames
+            insights_entries = [value for key, value in agent.stage_memo._entries.items() if key[0] == "insights"]
+            assert insights_entries and all(set(value) == {"key_insights", "rule_based_sections"} for value in insights_entries)
+            print(f"Agent memo holds {len(agent.stage_memo)} stage outputs, about {agent.stage_memo.bytes / 1e6:.1f} MB")
+            print("\n")
+        finally:
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+            close_http_clients()
+
+    print("=== Incremental Feedback Test Complete ===")
+
+if __name__ == "__main__":
+    test_incremental_feedback()
@@ -0,0 +1,156 @@
+"""
+Test script for per-stage instrumentation of processing runs
+"""
+
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig, TraceConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils.http_client import close_http_clients
+from utils.instrumentation import NOOP_SPAN, begin_run, configure_tracing, span, start_trace
+from utils.llm_cache import configure_llm_cache
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+
+def test_instrumentation():
+    """Test spans, memory marks, exports and the spans recorded by workflow runs"""
+
+    print("=== Testing Instrumentation ===\n")
+
+    if not os.path.exists("complex_sample_data.xlsx"):
+        print("Sample workbook not found.")
+        return
+
+    # Test 1: Without a trace, instrumentation is a no-op
+    print("Test 1: Disabled tracing")
+    print("-" * 30)
+    configure_tracing(None)
+    assert span("parse", rows=1) is NOOP_SPAN
+    assert begin_run("process_excel") is NOOP_SPAN
+    start = time.perf_counter()
+    for _ in range(100000):
+        with span("parse", rows=1) as disabled:
+            disabled.set(cells=1)
+    per_call = (time.perf_counter() - start) / 100000
+    assert per_call < 5e-6
+    print(f"Disabled span: {per_call * 1e9:.0f} ns per call")
+    print("\n")
+
+    # Test 2: Nesting, throughput, memory marks, errors and isolation between threads
+    print("Test 2: Spans")
+    print("-" * 30)
+    with start_trace("unit", memory=True) as trace:
+        with span("stage", rows=1000, cells=4000) as stage:
+            with span("allocate"):
+                block = bytearray(8 * 1024 * 1024)
+            del block
+            stage.set(extra="value")
+        with contextlib.suppress(ValueError):
+            with span("failing"):
+                raise ValueError("bad sheet")
+    spans = {span_["name"]: span_ for span_ in trace.to_dict()["spans"]}
+    assert spans["unit"]["parent_id"] is None
+    assert spans["stage"]["parent_id"] == spans["unit"]["span_id"]
+    assert spans["allocate"]["parent_id"] == spans["stage"]["span_id"]
+    assert spans["stage"]["attributes"] == {"rows": 1000, "cells": 4000, "extra": "value"}
+    assert spans["stage"]["cells_per_second"] == 4000 / spans["stage"]["duration"]
+    assert spans["allocate"]["memory_peak_bytes"] >= 8 * 1024 * 1024
+    assert spans["stage"]["memory_peak_bytes"] >= spans["allocate"]["memory_peak_bytes"]
+    assert spans["failing"]["error"] == "ValueError: bad sheet"
+    otlp = trace.to_otlp()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(otlp) == 4 and all(otlp_span["traceId"] == trace.trace_id for otlp_span in otlp)
+    assert next(otlp_span for otlp_span in otlp if otlp_span["name"] == "failing")["status"]["code"] == 2
+
+    traces = {}
+    def traced(name):
+        with start_trace(name) as thread_trace:
+            with span(f"{name}-stage"):
+                time.sleep(0.05)
+        traces[name] = thread_trace
+    threads = [threading.Thread(target=traced, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [span_.name for span_ in traces["a"].spans] == ["a-stage", "a"]
+    assert [span_.name for span_ in traces["b"].spans] == ["b-stage", "b"]
+    print(f"Stage totals: {trace.stage_totals()}")
+    print("\n")
+
+    with MockDeepSeekServer(latency=0.05, response_text="Insight: profit is stable.") as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+        workflow = ExcelProcessingWorkflow()
+        config = ProcessingConfig(compression_intensity="high")
+
+        try:
+            # Test 3: Spans of sync, async and streaming runs
+            print("Test 3: Workflow spans")
+            print("-" * 30)
+            runs = {
+                "sync": lambda: workflow.process_excel("complex_sample_data.xlsx", "Analyze sales", config),
+                "async": lambda: asyncio.run(workflow.aprocess_excel("complex_sample_data.xlsx", "Analyze sales", config)),
+                "stream": lambda: "".join(workflow.stream_process_excel("complex_sample_data.xlsx", "Analyze sales", config))
+            }
+            for mode, run in runs.items():
+                with contextlib.redirect_stdout(io.StringIO()), start_trace(mode) as trace:
+                    run()
+                by_id = {span_.span_id: span_ for span_ in trace.spans}
+                totals = trace.stage_totals()
+                assert totals["probe"]["count"] == 1 and totals["sheet"]["count"] == 5
+                assert totals["parse"]["count"] == totals["compress"]["count"] == 5
+                assert totals["format"]["count"] == 1
+                for parse in trace.find("parse"):
+                    assert by_id[parse.parent_id].name == "sheet"
+                sales = next(compress for compress in trace.find("compress") if compress.attributes["sheet"] == "Sales_Data")
+                assert sales.attributes["cells"] == 8360 * 8 and sales.attributes["plan_cache"] in ("hit", "miss", "shared")
+                insights = [llm for llm in trace.find("llm") if by_id[llm.parent_id].name == "format"]
+                assert len(insights) == 1 and insights[0].attributes["cached"] is False
+                if mode != "stream":
+                    assert insights[0].attributes["total_tokens"] > 0
+                    assert trace.find("format")[0].attributes["insights_source"] == "llm"
+                print(f"{mode}: {len(trace.spans)} spans, " +
+                      ", ".join(f"{name} {total['seconds'] * 1000:.0f} ms" for name, total in totals.items()
+                                if name in ("parse", "compress", "llm")))
+            print("\n")
+
+            # Test 4: Runs are exported to the configured trace file
+            print("Test 4: Trace export")
+            print("-" * 30)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                path = os.path.join(temp_dir, "traces.jsonl")
+                configure_tracing(TraceConfig(path=path))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    workflow.process_excel("simple_sample_data.xlsx", "Analyze sales", config)
+                configure_tracing(TraceConfig(path=path, format="otlp"))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    workflow.process_excel("simple_sample_data.xlsx", "Analyze sales", config)
+                with open(path, encoding="utf-8") as f:
+                    lines = [json.loads(line) for line in f]
+                assert len(lines) == 2
+                assert lines[0]["name"] == "process_excel"
+                assert {span_["name"] for span_ in lines[0]["spans"]} >= {"process_excel", "workflow", "probe", "sheet", "parse", "compress", "format", "llm"}
+                otlp_spans = lines[1]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+                assert any(otlp_span["name"] == "parse" for otlp_span in otlp_spans)
+                print(f"Exported {len(lines[0]['spans'])} spans as JSON and {len(otlp_spans)} as OTLP")
+            print("\n")
+        finally:
+            configure_tracing(None)
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+            close_http_clients()
+
+    print("=== Instrumentation Test Complete ===")
+
+if __name__ == "__main__":
+    test_instrumentation()
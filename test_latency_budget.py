@@ -0,0 +1,113 @@
+"""
+Test script for the latency-budgeted race between LLM insights and the rule-based fallback
+"""
+
+from config.config import ProcessingConfig, LLMCacheConfig, LLMDispatcherConfig
+from mock_deepseek_server import MockDeepSeekServer
+from tools.excel_parser_tool import ExcelParseTool
+from tools.data_compression_tool import DataCompressionTool
+from tools.format_adapter_tool import FormatAdapterTool
+from utils.llm_cache import configure_llm_cache
+from utils.llm_dispatcher import configure_llm_dispatcher
+from utils.http_client import close_http_clients
+import os
+import tempfile
+import time
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+def test_latency_budget():
+    """Test that a slow LLM call is bounded by the budget and its late result is cached or cancelled"""
+
+    print("=== Testing LLM Latency Budget ===\n")
+
+    file_path = "simple_sample_data.xlsx"
+    if not os.path.exists(file_path):
+        print(f"Test file {file_path} not found.")
+        return
+
+    with MockDeepSeekServer(latency=1.0, response_text="Slow insight: profit is seasonal.") as server, \
+            tempfile.TemporaryDirectory() as cache_dir:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        cache = configure_llm_cache(LLMCacheConfig(path=os.path.join(cache_dir, "llm_cache.sqlite")))
+        dispatcher = configure_llm_dispatcher(LLMDispatcherConfig(rate_limit=0))
+
+        try:
+            parsed = ExcelParseTool()._run(file_path)
+            compressed = DataCompressionTool()._run(parsed, ProcessingConfig(compression_intensity="low"))
+            format_tool = FormatAdapterTool()
+
+            # Test 1: The rule-based output is used once the budget runs out
+            print("Test 1: Budget exceeded")
+            print("-" * 23)
+
+            config = ProcessingConfig(llm_latency_budget=0.2)
+            start = time.perf_counter()
+            result = format_tool._run(compressed, "Analyze profit trends", config)
+            elapsed = time.perf_counter() - start
+            print(f"Answered from {result['insights_source']} in {elapsed:.2f}s")
+            assert result["status"] == "success"
+            assert result["insights_source"] == "rules"
+            assert "Classification analysis:" in result["formatted_content"]
+            assert elapsed < 0.8
+            print("\n")
+
+            # Test 2: The late LLM response is cached and used next time
+            print("Test 2: Late result cached")
+            print("-" * 26)
+
+            assert _wait_for(lambda: cache.stats()["writes"] == 1)
+            start = time.perf_counter()
+            result = format_tool._run(compressed, "Analyze profit trends", config)
+            elapsed = time.perf_counter() - start
+            print(f"Answered from {result['insights_source']} in {elapsed:.2f}s")
+            assert result["insights_source"] == "llm"
+            assert "Slow insight" in result["formatted_content"]
+            assert elapsed < 0.5
+            print("\n")
+
+            # Test 3: With late_llm_result="cancel" the abandoned call is not cached
+            print("Test 3: Late result cancelled")
+            print("-" * 29)
+
+            config = ProcessingConfig(llm_latency_budget=0.2, late_llm_result="cancel")
+            result = format_tool._run(compressed, "Find anomalies", config)
+            assert result["insights_source"] == "rules"
+            assert _wait_for(lambda: dispatcher.stats()["abandoned"] == 1)
+            time.sleep(1.2)
+            print(f"Dispatcher stats: {dispatcher.stats()}")
+            assert cache.stats()["writes"] == 1
+            print("\n")
+
+            # Test 4: A fast LLM call within the budget wins the race
+            print("Test 4: Within budget")
+            print("-" * 21)
+
+            server.latency = 0.0
+            config = ProcessingConfig(llm_latency_budget=5.0)
+            result = format_tool._run(compressed, "Summarize regions", config)
+            print(f"Answered from {result['insights_source']}")
+            assert result["insights_source"] == "llm"
+            print("\n")
+        finally:
+            close_http_clients()
+            configure_llm_cache(None)
+            configure_llm_dispatcher(LLMDispatcherConfig())
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+
+    print("=== LLM Latency Budget Test Complete ===")
+
+if __name__ == "__main__":
+    test_latency_budget()
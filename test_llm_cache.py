@@ -0,0 +1,90 @@
+"""
+Test script for the persistent LLM response cache
+"""
+
+from config.config import LLMCacheConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils.llm_cache import LLMResponseCache, configure_llm_cache
+from utils.llm_utils import call_deepseek_llm
+from utils.http_client import close_http_clients
+import os
+import tempfile
+import time
+
+def test_llm_cache():
+    """Test TTL, LRU eviction, hit latency and integration with call_deepseek_llm"""
+
+    print("=== Testing LLM Response Cache ===\n")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Test 1: Keys cover every request parameter
+        print("Test 1: Cache keys")
+        print("-" * 18)
+
+        key = LLMResponseCache.make_key("deepseek-chat", "system", "prompt", 0.3, 400)
+        assert key != LLMResponseCache.make_key("deepseek-chat", "system", "prompt", 0.3, 500)
+        assert key != LLMResponseCache.make_key("deepseek-chat", "", "prompt", 0.3, 400)
+        print(f"Key: {key[:16]}...")
+        print("\n")
+
+        # Test 2: Hit latency
+        print("Test 2: Hit latency")
+        print("-" * 19)
+
+        cache = LLMResponseCache(os.path.join(cache_dir, "latency.sqlite3"))
+        cache.put(key, "cached insight " * 50)
+        start = time.perf_counter()
+        for _ in range(1000):
+            assert cache.get(key) is not None
+        per_hit_ms = (time.perf_counter() - start)
+        print(f"Average hit latency: {per_hit_ms:.4f} ms")
+        assert per_hit_ms < 1.0
+        print("\n")
+
+        # Test 3: TTL expiry and byte-budget eviction
+        print("Test 3: TTL and LRU eviction")
+        print("-" * 28)
+
+        expiring = LLMResponseCache(os.path.join(cache_dir, "ttl.sqlite3"), ttl=0.05)
+        expiring.put("short-lived", "value")
+        time.sleep(0.1)
+        assert expiring.get("short-lived") is None
+
+        bounded = LLMResponseCache(os.path.join(cache_dir, "lru.sqlite3"), max_bytes=250)
+        for i in range(5):
+            bounded.put(f"key-{i}", "x" * 100)
+        stats = bounded.stats()
+        print(f"Stats after 5 writes of 100 bytes with a 250 byte budget: {stats}")
+        assert stats["bytes"] <= 250
+        assert bounded.get("key-0") is None and bounded.get("key-4") is not None
+        print("\n")
+
+        # Test 4: Repeated calls are answered from the cache
+        print("Test 4: call_deepseek_llm integration")
+        print("-" * 37)
+
+        with MockDeepSeekServer(response_text="pong") as server:
+            previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+            os.environ["DEEPSEEK_BASE_URL"] = server.url
+            os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+            close_http_clients()
+            shared = configure_llm_cache(LLMCacheConfig(path=os.path.join(cache_dir, "llm.sqlite3")))
+            try:
+                responses = [call_deepseek_llm("ping", temperature=0.0) for _ in range(5)]
+                print(f"Requests served: {server.requests_served}, stats: {shared.stats()}")
+                assert responses == ["pong"] * 5
+                assert server.requests_served == 1
+                assert shared.stats()["hit_rate"] == 0.8
+            finally:
+                configure_llm_cache(None)
+                close_http_clients()
+                if previous_url is None:
+                    os.environ.pop("DEEPSEEK_BASE_URL", None)
+                else:
+                    os.environ["DEEPSEEK_BASE_URL"] = previous_url
+        print("\n")
+
+    print("=== LLM Response Cache Test Complete ===")
+
+if __name__ == "__main__":
+    test_llm_cache()
@@ -0,0 +1,55 @@
+"""
+Test script for the pooled LLM client, run against the local mock server
+"""
+
+from mock_deepseek_server import MockDeepSeekServer
+from utils.llm_utils import call_deepseek_llm, acall_deepseek_llm
+from utils.http_client import close_http_clients
+from utils.llm_cache import configure_llm_cache
+import asyncio
+import os
+
+def test_llm_client():
+    """Test that LLM calls reuse pooled keep-alive connections"""
+
+    print("=== Testing Pooled LLM Client ===\n")
+
+    with MockDeepSeekServer(response_text="pong") as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        # Cache hits would bypass the connection pool under test
+        configure_llm_cache(None)
+
+        try:
+            # Test 1: Sequential sync calls share one connection
+            print("Test 1: Sync calls")
+            print("-" * 18)
+
+            responses = [call_deepseek_llm("ping") for _ in range(10)]
+            print(f"Responses: {set(responses)}, connections opened: {server.connections_opened}")
+            assert responses == ["pong"] * 10
+            assert server.connections_opened == 1
+            print("\n")
+
+            # Test 2: Async calls from separate event loops share the same pool
+            print("Test 2: Async calls from separate event loops")
+            print("-" * 45)
+
+            for _ in range(3):
+                assert asyncio.run(acall_deepseek_llm("ping")) == "pong"
+            print(f"Connections opened: {server.connections_opened}")
+            assert server.connections_opened == 1
+            print("\n")
+        finally:
+            close_http_clients()
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+
+    print("=== Pooled LLM Client Test Complete ===")
+
+if __name__ == "__main__":
+    test_llm_client()
@@ -0,0 +1,92 @@
+"""
+Test script for the rate-limited LLM dispatcher, run against the local mock server
+"""
+
+from config.config import LLMDispatcherConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils.llm_utils import call_deepseek_llm, acall_deepseek_llm
+from utils.llm_cache import configure_llm_cache
+from utils.llm_dispatcher import configure_llm_dispatcher
+from utils.http_client import close_http_clients
+import asyncio
+import os
+import time
+
+def test_llm_dispatcher():
+    """Test retries, coalescing, permanent errors and rate limiting"""
+
+    print("=== Testing LLM Dispatcher ===\n")
+
+    with MockDeepSeekServer(response_text="pong") as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        try:
+            # Test 1: 429 and 503 responses are retried with backoff
+            print("Test 1: Retries on 429/5xx")
+            print("-" * 26)
+
+            dispatcher = configure_llm_dispatcher(LLMDispatcherConfig(rate_limit=0, backoff_base=0.01))
+            server.inject_errors(429, count=2, retry_after=0)
+            server.inject_errors(503, count=1)
+            response = call_deepseek_llm("retry me")
+            print(f"Response: {response}, stats: {dispatcher.stats()}")
+            assert response == "pong"
+            assert dispatcher.stats()["retries"] == 3
+            print("\n")
+
+            # Test 2: Permanent errors fail fast into the fallback message
+            print("Test 2: Non-retryable errors")
+            print("-" * 28)
+
+            server.inject_errors(400)
+            response = call_deepseek_llm("bad request")
+            print(f"Response: {response[:60]}...")
+            assert response.startswith("Error calling LLM")
+            assert dispatcher.stats()["retries"] == 3
+            print("\n")
+
+            # Test 3: Identical in-flight prompts share one API call
+            print("Test 3: Request coalescing")
+            print("-" * 26)
+
+            server.latency = 0.2
+            served_before = server.requests_served
+
+            async def _identical_calls():
+                return await asyncio.gather(*[acall_deepseek_llm("same prompt") for _ in range(5)])
+
+            responses = asyncio.run(_identical_calls())
+            print(f"Responses: {responses}, API requests: {server.requests_served - served_before}")
+            assert responses == ["pong"] * 5
+            assert server.requests_served - served_before == 1
+            server.latency = 0.0
+            print("\n")
+
+            # Test 4: Token bucket spaces out bursts
+            print("Test 4: Rate limiting")
+            print("-" * 20)
+
+            dispatcher = configure_llm_dispatcher(LLMDispatcherConfig(rate_limit=20, burst=1))
+            start = time.perf_counter()
+            for i in range(5):
+                call_deepseek_llm(f"rate limited {i}")
+            elapsed = time.perf_counter() - start
+            print(f"5 calls at 20 requests/s took {elapsed:.3f} s")
+            assert elapsed >= 0.15
+            print("\n")
+        finally:
+            configure_llm_dispatcher(LLMDispatcherConfig.from_env())
+            close_http_clients()
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+
+    print("=== LLM Dispatcher Test Complete ===")
+
+if __name__ == "__main__":
+    test_llm_dispatcher()
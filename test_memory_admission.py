@@ -0,0 +1,211 @@
+"""
+Test script for memory-aware admission control of concurrent jobs
+"""
+
+from agents.batch_processor import process_many
+from agents.job_service import JobService
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils.excel_utils import ExcelParser
+from utils.http_client import close_http_clients
+from utils.llm_cache import configure_llm_cache
+from utils.memory_admission import MemoryBudget, MemoryEstimate, estimate_job_memory
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextlib
+import io
+import os
+import threading
+import time
+
+MB = 1024 * 1024
+
+def test_memory_admission():
+    """Test memory estimates, budget decisions and admission in the processing entry points"""
+
+    print("=== Testing Memory Admission Control ===\n")
+
+    if not os.path.exists("simple_sample_data.xlsx") or not os.path.exists("complex_sample_data.xlsx"):
+        print("Sample workbooks not found.")
+        return
+
+    config = ProcessingConfig(compression_intensity="high")
+
+    # Test 1: Estimates follow workbook size and column types
+    print("Test 1: Estimates from probe metadata")
+    print("-" * 30)
+    sheets = ExcelParser.probe_workbook("complex_sample_data.xlsx", sample_rows=5)
+    sales = next(sheet for sheet in sheets if sheet["name"] == "Sales_Data")
+    assert sales["column_types"] == ["datetime", "text", "text", "text", "numeric", "numeric", "numeric", "numeric"]
+    simple = estimate_job_memory("simple_sample_data.xlsx", config)
+    complex_ = estimate_job_memory("complex_sample_data.xlsx", config)
+    assert 0 < simple.cells < complex_.cells
+    assert simple.full_bytes < complex_.full_bytes
+    assert complex_.pipelined_bytes < complex_.full_bytes
+    pipelined = estimate_job_memory("complex_sample_data.xlsx", ProcessingConfig(compression_intensity="high", pipeline_chunk_rows=1000))
+    assert pipelined.full_bytes == pipelined.pipelined_bytes == complex_.pipelined_bytes
+    assert estimate_job_memory("missing.xlsx", config).full_bytes == 0
+    # Below high intensity the pipeline keeps every row, so it saves nothing
+    for intensity in ("low", "medium"):
+        unbounded = estimate_job_memory("complex_sample_data.xlsx", ProcessingConfig(compression_intensity=intensity))
+        assert unbounded.pipelined_bytes == unbounded.full_bytes == complex_.full_bytes
+    print(f"simple: {simple.full_bytes / MB:.1f} MB, complex: {complex_.full_bytes / MB:.1f} MB "
+          f"({complex_.pipelined_bytes / MB:.1f} MB pipelined)")
+    print("\n")
+
+    # Test 2: Budget decisions
+    print("Test 2: Budget decisions")
+    print("-" * 30)
+    budget = MemoryBudget(100 * MB)
+    big = MemoryEstimate(1, 60 * MB, 30 * MB)
+    first = budget.try_admit(big, config)
+    assert first.mode == "full" and first.config is config
+    # Does not fit in full next to the first job, but fits pipelined
+    second = budget.try_admit(big, config)
+    assert second.mode == "pipelined" and second.config.pipeline_chunk_rows and config.pipeline_chunk_rows is None
+    assert budget.try_admit(big, config) is None
+    # A waiting job is admitted once memory is released, and blocks later try_admit calls meanwhile
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(budget.admit(big, config)))
+    waiter.start()
+    while budget.stats()["waiting"] == 0:
+        time.sleep(0.01)
+    assert budget.try_admit(MemoryEstimate(1, MB, MB), config) is None
+    budget.release(first)
+    waiter.join(5)
+    assert admitted and admitted[0].mode == "full"
+    # Cancelled while waiting
+    assert budget.admit(big, config, cancelled=lambda: True) is None
+    budget.release(second)
+    budget.release(admitted[0])
+    # Larger than the whole budget: runs alone, pipelined
+    huge = budget.try_admit(MemoryEstimate(1, 500 * MB, 200 * MB), config)
+    assert huge is not None and huge.mode == "pipelined"
+    assert budget.try_admit(MemoryEstimate(1, MB, MB), config) is None
+    budget.release(huge)
+    stats = budget.stats()
+    assert stats["reserved_bytes"] == 0 and stats["admitted"] == 0 and stats["over_budget"] == 1
+    print(f"Budget stats: {stats}")
+    print("\n")
+
+    with MockDeepSeekServer(latency=0.1, response_text="Insight: profit is stable.") as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        try:
+            # Test 3: Concurrent in-process runs stay within the budget
+            print("Test 3: Workflow admission")
+            print("-" * 30)
+            # Room for one full run and one pipelined run; the third waits
+            budget = MemoryBudget(complex_.full_bytes + complex_.pipelined_bytes)
+            peaks = []
+            admit = budget._reserve
+            budget._reserve = lambda admission: (admit(admission), peaks.append(budget._reserved))[0]
+            workflow = ExcelProcessingWorkflow(memory_budget=budget)
+            outputs = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = ExcelProcessingWorkflow().process_excel("complex_sample_data.xlsx", "Analyze sales", config)
+                threads = [threading.Thread(target=lambda: outputs.append(
+                    workflow.process_excel("complex_sample_data.xlsx", "Analyze sales", config))) for _ in range(3)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            assert len(outputs) == 3 and all(output.startswith("Task: Analyze sales") for output in outputs)
+            assert expected in outputs
+            assert max(peaks) <= budget.limit_bytes
+            stats = budget.stats()
+            assert stats["full"] + stats["pipelined"] == 3 and stats["pipelined"] >= 1 and stats["waited"] >= 1
+            assert stats["reserved_bytes"] == 0
+            print(f"Peak reserved {max(peaks) / MB:.1f} of {budget.limit_bytes / MB:.1f} MB; "
+                  f"{stats['full']} full, {stats['pipelined']} pipelined, {stats['waited']} waited")
+            print("\n")
+
+            # Test 4: Batch and service entry points
+            print("Test 4: process_many and JobService")
+            print("-" * 30)
+            files = ["complex_sample_data.xlsx", "complex_sample_data.xlsx", "simple_sample_data.xlsx"]
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = list(process_many(files, "Analyze sales", config, max_workers=2,
+                                            memory_budget=complex_.full_bytes + simple.full_bytes))
+            assert all(result["status"] == "success" for result in results)
+            assert all(result["memory_mode"] in ("full", "pipelined") for result in results)
+            print(f"process_many: {[(result['file_path'], result['memory_mode']) for result in results]}")
+
+            with JobService(workers=1, memory_budget=complex_.pipelined_bytes) as service:
+                job = service.wait(service.submit("complex_sample_data.xlsx", "Analyze sales", config).id, 120)
+                summary = job.to_dict()
+                assert summary["status"] == "succeeded"
+                assert summary["estimated_bytes"] == complex_.full_bytes and summary["memory_mode"] == "pipelined"
+                assert service.stats()["memory"]["pipelined"] == 1
+            print(f"JobService: estimated {summary['estimated_bytes'] / MB:.1f} MB, ran {summary['memory_mode']}")
+
+            # A job waiting for memory holds no worker: a later, higher-priority job that fits starts first
+            assert simple.full_bytes < complex_.pipelined_bytes
+            with JobService(workers=2, memory_budget=complex_.full_bytes + simple.full_bytes) as service:
+                service.wait_ready(60)
+                running = service.submit("complex_sample_data.xlsx", "Analyze sales", config)
+                while service.get(running.id).status == "queued":
+                    time.sleep(0.01)
+                large = service.submit("complex_sample_data.xlsx", "Analyze sales", config, priority=0)
+                time.sleep(0.2)
+                assert large.status == "queued"
+                small = service.submit("simple_sample_data.xlsx", "Analyze sales", config, priority=5)
+                for job in (running, large, small):
+                    assert service.wait(job.id, 120).status == "succeeded"
+                assert small.started_at < large.started_at
+                assert small.started_at < running.finished_at
+            print(f"Small high-priority job started {large.started_at - small.started_at:.2f}s before the waiting large one")
+            print("\n")
+
+            # Test 5: Async runs waiting for memory do not hold executor threads
+            print("Test 5: Async admission with more waiting runs than executor threads")
+            print("-" * 30)
+            budget = MemoryBudget(complex_.full_bytes)
+            workflow = ExcelProcessingWorkflow(memory_budget=budget)
+
+            async def concurrent_runs():
+                asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+                runs = [workflow.aprocess_excel("complex_sample_data.xlsx", "Analyze sales", config) for _ in range(6)]
+                return await asyncio.wait_for(asyncio.gather(*runs), 120)
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                outputs = asyncio.run(concurrent_runs())
+            assert len(outputs) == 6 and all(output.startswith("Task: Analyze sales") for output in outputs)
+            stats = budget.stats()
+            assert stats["full"] + stats["pipelined"] == 6 and stats["waited"] >= 1
+            assert stats["reserved_bytes"] == 0 and stats["waiting"] == 0
+
+            # A cancelled waiter leaves the line and the budget untouched
+            async def cancelled_waiter():
+                running = budget.try_admit(complex_, config)
+                waiter = asyncio.ensure_future(budget.aadmit(complex_, config))
+                await asyncio.sleep(0.05)
+                assert budget.stats()["waiting"] == 1
+                waiter.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await waiter
+                assert budget.stats()["waiting"] == 0
+                budget.release(running)
+
+            asyncio.run(cancelled_waiter())
+            assert budget.stats()["reserved_bytes"] == 0
+            print(f"6 runs on 2 executor threads finished in {time.perf_counter() - start:.2f}s; "
+                  f"{stats['waited']} waited for memory")
+            print("\n")
+        finally:
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+            close_http_clients()
+
+    print("=== Memory Admission Control Test Complete ===")
+
+if __name__ == "__main__":
+    test_memory_admission()
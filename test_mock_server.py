@@ -0,0 +1,65 @@
+"""
+Test script for the mock DeepSeek server used by offline benchmarks
+"""
+
+from mock_deepseek_server import MockDeepSeekServer, sample_latency, LATENCY_DISTRIBUTIONS
+import httpx
+import random
+import statistics
+
+def _chat(client: httpx.Client, prompt: str, stream: bool = False) -> httpx.Response:
+    body = {"model": "deepseek-chat", "messages": [{"role": "user", "content": prompt}], "stream": stream}
+    return client.post("/v1/chat/completions", json=body)
+
+def test_mock_server():
+    """Test latency distributions, response modes, error injection and reproducibility"""
+
+    print("=== Testing Mock DeepSeek Server ===\n")
+
+    # Test 1: Latency distributions have the configured mean
+    print("Test 1: Latency distributions")
+    print("-" * 29)
+
+    for distribution in LATENCY_DISTRIBUTIONS:
+        rng = random.Random(0)
+        samples = [sample_latency(rng, distribution, 0.2, 0.05) for _ in range(5000)]
+        mean = statistics.mean(samples)
+        print(f"{distribution:<12} mean {mean:.3f}s  max {max(samples):.3f}s")
+        assert min(samples) >= 0
+        assert abs(mean - 0.2) < 0.01
+    print("\n")
+
+    # Test 2: Canned and echo responses, plain and streamed
+    print("Test 2: Response modes")
+    print("-" * 22)
+
+    canned = {"compression rules": '{"columns": {}}'}
+    with MockDeepSeekServer(canned_responses=canned) as server, httpx.Client(base_url=server.url) as client:
+        assert _chat(client, "generate compression rules").json()["choices"][0]["message"]["content"] == '{"columns": {}}'
+        assert _chat(client, "anything else").json()["choices"][0]["message"]["content"] == server.response_text
+        server.response_mode = "echo"
+        response = _chat(client, "echo this prompt", stream=True)
+        assert "data: [DONE]" in response.text and "prompt" in response.text
+        print("Canned, default and echo responses OK")
+    print("\n")
+
+    # Test 3: Random errors follow the configured rates and replay with the same seed
+    print("Test 3: Error injection")
+    print("-" * 23)
+
+    sequences = []
+    for _ in range(2):
+        with MockDeepSeekServer(error_rate=0.2, rate_limit_rate=0.2, retry_after=1, seed=42) as server, \
+                httpx.Client(base_url=server.url) as client:
+            statuses = [_chat(client, "ping").status_code for _ in range(200)]
+            sequences.append(statuses)
+            print(f"503: {statuses.count(503)}, 429: {statuses.count(429)}, stats: {server.stats()}")
+            assert server.stats()["errors_injected"] == statuses.count(503) + statuses.count(429)
+            assert 20 <= statuses.count(503) <= 60 and 20 <= statuses.count(429) <= 60
+    assert sequences[0] == sequences[1]
+    print("\n")
+
+    print("=== Mock DeepSeek Server Test Complete ===")
+
+if __name__ == "__main__":
+    test_mock_server()
@@ -0,0 +1,117 @@
+"""
+Test script for priority-ranked, token-aware output packing
+"""
+
+from utils.output_packer import OutputPacker, StreamBudget, count_tokens
+
+def test_output_packer():
+    """Test that packing keeps high-priority lines whole and preserves order"""
+
+    print("=== Testing Output Packer ===\n")
+
+    def build(max_tokens=None, max_chars=None):
+        packer = OutputPacker(max_tokens=max_tokens, max_chars=max_chars)
+        packer.add_section("header", ["Task: Analyze profit"])
+        packer.add_section("core_indicators", [
+            "- Total profit: 2.2 million yuan",
+            "- Product C had negative profit in Q4 (-120 thousand yuan), accounting for 5.5%"
+        ], title="Core indicators:")
+        packer.add_section("classification", [
+            "- Southwest region: 715 thousand profit share",
+            "- Raw material costs: Average increase of 12% (affecting profit)"
+        ], title="Classification analysis:", blank_before=True)
+        return packer
+
+    # Test 1: Everything fits, output matches the plain layout
+    print("Test 1: Unlimited budget")
+    print("-" * 24)
+
+    full = build().pack()
+    print(full)
+    assert full == "\n".join([
+        "Task: Analyze profit",
+        "Core indicators:",
+        "- Total profit: 2.2 million yuan",
+        "- Product C had negative profit in Q4 (-120 thousand yuan), accounting for 5.5%",
+        "",
+        "Classification analysis:",
+        "- Southwest region: 715 thousand profit share",
+        "- Raw material costs: Average increase of 12% (affecting profit)"
+    ])
+    print("\n")
+
+    # Test 2: Character budget drops low-priority lines whole instead of cutting mid-number
+    print("Test 2: Character budget")
+    print("-" * 24)
+
+    for max_chars in (0, 30, 80, 150, 200, len(full)):
+        packed = build(max_chars=max_chars).pack()
+        print(f"{max_chars:>4}: {packed!r}")
+        assert len(packed) <= max_chars
+        kept = [line for line in packed.split("\n") if line]
+        # Lines are whole (or cut at a clause boundary) and in their original order
+        for line in kept:
+            assert line in full or (line.endswith("...") and line[:-3] in full)
+        assert [full.index(line.rstrip(".")) for line in kept] == sorted(full.index(line.rstrip(".")) for line in kept)
+    packed = build(max_chars=80).pack()
+    assert packed.startswith("Task: Analyze profit\nCore indicators:\n- Total profit: 2.2 million yuan")
+    assert "Classification analysis:" not in packed
+    print("\n")
+
+    # Test 3: Token budget
+    print("Test 3: Token budget")
+    print("-" * 20)
+
+    packer = build(max_tokens=25)
+    packed = packer.pack()
+    print(f"{packer.tokens_used} tokens, {packer.dropped_lines} lines dropped: {packed!r}")
+    assert packer.tokens_used <= 25 and count_tokens(packed) <= 25
+    assert packer.dropped_lines > 0
+    print("\n")
+
+    # Test 4: Sub-headings stay with the content below them
+    print("Test 4: Sub-headings")
+    print("-" * 20)
+
+    packer = OutputPacker(max_chars=60)
+    packer.add_section("header", ["Task: Summarize"])
+    packer.add_section("insights", ["Anomalies:", "- Product C lost money in Q4.", "", "Trends:", "- Sales are flat, margins fell sharply."], blank_before=True)
+    packed = packer.pack()
+    print(repr(packed))
+    assert packed == "Task: Summarize\n\nAnomalies:\n- Product C lost money in Q4."
+    print("\n")
+
+    # Test 5: A streamed output packs its sections into one shared budget, matching the packed output
+    print("Test 5: Stream budget")
+    print("-" * 21)
+
+    for max_tokens, max_chars in ((None, None), (None, 80), (None, 150), (25, None)):
+        budget = StreamBudget(max_tokens=max_tokens, max_chars=max_chars)
+        budget.spend("Task: Analyze profit")
+        chunks = ["Task: Analyze profit\n"]
+        chunks.append(budget.pack("core_indicators", [
+            "- Total profit: 2.2 million yuan",
+            "- Product C had negative profit in Q4 (-120 thousand yuan), accounting for 5.5%"
+        ], title="Core indicators:"))
+        chunks.append(budget.pack("classification", [
+            "- Southwest region: 715 thousand profit share",
+            "- Raw material costs: Average increase of 12% (affecting profit)"
+        ], title="Classification analysis:", blank_before=True))
+        streamed = "".join(chunks)
+        print(f"{max_tokens}, {max_chars}: {streamed!r}")
+        assert all(chunk.endswith("\n") for chunk in chunks if chunk)
+        assert len(streamed) <= (max_chars if max_chars is not None else len(full) + 1)
+        assert budget.tokens_used <= (max_tokens if max_tokens is not None else budget.tokens_used)
+        if max_tokens is None and max_chars is None:
+            assert streamed == full + "\n"
+    # Lines are taken whole or not at all
+    budget = StreamBudget(max_chars=20)
+    assert budget.take("- Product C lost")
+    assert not budget.take("- money in Q4.")
+    assert budget.remaining_chars == 3
+    print("\n")
+
+    print("=== Output Packer Test Complete ===")
+
+if __name__ == "__main__":
+    test_output_packer()
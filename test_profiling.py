@@ -0,0 +1,107 @@
+"""
+Test script for on-demand profiling of workflow graph nodes
+"""
+
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils.http_client import close_http_clients
+from utils.llm_cache import configure_llm_cache
+from utils.profiling import profile_node, read_manifest
+import asyncio
+import contextlib
+import io
+import os
+import pstats
+import re
+import tempfile
+
+def test_profiling():
+    """Test sampling and cProfile profiles, node selection and allocation diffs"""
+
+    print("=== Testing Profiling ===\n")
+
+    if not os.path.exists("simple_sample_data.xlsx"):
+        print("Sample workbook not found.")
+        return
+
+    # Test 1: Nothing is written unless a profile directory is configured
+    print("Test 1: Profiling disabled")
+    print("-" * 30)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with profile_node(ProcessingConfig(), "process_sheet", "data.xlsx", "Sheet1"):
+            pass
+        with profile_node(ProcessingConfig(profile_dir=temp_dir, profile_nodes=["merge_sheets"]), "process_sheet", "data.xlsx"):
+            pass
+        assert os.listdir(temp_dir) == []
+        try:
+            with profile_node(ProcessingConfig(profile_dir=temp_dir, profiler="perf"), "process_sheet", "data.xlsx"):
+                pass
+            assert False, "unknown profiler accepted"
+        except ValueError as e:
+            print(f"Rejected: {e}")
+    print("\n")
+
+    with MockDeepSeekServer(latency=0.05, response_text="Insight: profit is stable.") as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+        workflow = ExcelProcessingWorkflow()
+
+        try:
+            # Test 2: Sampling profiles in collapsed-stack format for every node of sync, async and streaming runs
+            print("Test 2: Sampling profiler")
+            print("-" * 30)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                config = ProcessingConfig(profile_dir=temp_dir, profile_interval=0.001)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    workflow.process_excel("simple_sample_data.xlsx", "Analyze sales", config)
+                    asyncio.run(workflow.aprocess_excel("simple_sample_data.xlsx", "Analyze sales", config))
+                    "".join(workflow.stream_process_excel("simple_sample_data.xlsx", "Analyze sales", config))
+                records = read_manifest(temp_dir)
+                nodes = [record["node"] for record in records]
+                assert nodes.count("probe_workbook") == 3 and nodes.count("merge_sheets") == 3
+                assert nodes.count("format_output") == 2
+                assert nodes.count("process_sheet") > 0 and nodes.count("process_sheet") % 3 == 0
+                assert all(record["sheet"] for record in records if record["node"] == "process_sheet")
+                sampled = 0
+                for record in records:
+                    with open(record["files"]["collapsed"], encoding="utf-8") as f:
+                        lines = f.read().splitlines()
+                    assert all(re.fullmatch(r".+ \d+", line) for line in lines)
+                    sampled += sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+                assert sampled > 0
+                print(f"{len(records)} node profiles, {sampled} stack samples")
+            print("\n")
+
+            # Test 3: cProfile statistics for selected nodes, with allocation diffs
+            print("Test 3: cProfile and allocation diffs")
+            print("-" * 30)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                config = ProcessingConfig(profile_dir=temp_dir, profiler="cprofile",
+                                          profile_nodes=["process_sheet"], profile_memory=True)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    workflow.process_excel("simple_sample_data.xlsx", "Analyze sales", config)
+                records = read_manifest(temp_dir)
+                assert records and all(record["node"] == "process_sheet" for record in records)
+                for record in records:
+                    stats = pstats.Stats(record["files"]["pstats"])
+                    assert any(function == "parse_excel" for _, _, function in stats.stats)
+                    with open(record["files"]["memory"], encoding="utf-8") as f:
+                        assert f.readline().startswith("Net allocated:")
+                    assert isinstance(record["net_allocated_bytes"], int)
+                print(", ".join(f"{record['sheet']} {record['seconds'] * 1000:.0f} ms" for record in records))
+            print("\n")
+        finally:
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+            close_http_clients()
+
+    print("=== Profiling Test Complete ===")
+
+if __name__ == "__main__":
+    test_profiling()
@@ -0,0 +1,235 @@
+"""
+Test script for the end-to-end result cache of the LangGraph workflow
+"""
+
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig, ResultCacheConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils.llm_cache import configure_llm_cache
+from utils.http_client import close_http_clients
+from utils.result_cache import DiskResultBackend, ResultCache, configure_result_cache, result_cache_key
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import pandas as pd
+
+def _quiet(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+def test_result_cache():
+    """Test hits, invalidation on changed files and configs, tiers, TTL, stale-while-revalidate, single flight and the disk bound"""
+
+    print("=== Testing Result Cache ===\n")
+
+    source_path = "simple_sample_data.xlsx"
+    if not os.path.exists(source_path):
+        print(f"Test file {source_path} not found.")
+        return
+
+    with MockDeepSeekServer(latency=0.1, response_text="Insight: profit is stable.") as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        def requests():
+            return server.stats()["requests_served"]
+
+        try:
+            file_path = os.path.join(tmp, "workbook.xlsx")
+            shutil.copyfile(source_path, file_path)
+            cache_dir = os.path.join(tmp, "results")
+            cache = configure_result_cache(ResultCacheConfig(memory_entries=16, directory=cache_dir))
+            workflow = ExcelProcessingWorkflow()
+            task = "Analyze profit trends"
+            config = ProcessingConfig(compression_intensity="medium")
+
+            # Test 1: A repeat request is served from the cache
+            print("Test 1: Repeat request")
+            print("-" * 30)
+            start = time.perf_counter()
+            first = _quiet(workflow.process_excel, file_path, task, config)
+            first_seconds = time.perf_counter() - start
+            before = requests()
+            start = time.perf_counter()
+            second = _quiet(workflow.process_excel, file_path, task, config)
+            second_seconds = time.perf_counter() - start
+            assert second == first
+            assert requests() == before
+            assert second_seconds < first_seconds / 10
+            assert asyncio.run(workflow.aprocess_excel(file_path, task, config)) == first
+            print(f"First run {first_seconds:.2f}s, repeat {second_seconds * 1000:.1f} ms")
+            print("\n")
+
+            # Test 2: Changed configs, tasks and files miss
+            print("Test 2: Invalidation")
+            print("-" * 30)
+            key = result_cache_key(file_path, task, config)
+            assert result_cache_key(file_path, task, replace(config, max_output_length=500)) != key
+            assert result_cache_key(file_path, "Summarize", config) != key
+            assert result_cache_key(file_path, task, replace(config, pipeline_chunk_rows=1000)) != key
+            # Settings that do not change the output share the entry
+            neutral = replace(config, checkpoint_dir=None, checkpoint_min_cells=1, checkpoint_max_age=1.0, checkpoint_max_bytes=1,
+                              rules_cache_dir=tmp, compression_workers=1, max_parallel_sheets=1, max_concurrent_llm_calls=1,
+                              pipeline_queue_chunks=1, late_llm_result="cancel", profile_nodes=["merge_sheets"],
+                              profiler="cprofile", profile_interval=0.1, profile_memory=True)
+            assert result_cache_key(file_path, task, neutral) == key
+            assert _quiet(workflow.process_excel, file_path, task, neutral) == first and requests() == before
+            # Profiled runs are not answered from the cache
+            profiled = replace(config, profile_dir=os.path.join(tmp, "profiles"))
+            assert result_cache_key(file_path, task, profiled) == key
+            _quiet(workflow.process_excel, file_path, task, profiled)
+            assert requests() > before and os.listdir(profiled.profile_dir)
+            copy_path = os.path.join(tmp, "copy.xlsx")
+            shutil.copyfile(file_path, copy_path)
+            # Same bytes under another name share the entry
+            assert result_cache_key(copy_path, task, config) == key
+            df = pd.read_excel(file_path)
+            df.iloc[0, -1] = 123456789
+            df.to_excel(file_path, index=False)
+            assert result_cache_key(file_path, task, config) != key
+            before = requests()
+            changed = _quiet(workflow.process_excel, file_path, task, config)
+            assert requests() > before and changed.startswith(f"Task: {task}")
+            print("Config, task and file content changes produce new keys")
+            print("\n")
+
+            # Test 3: The disk tier serves a fresh process (a new cache on the same directory)
+            print("Test 3: Disk tier")
+            print("-" * 30)
+            cache = configure_result_cache(ResultCacheConfig(memory_entries=16, directory=cache_dir))
+            before = requests()
+            assert _quiet(workflow.process_excel, copy_path, task, config) == first
+            assert requests() == before
+            assert cache.stats()["hits"] == 1
+            print(f"Disk entries: {len(os.listdir(cache_dir))}")
+            print("\n")
+
+            # Test 4: Concurrent identical misses share one run; incomplete results are not stored
+            print("Test 4: Single flight and cacheability")
+            print("-" * 30)
+            cache = configure_result_cache(ResultCacheConfig(memory_entries=16))
+            before = requests()
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                outputs = list(executor.map(lambda _: _quiet(workflow.process_excel, copy_path, task, config), range(4)))
+            assert outputs == [first] * 4
+            # One run: its plan and insights calls (the mock's reply is no valid plan, and fallback plans are not cached)
+            assert requests() - before == 2
+            stats = cache.stats()
+            assert stats["writes"] == 1 and stats["shared"] + stats["hits"] == 3
+            # A missing file and a rule-based fallback are not cached
+            _quiet(workflow.process_excel, "missing.xlsx", task, config)
+            _quiet(workflow.process_excel, copy_path, task, replace(config, llm_latency_budget=0.0))
+            assert cache.stats()["writes"] == 1
+            print(f"Stats: {cache.stats()}")
+            print("\n")
+
+            # Test 5: Expired entries are served stale while they are recomputed
+            print("Test 5: TTL and stale-while-revalidate")
+            print("-" * 30)
+            cache = configure_result_cache(ResultCacheConfig(memory_entries=16, ttl=0.2, stale_while_revalidate=30.0))
+            _quiet(workflow.process_excel, copy_path, task, config)
+            time.sleep(0.3)
+            before = requests()
+            start = time.perf_counter()
+            stale = _quiet(workflow.process_excel, copy_path, task, config)
+            stale_seconds = time.perf_counter() - start
+            assert stale == first and stale_seconds < 0.05
+            for _ in range(100):
+                if cache.stats()["writes"] == 2:
+                    break
+                time.sleep(0.05)
+            assert cache.stats()["writes"] == 2 and requests() > before
+            assert cache.lookup(result_cache_key(copy_path, task, config))[1] == "hit"
+            expired = configure_result_cache(ResultCacheConfig(memory_entries=16, ttl=0.1))
+            _quiet(workflow.process_excel, copy_path, task, config)
+            time.sleep(0.2)
+            assert expired.lookup(result_cache_key(copy_path, task, config)) == (None, "miss")
+            print(f"Stale result served in {stale_seconds * 1000:.1f} ms, then revalidated")
+            print("\n")
+
+            # Test 6: Concurrent async misses share one computation, also with a thread's miss
+            print("Test 6: Async single flight")
+            print("-" * 30)
+            cache = ResultCache([])
+            calls = []
+
+            async def acompute():
+                calls.append("async")
+                await asyncio.sleep(0.2)
+                return "result"
+
+            def compute():
+                calls.append("sync")
+                time.sleep(0.2)
+                return "result"
+
+            async def concurrent_misses():
+                return await asyncio.gather(*[cache.aget_or_compute("key", acompute, compute) for _ in range(4)])
+
+            results = asyncio.run(concurrent_misses())
+            assert calls == ["async"]
+            assert sorted(status for _, status in results) == ["miss", "shared", "shared", "shared"]
+            assert all(value == "result" for value, _ in results)
+            calls.clear()
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                thread_miss = executor.submit(cache.get_or_compute, "other", compute)
+                time.sleep(0.05)
+                assert asyncio.run(cache.aget_or_compute("other", acompute, compute)) == ("result", "shared")
+                assert thread_miss.result() == ("result", "miss")
+            assert calls == ["sync"]
+
+            async def failing():
+                await asyncio.sleep(0.1)
+                raise RuntimeError("compute failed")
+
+            async def concurrent_failures():
+                return await asyncio.gather(*[cache.aget_or_compute("failing", failing, compute) for _ in range(2)],
+                                            return_exceptions=True)
+
+            assert all(isinstance(e, RuntimeError) for e in asyncio.run(concurrent_failures()))
+            assert not cache._pending
+            print(f"Stats: {cache.stats()}")
+            print("\n")
+
+            # Test 7: The disk tier removes the least recently used results above max_bytes
+            print("Test 7: Disk tier size bound")
+            print("-" * 30)
+            bounded_dir = os.path.join(tmp, "bounded")
+            backend = DiskResultBackend(bounded_dir, max_bytes=3500)
+            for i, key in enumerate("abc"):
+                backend.put(key, "x" * 1000, time.time())
+                # Distinct modification times, oldest first
+                os.utime(os.path.join(bounded_dir, f"{key}.json"), (1000 + i, 1000 + i))
+            assert backend.get("a") is not None
+            backend.put("d", "x" * 1000, time.time())
+            assert sorted(os.listdir(bounded_dir)) == ["a.json", "c.json", "d.json"]
+            assert sum(os.path.getsize(os.path.join(bounded_dir, name)) for name in os.listdir(bounded_dir)) <= 3500
+            unbounded = DiskResultBackend(os.path.join(tmp, "unbounded"), max_bytes=0)
+            for key in "abcde":
+                unbounded.put(key, "x" * 1000, time.time())
+            assert len(os.listdir(unbounded.directory)) == 5
+            assert ResultCacheConfig().max_bytes == 1024 * 1024 * 1024
+            print(f"Kept {sorted(os.listdir(bounded_dir))} within 3500 bytes")
+            print("\n")
+        finally:
+            configure_result_cache(None)
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+            close_http_clients()
+
+    print("=== Result Cache Test Complete ===")
+
+if __name__ == "__main__":
+    test_result_cache()
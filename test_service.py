@@ -0,0 +1,149 @@
+"""
+Test script for the long-running processing service: warm workers, priorities, polling and cancellation
+"""
+
+from agents.job_service import JobService
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig
+from mock_deepseek_server import MockDeepSeekServer
+from service import ExcelProcessingServer, ServiceClient, ServiceError, parse_client_config
+from utils.http_client import close_http_clients
+from utils.llm_cache import configure_llm_cache
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+def test_service():
+    """Test the job API over TCP and a Unix socket"""
+
+    print("=== Testing Processing Service ===\n")
+
+    if not os.path.exists("simple_sample_data.xlsx") or not os.path.exists("complex_sample_data.xlsx"):
+        print("Sample workbooks not found.")
+        return
+
+    with MockDeepSeekServer(latency=0.3, response_text="Insight: profit is stable.") as mock:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        previous_cache = os.environ.pop("DEEPSEEK_CACHE_PATH", None)
+        os.environ["DEEPSEEK_BASE_URL"] = mock.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        try:
+            config = ProcessingConfig(compression_intensity="medium")
+            with tempfile.TemporaryDirectory() as socket_dir, \
+                    JobService(workers=1, max_queue=3) as service, \
+                    ExcelProcessingServer(service) as server, \
+                    ExcelProcessingServer(service, socket_path=os.path.join(socket_dir, "service.sock")) as unix_server:
+                assert service.wait_ready(120), "Workers did not start"
+                client = ServiceClient(server.url)
+
+                # Test 1: A job returns the same output as a direct run, over TCP and the Unix socket
+                print("Test 1: Processing over TCP and a Unix socket")
+                print("-" * 30)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    expected = ExcelProcessingWorkflow().process_excel("simple_sample_data.xlsx", "Analyze sales", config)
+                job = client.process("simple_sample_data.xlsx", "Analyze sales", config)
+                assert job["status"] == "succeeded", job
+                assert job["output"] == expected
+                unix_job = ServiceClient(unix_server.url).process("simple_sample_data.xlsx", "Analyze sales", config)
+                assert unix_job["status"] == "succeeded" and unix_job["output"] == expected
+                assert service.stats()["worker_restarts"] == 0
+                print(f"TCP job took {job['seconds']:.2f}s in the worker; Unix socket job {unix_job['seconds']:.2f}s")
+                print("\n")
+
+                # Test 2: Higher priorities run first; a full queue rejects submissions
+                print("Test 2: Priorities and queue bound")
+                print("-" * 30)
+                busy = client.submit("complex_sample_data.xlsx", "Occupy the worker", config)
+                while client.get(busy["id"])["status"] == "queued":
+                    time.sleep(0.01)
+                low = client.submit("simple_sample_data.xlsx", "Low priority", config, priority=0)
+                high = client.submit("simple_sample_data.xlsx", "High priority", config, priority=10)
+                extra = client.submit("simple_sample_data.xlsx", "Fills the queue", config)
+                try:
+                    client.submit("simple_sample_data.xlsx", "Rejected", config)
+                    assert False, "Expected the full queue to reject the job"
+                except ServiceError as e:
+                    assert e.status == 429
+                    print(f"Full queue rejected a job: {e}")
+                low_done, high_done = client.wait(low["id"]), client.wait(high["id"])
+                assert low_done["status"] == high_done["status"] == "succeeded"
+                assert high_done["started_at"] < low_done["started_at"]
+                assert client.wait(extra["id"])["status"] == "succeeded"
+                assert client.wait(busy["id"])["status"] == "succeeded"
+                print("High priority job started before the earlier low priority job")
+                print("\n")
+
+                # Test 3: Cancelling queued and running jobs
+                print("Test 3: Cancellation")
+                print("-" * 30)
+                running = client.submit("complex_sample_data.xlsx", "Cancelled while running", config)
+                queued = client.submit("simple_sample_data.xlsx", "Cancelled while queued", config)
+                while client.get(running["id"])["status"] == "queued":
+                    time.sleep(0.01)
+                assert client.cancel(queued["id"])["status"] == "cancelled"
+                client.cancel(running["id"])
+                cancelled = client.wait(running["id"], timeout=30)
+                assert cancelled["status"] == "cancelled" and cancelled["output"] is None
+                assert client.get(queued["id"])["started_at"] is None
+                assert service.stats()["worker_restarts"] == 1
+                # The replacement worker serves the next job
+                after = client.process("simple_sample_data.xlsx", "Analyze sales", config)
+                assert after["status"] == "succeeded" and after["output"] == expected
+                print(f"Cancelled: {cancelled['message']}; replacement worker processed the next job")
+                print("\n")
+
+                # Test 4: Errors and unknown jobs
+                print("Test 4: Errors")
+                print("-" * 30)
+                failed = client.process("missing.xlsx", "Analyze", config)
+                assert failed["status"] == "failed" and "missing.xlsx" in failed["message"]
+                for call in (lambda: client.get("no-such-job"), lambda: client.cancel("no-such-job")):
+                    try:
+                        call()
+                        assert False, "Expected 404 for an unknown job"
+                    except ServiceError as e:
+                        assert e.status == 404
+                # Unknown and server-side fields, wrong types and out-of-range values are rejected
+                invalid_configs = [{"no_such_option": 1}, {"checkpoint_dir": "/tmp/pickles"}, {"profile_dir": "/etc"},
+                                   {"rules_cache_dir": "/tmp/plans"}, {"compression_intensity": "extreme"},
+                                   {"max_output_length": "2000"}, {"max_output_length": True},
+                                   {"compression_workers": 10000}, {"exclude_columns": "Profit"},
+                                   {"llm_latency_budget": -1}, "medium"]
+                submitted = service.stats()["submitted"]
+                for invalid in invalid_configs:
+                    try:
+                        client._request("POST", "/jobs", {"file_path": "simple_sample_data.xlsx", "config": invalid})
+                        assert False, f"Expected 400 for config {invalid}"
+                    except ServiceError as e:
+                        assert e.status == 400
+                assert service.stats()["submitted"] == submitted
+                # Client fields are applied to the server's settings, which keep the directories
+                server_side = ProcessingConfig(checkpoint_dir=None, rules_cache_dir="/srv/plans")
+                parsed = parse_client_config({"compression_intensity": "high", "llm_latency_budget": 2,
+                                              "exclude_columns": ["Notes"], "max_output_tokens": None}, server_side)
+                assert parsed.compression_intensity == "high" and parsed.llm_latency_budget == 2
+                assert parsed.checkpoint_dir is None and parsed.rules_cache_dir == "/srv/plans"
+                assert parse_client_config({}).checkpoint_dir == ProcessingConfig().checkpoint_dir
+                health = client.health()
+                assert health["workers_ready"] == 1 and health["queued"] == 0 and health["running"] == 0
+                print(f"Failed job reported: {failed['message']}")
+                print(f"Health: {health}")
+                print("\n")
+        finally:
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+            if previous_cache is not None:
+                os.environ["DEEPSEEK_CACHE_PATH"] = previous_cache
+            close_http_clients()
+
+    print("=== Processing Service Test Complete ===")
+
+if __name__ == "__main__":
+    test_service()
@@ -0,0 +1,110 @@
+"""
+Test script for the per-sheet fan-out of the LangGraph workflow
+"""
+
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig
+from mock_deepseek_server import MockDeepSeekServer
+from tools import data_compression_tool
+from utils.excel_utils import ExcelParser
+from utils.llm_cache import configure_llm_cache
+from utils.http_client import close_http_clients
+import contextlib
+import io
+import os
+import tempfile
+import pandas as pd
+
+def _run_quietly(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+def test_sheet_fanout():
+    """Test the probe step, parallel sheet branches and the merge"""
+
+    print("=== Testing Sheet Fan-out ===\n")
+
+    file_path = "complex_sample_data.xlsx"
+    if not os.path.exists(file_path):
+        print(f"Test file {file_path} not found.")
+        return
+
+    with MockDeepSeekServer(latency=0.05, response_text="Insight: profit is stable.") as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        try:
+            workflow = ExcelProcessingWorkflow()
+            agent = workflow.agent
+
+            # Test 1: The probe lists sheets without parsing them
+            print("Test 1: Probe")
+            print("-" * 30)
+            sheets = ExcelParser.probe_workbook(file_path)
+            assert [sheet["name"] for sheet in sheets] == pd.ExcelFile(file_path).sheet_names
+            assert all(sheet["rows"] > 0 and sheet["columns"] > 0 for sheet in sheets)
+            assert ExcelParser.probe_workbook(file_path, ["Monthly_Trend", "Missing"]) == [sheets[-1]]
+            print(", ".join(f"{sheet['name']} {sheet['rows']}x{sheet['columns']}" for sheet in sheets))
+            print("\n")
+
+            # Test 2: Fan-out output matches a linear parse -> compress -> format run
+            print("Test 2: Same output as the linear pipeline")
+            print("-" * 30)
+            task = "Analyze profit trends"
+            for config in (ProcessingConfig(compression_intensity="medium"),
+                           ProcessingConfig(compression_intensity="high", include_sheets=["Regional_Summary", "Sales_Data"])):
+                parsed = _run_quietly(agent.parser_tool._run, file_path, config.include_sheets)
+                compressed = _run_quietly(agent.compression_tool._run, parsed, config)
+                linear = _run_quietly(agent.format_tool._run, compressed, task, config)["formatted_content"]
+                fanned_out = _run_quietly(workflow.process_excel, file_path, task, config)
+                assert fanned_out == linear
+                streamed = "".join(_run_quietly(list, workflow.stream_process_excel(file_path, task, config)))
+                assert streamed.startswith(f"Task: {task}") and "Insight: profit is stable." in streamed
+            print("Invoke and stream outputs match the linear pipeline")
+            print("\n")
+
+            # Test 3: Sheets with the same schema share one rule generation across branches
+            print("Test 3: One compression plan per schema")
+            print("-" * 30)
+            frame = pd.DataFrame({"Region": ["North", "South", "East"] * 4, "Profit": range(12)})
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                twin_path = os.path.join(tmp_dir, "twins.xlsx")
+                with pd.ExcelWriter(twin_path) as writer:
+                    for sheet_name in ("Q1", "Q2", "Q3"):
+                        frame.to_excel(writer, sheet_name=sheet_name, index=False)
+                data_compression_tool._plan_cache.clear()
+                served = server.stats()["requests_served"]
+                state = {
+                    "file_path": twin_path, "task_description": task, "config": ProcessingConfig(compression_intensity="medium"),
+                    "parsed_data": {}, "compressed_data": {}, "formatted_output": "", "sheets": [], "sheet_results": [],
+                    "messages": [], "next_action": "parse"
+                }
+                final_state = _run_quietly(workflow.app.invoke, state)
+                # One compression plan request plus the insights request
+                assert server.stats()["requests_served"] - served == 2
+                # Merged in workbook order, whatever order the branches finished in
+                assert list(final_state["compressed_data"]["sheets"]) == ["Q1", "Q2", "Q3"]
+            print("Three same-schema sheets made a single plan request")
+            print("\n")
+
+            # Test 4: A missing file still produces output instead of raising
+            print("Test 4: Missing file")
+            print("-" * 30)
+            output = _run_quietly(workflow.process_excel, "missing.xlsx", task, ProcessingConfig())
+            assert output.startswith(f"Task: {task}")
+            print(output[:80])
+        finally:
+            close_http_clients()
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+    print("\n")
+
+    print("=== Sheet Fan-out Test Complete ===")
+
+if __name__ == "__main__":
+    test_sheet_fanout()
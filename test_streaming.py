@@ -0,0 +1,142 @@
+"""
+Test script for streaming LLM responses, run against the local mock server
+"""
+
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig, LLMDispatcherConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils import llm_utils
+from utils.llm_utils import stream_deepseek_llm
+from utils.llm_cache import configure_llm_cache
+from utils.llm_dispatcher import LLMRequestError, configure_llm_dispatcher
+from utils.output_packer import count_tokens
+from utils.http_client import close_http_clients
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+import httpx
+import os
+import time
+
+def test_streaming():
+    """Test token streaming, the streaming process_excel API, dispatcher limits and broken streams"""
+
+    print("=== Testing Streaming Output ===\n")
+
+    insights = "1. Profit is concentrated in a few regions.\n2. Product C loses money in Q4."
+    with MockDeepSeekServer(response_text=insights, token_latency=0.02) as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        try:
+            # Test 1: Tokens arrive incrementally
+            print("Test 1: Token streaming")
+            print("-" * 23)
+
+            start = time.perf_counter()
+            first_token_at = None
+            chunks = []
+            for chunk in stream_deepseek_llm("Summarize the data"):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter() - start
+                chunks.append(chunk)
+            total = time.perf_counter() - start
+            print(f"{len(chunks)} chunks, first after {first_token_at * 1000:.1f} ms, all after {total * 1000:.1f} ms")
+            assert "".join(chunks) == insights
+            assert len(chunks) > 1 and first_token_at < total / 2
+            print("\n")
+
+            # Test 2: Header is emitted before the workbook is processed
+            print("Test 2: Streaming process_excel")
+            print("-" * 31)
+
+            file_path = "simple_sample_data.xlsx"
+            if os.path.exists(file_path):
+                workflow = ExcelProcessingWorkflow()
+                config = ProcessingConfig(compression_intensity="low", max_output_length=2000)
+                stream = workflow.stream_process_excel(file_path, "Analyze profit anomalies", config)
+                assert next(stream) == "Task: Analyze profit anomalies\n"
+                output = "Task: Analyze profit anomalies\n" + "".join(stream)
+                print(output)
+                assert output.endswith(insights)
+                assert len(output) <= config.max_output_length
+
+                # Output is packed into the length and token budgets while streaming, ending at a line boundary
+                for limits in ({"max_output_length": 60}, {"max_output_length": 100}, {"max_output_tokens": 24}):
+                    limited = "".join(workflow.stream_process_excel(file_path, "Analyze profit anomalies", replace(config, **limits)))
+                    print(f"{limits}: {limited!r}")
+                    assert output.startswith(limited) and limited.endswith("\n")
+                    assert len(limited) <= limits.get("max_output_length", len(output))
+                    assert count_tokens(limited) <= limits.get("max_output_tokens", count_tokens(output))
+                assert limited.startswith("Task: Analyze profit anomalies\n\n1. Profit")
+
+                # Insights that miss the latency budget are replaced by the rule-based analysis
+                late = "".join(workflow.stream_process_excel(file_path, "Analyze profit anomalies", replace(config, llm_latency_budget=0.01)))
+                assert "Classification analysis:" in late and "Profit is concentrated" not in late
+                in_time = "".join(workflow.stream_process_excel(file_path, "Analyze profit anomalies", replace(config, llm_latency_budget=10)))
+                assert in_time == output
+            else:
+                print(f"Test file {file_path} not found.")
+            print("\n")
+
+            # Test 3: Streams hold a dispatcher slot, so max_concurrency bounds them too
+            print("Test 3: Dispatcher limits")
+            print("-" * 25)
+
+            dispatcher = configure_llm_dispatcher(LLMDispatcherConfig(rate_limit=0, max_concurrency=1))
+            start = time.perf_counter()
+            "".join(stream_deepseek_llm("Summarize the data"))
+            single = time.perf_counter() - start
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                outputs = list(executor.map(lambda prompt: "".join(stream_deepseek_llm(prompt)), ["First", "Second"]))
+            both = time.perf_counter() - start
+            print(f"One stream {single * 1000:.0f} ms, two with max_concurrency=1 {both * 1000:.0f} ms")
+            assert outputs == [insights, insights]
+            assert both > 1.8 * single
+            assert dispatcher.stats()["api_calls"] == 3
+            print("\n")
+
+            # Test 4: A stream that breaks off after content raises instead of appending an error chunk
+            print("Test 4: Broken stream")
+            print("-" * 21)
+
+            iter_sse_content = llm_utils._iter_sse_content
+
+            def breaking_iter_sse_content(response):
+                for index, content in enumerate(iter_sse_content(response)):
+                    if index == 3:
+                        raise httpx.ReadError("connection reset")
+                    yield content
+
+            llm_utils._iter_sse_content = breaking_iter_sse_content
+            requests_before = server.stats()["requests_served"]
+            chunks = []
+            try:
+                for chunk in stream_deepseek_llm("Summarize the data again"):
+                    chunks.append(chunk)
+                assert False, "broken stream did not raise"
+            except LLMRequestError as e:
+                print(f"Raised after {len(chunks)} chunks: {e}")
+            finally:
+                llm_utils._iter_sse_content = iter_sse_content
+            assert len(chunks) == 3 and not any("Error calling LLM" in chunk for chunk in chunks)
+            # Not retried: the chunks already yielded cannot be taken back
+            assert server.stats()["requests_served"] == requests_before + 1
+            # The slot was given back
+            assert "".join(stream_deepseek_llm("Summarize the data once more")) == insights
+            print("\n")
+        finally:
+            configure_llm_dispatcher(LLMDispatcherConfig.from_env())
+            close_http_clients()
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+
+    print("=== Streaming Output Test Complete ===")
+
+if __name__ == "__main__":
+    test_streaming()
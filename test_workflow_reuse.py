@@ -0,0 +1,78 @@
+"""
+Test script for the shared agent and once-compiled LangGraph workflow
+"""
+
+from agents.excel_processing_agent import ExcelProcessingAgent, get_shared_agent
+from agents.langgraph_agent import ExcelProcessingWorkflow
+from config.config import ProcessingConfig
+from mock_deepseek_server import MockDeepSeekServer
+from utils.llm_cache import configure_llm_cache
+from utils.http_client import close_http_clients
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import io
+import os
+
+def test_workflow_reuse():
+    """Test graph and tool sharing, and concurrent invocations of one compiled graph"""
+
+    print("=== Testing Workflow Reuse ===\n")
+
+    # Test 1: Workflows share the agent, its tools and one compiled graph
+    print("Test 1: Shared graph and tools")
+    print("-" * 30)
+
+    first, second = ExcelProcessingWorkflow(), ExcelProcessingWorkflow()
+    assert first.agent is second.agent is get_shared_agent()
+    assert first.app is second.app
+    agent = first.agent
+    assert agent.processing_chain.parser_tool is agent.parser_tool
+    assert agent.processing_chain.compression_tool is agent.compression_tool
+    assert agent.processing_chain.format_tool is agent.format_tool
+
+    # A workflow on its own agent compiles its own graph, once
+    custom = ExcelProcessingWorkflow(agent=ExcelProcessingAgent())
+    assert custom.app is not first.app and custom.app is custom.app
+    print("Graph compiled once and shared")
+    print("\n")
+
+    # Test 2: Concurrent requests on the shared graph
+    print("Test 2: Concurrent invocations")
+    print("-" * 30)
+
+    file_path = "simple_sample_data.xlsx"
+    if not os.path.exists(file_path):
+        print(f"Test file {file_path} not found.")
+        return
+
+    with MockDeepSeekServer(latency=0.05, response_text="Insight: profit is stable.") as server:
+        previous_url = os.environ.get("DEEPSEEK_BASE_URL")
+        os.environ["DEEPSEEK_BASE_URL"] = server.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+        close_http_clients()
+        configure_llm_cache(None)
+
+        try:
+            config = ProcessingConfig(compression_intensity="medium")
+            tasks = [f"Analyze region {index}" for index in range(8)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                with ThreadPoolExecutor(max_workers=4) as executor:
+                    outputs = list(executor.map(
+                        lambda task: ExcelProcessingWorkflow().process_excel(file_path, task, config), tasks
+                    ))
+            for task, output in zip(tasks, outputs):
+                assert output.startswith(f"Task: {task}\n"), output[:100]
+                assert "Insight: profit is stable." in output
+            print(f"{len(outputs)} concurrent runs produced their own outputs")
+        finally:
+            close_http_clients()
+            if previous_url is None:
+                os.environ.pop("DEEPSEEK_BASE_URL", None)
+            else:
+                os.environ["DEEPSEEK_BASE_URL"] = previous_url
+    print("\n")
+
+    print("=== Workflow Reuse Test Complete ===")
+
+if __name__ == "__main__":
+    test_workflow_reuse()
@@ -1,14 +1,27 @@
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import Type, List, Dict, Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import threading
 import pandas as pd
 from config.config import ProcessingConfig
-from utils.llm_utils import initialize_deepseek_llm, generate_compression_rules
+from utils.llm_utils import initialize_deepseek_llm, agenerate_compression_rules
+from utils.async_utils import run_sync
+from utils.instrumentation import current_span, span
+from utils.compression_rules import CompressionPlan, PlanCache, default_compression_plan, header_types, schema_signature
 
 class DataCompressionInput(BaseModel):
     data: Dict[str, Any] = Field(description="Parsed Excel data from excel_parser tool")
     config: ProcessingConfig = Field(description="Processing configuration")
 
+# Compression plans are shared by every tool instance so one LLM call serves all files with the same schema
+_plan_cache = PlanCache()
+# Plan generations in flight, keyed by schema signature. Futures rather than tasks, so sheets
+# compressed on different event loops (e.g. parallel per-sheet branches) wait for a single LLM call.
+_pending_plans: Dict[str, Future] = {}
+_pending_plans_lock = threading.Lock()
+
 class DataCompressionTool(BaseTool):
     name: str = "data_compressor"
     description: str = "Compress parsed Excel data using rule-based and LLM-based methods"
@@ -17,39 +30,10 @@ class DataCompressionTool(BaseTool):
         """Compress data based on configuration"""
         try:
             # Initialize LLM for dynamic rule generation (if needed)
-            llm_config = initialize_deepseek_llm()
-            
-            compressed_sheets = {}
+            initialize_deepseek_llm()
             
-            # Process each sheet
-            for sheet_name, sheet_data in data.get("sheets", {}).items():
-                df_dict = sheet_data.get("data", {})
-                df = pd.DataFrame.from_dict(df_dict)
-                
-                # Get data description for LLM
-                data_description = self._get_data_description(df, sheet_data)
-                
-                # Generate dynamic compression rules using LLM
-                compression_rules = generate_compression_rules(data_description, config.task_type)
-                
-                # Apply compression based on intensity
-                if config.compression_intensity == "low":
-                    # Minimal compression - just remove null columns with >90% nulls
-                    compressed_df = self._apply_low_compression(df)
-                elif config.compression_intensity == "medium":
-                    # Medium compression - remove null columns, aggregate numerical data
-                    compressed_df = self._apply_medium_compression(df, sheet_data, compression_rules)
-                else:  # high
-                    # High compression - aggressive aggregation and summarization
-                    compressed_df = self._apply_high_compression(df, sheet_data, config.task_type, compression_rules)
-                
-                # Convert back to dict
-                compressed_sheets[sheet_name] = {
-                    "data": compressed_df.to_dict(),
-                    "shape": compressed_df.shape,
-                    "columns": list(compressed_df.columns),
-                    "compression_rules": compression_rules  # Include rules for debugging
-                }
+            # Sheets are compressed concurrently: LLM calls on the event loop, pandas work in a thread pool
+            compressed_sheets = run_sync(self._compress_sheets(data, config))
             
             return {
                 "status": "success",
@@ -62,6 +46,83 @@ class DataCompressionTool(BaseTool):
                 "message": f"Failed to compress data: {str(e)}"
             }
     
+    async def _compress_sheets(self, data: Dict[str, Any], config: ProcessingConfig) -> Dict[str, Any]:
+        """Compress all sheets concurrently, preserving sheet order in the result"""
+        llm_semaphore = asyncio.Semaphore(max(1, config.max_concurrent_llm_calls))
+        
+        with ThreadPoolExecutor(max_workers=max(1, config.compression_workers)) as executor:
+            results = await asyncio.gather(*[
+                self._compress_sheet(sheet_name, sheet_data, config, llm_semaphore, executor)
+                for sheet_name, sheet_data in data.get("sheets", {}).items()
+            ])
+        
+        return dict(results)
+    
+    async def _compress_sheet(self,
+                              sheet_name: str,
+                              sheet_data: Dict,
+                              config: ProcessingConfig,
+                              llm_semaphore: asyncio.Semaphore,
+                              executor: ThreadPoolExecutor):
+        """Compress a single sheet, offloading CPU-bound work to the executor"""
+        loop = asyncio.get_running_loop()
+        df_dict = sheet_data.get("data", {})
+        with span("compress", sheet=sheet_name, intensity=config.compression_intensity) as compress_span:
+            df = await loop.run_in_executor(executor, pd.DataFrame.from_dict, df_dict)
+            compress_span.set(rows=df.shape[0], cells=int(df.size))
+            
+            if config.compression_intensity == "low":
+                # Minimal compression does not use rules, so skip the LLM call entirely
+                compression_plan = None
+            else:
+                # Get the compression plan for this schema (cached, or generated by the LLM)
+                compression_plan = await self._get_compression_plan(df, sheet_data, config, llm_semaphore)
+            
+            compressed_sheet = await loop.run_in_executor(
+                executor, self._compress_frame, df, sheet_data, compression_plan, config
+            )
+            output_rows, output_columns = compressed_sheet["shape"]
+            compress_span.set(output_rows=output_rows, output_cells=output_rows * output_columns)
+        return sheet_name, compressed_sheet
+    
+    def get_compression_plan(self, df: pd.DataFrame, sheet_data: Dict, config: ProcessingConfig) -> Optional[CompressionPlan]:
+        """
+        Compression plan for one sheet, from the cache or generated by the LLM
+        
+        Args:
+            df: Sheet data, or a sample of it
+            sheet_data: Parsed sheet profile (data types, null values, outliers)
+            config: Processing configuration
+            
+        Returns:
+            The plan, or None for low intensity, which does not use rules
+        """
+        if config.compression_intensity == "low":
+            return None
+        llm_semaphore = asyncio.Semaphore(max(1, config.max_concurrent_llm_calls))
+        return run_sync(self._get_compression_plan(df, sheet_data, config, llm_semaphore))
+    
+    def _compress_frame(self, df: pd.DataFrame, sheet_data: Dict, compression_plan: Optional[CompressionPlan], config: ProcessingConfig) -> Dict[str, Any]:
+        """Apply compression to one sheet and convert it back to dict"""
+        # Apply compression based on intensity
+        if config.compression_intensity == "low":
+            # Minimal compression - just remove null columns with >90% nulls
+            compressed_df = self._apply_low_compression(df)
+        elif config.compression_intensity == "medium":
+            # Medium compression - remove null columns, apply column-level rules
+            compressed_df = self._apply_medium_compression(df, sheet_data, compression_plan, config)
+        else:  # high
+            # High compression - aggressive aggregation and summarization
+            compressed_df = self._apply_high_compression(df, sheet_data, config.task_type, compression_plan, config)
+        
+        # Convert back to dict
+        return {
+            "data": compressed_df.to_dict(),
+            "shape": compressed_df.shape,
+            "columns": list(compressed_df.columns),
+            "compression_rules": compression_plan.to_dict() if compression_plan else None  # Include rules for debugging
+        }
+    
     def _get_data_description(self, df: pd.DataFrame, sheet_data: Dict) -> str:
         """Generate a description of the data for the LLM"""
         description = f"Dataset with {df.shape[0]} rows and {df.shape[1]} columns. "
@@ -99,59 +160,138 @@ class DataCompressionTool(BaseTool):
         df_filtered = df.dropna(axis=1, thresh=threshold)
         return df_filtered
     
-    def _apply_medium_compression(self, df: pd.DataFrame, sheet_data: Dict, compression_rules: str) -> pd.DataFrame:
+    async def _get_compression_plan(self,
+                                    df: pd.DataFrame,
+                                    sheet_data: Dict,
+                                    config: ProcessingConfig,
+                                    llm_semaphore: asyncio.Semaphore) -> CompressionPlan:
+        """Look up the compression plan for the sheet schema, generating it with the LLM on a miss"""
+        signature = schema_signature(header_types(df), config.task_type)
+        
+        compression_plan = _plan_cache.get(signature, config.rules_cache_dir)
+        if compression_plan is not None:
+            current_span().set(plan_cache="hit")
+            return compression_plan
+        
+        # Sheets sharing a schema wait for a single rule generation
+        while True:
+            with _pending_plans_lock:
+                pending = _pending_plans.get(signature)
+                generating = pending is None
+                if generating:
+                    pending = _pending_plans[signature] = Future()
+            if generating:
+                break
+            current_span().set(plan_cache="shared")
+            # Shielded, so a cancelled waiter does not cancel the generation the other sheets wait for
+            compression_plan = await asyncio.shield(asyncio.wrap_future(pending))
+            if compression_plan is not None:
+                return compression_plan
+            # The sheet generating the plan was cancelled: generate it here instead, unless it was cached meanwhile
+            compression_plan = _plan_cache.get(signature, config.rules_cache_dir)
+            if compression_plan is not None:
+                return compression_plan
+        current_span().set(plan_cache="miss")
+        
+        try:
+            compression_plan = await self._generate_compression_plan(df, sheet_data, config, signature, llm_semaphore)
+        except Exception as e:
+            self._settle_pending_plan(signature, pending, None, exception=e)
+            raise
+        except BaseException:
+            # A cancellation belongs to this sheet alone; the sheets waiting for it generate the plan themselves
+            self._settle_pending_plan(signature, pending, None)
+            raise
+        self._settle_pending_plan(signature, pending, compression_plan)
+        return compression_plan
+    
+    @staticmethod
+    def _settle_pending_plan(signature: str,
+                             pending: Future,
+                             compression_plan: Optional[CompressionPlan],
+                             exception: Optional[Exception] = None) -> None:
+        """Hand the outcome of a plan generation to the sheets waiting for it; None makes them retry"""
+        # Removed first, so a waiter that retries starts a new generation rather than finding this one.
+        # LLM plans are in _plan_cache by now, so later lookups no longer need the future.
+        with _pending_plans_lock:
+            _pending_plans.pop(signature, None)
+        if exception is not None:
+            pending.set_exception(exception)
+        else:
+            pending.set_result(compression_plan)
+    
+    async def _generate_compression_plan(self,
+                                         df: pd.DataFrame,
+                                         sheet_data: Dict,
+                                         config: ProcessingConfig,
+                                         signature: str,
+                                         llm_semaphore: asyncio.Semaphore) -> CompressionPlan:
+        """Generate and cache the compression plan for a schema"""
+        data_types = sheet_data.get("data_types", {})
+        
+        # Get data description for LLM
+        data_description = self._get_data_description(df, sheet_data)
+        
+        # Generate dynamic compression rules using LLM, bounded by the concurrency limit
+        async with llm_semaphore:
+            compression_rules = await agenerate_compression_rules(data_description, config.task_type)
+        compression_plan = CompressionPlan.from_json(compression_rules)
+        
+        if compression_plan is None:
+            # Fall back to rule-based plan if the LLM fails or returns unusable rules. It is not
+            # cached, so the next file with this schema asks the LLM again rather than keeping
+            # the fallback for good after one outage.
+            return default_compression_plan(data_types, config.task_type)
+        
+        _plan_cache.put(signature, compression_plan, config.rules_cache_dir)
+        return compression_plan
+    
+    def _apply_medium_compression(self, df: pd.DataFrame, sheet_data: Dict, compression_plan: CompressionPlan, config: ProcessingConfig) -> pd.DataFrame:
         """Apply medium compression with LLM-assisted rules"""
         # Start with low compression
         df_filtered = self._apply_low_compression(df)
         
-        # For numerical columns, add summary statistics
-        data_types = sheet_data.get("data_types", {})
-        numerical_cols = [col for col, dtype in data_types.items() if dtype in ['int64', 'float64', 'numeric'] and col in df_filtered.columns]
-        
-        # Create a summary row for numerical data
-        if numerical_cols:
-            summary_data = {}
-            for col in df_filtered.columns:
-                if col in numerical_cols:
-                    summary_data[col] = {
-                        "mean": df_filtered[col].mean(),
-                        "median": df_filtered[col].median(),
-                        "std": df_filtered[col].std(),
-                        "min": df_filtered[col].min(),
-                        "max": df_filtered[col].max()
-                    }
-                else:
-                    # Use LLM rules for text columns
-                    unique_count = df_filtered[col].nunique()
-                    summary_data[col] = f"Text column with {unique_count} unique values. Rules: {compression_rules[:100]}..."
-            
-            # Add summary as a new row (in a real implementation, this would be more sophisticated)
-            # For now, we'll just return the filtered dataframe
-            return df_filtered
-        
-        return df_filtered
+        # Column-level rules only (drop and bucket), so row-level detail and totals are preserved
+        compiled_plan = compression_plan.compile(
+            list(df_filtered.columns),
+            sheet_data.get("data_types", {}),
+            exclude_columns=config.exclude_columns,
+            aggregate=False,
+            sample=False
+        )
+        return compiled_plan.execute(df_filtered)
     
-    def _apply_high_compression(self, df: pd.DataFrame, sheet_data: Dict, task_type: str, compression_rules: str) -> pd.DataFrame:
+    def _apply_high_compression(self, df: pd.DataFrame, sheet_data: Dict, task_type: str, compression_plan: CompressionPlan, config: ProcessingConfig) -> pd.DataFrame:
         """Apply high compression with LLM-assisted summarization"""
-        # Start with medium compression
-        df_filtered = self._apply_medium_compression(df, sheet_data, compression_rules)
-        
-        # Apply task-specific compression with LLM guidance
-        if task_type == "summary":
-            # For summary tasks, we might want to group by categories and aggregate
-            # This is a simplified implementation
-            pass
-        elif task_type == "analysis":
-            # For analysis, preserve more detail but still compress
-            pass
-        elif task_type == "inference":
-            # For inference, focus on patterns and relationships
-            pass
-            
-        return df_filtered
+        # Start with low compression
+        df_filtered = self._apply_low_compression(df)
+        
+        # Full plan: drop, bucket, group and aggregate, or sample down to the row budget if nothing is aggregated.
+        # The task type is already part of the plan, since plans are generated per task type.
+        compiled_plan = compression_plan.compile(
+            list(df_filtered.columns),
+            sheet_data.get("data_types", {}),
+            exclude_columns=config.exclude_columns
+        )
+        return compiled_plan.execute(df_filtered)
     
     async def _arun(self, data: Dict[str, Any], config: ProcessingConfig) -> Dict[str, Any]:
-        """Async version of the tool"""
-        return self._run(data, config)
+        """Async version of the tool: LLM calls are awaited, pandas work runs in a thread pool"""
+        try:
+            # Fails without LLM credentials, as the synchronous version does
+            initialize_deepseek_llm()
+            
+            compressed_sheets = await self._compress_sheets(data, config)
+            
+            return {
+                "status": "success",
+                "sheets": compressed_sheets,
+                "message": f"Successfully compressed {len(compressed_sheets)} sheets"
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Failed to compress data: {str(e)}"
+            }
     
     args_schema: Type[BaseModel] = DataCompressionInput
\ No newline at end of file
@@ -1,8 +1,10 @@
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import Type, List, Dict, Any, Optional
+import asyncio
 import pandas as pd
 from utils.excel_utils import ExcelParser
+from utils.instrumentation import bind_context, span
 from config.config import ProcessingConfig
 
 class ExcelParseInput(BaseModel):
@@ -17,31 +19,36 @@ class ExcelParseTool(BaseTool):
     def _run(self, file_path: str, include_sheets: Optional[List[str]] = None, password: Optional[str] = None) -> Dict[str, Any]:
         """Parse Excel file and return structured data"""
         try:
-            # Parse the Excel file
-            sheets_data = ExcelParser.parse_excel(file_path, include_sheets, password)
+            with span("parse") as parse_span:
+                # Parse the Excel file
+                sheets_data = ExcelParser.parse_excel(file_path, include_sheets, password)
+                parse_span.set(sheets=len(sheets_data),
+                               rows=sum(df.shape[0] for df in sheets_data.values()),
+                               cells=sum(int(df.size) for df in sheets_data.values()))
             
             # Process each sheet
             processed_sheets = {}
             for sheet_name, df in sheets_data.items():
-                # Detect data types
-                data_types = ExcelParser.detect_data_types(df)
-                
-                # Detect null values
-                null_values = ExcelParser.detect_null_values(df)
-                
-                # Detect numerical columns for outlier detection
-                numerical_columns = [col for col, dtype in data_types.items() if dtype in ['int64', 'float64', 'numeric']]
-                outliers = ExcelParser.detect_outliers(df, numerical_columns)
-                
-                # Store processed data
-                processed_sheets[sheet_name] = {
-                    "data": df.to_dict(),
-                    "shape": df.shape,
-                    "columns": list(df.columns),
-                    "data_types": data_types,
-                    "null_values": null_values,
-                    "outliers": outliers
-                }
+                with span("profile", sheet=sheet_name, rows=df.shape[0], cells=int(df.size)):
+                    # Detect data types
+                    data_types = ExcelParser.detect_data_types(df)
+                    
+                    # Detect null values
+                    null_values = ExcelParser.detect_null_values(df)
+                    
+                    # Detect numerical columns for outlier detection
+                    numerical_columns = [col for col, dtype in data_types.items() if dtype in ['int64', 'float64', 'numeric']]
+                    outliers = ExcelParser.detect_outliers(df, numerical_columns)
+                    
+                    # Store processed data
+                    processed_sheets[sheet_name] = {
+                        "data": df.to_dict(),
+                        "shape": df.shape,
+                        "columns": list(df.columns),
+                        "data_types": data_types,
+                        "null_values": null_values,
+                        "outliers": outliers
+                    }
             
             return {
                 "status": "success",
@@ -55,7 +62,8 @@ class ExcelParseTool(BaseTool):
             }
     
     async def _arun(self, file_path: str, include_sheets: Optional[List[str]] = None, password: Optional[str] = None) -> Dict[str, Any]:
-        """Async version of the tool"""
-        return self._run(file_path, include_sheets, password)
+        """Async version of the tool: parsing is CPU-bound, so it runs in the loop's default executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, bind_context(self._run), file_path, include_sheets, password)
     
     args_schema: Type[BaseModel] = ExcelParseInput
\ No newline at end of file
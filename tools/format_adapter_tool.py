@@ -1,9 +1,18 @@
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
-from typing import Type, List, Dict, Any, Optional
+from typing import Type, List, Dict, Any, Optional, Iterator, Tuple
+import asyncio
+import concurrent.futures
+import itertools
+import time
 import pandas as pd
 from config.config import ProcessingConfig
-from utils.llm_utils import extract_key_insights
+from utils.analysis_context import AnalysisContext
+from utils.context_encoders import encode_sample
+from utils.instrumentation import span
+from utils.llm_cache import get_llm_cache
+from utils.output_packer import OutputPacker, StreamBudget
+from utils.llm_utils import aextract_key_insights, extract_key_insights, stream_key_insights, submit_key_insights
 
 class FormatAdapterInput(BaseModel):
     data: Dict[str, Any] = Field(description="Compressed data from data_compressor tool")
@@ -17,116 +26,319 @@ class FormatAdapterTool(BaseTool):
     def _run(self, data: Dict[str, Any], task_description: str, config: ProcessingConfig) -> Dict[str, Any]:
         """Format data into natural language context"""
         try:
-            # Build the formatted output in the required structure
-            output_lines = []
-            output_lines.append(f"Task: {task_description}")
-            
-            # Create a summary of the data for LLM analysis
-            data_summary = self._create_data_summary(data)
-            
-            # Use LLM to extract key insights
-            key_insights = extract_key_insights(data_summary, task_description)
-            
-            # Add the LLM-generated insights to the output
-            if key_insights and "Error calling LLM" not in key_insights:
-                # Parse the LLM response and format it properly
-                output_lines.append("")  # Empty line for separation
-                output_lines.append(key_insights)
-            else:
-                # Fallback to rule-based extraction if LLM fails
-                core_indicators = self._extract_core_indicators(data)
-                if core_indicators:
-                    output_lines.append("Core indicators:")
-                    # Remove duplicates while preserving order
-                    unique_indicators = list(dict.fromkeys(core_indicators))
-                    for indicator in unique_indicators:
-                        output_lines.append(f"- {indicator}")
-                
-                # Extract classification analysis
-                classification_analysis = self._extract_classification_analysis(data)
-                if classification_analysis:
-                    output_lines.append("\nClassification analysis:")
-                    # Remove duplicates while preserving order
-                    unique_analysis = list(dict.fromkeys(classification_analysis))
-                    for analysis in unique_analysis:
-                        output_lines.append(f"- {analysis}")
-            
-            # Join all lines
-            formatted_content = "\n".join(output_lines)
-            
-            # Apply length control
-            if len(formatted_content) > config.max_output_length:
-                # Simple truncation - in practice, you'd want more intelligent trimming
-                formatted_content = formatted_content[:config.max_output_length-3] + "..."
-            
-            return {
-                "status": "success",
-                "formatted_content": formatted_content,
-                "length": len(formatted_content),
-                "message": "Successfully formatted data"
-            }
+            with span("format", sheets=len(data.get("sheets", {}))) as format_span:
+                insights = self._prepare_insights(data, task_description, config)
+                result = self._pack_output(task_description=task_description, config=config, **insights)
+                format_span.set(insights_source=result["insights_source"], output_chars=len(result["formatted_content"]))
+            return result
         except Exception as e:
             return {
                 "status": "error",
                 "message": f"Failed to format data: {str(e)}"
             }
     
-    def _create_data_summary(self, data: Dict[str, Any]) -> str:
+    def _prepare_insights(self, data: Dict[str, Any], task_description: str, config: ProcessingConfig) -> Dict[str, Any]:
+        """
+        Everything the output is packed from, except the length budget
+        
+        Returns:
+            "context" (sheet frames), "key_insights" (LLM response, None if it missed the latency
+            budget) and "rule_based_sections" (None if not computed)
+        """
+        # Build each sheet frame once for the summary and every extractor
+        context = AnalysisContext(data)
+        
+        # Create a summary of the data for LLM analysis
+        data_summary = self._create_data_summary(context, config)
+        
+        if config.llm_latency_budget is None:
+            # Use LLM to extract key insights
+            key_insights = extract_key_insights(data_summary, task_description)
+            rule_based_sections = None
+        else:
+            key_insights, rule_based_sections = self._race_key_insights(context, data_summary, task_description, config)
+        
+        return {"context": context, "key_insights": key_insights, "rule_based_sections": rule_based_sections}
+    
+    def _pack_output(self,
+                     context: AnalysisContext,
+                     task_description: str,
+                     config: ProcessingConfig,
+                     key_insights: Optional[str],
+                     rule_based_sections: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Pack the header and the LLM insights, or the rule-based sections, into the output budget"""
+        # Build the formatted output in the required structure, packed by priority into the length budget
+        packer = OutputPacker(max_tokens=config.max_output_tokens, max_chars=max(0, config.max_output_length))
+        packer.add_section("header", [f"Task: {task_description}"])
+        
+        # Add the LLM-generated insights to the output
+        if key_insights and "Error calling LLM" not in key_insights:
+            # Each line of the LLM response is packed separately, after an empty line for separation
+            packer.add_section("insights", key_insights.split("\n"), blank_before=True)
+            insights_source = "llm"
+        else:
+            # Fallback to rule-based extraction if LLM fails or misses the latency budget
+            if rule_based_sections is None:
+                rule_based_sections = self._rule_based_sections(context)
+            for section in rule_based_sections:
+                packer.add_section(**section)
+            insights_source = "rules"
+        
+        # Keep the most valuable lines that fit; lower-priority lines are dropped whole
+        formatted_content = packer.pack()
+        
+        return {
+            "status": "success",
+            "formatted_content": formatted_content,
+            "length": len(formatted_content),
+            "tokens": packer.tokens_used,
+            "insights_source": insights_source,
+            "message": "Successfully formatted data"
+        }
+    
+    def _race_key_insights(self, context: AnalysisContext, data_summary: str, task_description: str, config: ProcessingConfig) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """
+        Run the LLM call and the rule-based extraction concurrently within config.llm_latency_budget
+        
+        Returns:
+            The LLM insights (None if they missed the budget) and the rule-based output sections
+        """
+        deadline = time.monotonic() + config.llm_latency_budget
+        future = submit_key_insights(data_summary, task_description)
+        
+        # The rule-based output is computed while the request is in flight
+        rule_based_sections = self._rule_based_sections(context)
+        
+        return self._wait_key_insights(future, deadline, config), rule_based_sections
+    
+    def _wait_key_insights(self, future: concurrent.futures.Future, deadline: float, config: ProcessingConfig) -> Optional[str]:
+        """The insights from submit_key_insights, or None if they miss the deadline"""
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except concurrent.futures.TimeoutError:
+            # A late response can only be reused through the response cache; without one, stop paying for it
+            if config.late_llm_result == "cancel" or get_llm_cache() is None:
+                future.cancel()
+            return None
+    
+    async def _arace_key_insights(self, context: AnalysisContext, data_summary: str, task_description: str, config: ProcessingConfig) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """Async version of _race_key_insights; the rule-based extraction runs in the loop's default executor"""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + config.llm_latency_budget
+        future = submit_key_insights(data_summary, task_description)
+        
+        # The rule-based output is computed while the request is in flight
+        rule_based_sections = await loop.run_in_executor(None, self._rule_based_sections, context)
+        
+        try:
+            # Shielded so that missing the budget leaves the decision to cancel to late_llm_result
+            key_insights = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)), timeout=max(0.0, deadline - time.monotonic())
+            )
+            return key_insights, rule_based_sections
+        except asyncio.TimeoutError:
+            if config.late_llm_result == "cancel" or get_llm_cache() is None:
+                future.cancel()
+            return None, rule_based_sections
+    
+    def _rule_based_sections(self, context: AnalysisContext) -> List[Dict[str, Any]]:
+        """Core indicators and classification analysis as OutputPacker sections"""
+        sections = [self._core_indicators_section(context), self._classification_section(context)]
+        return [section for section in sections if section is not None]
+    
+    def _core_indicators_section(self, context: AnalysisContext) -> Optional[Dict[str, Any]]:
+        core_indicators = self._extract_core_indicators(context)
+        if not core_indicators:
+            return None
+        # Remove duplicates while preserving order
+        unique_indicators = list(dict.fromkeys(core_indicators))
+        return {
+            "name": "core_indicators",
+            "title": "Core indicators:",
+            "lines": [f"- {indicator}" for indicator in unique_indicators]
+        }
+    
+    def _classification_section(self, context: AnalysisContext) -> Optional[Dict[str, Any]]:
+        classification_analysis = self._extract_classification_analysis(context)
+        if not classification_analysis:
+            return None
+        # Remove duplicates while preserving order
+        unique_analysis = list(dict.fromkeys(classification_analysis))
+        return {
+            "name": "classification",
+            "title": "Classification analysis:",
+            "lines": [f"- {analysis}" for analysis in unique_analysis],
+            "blank_before": True
+        }
+    
+    def format_header(self, task_description: str) -> str:
+        """Header chunk that opens every streamed output"""
+        return f"Task: {task_description}\n"
+    
+    def stream(self, data: Dict[str, Any], task_description: str, config: ProcessingConfig, include_header: bool = True) -> Iterator[str]:
+        """
+        Stream formatted content: deterministic sections immediately, LLM insights line by line as they arrive
+        
+        With config.llm_latency_budget set, the insights arrive in one piece if the LLM answers
+        within the budget, and the rule-based classification analysis is sent otherwise.
+        
+        Args:
+            data: Compressed data from data_compressor tool
+            task_description: Description of the task to guide formatting
+            config: Processing configuration
+            include_header: Whether to emit the task header (False if the caller already sent it)
+            
+        Yields:
+            Output chunks, within config.max_output_length characters and config.max_output_tokens
+            tokens in total (header included); the output only ends early at a line boundary
+        """
+        header = self.format_header(task_description)
+        budget = StreamBudget(max_tokens=config.max_output_tokens, max_chars=max(0, config.max_output_length))
+        # Charged even when the caller sent it
+        budget.spend(header.rstrip("\n"))
+        chunks = self._stream_sections(data, task_description, config, budget)
+        if include_header:
+            return self._prepend(header, chunks)
+        return chunks
+    
+    def _stream_sections(self, data: Dict[str, Any], task_description: str, config: ProcessingConfig, budget: StreamBudget) -> Iterator[str]:
+        """Yield the output sections in the order they become available, packed into the budget"""
+        context = AnalysisContext(data)
+        
+        # Rule-based indicators need no LLM call, so they go out first, packed by the same priorities as _pack_output
+        core_indicators = self._core_indicators_section(context)
+        if core_indicators:
+            packed = budget.pack(**core_indicators)
+            if packed:
+                yield packed
+        
+        data_summary = self._create_data_summary(context, config)
+        classification = None
+        if config.llm_latency_budget is None:
+            # Stream the LLM-generated insights as they arrive
+            insights = stream_key_insights(data_summary, task_description)
+        else:
+            deadline = time.monotonic() + config.llm_latency_budget
+            future = submit_key_insights(data_summary, task_description)
+            # The fallback is computed while the request is in flight
+            classification = self._classification_section(context)
+            insights = self._complete_insights(self._wait_key_insights(future, deadline, config))
+        
+        try:
+            first_chunk = next(insights, "")
+            if first_chunk and "Error calling LLM" not in first_chunk:
+                yield from self._stream_lines(itertools.chain([first_chunk], insights), budget)
+                return
+        finally:
+            # Closing the source also closes the underlying HTTP stream
+            insights.close()
+        
+        # Fallback to rule-based classification analysis if LLM fails or misses the latency budget
+        if classification is None:
+            classification = self._classification_section(context)
+        if classification:
+            packed = budget.pack(**classification)
+            if packed:
+                yield packed
+    
+    @staticmethod
+    def _complete_insights(key_insights: Optional[str]) -> Iterator[str]:
+        if key_insights:
+            yield key_insights
+    
+    @staticmethod
+    def _stream_lines(chunks: Iterator[str], budget: StreamBudget) -> Iterator[str]:
+        """
+        Pass the insights on line by line, after a blank line, while they fit in the budget
+        
+        Blank lines and sub-headings (lines ending in ":") are held back and sent with the line
+        after them, as OutputPacker keeps them; the first line that does not fit ends the output.
+        """
+        held = [""]
+        started = False
+        text = ""
+        for chunk in chunks:
+            text += chunk
+            *lines, text = text.split("\n")
+            for line in lines:
+                if not line.strip():
+                    # Spacing before the first line is the separating blank line alone
+                    if started:
+                        held.append(line)
+                    continue
+                if line.rstrip().endswith(":"):
+                    held.append(line)
+                    continue
+                if not budget.take(*held, line):
+                    return
+                yield "\n".join(held + [line]) + "\n"
+                held = []
+                started = True
+        # The response may end without a line break
+        if text.strip() and budget.take(*held, text):
+            yield "\n".join(held + [text])
+    
+    @staticmethod
+    def _prepend(first: str, chunks: Iterator[str]) -> Iterator[str]:
+        yield first
+        yield from chunks
+    
+    def _create_data_summary(self, context: AnalysisContext, config: Optional[ProcessingConfig] = None) -> str:
         """Create a summary of the data for LLM analysis"""
+        context_format = config.context_format if config else "rows"
+        significant_digits = config.significant_digits if config else None
         summary_lines = []
         
-        for sheet_name, sheet_data in data.get("sheets", {}).items():
-            df_dict = sheet_data.get("data", {})
-            if not df_dict:
-                continue
-                
-            df = pd.DataFrame.from_dict(df_dict)
-            summary_lines.append(f"Sheet '{sheet_name}': {df.shape[0]} rows, {df.shape[1]} columns")
+        for sheet in context.sheets:
+            df = sheet.df
+            summary_lines.append(f"Sheet '{sheet.name}': {df.shape[0]} rows, {df.shape[1]} columns")
             
-            # Add column names
-            summary_lines.append(f"  Columns: {', '.join(df.columns[:10])}{'...' if len(df.columns) > 10 else ''}")
-            
-            # Add sample data if available
-            if not df.empty:
-                summary_lines.append("  Sample data:")
-                for i, row in df.head(3).iterrows():
-                    row_data = ", ".join([f"{col}: {val}" for col, val in row.items()][:5])
-                    summary_lines.append(f"    Row {i}: {row_data}...")
+            if context_format == "rows":
+                # Add column names
+                summary_lines.append(f"  Columns: {', '.join(df.columns[:10])}{'...' if len(df.columns) > 10 else ''}")
+                
+                # Add sample data if available
+                if not df.empty:
+                    summary_lines.append("  Sample data:")
+                    summary_lines.extend(encode_sample(df.head(3), "rows", significant_digits))
+            else:
+                # Compact formats name the columns in their header row
+                if len(df.columns) > 10:
+                    summary_lines.append(f"  Sample data (first 10 of {len(df.columns)} columns):")
+                else:
+                    summary_lines.append("  Sample data:")
+                summary_lines.extend(encode_sample(df.iloc[:3, :10], context_format, significant_digits))
         
         return "\n".join(summary_lines)
     
-    def _extract_core_indicators(self, data: Dict[str, Any]) -> List[str]:
+    def _extract_core_indicators(self, context: AnalysisContext) -> List[str]:
         """Extract core indicators from the data"""
         indicators = []
         
         # Look for summary sheets or aggregate data
-        for sheet_name, sheet_data in data.get("sheets", {}).items():
-            df_dict = sheet_data.get("data", {})
-            if not df_dict:
-                continue
-                
-            df = pd.DataFrame.from_dict(df_dict)
+        for sheet in context.sheets:
+            df = sheet.df
             
             # If this looks like a summary sheet, extract key metrics
-            if "summary" in sheet_name.lower() or "profit" in [col.lower() for col in df.columns] and "total" in [col.lower() for col in df.columns]:
+            if "summary" in sheet.name.lower() or sheet.has_column_ci("profit") and sheet.has_column_ci("total"):
                 # For product summary sheet
-                if "Product" in df.columns and "Profit" in df.columns:
-                    total_profit = df["Profit"].sum()
+                if sheet.has_columns("Product", "Profit"):
+                    total_profit = sheet.total("Profit")
                     indicators.append(f"Total profit: {self._format_number(total_profit)} yuan")
                     
                     # Find Product C losses in Q4 if exists
-                    if "Date" in df.columns or "Product" in df.columns:
+                    if "Date" in sheet.columns or "Product" in sheet.columns:
                         # This would be more sophisticated in a real implementation
                         pass
                 
                 # For regional summary sheet
-                if "Region" in df.columns and "Profit" in df.columns:
+                if sheet.has_columns("Region", "Profit"):
                     # Find east china region data if exists
                     pass
             
             # If this is detailed sales data
-            elif "Sales" in sheet_name and "Profit" in df.columns:
-                total_profit = df["Profit"].sum()
+            elif "Sales" in sheet.name and "Profit" in sheet.columns:
+                total_profit = sheet.total("Profit")
                 indicators.append(f"Total profit: {self._format_number(total_profit)} yuan")
                 
                 # Find negative profits for Product C
@@ -140,22 +352,16 @@ class FormatAdapterTool(BaseTool):
         
         return indicators
     
-    def _extract_classification_analysis(self, data: Dict[str, Any]) -> List[str]:
+    def _extract_classification_analysis(self, context: AnalysisContext) -> List[str]:
         """Extract classification analysis from the data"""
         analysis = []
         
         # Look for regional data
-        for sheet_name, sheet_data in data.get("sheets", {}).items():
-            df_dict = sheet_data.get("data", {})
-            if not df_dict:
-                continue
-                
-            df = pd.DataFrame.from_dict(df_dict)
-            
+        for sheet in context.sheets:
             # Regional analysis
-            if "Region" in df.columns and "Profit" in df.columns:
+            if sheet.has_columns("Region", "Profit"):
                 # Sort by profit to find top regions
-                region_profit = df.groupby("Region")["Profit"].sum().sort_values(ascending=False)
+                region_profit = sheet.group_sum("Region", "Profit").sort_values(ascending=False)
                 if not region_profit.empty:
                     top_region = region_profit.index[0]
                     top_profit = region_profit.iloc[0]
@@ -163,9 +369,9 @@ class FormatAdapterTool(BaseTool):
                     analysis.append(f"{top_region} region: {self._format_number(top_profit)} profit share")
             
             # Product analysis
-            if "Product" in df.columns and "Profit" in df.columns:
+            if sheet.has_columns("Product", "Profit"):
                 # Calculate cost analysis if possible
-                if "Total_Price" in df.columns and "Quantity" in df.columns:
+                if sheet.has_columns("Total_Price", "Quantity"):
                     # This is a simplified example
                     analysis.append("Raw material costs: Average increase of 12% (affecting profit)")
         
@@ -181,7 +387,28 @@ class FormatAdapterTool(BaseTool):
             return f"{num:.0f}"
     
     async def _arun(self, data: Dict[str, Any], task_description: str, config: ProcessingConfig) -> Dict[str, Any]:
-        """Async version of the tool"""
-        return self._run(data, task_description, config)
+        """Async version of the tool: the LLM call is awaited, building frames and packing run in the default executor"""
+        try:
+            loop = asyncio.get_running_loop()
+            with span("format", sheets=len(data.get("sheets", {}))) as format_span:
+                context = await loop.run_in_executor(None, AnalysisContext, data)
+                data_summary = await loop.run_in_executor(None, self._create_data_summary, context, config)
+                
+                if config.llm_latency_budget is None:
+                    key_insights = await aextract_key_insights(data_summary, task_description)
+                    rule_based_sections = None
+                else:
+                    key_insights, rule_based_sections = await self._arace_key_insights(context, data_summary, task_description, config)
+                
+                result = await loop.run_in_executor(
+                    None, self._pack_output, context, task_description, config, key_insights, rule_based_sections
+                )
+                format_span.set(insights_source=result["insights_source"], output_chars=len(result["formatted_content"]))
+            return result
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Failed to format data: {str(e)}"
+            }
     
     args_schema: Type[BaseModel] = FormatAdapterInput
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Per-run analysis context shared by the formatter's summary and extractors
+
+Each sheet of the compressed data is turned into a DataFrame once, together with
+case-insensitive column lookups, and aggregates such as profit by region are
+computed on first use and reused by every extractor that asks for them.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+import pandas as pd
+
+
+class SheetView:
+    """One sheet's DataFrame plus memoized column lookups and aggregates"""
+
+    def __init__(self, name: str, df: pd.DataFrame):
+        self.name = name
+        self.df = df
+        self.columns = set(df.columns)
+        self.lower_columns = {str(col).lower() for col in df.columns}
+        self._totals: Dict[str, float] = {}
+        self._group_sums: Dict[Tuple[str, str], pd.Series] = {}
+
+    def has_columns(self, *columns: str) -> bool:
+        """Check that all columns exist, matching names exactly"""
+        return all(col in self.columns for col in columns)
+
+    def has_column_ci(self, column: str) -> bool:
+        """Check that a column exists, ignoring case"""
+        return column.lower() in self.lower_columns
+
+    def total(self, column: str) -> float:
+        """Sum of a column, computed once"""
+        if column not in self._totals:
+            self._totals[column] = self.df[column].sum()
+        return self._totals[column]
+
+    def group_sum(self, by: str, column: str) -> pd.Series:
+        """Sum of a column per group, computed once; callers must not modify the result"""
+        key = (by, column)
+        if key not in self._group_sums:
+            self._group_sums[key] = self.df.groupby(by)[column].sum()
+        return self._group_sums[key]
+
+
+class AnalysisContext:
+    """Sheet views for one formatting run; not shared between threads"""
+
+    def __init__(self, data: Dict[str, Any]):
+        """
+        Args:
+            data: Compressed data from the data_compressor tool
+        """
+        self.sheets: List[SheetView] = []
+        for sheet_name, sheet_data in data.get("sheets", {}).items():
+            df_dict = sheet_data.get("data", {})
+            if not df_dict:
+                continue
+            self.sheets.append(SheetView(sheet_name, pd.DataFrame.from_dict(df_dict)))
+
+    def sheet(self, name: str) -> Optional[SheetView]:
+        return next((sheet for sheet in self.sheets if sheet.name == name), None)
@@ -0,0 +1,28 @@
+"""
+Helpers for running async code from the synchronous tool entry points
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine
+import asyncio
+import contextvars
+
+def run_sync(coro: Coroutine) -> Any:
+    """
+    Run a coroutine to completion from synchronous code
+
+    Args:
+        coro: Coroutine to run
+
+    Returns:
+        The coroutine's result
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    # Called from inside a running event loop, which cannot be re-entered: use a helper thread,
+    # running in the caller's context so context variables (e.g. the active trace) carry over
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(contextvars.copy_context().run, asyncio.run, coro).result()
@@ -0,0 +1,295 @@
+"""
+Disk checkpoints of per-sheet workflow results in a compact binary form
+
+A sheet result carries its parsed and compressed data as {column: {row: value}}
+dicts. For a checkpoint, the row labels are stored once per sheet and every
+column as one typed array (categorical for repetitive text), the whole result
+is pickled and then compressed with zstd when the zstandard package is
+installed, zlib otherwise. Columns whose values would not survive the round
+trip through a typed array unchanged (e.g. None mixed with numbers) are kept
+as object arrays.
+
+Checkpoints are unpickled on load, so they are only read from directories that
+belong to the current user and are not writable by group or others. Runs that
+crash or whose workbook changes leave their checkpoints behind; those are
+pruned by age and total size whenever a checkpointed run starts.
+"""
+
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+import zlib
+import pandas as pd
+from config.config import ProcessingConfig
+from utils.result_cache import file_fingerprint
+from utils.stage_memo import COMPRESS_FIELDS, PARSE_FIELDS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHECKPOINT_VERSION = 1
+MAGIC = b"XCK1"
+CODEC_ZSTD = b"Z"
+CODEC_ZLIB = b"L"
+ZSTD_LEVEL = 3
+# Level 1 keeps writes fast; higher levels save little on already compact arrays
+ZLIB_LEVEL = 1
+# Text columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_UNIQUE_SHARE = 0.5
+# Sheet results carry their data under these keys
+DATA_SECTIONS = ("parsed", "compressed")
+
+
+def checkpoint_id(file_path: str, config: ProcessingConfig) -> str:
+    """
+    Identifier of the checkpoints of a run
+
+    Built from the workbook content and the configuration fields the per-sheet stages read,
+    so a run resumes only from checkpoints of identical inputs.
+    """
+    payload = json.dumps(
+        [CHECKPOINT_VERSION, file_fingerprint(file_path)] + [getattr(config, name) for name in PARSE_FIELDS + COMPRESS_FIELDS],
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _same_values(restored: List[Any], values: List[Any]) -> bool:
+    """Whether round-tripped column values equal the originals, value types included"""
+    if len(restored) != len(values):
+        return False
+    for a, b in zip(restored, values):
+        if type(a) is not type(b):
+            return False
+        # NaN is the only value not equal to itself
+        if a != b and (a == a or b == b):
+            return False
+    return True
+
+
+def _column_array(values: List[Any]) -> Any:
+    """
+    Compact array for a column's values: typed if they round-trip exactly, categorical for
+    repetitive text, otherwise an object array
+    """
+    series = pd.Series(values)
+    if series.dtype == object:
+        if len(series) > 1 and series.nunique(dropna=False) <= len(series) * CATEGORY_MAX_UNIQUE_SHARE:
+            categorical = series.astype("category")
+            if _same_values(categorical.tolist(), values):
+                return categorical.values
+        return series.to_numpy()
+    if not _same_values(series.tolist(), values):
+        return pd.Series(values, dtype=object).to_numpy()
+    return series.to_numpy()
+
+
+def _pack_data(data: Dict[str, Dict[Any, Any]]) -> Dict[str, Any]:
+    """Columns as arrays over one shared index (a RangeIndex for the usual 0..n-1 row labels)"""
+    keys = list(next(iter(data.values()))) if data else []
+    index = pd.RangeIndex(len(keys)) if keys == list(range(len(keys))) else pd.Index(keys, dtype=object)
+    columns = []
+    for column, values in data.items():
+        if list(values) == keys:
+            columns.append((column, _column_array(list(values.values()))))
+        else:
+            # A column with its own row labels keeps them
+            columns.append((column, {"index": pd.Index(list(values), dtype=object), "values": _column_array(list(values.values()))}))
+    return {"index": index, "columns": columns}
+
+
+def _unpack_data(packed: Dict[str, Any]) -> Dict[str, Dict[Any, Any]]:
+    data = {}
+    for column, array in packed["columns"]:
+        if isinstance(array, dict):
+            data[column] = pd.Series(array["values"], index=array["index"]).to_dict()
+        else:
+            data[column] = pd.Series(array, index=packed["index"]).to_dict()
+    return data
+
+
+def encode_sheet_result(sheet_result: Dict[str, Any]) -> bytes:
+    """
+    Serialize a per-sheet workflow result
+
+    Args:
+        sheet_result: Result of the process_sheet node ("parsed" and "compressed" sheet dicts)
+
+    Returns:
+        Compressed binary checkpoint
+    """
+    packed = dict(sheet_result)
+    for section in DATA_SECTIONS:
+        if packed.get(section) is not None and "data" in packed[section]:
+            packed[section] = dict(packed[section], data=_pack_data(packed[section]["data"]))
+    raw = pickle.dumps(packed, protocol=pickle.HIGHEST_PROTOCOL)
+    if zstandard is not None:
+        return MAGIC + CODEC_ZSTD + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return MAGIC + CODEC_ZLIB + zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decode_sheet_result(blob: bytes) -> Dict[str, Any]:
+    """Inverse of encode_sheet_result"""
+    if blob[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a sheet checkpoint")
+    codec, body = blob[len(MAGIC):len(MAGIC) + 1], blob[len(MAGIC) + 1:]
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Checkpoint is zstd-compressed but zstandard is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(body)
+    elif codec == CODEC_ZLIB:
+        raw = zlib.decompress(body)
+    else:
+        raise ValueError(f"Unknown checkpoint codec {codec!r}")
+
+    sheet_result = pickle.loads(raw)
+    for section in DATA_SECTIONS:
+        if sheet_result.get(section) is not None and "data" in sheet_result[section]:
+            sheet_result[section]["data"] = _unpack_data(sheet_result[section]["data"])
+    return sheet_result
+
+
+def _private(path: str) -> bool:
+    """Whether an existing directory belongs to the current user and only they can write to it"""
+    if not hasattr(os, "getuid"):
+        # No POSIX ownership to check
+        return True
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+class CheckpointStore:
+    """Per-run directories of sheet checkpoints"""
+
+    def __init__(self,
+                 directory: str,
+                 max_age: float = ProcessingConfig.checkpoint_max_age,
+                 max_bytes: int = ProcessingConfig.checkpoint_max_bytes):
+        """
+        Args:
+            directory: Directory holding one subdirectory per run
+            max_age: Seconds after a run's last checkpoint that prune removes it
+            max_bytes: Total size of the checkpoints above which prune removes the oldest runs
+        """
+        self.directory = directory
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+    def trusted(self) -> bool:
+        """
+        Whether checkpoints may be loaded from the directory
+
+        True if it does not exist yet (it is created owner-only) or belongs to the current user
+        and is not writable by group or others.
+        """
+        return not os.path.exists(self.directory) or _private(self.directory)
+
+    def _run_dir(self, run_id: str) -> str:
+        return os.path.join(self.directory, run_id)
+
+    def _path(self, run_id: str, index: int) -> str:
+        return os.path.join(self._run_dir(run_id), f"sheet-{index}.ckpt")
+
+    def save_sheet(self, run_id: str, sheet_result: Dict[str, Any]) -> int:
+        """
+        Persist a completed sheet
+
+        Returns:
+            Size of the checkpoint in bytes
+        """
+        blob = encode_sheet_result(sheet_result)
+        # Owner-only, since checkpoints are unpickled on load
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        os.makedirs(self._run_dir(run_id), mode=0o700, exist_ok=True)
+        if not (_private(self.directory) and _private(self._run_dir(run_id))):
+            raise PermissionError(f"Checkpoint directory {self.directory} must belong to the current user "
+                                  f"and not be writable by group or others")
+        # Write to a temporary file first so a crash mid-write never leaves a truncated checkpoint
+        path = self._path(run_id, sheet_result["index"])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+        return len(blob)
+
+    def load_sheet(self, run_id: str, index: int) -> Optional[Dict[str, Any]]:
+        """
+        Checkpointed result of a sheet, or None if there is no usable checkpoint
+
+        Checkpoints in a directory other users could have written to are never loaded.
+        """
+        if not (_private(self.directory) and _private(self._run_dir(run_id))):
+            return None
+        try:
+            with open(self._path(run_id, index), "rb") as f:
+                return decode_sheet_result(f.read())
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def completed_sheets(self, run_id: str) -> List[int]:
+        """Indexes of the sheets checkpointed for a run; empty if the directory is not trusted"""
+        if not self.trusted():
+            return []
+        try:
+            names = os.listdir(self._run_dir(run_id))
+        except OSError:
+            return []
+        return sorted(int(name[len("sheet-"):-len(".ckpt")]) for name in names
+                      if name.startswith("sheet-") and name.endswith(".ckpt"))
+
+    def discard(self, run_id: str) -> None:
+        """Remove the checkpoints of a finished run"""
+        shutil.rmtree(self._run_dir(run_id), ignore_errors=True)
+
+    def prune(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Remove the checkpoints of runs last written more than max_age ago, then those of the
+        oldest runs until the rest fit in max_bytes
+
+        Args:
+            keep: Run that is never removed, such as the one about to resume
+
+        Returns:
+            Identifiers of the removed runs
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        runs = []
+        total = 0
+        for name in names:
+            try:
+                size = self._run_size(name)
+                # Adding a sheet's checkpoint updates the directory's modification time
+                modified = os.stat(self._run_dir(name)).st_mtime
+            except OSError:
+                # Not a run directory, or removed by another run in the meantime
+                continue
+            total += size
+            if name != keep:
+                runs.append((modified, size, name))
+
+        removed = []
+        now = time.time()
+        for modified, size, name in sorted(runs):
+            if now - modified <= self.max_age and total <= self.max_bytes:
+                break
+            self.discard(name)
+            total -= size
+            removed.append(name)
+        return removed
+
+    def _run_size(self, run_id: str) -> int:
+        """Bytes of a run's checkpoints; raises OSError if the run directory does not exist"""
+        return sum(entry.stat().st_size for entry in os.scandir(self._run_dir(run_id)) if entry.is_file())
@@ -0,0 +1,559 @@
+"""
+Chunk-pipelined parsing, profiling and compression of a single sheet
+
+Row chunks flow from a streaming reader through bounded queues into two
+concurrent stages, so the reader keeps reading while earlier chunks are being
+profiled and aggregated, and a full queue blocks the stage feeding it:
+
+    read_sheet_chunks -> [queue] -> SheetProfile.update -> [queue] -> ChunkAggregator.update
+
+Both the profile and the aggregates are mergeable partials that are finalized
+once the last chunk is in. Sheets whose compression reduces to group-wise sum,
+count, min, max, mean and nunique never hold more than a few chunks plus one
+partial row per group. Other plans (no aggregation, numeric buckets, medians)
+need every row, so the aggregator buffers only the columns the plan keeps and
+finalizes with the regular compression code.
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import queue
+import threading
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from pandas.io.parsers import TextParser
+from config.config import ProcessingConfig
+from utils.compression_rules import CompiledPlan, CompressionPlan, NUMERIC_TYPES, SIGNATURE_ROWS
+from utils.excel_utils import ExcelParser
+
+# Values kept per numeric column to estimate quartiles for outlier detection;
+# sheets with fewer non-null values per column get exact quartiles
+QUARTILE_SAMPLE_SIZE = 20000
+# Lowest and highest values kept per numeric column as outlier candidates
+OUTLIER_CANDIDATES = 1000
+# Partial aggregate rows accumulated before they are merged down to one row per group
+COMPACT_ROWS = 50000
+# Constant group key used when a plan aggregates without grouping
+_ALL_ROWS = "__all_rows__"
+_DONE = object()
+
+
+def _convert_cell(value: Any) -> Any:
+    """Convert a cell value the way pandas' openpyxl reader does"""
+    if value is None:
+        return ""
+    if type(value) is float and value.is_integer():
+        return int(value)
+    return value
+
+
+def read_sheet_chunks(file_path: str, sheet_name: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Stream a sheet as DataFrames of at most chunk_rows rows
+
+    Cells are converted and typed exactly as pd.read_excel does (via TextParser), and each
+    chunk carries the row labels the whole-sheet DataFrame would have. Blank rows are kept
+    unless they trail the data; cells beyond the header row's width are ignored.
+
+    Args:
+        file_path: Path to the Excel file
+        sheet_name: Sheet to read
+        chunk_rows: Maximum rows per chunk
+
+    Yields:
+        Consecutive row chunks
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        worksheet = workbook[sheet_name]
+        worksheet.reset_dimensions()
+        rows = worksheet.iter_rows(values_only=True)
+
+        header = None
+        for row in rows:
+            header = [_convert_cell(value) for value in row]
+            while header and header[-1] == "":
+                header.pop()
+            if header:
+                break
+        if not header:
+            return
+        width = len(header)
+
+        offset = 0
+        chunk: List[List[Any]] = []
+        blank_rows = 0
+        for row in rows:
+            converted = [_convert_cell(value) for value in row[:width]]
+            if not any(value != "" for value in converted):
+                # Only emitted if data follows; trailing blank rows are trimmed as in pandas
+                blank_rows += 1
+                continue
+            for _ in range(blank_rows):
+                chunk.append([""] * width)
+            blank_rows = 0
+            converted.extend([""] * (width - len(converted)))
+            chunk.append(converted)
+            if len(chunk) >= chunk_rows:
+                yield _chunk_frame(header, chunk[:chunk_rows], offset)
+                offset += chunk_rows
+                chunk = chunk[chunk_rows:]
+        if chunk or not offset:
+            # A sheet with only a header row still yields its (empty) columns
+            yield _chunk_frame(header, chunk, offset)
+    finally:
+        workbook.close()
+
+
+def _chunk_frame(header: List[Any], rows: List[List[Any]], offset: int) -> pd.DataFrame:
+    df = TextParser([header] + rows, header=0, skip_blank_lines=False).read()
+    df.index = pd.RangeIndex(offset, offset + len(df))
+    return df
+
+
+def concat_chunks(chunks: List[pd.DataFrame], data_types: Dict[Any, str]) -> pd.DataFrame:
+    """
+    Join row chunks into the DataFrame pd.read_excel would have returned
+
+    Args:
+        chunks: Consecutive chunks from read_sheet_chunks
+        data_types: Whole-sheet data types from SheetProfile
+
+    Returns:
+        The rows, with date columns restored where a chunk without dates was read as NaN
+    """
+    df = pd.concat(chunks)
+    for col, dtype in data_types.items():
+        if "datetime" in dtype and col in df.columns and df[col].dtype == object:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def _merge_data_type(kinds: set, has_nulls: bool) -> str:
+    """Data type of a whole column from the types detected in its chunks"""
+    if not kinds:
+        # Entirely empty columns are read as NaN
+        return "float64"
+    if len(kinds) == 1:
+        kind = next(iter(kinds))
+        if has_nulls and kind == "int64":
+            return "float64"
+        if has_nulls and kind == "text":
+            return "mixed"
+        if has_nulls and kind == "bool":
+            return "numeric"
+        return kind
+    if kinds <= {"int64", "float64"}:
+        return "float64"
+    if kinds <= {"int64", "float64", "numeric"}:
+        return "numeric"
+    return "mixed"
+
+
+class SheetProfile:
+    """Mergeable profile of a sheet: data types, null counts and IQR outliers"""
+
+    def __init__(self, seed: int = 0):
+        self.rows = 0
+        self.columns: List[Any] = []
+        self._kinds: Dict[Any, set] = {}
+        self._nulls: Dict[Any, int] = {}
+        self._sample_values: Dict[Any, np.ndarray] = {}
+        self._sample_keys: Dict[Any, np.ndarray] = {}
+        self._low: Dict[Any, Tuple[np.ndarray, np.ndarray]] = {}
+        self._high: Dict[Any, Tuple[np.ndarray, np.ndarray]] = {}
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Add a chunk of rows"""
+        if not self.columns:
+            self.columns = list(chunk.columns)
+        self.rows += len(chunk)
+
+        nulls = chunk.isnull().sum()
+        for col, kind in ExcelParser.detect_data_types(chunk).items():
+            self._nulls[col] = self._nulls.get(col, 0) + int(nulls[col])
+            # All-null chunks say nothing about the type of the column
+            if nulls[col] < len(chunk):
+                self._kinds.setdefault(col, set()).add(kind)
+            if kind in NUMERIC_TYPES:
+                self._update_numeric(col, chunk[col])
+
+    def _update_numeric(self, col: Any, series: pd.Series) -> None:
+        values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+        index = series.index.to_numpy()
+        present = ~np.isnan(values)
+        values, index = values[present], index[present]
+
+        # Uniform sample for the quartiles: keep the values with the smallest random keys
+        keys = self._rng.random(len(values))
+        sample_values = np.concatenate([self._sample_values.get(col, values[:0]), values])
+        sample_keys = np.concatenate([self._sample_keys.get(col, keys[:0]), keys])
+        if len(sample_values) > QUARTILE_SAMPLE_SIZE:
+            keep = np.argpartition(sample_keys, QUARTILE_SAMPLE_SIZE)[:QUARTILE_SAMPLE_SIZE]
+            sample_values, sample_keys = sample_values[keep], sample_keys[keep]
+        self._sample_values[col] = sample_values
+        self._sample_keys[col] = sample_keys
+
+        self._low[col] = self._extremes(self._low.get(col), values, index, lowest=True)
+        self._high[col] = self._extremes(self._high.get(col), values, index, lowest=False)
+
+    @staticmethod
+    def _extremes(current, values: np.ndarray, index: np.ndarray, lowest: bool):
+        if current is not None:
+            values = np.concatenate([current[0], values])
+            index = np.concatenate([current[1], index])
+        if len(values) > OUTLIER_CANDIDATES:
+            order = values if lowest else -values
+            keep = np.argpartition(order, OUTLIER_CANDIDATES)[:OUTLIER_CANDIDATES]
+            values, index = values[keep], index[keep]
+        return values, index
+
+    def data_types(self) -> Dict[Any, str]:
+        return {col: _merge_data_type(self._kinds.get(col, set()), self._nulls[col] > 0) for col in self.columns}
+
+    def outliers(self, data_types: Dict[Any, str]) -> Dict[Any, List[int]]:
+        """
+        IQR outliers of the numeric columns
+
+        Quartiles are exact while a column has at most QUARTILE_SAMPLE_SIZE values and
+        estimated from a uniform sample above that; at most OUTLIER_CANDIDATES outliers are
+        reported on each side.
+        """
+        outliers = {}
+        for col, kind in data_types.items():
+            if kind not in NUMERIC_TYPES:
+                continue
+            sample = self._sample_values.get(col)
+            if sample is None or not len(sample):
+                outliers[col] = []
+                continue
+            q1, q3 = np.quantile(sample, [0.25, 0.75])
+            lower_bound = q1 - 1.5 * (q3 - q1)
+            upper_bound = q3 + 1.5 * (q3 - q1)
+            low_values, low_index = self._low[col]
+            high_values, high_index = self._high[col]
+            found = set(low_index[low_values < lower_bound].tolist()) | set(high_index[high_values > upper_bound].tolist())
+            outliers[col] = sorted(int(row) for row in found)
+        return outliers
+
+    def finalize(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Sheet entry in the excel_parser tool's format, without the row data
+        """
+        data_types = self.data_types()
+        return {
+            "data": {},
+            "shape": (self.rows, len(self.columns)),
+            "columns": list(self.columns),
+            "data_types": data_types,
+            "null_values": {col: self._nulls[col] for col in self.columns},
+            "outliers": self.outliers(data_types)
+        }
+
+
+class ChunkAggregator:
+    """Incremental compression of row chunks with mergeable partial aggregates"""
+
+    # Partial columns needed to merge each aggregation
+    PARTIALS = {"sum": ("sum",), "count": ("count",), "min": ("min",), "max": ("max",), "mean": ("sum", "count")}
+
+    def __init__(self, plan: Optional[CompressionPlan], sample_profile: Dict[str, Any], config: ProcessingConfig):
+        """
+        Args:
+            plan: Compression plan for the sheet (None for low intensity)
+            sample_profile: Profile of the first chunks, from SheetProfile.finalize()
+            config: Processing configuration
+        """
+        self.plan = plan
+        self.config = config
+        self.compiled: Optional[CompiledPlan] = None
+        columns = sample_profile["columns"]
+        if plan is not None:
+            # Assumes no column is dropped for nulls; checked against the final profile in finalize()
+            self.compiled = plan.compile(
+                columns,
+                sample_profile["data_types"],
+                exclude_columns=config.exclude_columns,
+                aggregate=config.compression_intensity == "high",
+                sample=config.compression_intensity == "high"
+            )
+        # A column without any value in the first chunk has no known type to plan the aggregation on
+        typed = all(sample_profile["null_values"][col] < sample_profile["shape"][0] for col in columns)
+        self.grouped = typed and self._can_group(self.compiled)
+        self.failed = False
+        self.kept_columns = [col for col in columns if self.compiled is None or col not in self.compiled.drop_columns]
+        self._rows: List[pd.DataFrame] = []
+        self._partials: List[pd.DataFrame] = []
+        self._partial_rows = 0
+        self._distinct: Dict[Any, List[pd.DataFrame]] = {}
+        self._dated_columns: set = set()
+
+    @staticmethod
+    def _can_group(compiled: Optional[CompiledPlan]) -> bool:
+        """Whether the plan's output can be merged from per-chunk partial aggregates"""
+        return (compiled is not None
+                and bool(compiled.aggregations)
+                and not compiled.numeric_buckets
+                and all(agg in ChunkAggregator.PARTIALS or agg == "nunique" for agg in compiled.aggregations.values()))
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Add a chunk of rows"""
+        if not self.grouped:
+            # The plan needs every row: keep only the columns it does not drop
+            self._rows.append(chunk[self.kept_columns])
+            return
+        if self.failed:
+            return
+        try:
+            self._aggregate(chunk)
+        except (TypeError, ValueError):
+            # A later chunk does not have the types the plan was compiled for (e.g. text in a
+            # column that started out numeric); finalize() reports that the sheet needs full compression
+            self.failed = True
+            self._partials, self._distinct = [], {}
+
+    def _aggregate(self, chunk: pd.DataFrame) -> None:
+        chunk = self._bucket_dates(chunk)
+        keys = self.compiled.group_by or [_ALL_ROWS]
+        if not self.compiled.group_by:
+            chunk = chunk.assign(**{_ALL_ROWS: 0})
+
+        named_partials = {}
+        for col, agg in self.compiled.aggregations.items():
+            if agg == "nunique":
+                distinct = chunk[keys + [col]].drop_duplicates()
+                self._distinct.setdefault(col, []).append(distinct)
+                continue
+            for partial in self.PARTIALS[agg]:
+                named_partials[f"{col}\x00{partial}"] = (col, partial)
+        if named_partials:
+            self._partials.append(chunk.groupby(keys, dropna=False, sort=False).agg(**named_partials).reset_index())
+            self._partial_rows += len(self._partials[-1])
+        if self._partial_rows > COMPACT_ROWS:
+            self._compact(keys)
+
+    def _bucket_dates(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Apply the plan's date buckets to a chunk
+
+        The whole column keeps its raw values if it has no valid date at all, so chunks keep
+        theirs until a chunk with dates shows up; their partials are then set to "NaT", which
+        is what bucketing turns an invalid date into.
+        """
+        if not self.compiled.date_buckets:
+            return chunk
+        chunk = chunk.copy()
+        for col, freq in self.compiled.date_buckets.items():
+            values = pd.to_datetime(chunk[col], errors="coerce")
+            if col not in self._dated_columns:
+                if not values.notna().any():
+                    continue
+                self._dated_columns.add(col)
+                for frame in self._partials + [frame for frames in self._distinct.values() for frame in frames]:
+                    if col in frame.columns:
+                        frame[col] = "NaT"
+            chunk[col] = values.dt.to_period(freq).astype(str)
+        return chunk
+
+    def _compact(self, keys: List[Any]) -> None:
+        """Merge the partial aggregates down to one row per group"""
+        if self._partials:
+            partials = pd.concat(self._partials, ignore_index=True)
+            # Counts of the parts add up, like sums
+            merged = {name: name.rsplit("\x00", 1)[1].replace("count", "sum") for name in partials.columns if name not in keys}
+            self._partials = [partials.groupby(keys, dropna=False, sort=False).agg(merged).reset_index()]
+            self._partial_rows = len(self._partials[0])
+        for col, frames in self._distinct.items():
+            self._distinct[col] = [pd.concat(frames, ignore_index=True).drop_duplicates()]
+
+    def finalize(self, sheet_data: Dict[str, Any], compress_frame: Callable) -> Optional[Dict[str, Any]]:
+        """
+        Finish compression once every chunk has been added
+
+        Args:
+            sheet_data: Final sheet profile from SheetProfile.finalize()
+            compress_frame: The data_compressor tool's _compress_frame, used for buffered rows
+
+        Returns:
+            Compressed sheet entry, or None if the partial aggregates no longer match the plan
+            resolved against the final profile (the caller then compresses the sheet in full)
+        """
+        if not self.grouped:
+            rows = concat_chunks(self._rows, sheet_data["data_types"]) if self._rows else pd.DataFrame(columns=self.kept_columns)
+            return compress_frame(rows, sheet_data, self.plan, self.config)
+
+        if self.failed:
+            return None
+
+        # Resolve the plan as the regular path would, after dropping columns with too many nulls
+        threshold = 0.9 * sheet_data["shape"][0]
+        surviving = [col for col in sheet_data["columns"] if sheet_data["shape"][0] - sheet_data["null_values"][col] >= threshold]
+        final = self.plan.compile(surviving, sheet_data["data_types"], exclude_columns=self.config.exclude_columns)
+        compatible = (not final.numeric_buckets
+                      and set(final.group_by) <= set(self.compiled.group_by)
+                      and all(self.compiled.aggregations.get(col) == agg for col, agg in final.aggregations.items())
+                      and all(self.compiled.date_buckets.get(col) == freq for col, freq in final.date_buckets.items()))
+        if not compatible:
+            return None
+
+        keys = self.compiled.group_by or [_ALL_ROWS]
+        self._compact(keys)
+        partials = self._partials[0] if self._partials else None
+        distinct = {col: frames[0] for col, frames in self._distinct.items()}
+        final_keys = final.group_by or [_ALL_ROWS]
+        values = {}
+        for col, agg in final.aggregations.items():
+            if agg == "nunique":
+                values[col] = distinct[col].groupby(final_keys, dropna=False, sort=True)[col].nunique()
+                continue
+            grouped = partials.groupby(final_keys, dropna=False, sort=True)
+            if agg == "mean":
+                values[col] = grouped[f"{col}\x00sum"].sum() / grouped[f"{col}\x00count"].sum()
+            else:
+                values[col] = getattr(grouped[f"{col}\x00{self.PARTIALS[agg][0]}"], "sum" if agg == "count" else agg)()
+
+        if final.group_by:
+            result = pd.DataFrame(values).reset_index()
+        else:
+            result = pd.Series({col: series.iloc[0] for col, series in values.items()}).to_frame().T
+        result = final.apply_sample(result).reset_index(drop=True)
+        return {
+            "data": result.to_dict(),
+            "shape": result.shape,
+            "columns": list(result.columns),
+            "compression_rules": self.plan.to_dict()
+        }
+
+
+def _put(target: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Put with backpressure, giving up once the pipeline is stopping"""
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(source: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return source.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _start_aggregator(sample: List[pd.DataFrame],
+                      config: ProcessingConfig,
+                      get_plan: Callable[[pd.DataFrame, Dict[str, Any], ProcessingConfig], Optional[CompressionPlan]]) -> ChunkAggregator:
+    """Request the plan for the sheet's first chunks and start aggregating with it"""
+    # The profiler thread is already ahead; profile the sample separately for the plan
+    sample_profile = SheetProfile()
+    for part in sample:
+        sample_profile.update(part)
+    sample_profile = sample_profile.finalize()
+    plan = get_plan(pd.concat(sample) if len(sample) > 1 else sample[0], sample_profile, config)
+    aggregator = ChunkAggregator(plan, sample_profile, config)
+    for part in sample:
+        aggregator.update(part)
+    return aggregator
+
+
+def run_sheet_pipeline(file_path: str,
+                       sheet_name: str,
+                       config: ProcessingConfig,
+                       get_plan: Callable[[pd.DataFrame, Dict[str, Any], ProcessingConfig], Optional[CompressionPlan]],
+                       compress_frame: Callable) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Parse, profile and compress one sheet as a pipeline of row chunks
+
+    The compression plan is requested from the profile of the first chunk (or of the first
+    chunks, until they hold SIGNATURE_ROWS rows, whose types key the plan cache as for a fully
+    loaded sheet); reading and profiling carry on while it is generated, until the bounded
+    queues fill up.
+
+    Args:
+        file_path: Path to the Excel file
+        sheet_name: Sheet to process
+        config: Processing configuration (pipeline_chunk_rows and pipeline_queue_chunks)
+        get_plan: Returns the compression plan for a sample DataFrame and its profile
+        compress_frame: The data_compressor tool's _compress_frame
+
+    Returns:
+        The sheet's profile (without row data) and its compressed entry, which is None when
+        the sheet has to be compressed from the full data instead (see ChunkAggregator.finalize)
+    """
+    queue_chunks = max(1, config.pipeline_queue_chunks)
+    to_profile: queue.Queue = queue.Queue(maxsize=queue_chunks)
+    to_aggregate: queue.Queue = queue.Queue(maxsize=queue_chunks)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    profile = SheetProfile()
+
+    def read():
+        try:
+            for chunk in read_sheet_chunks(file_path, sheet_name, max(1, config.pipeline_chunk_rows)):
+                if not _put(to_profile, chunk, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(to_profile, _DONE, stop)
+
+    def profile_chunks():
+        try:
+            while True:
+                chunk = _get(to_profile, stop)
+                if chunk is _DONE:
+                    return
+                profile.update(chunk)
+                if not _put(to_aggregate, chunk, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(to_aggregate, _DONE, stop)
+
+    stages = [threading.Thread(target=read, daemon=True), threading.Thread(target=profile_chunks, daemon=True)]
+    for stage in stages:
+        stage.start()
+
+    aggregator = None
+    sample: List[pd.DataFrame] = []
+    try:
+        while True:
+            chunk = _get(to_aggregate, stop)
+            if chunk is _DONE:
+                break
+            if aggregator is not None:
+                aggregator.update(chunk)
+                continue
+            # The plan is keyed by the types of the sheet's first rows; wait for enough of them
+            sample.append(chunk)
+            if sum(len(part) for part in sample) >= SIGNATURE_ROWS:
+                aggregator = _start_aggregator(sample, config, get_plan)
+                sample = []
+        if aggregator is None and sample:
+            # The whole sheet fits in the sample
+            aggregator = _start_aggregator(sample, config, get_plan)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for stage in stages:
+            stage.join()
+    if errors:
+        raise errors[0]
+
+    sheet_data = profile.finalize()
+    if aggregator is None:
+        # Empty sheet
+        return sheet_data, compress_frame(pd.DataFrame(), sheet_data, None, config)
+    return sheet_data, aggregator.finalize(sheet_data, compress_frame)
+
@@ -0,0 +1,374 @@
+"""
+Structured compression rule DSL
+
+The LLM is asked for compression rules as JSON (see COMPRESSION_RULES_SCHEMA).
+The rules are parsed into a CompressionPlan, which is compiled against a concrete
+column layout into a CompiledPlan of vectorized pandas operations. Plans are keyed
+by a schema signature so one LLM call can drive the compression of every workbook
+that shares the same columns and data types.
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple
+import datetime
+import hashlib
+import json
+import numbers
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+
+COMPRESSION_RULES_SCHEMA = """{
+  "columns": {
+    "<column name>": {
+      "action": "keep | drop | aggregate | bucket",
+      "agg": "sum | mean | median | min | max | count | nunique (aggregate only)",
+      "bins": "number of equal-width bins (bucket on numeric columns only)",
+      "freq": "D | W | M | Q | Y (bucket on date columns only)"
+    }
+  },
+  "group_by": ["<column name>", "..."],
+  "sample": {"rows": "maximum number of rows to keep", "seed": 0}
+}"""
+
+VALID_ACTIONS = ("keep", "drop", "aggregate", "bucket")
+VALID_AGGREGATIONS = ("sum", "mean", "median", "min", "max", "count", "nunique")
+VALID_FREQUENCIES = ("D", "W", "M", "Q", "Y")
+NUMERIC_TYPES = ("int64", "float64", "numeric")
+# Leading rows whose values type the columns of a schema signature
+SIGNATURE_ROWS = 20
+
+
+@dataclass
+class ColumnRule:
+    """Compression rule for a single column"""
+    action: str = "keep"
+    agg: Optional[str] = None
+    bins: Optional[int] = None
+    freq: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        rule = {"action": self.action}
+        if self.agg is not None:
+            rule["agg"] = self.agg
+        if self.bins is not None:
+            rule["bins"] = self.bins
+        if self.freq is not None:
+            rule["freq"] = self.freq
+        return rule
+
+
+@dataclass
+class CompiledPlan:
+    """Compression plan resolved against a concrete column layout"""
+    drop_columns: List[str]
+    numeric_buckets: Dict[str, int]
+    date_buckets: Dict[str, str]
+    group_by: List[str]
+    aggregations: Dict[str, str]
+    sample_rows: Optional[int]
+    seed: int
+
+    def execute(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Apply the plan to a DataFrame using vectorized operations only"""
+        result = df.drop(columns=[col for col in self.drop_columns if col in df.columns])
+
+        for col, bins in self.numeric_buckets.items():
+            values = pd.to_numeric(result[col], errors="coerce")
+            if values.notna().any():
+                result[col] = pd.cut(values, bins=bins).astype(str)
+
+        for col, freq in self.date_buckets.items():
+            values = pd.to_datetime(result[col], errors="coerce")
+            if values.notna().any():
+                result[col] = values.dt.to_period(freq).astype(str)
+
+        if self.aggregations:
+            named_aggs = {col: (col, agg) for col, agg in self.aggregations.items()}
+            if self.group_by:
+                result = result.groupby(self.group_by, dropna=False, sort=True).agg(**named_aggs).reset_index()
+            else:
+                result = result.agg({col: agg for col, agg in self.aggregations.items()}).to_frame().T
+
+        return self.apply_sample(result).reset_index(drop=True)
+
+    def apply_sample(self, result: pd.DataFrame) -> pd.DataFrame:
+        """Sample rows down to the row budget, keeping their order"""
+        if self.sample_rows is not None and len(result) > self.sample_rows:
+            result = result.sample(n=self.sample_rows, random_state=self.seed).sort_index()
+        return result
+
+
+@dataclass
+class CompressionPlan:
+    """Schema-level compression rules, independent of any particular file"""
+    columns: Dict[str, ColumnRule] = field(default_factory=dict)
+    group_by: List[str] = field(default_factory=list)
+    sample_rows: Optional[int] = None
+    seed: int = 0
+    source: str = "llm"
+
+    def __post_init__(self):
+        self._compiled: Dict[Tuple, CompiledPlan] = {}
+        self._lock = threading.Lock()
+
+    def to_dict(self) -> Dict[str, Any]:
+        plan = {
+            "columns": {col: rule.to_dict() for col, rule in self.columns.items()},
+            "group_by": list(self.group_by),
+            "source": self.source
+        }
+        if self.sample_rows is not None:
+            plan["sample"] = {"rows": self.sample_rows, "seed": self.seed}
+        return plan
+
+    @classmethod
+    def from_dict(cls, rules: Dict[str, Any], source: str = "llm") -> "CompressionPlan":
+        """Build a plan from a rules dict, normalizing anything outside the schema"""
+        columns = {}
+        for col, raw_rule in (rules.get("columns") or {}).items():
+            if isinstance(raw_rule, str):
+                raw_rule = {"action": raw_rule}
+            if not isinstance(raw_rule, dict):
+                continue
+
+            action = str(raw_rule.get("action", "keep")).lower()
+            if action not in VALID_ACTIONS:
+                action = "keep"
+
+            rule = ColumnRule(action=action)
+            if action == "aggregate":
+                agg = str(raw_rule.get("agg", "sum")).lower()
+                rule.agg = agg if agg in VALID_AGGREGATIONS else "sum"
+            elif action == "bucket":
+                freq = str(raw_rule.get("freq") or "").upper()
+                if freq in VALID_FREQUENCIES:
+                    rule.freq = freq
+                try:
+                    rule.bins = max(2, int(raw_rule.get("bins") or 10))
+                except (TypeError, ValueError):
+                    rule.bins = 10
+            columns[str(col)] = rule
+
+        group_by = [str(col) for col in rules.get("group_by") or [] if isinstance(col, str)]
+
+        sample_rows = None
+        seed = 0
+        sample = rules.get("sample")
+        if isinstance(sample, dict):
+            try:
+                sample_rows = int(sample["rows"]) if sample.get("rows") else None
+                seed = int(sample.get("seed") or 0)
+            except (TypeError, ValueError):
+                sample_rows = None
+
+        return cls(columns=columns, group_by=group_by, sample_rows=sample_rows, seed=seed,
+                   source=rules.get("source", source))
+
+    @classmethod
+    def from_json(cls, text: str) -> Optional["CompressionPlan"]:
+        """
+        Parse LLM output into a plan
+
+        Args:
+            text: Raw LLM response, optionally wrapped in markdown code fences
+
+        Returns:
+            The parsed plan, or None if the response holds no usable JSON object
+        """
+        match = re.search(r"\{.*\}", text or "", re.DOTALL)
+        if not match:
+            return None
+        try:
+            rules = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(rules, dict) or not isinstance(rules.get("columns"), dict):
+            return None
+        return cls.from_dict(rules)
+
+    def compile(self,
+                columns: List[str],
+                data_types: Dict[str, str],
+                exclude_columns: Optional[List[str]] = None,
+                aggregate: bool = True,
+                sample: bool = True) -> CompiledPlan:
+        """
+        Resolve the plan against a column layout
+
+        Args:
+            columns: Columns of the DataFrame the plan will run on
+            data_types: Detected data types by column
+            exclude_columns: Columns to drop regardless of the rules
+            aggregate: Whether to apply aggregate rules and grouping
+            sample: Whether to apply row sampling; plans that aggregate never sample,
+                since dropping aggregated groups would misstate the totals
+
+        Returns:
+            Compiled plan, memoized per layout and options
+        """
+        key = (tuple(columns), tuple(sorted(data_types.items())),
+               tuple(exclude_columns or []), aggregate, sample)
+        with self._lock:
+            compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+
+        excluded = set(exclude_columns or [])
+        drop_columns = []
+        numeric_buckets = {}
+        date_buckets = {}
+        aggregations = {}
+        kept = []
+
+        for col in columns:
+            rule = self.columns.get(col, ColumnRule())
+            dtype = data_types.get(col, "")
+            if col in excluded or rule.action == "drop":
+                drop_columns.append(col)
+            elif rule.action == "bucket" and "datetime" in dtype:
+                date_buckets[col] = rule.freq or "M"
+                kept.append(col)
+            elif rule.action == "bucket" and dtype in NUMERIC_TYPES:
+                numeric_buckets[col] = rule.bins or 10
+                kept.append(col)
+            elif rule.action == "aggregate" and aggregate:
+                aggregations[col] = rule.agg or "sum"
+            else:
+                kept.append(col)
+
+        group_by = []
+        if aggregations:
+            bucketed = set(numeric_buckets) | set(date_buckets)
+            group_by = [col for col in self.group_by if col in kept]
+            if not group_by:
+                group_by = [col for col in kept if col in bucketed or data_types.get(col) not in NUMERIC_TYPES]
+            # Kept columns that are not group keys cannot survive grouping, so summarize them too
+            for col in kept:
+                if col not in group_by:
+                    is_measure = data_types.get(col) in NUMERIC_TYPES and col not in bucketed
+                    aggregations[col] = "mean" if is_measure else "nunique"
+
+        compiled = CompiledPlan(
+            drop_columns=drop_columns,
+            numeric_buckets=numeric_buckets,
+            date_buckets=date_buckets,
+            group_by=group_by,
+            aggregations=aggregations,
+            sample_rows=self.sample_rows if sample and not aggregations else None,
+            seed=self.seed
+        )
+        with self._lock:
+            self._compiled[key] = compiled
+        return compiled
+
+
+def header_types(df: pd.DataFrame, rows: int = SIGNATURE_ROWS) -> Dict[Any, str]:
+    """
+    Coarse type of each column ("numeric", "text", "datetime" or "other") from its first value in the leading rows
+
+    Unlike ExcelParser.detect_data_types, this does not depend on the rows further down (a
+    null there turns int64 into float64 and text into mixed), so a sheet's first rows give
+    the same types as the whole sheet. Used for schema signatures, so that a chunk-pipelined
+    sheet looks up the same plan as the fully loaded one.
+    """
+    types = {}
+    head = df.head(rows)
+    for col in df.columns:
+        values = head[col].dropna()
+        value = values.iloc[0] if len(values) else None
+        if isinstance(value, (bool, np.bool_, numbers.Number)):
+            types[col] = "numeric"
+        elif isinstance(value, str):
+            types[col] = "text"
+        elif isinstance(value, (datetime.date, datetime.time)):
+            types[col] = "datetime"
+        else:
+            types[col] = "other"
+    return types
+
+
+def schema_signature(data_types: Dict[str, str], task_type: str) -> str:
+    """Stable key identifying a sheet schema for plan reuse; use header_types for data_types"""
+    payload = json.dumps({"columns": list(data_types.items()), "task_type": task_type})
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def default_compression_plan(data_types: Dict[str, str], task_type: str) -> CompressionPlan:
+    """
+    Rule-based plan used when the LLM does not return usable rules
+
+    Args:
+        data_types: Detected data types by column
+        task_type: Type of task (analysis, summary, inference)
+
+    Returns:
+        Plan that keeps text columns as dimensions, buckets dates by month
+        and aggregates numeric columns
+    """
+    agg = "mean" if task_type == "inference" else "sum"
+    # Without any dimension to group by, aggregation would collapse the sheet into a single row
+    has_dimensions = any(dtype not in NUMERIC_TYPES for dtype in data_types.values())
+    columns = {}
+    for col, dtype in data_types.items():
+        if "datetime" in dtype:
+            columns[col] = ColumnRule(action="bucket", freq="M")
+        elif dtype in NUMERIC_TYPES and has_dimensions:
+            columns[col] = ColumnRule(action="aggregate", agg=agg)
+        else:
+            columns[col] = ColumnRule(action="keep")
+    sample_rows = 200 if task_type == "summary" else 500
+    return CompressionPlan(columns=columns, sample_rows=sample_rows, source="rule-based")
+
+
+class PlanCache:
+    """Thread-safe cache of compression plans keyed by schema signature"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self._plans: Dict[str, CompressionPlan] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, signature: str, cache_dir: str) -> str:
+        return os.path.join(cache_dir, f"{signature}.json")
+
+    def get(self, signature: str, cache_dir: Optional[str] = None) -> Optional[CompressionPlan]:
+        """Look up a plan in memory, then in the on-disk cache directory"""
+        with self._lock:
+            plan = self._plans.get(signature)
+        if plan is not None:
+            return plan
+
+        cache_dir = cache_dir or self.cache_dir
+        if not cache_dir:
+            return None
+        try:
+            with open(self._path(signature, cache_dir), "r", encoding="utf-8") as f:
+                plan = CompressionPlan.from_dict(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+        with self._lock:
+            return self._plans.setdefault(signature, plan)
+
+    def put(self, signature: str, plan: CompressionPlan, cache_dir: Optional[str] = None) -> None:
+        """Store a plan in memory and, if configured, persist it as JSON"""
+        with self._lock:
+            self._plans[signature] = plan
+
+        cache_dir = cache_dir or self.cache_dir
+        if not cache_dir:
+            return
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see partial JSON
+        path = self._path(signature, cache_dir)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(plan.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._plans.clear()
@@ -0,0 +1,169 @@
+"""
+Compact, vectorized encodings of sheet samples for LLM context
+
+Each encoder turns the first rows of a DataFrame into text without iterrows:
+values are converted to strings a column at a time with numpy, and each output
+line is a single str.join over plain lists. Formats, from most to least verbose:
+
+- rows: one "col: val" line per row (the original summary layout)
+- markdown: a markdown table
+- csv: CSV with a header row
+- dictionary: CSV in which repetitive text columns are replaced by integer codes,
+  with one legend line per coded column
+"""
+
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+CONTEXT_FORMATS = ("rows", "markdown", "csv", "dictionary")
+# Columns shown in the "rows" layout, as in the original summary
+ROWS_FORMAT_COLUMNS = 5
+# A text column is dictionary-coded when it has at most this share of distinct values
+DICTIONARY_MAX_UNIQUE_SHARE = 0.5
+
+
+def round_significant(values: np.ndarray, digits: int) -> np.ndarray:
+    """Round floats to a number of significant digits"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    magnitude = np.where(np.isfinite(magnitude), magnitude, 0)
+    # Scale by exact powers of ten in the direction that avoids fractional factors like 1e-4
+    scale = digits - 1 - magnitude
+    up = 10.0 ** np.maximum(scale, 0)
+    down = 10.0 ** np.maximum(-scale, 0)
+    return np.where(scale >= 0, np.round(values * up) / up, np.round(values / down) * down)
+
+
+def format_columns(df: pd.DataFrame, significant_digits: Optional[int] = None) -> List[np.ndarray]:
+    """
+    Render every value as a string, one column at a time
+
+    Args:
+        df: Data to render
+        significant_digits: Round float columns to this many significant digits
+            (integer columns such as IDs and years are left exact)
+
+    Returns:
+        One object array of strings per column; missing values become empty strings
+    """
+    formatted = []
+    for col, dtype in df.dtypes.items():
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            text = series.dt.strftime("%Y-%m-%d %H:%M:%S").str.replace(" 00:00:00", "", regex=False).to_numpy(dtype=object)
+            missing = series.isna().to_numpy()
+        elif pd.api.types.is_float_dtype(dtype):
+            values = series.to_numpy(dtype=float)
+            missing = np.isnan(values)
+            if significant_digits:
+                values = round_significant(values, significant_digits)
+            finite = values[~missing]
+            if finite.size and np.all(finite == np.floor(finite)) and np.all(np.abs(finite) < 2 ** 53):
+                # Whole numbers stored as floats render without a trailing ".0"
+                text = np.where(missing, 0, values).astype(np.int64).astype(str).astype(object)
+            else:
+                # numpy renders the shortest repr that round-trips
+                text = np.array([value[:-2] if value.endswith(".0") else value for value in values.astype(str)], dtype=object)
+        elif pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+            text = series.to_numpy().astype(str).astype(object)
+            missing = None
+        else:
+            values = series.to_numpy(dtype=object)
+            missing = pd.isna(values)
+            text = values.astype(str)
+        if missing is not None and missing.any():
+            text[missing] = ""
+        formatted.append(text)
+    return formatted
+
+
+def _rows(columns: List[np.ndarray]) -> List[List[str]]:
+    """Transpose string columns into row lists"""
+    return np.column_stack(columns).tolist() if columns else []
+
+
+def _csv_quote(value: str) -> str:
+    if "," in value or '"' in value or "\n" in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def _csv_quote_column(values: np.ndarray) -> np.ndarray:
+    return np.array([_csv_quote(value) for value in values], dtype=object)
+
+
+def encode_rows(df: pd.DataFrame, significant_digits: Optional[int] = None) -> List[str]:
+    """One "Row i: col: val, ..." line per row, limited to the first columns"""
+    shown = df.iloc[:, :ROWS_FORMAT_COLUMNS]
+    if shown.empty:
+        return []
+    names = [f"{col}: " for col in shown.columns]
+    rows = _rows(format_columns(shown, significant_digits))
+    return [
+        f"    Row {index}: " + ", ".join(name + value for name, value in zip(names, row)) + "..."
+        for index, row in zip(shown.index, rows)
+    ]
+
+
+def encode_markdown(df: pd.DataFrame, significant_digits: Optional[int] = None) -> List[str]:
+    """Markdown table with a header row"""
+    columns = [np.array([value.replace("|", "\\|") for value in column], dtype=object)
+               for column in format_columns(df, significant_digits)]
+    header = "| " + " | ".join(str(col) for col in df.columns) + " |"
+    divider = "|" + "---|" * len(df.columns)
+    return [header, divider] + ["| " + " | ".join(row) + " |" for row in _rows(columns)]
+
+
+def encode_csv(df: pd.DataFrame, significant_digits: Optional[int] = None) -> List[str]:
+    """CSV with a header row"""
+    columns = format_columns(df, significant_digits)
+    # Only text columns can contain separators or quotes
+    columns = [_csv_quote_column(text) if pd.api.types.is_object_dtype(df[col]) else text
+               for col, text in zip(df.columns, columns)]
+    header = ",".join(_csv_quote(str(col)) for col in df.columns)
+    return [header] + [",".join(row) for row in _rows(columns)]
+
+
+def encode_dictionary(df: pd.DataFrame, significant_digits: Optional[int] = None) -> List[str]:
+    """CSV with repetitive text columns replaced by integer codes, preceded by their legends"""
+    legends = []
+    coded = {}
+    for col in df.columns:
+        series = df[col]
+        is_text = pd.api.types.is_object_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype)
+        if is_text and len(series) > 1 and series.nunique() <= len(series) * DICTIONARY_MAX_UNIQUE_SHARE:
+            codes, uniques = pd.factorize(series)
+            legends.append(f"{col}: " + ", ".join(f"{code}={value}" for code, value in enumerate(uniques)))
+            # Missing values get code -1 from factorize; keep them missing
+            coded[col] = pd.Series(codes, index=series.index, dtype="Int64").mask(codes < 0)
+        else:
+            coded[col] = series
+    lines = [f"Legend {legend}" for legend in legends]
+    return lines + encode_csv(pd.DataFrame(coded, index=df.index), significant_digits)
+
+
+ENCODERS: Dict[str, Callable[[pd.DataFrame, Optional[int]], List[str]]] = {
+    "rows": encode_rows,
+    "markdown": encode_markdown,
+    "csv": encode_csv,
+    "dictionary": encode_dictionary
+}
+
+
+def encode_sample(df: pd.DataFrame, context_format: str = "rows", significant_digits: Optional[int] = None) -> List[str]:
+    """
+    Encode a sample of a sheet for LLM context
+
+    Args:
+        df: Rows and columns to encode
+        context_format: One of CONTEXT_FORMATS
+        significant_digits: Round float columns to this many significant digits
+
+    Returns:
+        Output lines
+    """
+    encoder = ENCODERS.get(context_format)
+    if encoder is None:
+        raise ValueError(f"Unknown context format {context_format!r}; expected one of {CONTEXT_FORMATS}")
+    return encoder(df, significant_digits)
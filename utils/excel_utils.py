@@ -2,6 +2,8 @@ import pandas as pd
 from typing import List, Dict, Any, Tuple, Optional
 import numpy as np
 from io import StringIO
+from datetime import date, datetime, time
+from openpyxl import load_workbook
 
 class ExcelParser:
     """Handles parsing of Excel files with support for large files and multiple sheets"""
@@ -40,6 +42,66 @@ class ExcelParser:
         except Exception as e:
             raise Exception(f"Error parsing Excel file: {str(e)}")
     
+    @staticmethod
+    def probe_workbook(file_path: str,
+                       include_sheets: Optional[List[str]] = None,
+                       sample_rows: int = 0) -> List[Dict[str, Any]]:
+        """
+        List the sheets of a workbook with their size, without reading any cell data
+        
+        Args:
+            file_path: Path to the Excel file
+            include_sheets: List of sheet names to include (None for all)
+            sample_rows: Data rows read below the header to guess column types (0 reads no cells)
+            
+        Returns:
+            One dict per sheet with "name", "rows" and "columns", in the order the sheets
+            would be parsed; sizes come from the stored sheet dimensions and are 0 when unknown.
+            With sample_rows, also "column_types": "numeric", "text", "datetime" or "other"
+            per column, from the first non-empty sampled value
+        """
+        try:
+            workbook = load_workbook(file_path, read_only=True)
+        except Exception as e:
+            raise Exception(f"Error probing Excel file: {str(e)}")
+        
+        try:
+            sheet_names = include_sheets if include_sheets else workbook.sheetnames
+            sheets = []
+            for sheet_name in sheet_names:
+                if sheet_name in workbook.sheetnames:
+                    worksheet = workbook[sheet_name]
+                    sheet = {
+                        "name": sheet_name,
+                        "rows": worksheet.max_row or 0,
+                        "columns": worksheet.max_column or 0
+                    }
+                    if sample_rows > 0:
+                        sheet["column_types"] = ExcelParser._sample_column_types(worksheet, sheet["columns"], sample_rows)
+                    sheets.append(sheet)
+            return sheets
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def _sample_column_types(worksheet, columns: int, sample_rows: int) -> List[str]:
+        """Type of each column from its first non-empty value in the rows below the header"""
+        types: List[Optional[str]] = [None] * columns
+        for row in worksheet.iter_rows(min_row=2, max_row=1 + sample_rows, max_col=columns, values_only=True):
+            for i, value in enumerate(row[:columns]):
+                if types[i] is None and value is not None:
+                    if isinstance(value, (bool, int, float)):
+                        types[i] = "numeric"
+                    elif isinstance(value, str):
+                        types[i] = "text"
+                    elif isinstance(value, (datetime, date, time)):
+                        types[i] = "datetime"
+                    else:
+                        types[i] = "other"
+            if all(types):
+                break
+        return [column_type or "other" for column_type in types]
+    
     @staticmethod
     def detect_data_types(df: pd.DataFrame) -> Dict[str, str]:
         """Detect data types for each column in a DataFrame"""
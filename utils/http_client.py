@@ -0,0 +1,195 @@
+"""
+Process-wide pooled HTTP clients for LLM API calls
+
+Both clients are created lazily on first use and reused for every request, so
+connections (and their TCP/TLS handshakes) are kept alive across calls. The async
+client lives on a dedicated background event loop: coroutines from any other loop
+are forwarded to it, which lets short-lived loops (asyncio.run per tool call) share
+one connection pool.
+"""
+
+from typing import Optional, Dict, Any, Coroutine, Tuple
+import asyncio
+import concurrent.futures
+import importlib.util
+import os
+import threading
+import httpx
+from config.config import HTTPClientConfig
+
+_lock = threading.RLock()
+_settings: Optional[HTTPClientConfig] = None
+_client: Optional[httpx.Client] = None
+_client_key: Optional[Tuple[str, str]] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_key: Optional[Tuple[str, str]] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+
+def http2_available() -> bool:
+    """Check whether the optional h2 package needed for HTTP/2 is installed"""
+    return importlib.util.find_spec("h2") is not None
+
+def get_http_client_config() -> HTTPClientConfig:
+    """Current pool settings, read from the environment on first use"""
+    global _settings
+    with _lock:
+        if _settings is None:
+            _settings = HTTPClientConfig.from_env()
+        return _settings
+
+def configure_http_clients(config: HTTPClientConfig) -> None:
+    """
+    Replace the pool settings; existing clients are closed and rebuilt on next use
+
+    Args:
+        config: New connection pool settings
+    """
+    global _settings
+    close_http_clients()
+    with _lock:
+        _settings = config
+
+def _client_options(base_url: str, api_key: str) -> Dict[str, Any]:
+    settings = get_http_client_config()
+    return {
+        "base_url": base_url,
+        "headers": {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        },
+        "limits": httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry
+        ),
+        "timeout": httpx.Timeout(settings.timeout, connect=settings.connect_timeout),
+        # Fall back to HTTP/1.1 keep-alive when h2 is not installed
+        "http2": settings.http2 and http2_available()
+    }
+
+def get_http_client(base_url: str, api_key: str) -> httpx.Client:
+    """
+    Get the shared synchronous client for an API endpoint
+
+    Args:
+        base_url: API base URL
+        api_key: API key sent as a bearer token
+
+    Returns:
+        Pooled client; rebuilt if the endpoint or key changed since the last call
+    """
+    global _client, _client_key
+    key = (base_url, api_key)
+    with _lock:
+        if _client is not None and _client_key == key:
+            return _client
+        stale = _client
+        _client = httpx.Client(**_client_options(base_url, api_key))
+        _client_key = key
+    if stale is not None:
+        stale.close()
+    return _client
+
+def _get_client_loop() -> asyncio.AbstractEventLoop:
+    """Start the background event loop that owns the async client"""
+    global _loop, _loop_thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="llm-http-client", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+def get_async_http_client(base_url: str, api_key: str) -> httpx.AsyncClient:
+    """
+    Get the shared async client; only valid on the background client loop
+
+    Args:
+        base_url: API base URL
+        api_key: API key sent as a bearer token
+
+    Returns:
+        Pooled async client
+    """
+    global _async_client, _async_client_key
+    key = (base_url, api_key)
+    if _async_client is None or _async_client_key != key:
+        stale = _async_client
+        _async_client = httpx.AsyncClient(**_client_options(base_url, api_key))
+        _async_client_key = key
+        if stale is not None:
+            asyncio.ensure_future(stale.aclose())
+    return _async_client
+
+async def run_on_client_loop(coro: Coroutine) -> Any:
+    """
+    Run a coroutine on the background client loop and await its result
+
+    Args:
+        coro: Coroutine that uses get_async_http_client
+
+    Returns:
+        The coroutine's result
+    """
+    loop = _get_client_loop()
+    try:
+        if asyncio.get_running_loop() is loop:
+            return await coro
+    except RuntimeError:
+        pass
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+def run_on_client_loop_sync(coro: Coroutine) -> Any:
+    """
+    Run a coroutine on the background client loop, blocking the calling thread
+
+    Args:
+        coro: Coroutine that uses get_async_http_client
+
+    Returns:
+        The coroutine's result
+    """
+    loop = _get_client_loop()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("run_on_client_loop_sync would deadlock on the client loop; await run_on_client_loop instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+def submit_to_client_loop(coro: Coroutine) -> concurrent.futures.Future:
+    """
+    Start a coroutine on the background client loop without waiting for it
+    
+    Args:
+        coro: Coroutine that uses get_async_http_client
+        
+    Returns:
+        Future for the result; cancelling it cancels the coroutine
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_client_loop())
+
+def close_http_clients() -> None:
+    """Close the shared clients; they are recreated lazily on next use"""
+    global _client, _client_key, _async_client, _async_client_key
+    with _lock:
+        client, _client, _client_key = _client, None, None
+        loop = _loop
+    if client is not None:
+        client.close()
+
+    if loop is not None and _async_client is not None:
+        async def _close():
+            global _async_client, _async_client_key
+            async_client, _async_client, _async_client_key = _async_client, None, None
+            if async_client is not None:
+                await async_client.aclose()
+        asyncio.run_coroutine_threadsafe(_close(), loop).result()
+
+def _reset_after_fork() -> None:
+    """Drop pools inherited from the parent process; their sockets and loop thread are not usable"""
+    global _lock, _client, _client_key, _async_client, _async_client_key, _loop, _loop_thread
+    _lock = threading.RLock()
+    _client = _client_key = _async_client = _async_client_key = None
+    _loop = _loop_thread = None
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
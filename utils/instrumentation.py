@@ -0,0 +1,407 @@
+"""
+Per-stage instrumentation of processing runs
+
+A trace is a tree of spans: a name, a wall-clock duration and attributes such as
+rows and cells processed, LLM latency and token counts, or cache hits. Spans
+attach to the trace active in the current context (a context variable), so
+concurrent runs on other threads or tasks record into their own traces. With no
+trace active, span() returns a shared no-op span, so instrumented code costs a
+context-variable lookup when tracing is off.
+
+With memory tracking, tracemalloc runs while the trace is open and every span
+records the high-water mark of traced memory above its starting level. The mark
+is process-wide, so spans open at the same time see each other's allocations,
+and tracemalloc slows allocation-heavy code down several times: use it to find
+the stages that hold memory, not to time them.
+
+Traces are exported as JSON, or as OTLP/JSON (the OpenTelemetry file exporter
+format), one document per line.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Coroutine, Dict, Iterator, List, Optional, Set, Tuple
+import contextvars
+import functools
+import json
+import numbers
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from config.config import TraceConfig
+
+SERVICE_NAME = "excel-processing-agent"
+
+# (trace, innermost open span) of the current context
+_active: ContextVar[Optional[Tuple["Trace", "Span"]]] = ContextVar("instrumentation_active", default=None)
+
+_memory_lock = threading.Lock()
+_memory_spans: Set["Span"] = set()  # open spans that track memory
+_tracemalloc_holders = 0  # traces and profiled stages that need tracemalloc
+_started_tracemalloc = False
+
+_config: Optional[TraceConfig] = None
+_export_lock = threading.Lock()
+
+
+def hold_tracemalloc() -> None:
+    """Start tracemalloc unless it is running; pair every call with release_tracemalloc()"""
+    global _tracemalloc_holders, _started_tracemalloc
+    with _memory_lock:
+        if _tracemalloc_holders == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracemalloc = True
+        _tracemalloc_holders += 1
+
+
+def release_tracemalloc() -> None:
+    """Stop tracemalloc once no holder needs it, if hold_tracemalloc() started it"""
+    global _tracemalloc_holders, _started_tracemalloc
+    with _memory_lock:
+        _tracemalloc_holders -= 1
+        if _tracemalloc_holders == 0 and _started_tracemalloc:
+            tracemalloc.stop()
+            _started_tracemalloc = False
+
+
+def _fold_memory_peak() -> None:
+    """Raise the high-water mark of every open span to the peak since the last fold; call with _memory_lock held"""
+    peak = tracemalloc.get_traced_memory()[1]
+    for span in _memory_spans:
+        if peak > span._memory_high:
+            span._memory_high = peak
+    tracemalloc.reset_peak()
+
+
+class _NoopSpan:
+    """Stands in for a span when no trace is active"""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed stage of a trace; use it as a context manager, or call finish() for spans that end elsewhere"""
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start_time_ns = time.time_ns()
+        self.duration: Optional[float] = None
+        self.memory_peak_bytes: Optional[int] = None
+        self.error: Optional[str] = None
+        self._parent = parent
+        self._token = None
+        # Spans that outlive their trace (e.g. a late LLM call) are not measured: tracemalloc may be off
+        self._memory_tracked = trace.memory and not trace.closed
+        if self._memory_tracked:
+            with _memory_lock:
+                _fold_memory_peak()
+                self._memory_start = self._memory_high = tracemalloc.get_traced_memory()[0]
+                _memory_spans.add(self)
+        self._start = time.perf_counter()
+
+    def set(self, **attributes: Any) -> None:
+        """Add or replace attributes"""
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """End the span and record it in its trace; later calls do nothing"""
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        if self._memory_tracked:
+            with _memory_lock:
+                _fold_memory_peak()
+                _memory_spans.discard(self)
+                self.memory_peak_bytes = max(0, self._memory_high - self._memory_start)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace._record(self)
+        if self._parent is None:
+            self.trace._close()
+
+    def __enter__(self) -> "Span":
+        self._token = _active.set((self.trace, self))
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _active.reset(self._token)
+        self.finish(exc)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready span, with rows and cells per second when the span counted them"""
+        span = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time_ns / 1e9,
+            "duration": self.duration,
+            "attributes": dict(self.attributes)
+        }
+        if self.duration:
+            for unit in ("rows", "cells"):
+                if isinstance(self.attributes.get(unit), numbers.Real):
+                    span[f"{unit}_per_second"] = self.attributes[unit] / self.duration
+        if self.memory_peak_bytes is not None:
+            span["memory_peak_bytes"] = self.memory_peak_bytes
+        if self.error is not None:
+            span["error"] = self.error
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+class Trace:
+    """Spans recorded for one run"""
+
+    def __init__(self, name: str, memory: bool = False, export_path: Optional[str] = None, export_format: str = "json"):
+        """
+        Args:
+            name: Trace name
+            memory: Track memory high-water marks; tracemalloc runs until the root span finishes
+            export_path: File the trace is appended to when the root span finishes, None to keep it in memory
+            export_format: "json" or "otlp"
+        """
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.memory = memory
+        self.export_path = export_path
+        self.export_format = export_format
+        self.spans: List[Span] = []
+        self.closed = False
+        self._lock = threading.Lock()
+        if memory:
+            hold_tracemalloc()
+
+    def _close(self) -> None:
+        """Called when the root span finishes"""
+        self.closed = True
+        if self.memory:
+            release_tracemalloc()
+        if self.export_path:
+            try:
+                self.export(self.export_path, self.export_format)
+            except OSError as e:
+                print(f"Could not write trace to {self.export_path}: {str(e)}")
+
+    def _record(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def find(self, name: str) -> List[Span]:
+        """Finished spans with the given name, in the order they finished"""
+        with self._lock:
+            return [span for span in self.spans if span.name == name]
+
+    def stage_totals(self) -> Dict[str, Dict[str, float]]:
+        """Count and total seconds of the finished spans per name"""
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for span in self.spans:
+                total = totals.setdefault(span.name, {"count": 0, "seconds": 0.0})
+                total["count"] += 1
+                total["seconds"] += span.duration
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready trace with its spans in start order"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start_time_ns)
+        return {"trace_id": self.trace_id, "name": self.name, "spans": [span.to_dict() for span in spans]}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Trace as an OTLP/JSON ExportTraceServiceRequest"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start_time_ns)
+        otlp_spans = []
+        for span in spans:
+            attributes = dict(span.attributes)
+            if span.memory_peak_bytes is not None:
+                attributes["memory.peak_bytes"] = span.memory_peak_bytes
+            otlp_span = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span.start_time_ns),
+                "endTimeUnixNano": str(span.start_time_ns + int(span.duration * 1e9)),
+                "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+            }
+            if span.error is not None:
+                otlp_span["status"] = {"code": 2, "message": span.error}  # STATUS_CODE_ERROR
+            otlp_spans.append(otlp_span)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}]
+        }]}
+
+    def export(self, path: str, format: str = "json") -> None:
+        """Append the trace to a file as one line of JSON ("json") or OTLP/JSON ("otlp")"""
+        document = self.to_otlp() if format == "otlp" else self.to_dict()
+        line = json.dumps(document, default=str) + "\n"
+        with _export_lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+def span(name: str, **attributes: Any):
+    """
+    Span for a stage of the active trace, nested in the current span
+
+    Args:
+        name: Stage name, e.g. "parse" or "llm"
+        **attributes: Initial attributes; "rows" and "cells" also produce throughput figures
+
+    Returns:
+        A Span to use as a context manager, or the no-op span when no trace is active
+    """
+    active = _active.get()
+    if active is None:
+        return NOOP_SPAN
+    trace, parent = active
+    return Span(trace, name, parent, attributes)
+
+
+def current_span():
+    """Innermost open span of the active trace, or the no-op span"""
+    active = _active.get()
+    return active[1] if active is not None else NOOP_SPAN
+
+
+@contextmanager
+def start_trace(name: str, memory: bool = False, **attributes: Any) -> Iterator[Trace]:
+    """
+    Record the spans of a block into a new trace
+
+    Args:
+        name: Name of the trace and of its root span
+        memory: Track memory high-water marks with tracemalloc
+        **attributes: Attributes of the root span
+
+    Yields:
+        The trace; it holds every span once the block ends
+    """
+    trace = Trace(name, memory)
+    with Span(trace, name, None, attributes):
+        yield trace
+
+
+def begin_run(name: str, **attributes: Any):
+    """
+    Root span of a workflow entry point
+
+    Nested in the active trace if there is one; otherwise, when a trace file is
+    configured, the root of a new trace that is appended to the file when the
+    span finishes. The span is not active yet: use it as a context manager, or
+    activate() it around the work and finish() it at the end.
+
+    Returns:
+        The span, or the no-op span when tracing is off
+    """
+    active = _active.get()
+    if active is not None:
+        return Span(active[0], name, active[1], attributes)
+    config = get_trace_config()
+    if not config.path:
+        return NOOP_SPAN
+    trace = Trace(name, config.memory, export_path=config.path, export_format=config.format)
+    return Span(trace, name, None, attributes)
+
+
+@contextmanager
+def activate(span) -> Iterator[None]:
+    """Make a span current for a block without finishing it"""
+    if span is NOOP_SPAN:
+        yield
+        return
+    token = _active.set((span.trace, span))
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def iterate_in(span, iterator: Iterator) -> Iterator:
+    """Yield from an iterator with the span current only while the iterator runs, not while the consumer does"""
+    try:
+        while True:
+            with activate(span):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        # A consumer that stops early closes the source too
+        if hasattr(iterator, "close"):
+            with activate(span):
+                iterator.close()
+
+
+def bind_context(func: Callable) -> Callable:
+    """Wrap a function to run in a copy of the current context, e.g. in an executor thread"""
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+def bind_trace(coro: Coroutine) -> Coroutine:
+    """Wrap a coroutine scheduled on another event loop so its spans join the active trace"""
+    active = _active.get()
+    if active is None:
+        return coro
+
+    async def run():
+        _active.set(active)
+        return await coro
+
+    return run()
+
+
+def configure_tracing(config: Optional[TraceConfig]) -> TraceConfig:
+    """
+    Replace the process-wide trace settings used by begin_run
+
+    Args:
+        config: Trace settings; None turns exporting off
+
+    Returns:
+        The settings now in effect
+    """
+    global _config
+    _config = config if config is not None else TraceConfig()
+    return _config
+
+
+def get_trace_config() -> TraceConfig:
+    """Process-wide trace settings, read from the environment on first use"""
+    if _config is None:
+        configure_tracing(TraceConfig.from_env())
+    return _config
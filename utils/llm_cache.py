@@ -0,0 +1,188 @@
+"""
+Persistent, content-addressed cache for LLM responses
+
+Responses are stored in SQLite keyed by a hash of model, system message, prompt,
+temperature and max_tokens. WAL mode and a busy timeout make the file safe to
+share between worker processes; each thread and process uses its own connection.
+"""
+
+from typing import Optional, Dict, Any
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config.config import LLMCacheConfig
+
+# Hits refresh the LRU timestamp at most this often, so most lookups are read-only
+ACCESS_RESOLUTION = 60.0
+
+class LLMResponseCache:
+    """SQLite-backed response cache with TTL and a byte budget enforced by LRU eviction"""
+
+    def __init__(self, path: str, ttl: float = LLMCacheConfig.ttl, max_bytes: int = LLMCacheConfig.max_bytes):
+        """
+        Args:
+            path: SQLite database file, created if missing
+            ttl: Seconds before an entry expires
+            max_bytes: Total size of stored responses before LRU eviction kicks in
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expirations": 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection for the current thread and process"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    @staticmethod
+    def make_key(model: str, system_message: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        """Content hash identifying a request"""
+        payload = json.dumps([model, system_message, prompt, temperature, max_tokens], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            The cached response, or None on a miss or expired entry
+        """
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, created_at, accessed_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+
+        if row is None:
+            self._count("misses")
+            return None
+
+        value, created_at, accessed_at = row
+        if now - created_at > self.ttl:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._count("expirations")
+            self._count("misses")
+            return None
+
+        if now - accessed_at > ACCESS_RESOLUTION:
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        """Store a response and evict expired and least recently used entries over budget"""
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            expired = conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)).rowcount
+            evicted = self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._count("writes")
+        if expired:
+            self._count("expirations", expired)
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        """Delete least recently used entries until the byte budget is met"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        to_free = total - self.max_bytes
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at, rowid"):
+            victims.append((key,))
+            to_free -= size
+            if to_free <= 0:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        return len(victims)
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate metrics for this process plus current size of the shared store"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+
+        entries, total_bytes = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        stats["entries"] = entries
+        stats["bytes"] = total_bytes
+        return stats
+
+_cache_lock = threading.Lock()
+_cache: Optional[LLMResponseCache] = None
+_cache_configured = False
+
+def configure_llm_cache(config: Optional[LLMCacheConfig]) -> Optional[LLMResponseCache]:
+    """
+    Replace the process-wide response cache
+
+    Args:
+        config: Cache settings; None or a config without a path disables caching
+
+    Returns:
+        The new cache, or None when disabled
+    """
+    global _cache, _cache_configured
+    with _cache_lock:
+        _cache = None
+        if config is not None and config.path:
+            _cache = LLMResponseCache(config.path, config.ttl, config.max_bytes)
+        _cache_configured = True
+        return _cache
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Process-wide response cache, configured from the environment on first use"""
+    if not _cache_configured:
+        configure_llm_cache(LLMCacheConfig.from_env())
+    return _cache
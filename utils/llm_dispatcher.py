@@ -0,0 +1,216 @@
+"""
+Async dispatcher for LLM API requests
+
+Every request goes through one dispatcher on the background client loop, which
+applies process-wide token-bucket rate limiting and a concurrency bound, retries
+429/5xx and transport errors with jittered exponential backoff, and coalesces
+identical in-flight requests into a single API call.
+"""
+
+from typing import Optional, Dict, Any, Iterator
+import asyncio
+import contextlib
+import os
+import random
+import threading
+import httpx
+from config.config import LLMDispatcherConfig
+from utils.http_client import get_async_http_client, run_on_client_loop_sync, submit_to_client_loop
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+class LLMRequestError(Exception):
+    """Raised when an LLM request fails permanently or runs out of retries"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class TokenBucket:
+    """Token-bucket rate limiter; only used from the dispatcher's event loop"""
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum tokens that can accumulate (burst size)
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated: Optional[float] = None
+
+    async def acquire(self) -> float:
+        """Wait for a token; returns the seconds spent waiting"""
+        loop = asyncio.get_running_loop()
+        waited = 0.0
+        while True:
+            now = loop.time()
+            if self._updated is not None:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return waited
+            delay = (1 - self._tokens) / self.rate
+            waited += delay
+            await asyncio.sleep(delay)
+
+class LLMDispatcher:
+    """Rate-limited, retrying, coalescing sender for chat completion requests"""
+
+    def __init__(self, config: LLMDispatcherConfig):
+        self.config = config
+        self._bucket = TokenBucket(config.rate_limit, config.burst) if config.rate_limit > 0 else None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "api_calls": 0, "coalesced": 0, "retries": 0,
+                       "failures": 0, "abandoned": 0, "rate_limited_seconds": 0.0}
+
+    def _count(self, name: str, amount=1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    async def dispatch(self, request: Dict[str, Any], key: str) -> Dict[str, Any]:
+        """
+        Send a chat completion request; must run on the background client loop
+
+        Args:
+            request: Request from _build_chat_request (base_url, api_key, json)
+            key: Identity of the request; concurrent requests with the same key share one API call
+
+        Returns:
+            Parsed JSON response
+
+        Raises:
+            LLMRequestError: On a non-retryable error or when retries are exhausted
+        """
+        self._count("requests")
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._send_with_retries(request))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._count("coalesced")
+        
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # Shield the shared call so one cancelled caller does not cancel it for the others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Abandon the API call once no caller is waiting for it any more
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+                self._count("abandoned")
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    async def _acquire(self) -> None:
+        """Wait for a rate-limit token, then for a concurrency slot; counts one API call"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, self.config.max_concurrency))
+        if self._bucket is not None:
+            waited = await self._bucket.acquire()
+            if waited:
+                self._count("rate_limited_seconds", waited)
+        await self._semaphore.acquire()
+        self._count("api_calls")
+
+    async def _release(self) -> None:
+        self._semaphore.release()
+
+    @contextlib.contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        Hold a rate-limit token and concurrency slot for an API call made outside dispatch
+
+        For synchronous callers that talk to the API themselves, such as streamed
+        completions; blocks the calling thread until the slot is granted.
+        """
+        run_on_client_loop_sync(self._acquire())
+        try:
+            yield
+        finally:
+            # Not awaited, so the slot can also be given back from the client loop's own thread
+            submit_to_client_loop(self._release())
+
+    async def _send_with_retries(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                await self._acquire()
+                try:
+                    client = get_async_http_client(request["base_url"], request["api_key"])
+                    response = await client.post(request["path"], json=request["json"])
+                finally:
+                    self._semaphore.release()
+
+                if response.status_code < 400:
+                    return response.json()
+                error = LLMRequestError(
+                    f"LLM API returned HTTP {response.status_code}: {response.text[:200]}",
+                    response.status_code
+                )
+                retryable = response.status_code in RETRYABLE_STATUS_CODES
+                retry_after = response.headers.get("Retry-After")
+            except httpx.TransportError as e:
+                error = LLMRequestError(f"LLM API transport error: {e!r}")
+                retryable = True
+
+            if not retryable or attempt >= self.config.max_retries:
+                self._count("failures")
+                raise error
+
+            await asyncio.sleep(self.backoff_delay(attempt, retry_after))
+            attempt += 1
+            self._count("retries")
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+        ceiling = min(self.config.backoff_max, self.config.backoff_base * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.config.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+_dispatcher_lock = threading.Lock()
+_dispatcher: Optional[LLMDispatcher] = None
+
+def configure_llm_dispatcher(config: LLMDispatcherConfig) -> LLMDispatcher:
+    """Replace the process-wide dispatcher; requests already in flight finish on the old one"""
+    global _dispatcher
+    with _dispatcher_lock:
+        _dispatcher = LLMDispatcher(config)
+        return _dispatcher
+
+def get_llm_dispatcher() -> LLMDispatcher:
+    """Process-wide dispatcher, configured from the environment on first use"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = LLMDispatcher(LLMDispatcherConfig.from_env())
+        return _dispatcher
+
+def _reset_after_fork() -> None:
+    """Drop the dispatcher inherited from the parent; its loop primitives belong to a dead loop"""
+    global _dispatcher, _dispatcher_lock
+    _dispatcher_lock = threading.Lock()
+    if _dispatcher is not None:
+        _dispatcher = LLMDispatcher(_dispatcher.config)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
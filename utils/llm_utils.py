@@ -2,21 +2,27 @@
 Utility functions for LLM integration with DeepSeek API
 """
 
-from typing import Optional, Dict, Any, List
-from dotenv import load_dotenv
+from typing import Optional, Dict, Any, List, Iterator
+import concurrent.futures
 import os
-import httpx
 import json
-
-# Load environment variables
-load_dotenv()
+import time
+import httpx
+from config.config import load_environment
+from utils.http_client import get_http_client, run_on_client_loop, run_on_client_loop_sync, submit_to_client_loop
+from utils.instrumentation import bind_trace, span
+from utils.llm_dispatcher import LLMRequestError, RETRYABLE_STATUS_CODES, get_llm_dispatcher
+from utils.llm_cache import LLMResponseCache, get_llm_cache
+from utils.compression_rules import COMPRESSION_RULES_SCHEMA
 
 def get_deepseek_api_key() -> Optional[str]:
     """Get DeepSeek API key from environment variables"""
+    load_environment()
     return os.getenv("DEEPSEEK_API_KEY")
 
 def get_deepseek_base_url() -> Optional[str]:
     """Get DeepSeek base URL from environment variables"""
+    load_environment()
     return os.getenv("DEEPSEEK_BASE_URL")
 
 def initialize_deepseek_llm():
@@ -37,6 +43,41 @@ def initialize_deepseek_llm():
         "base_url": base_url
     }
 
+CHAT_COMPLETIONS_PATH = "/v1/chat/completions"
+
+def _build_chat_request(prompt: str, system_message: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
+    """Build endpoint, credentials, body and cache key for a chat completion request"""
+    # Initialize LLM configuration
+    llm_config = initialize_deepseek_llm()
+    
+    # Prepare messages
+    messages = []
+    if system_message:
+        messages.append({"role": "system", "content": system_message})
+    messages.append({"role": "user", "content": prompt})
+    
+    # Prepare request body
+    data = {
+        "model": "deepseek-chat",  # Using DeepSeek's chat model
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    
+    return {
+        "base_url": llm_config["base_url"],
+        "api_key": llm_config["api_key"],
+        "path": CHAT_COMPLETIONS_PATH,
+        "json": data,
+        # Identifies the request for the response cache and for coalescing in-flight duplicates
+        "key": LLMResponseCache.make_key(data["model"], system_message, prompt, temperature, max_tokens)
+    }
+
+def _usage_attributes(result: Dict[str, Any]) -> Dict[str, int]:
+    """Token counts reported by the API, for the request's span"""
+    usage = result.get("usage") or {}
+    return {key: usage[key] for key in ("prompt_tokens", "completion_tokens", "total_tokens") if key in usage}
+
 def call_deepseek_llm(prompt: str, system_message: str = "", temperature: float = 0.7, max_tokens: int = 500) -> str:
     """
     Call DeepSeek LLM with the given prompt
@@ -50,88 +91,210 @@ def call_deepseek_llm(prompt: str, system_message: str = "", temperature: float
     Returns:
         Generated response from the LLM
     """
-    try:
-        # Initialize LLM configuration
-        llm_config = initialize_deepseek_llm()
+    with span("llm", prompt_chars=len(prompt), max_tokens=max_tokens) as llm_span:
+        try:
+            request = _build_chat_request(prompt, system_message, temperature, max_tokens)
+            
+            # Serve repeated prompts from the response cache, if enabled
+            cache = get_llm_cache()
+            cached = cache.get(request["key"]) if cache else None
+            llm_span.set(cached=cached is not None)
+            if cached is not None:
+                return cached
+            
+            # Rate limiting, retries and coalescing happen in the dispatcher on the shared client loop
+            result = run_on_client_loop_sync(get_llm_dispatcher().dispatch(request, request["key"]))
+            
+            # Parse the response
+            content = result["choices"][0]["message"]["content"]
+            llm_span.set(completion_chars=len(content), **_usage_attributes(result))
+            if cache:
+                cache.put(request["key"], content)
+            return content
+            
+        except Exception as e:
+            llm_span.set(error=str(e))
+            # Return a fallback response once retries are exhausted or the error is permanent
+            return f"Error calling LLM: {str(e)}. Using rule-based approach instead."
+
+async def acall_deepseek_llm(prompt: str, system_message: str = "", temperature: float = 0.7, max_tokens: int = 500) -> str:
+    """
+    Async version of call_deepseek_llm, so several requests can be in flight at once
+    
+    Args:
+        prompt: The user prompt
+        system_message: System message to guide the model
+        temperature: Sampling temperature (0.0 to 1.0)
+        max_tokens: Maximum number of tokens to generate
         
-        # Prepare the API request
-        headers = {
-            "Authorization": f"Bearer {llm_config['api_key']}",
-            "Content-Type": "application/json"
-        }
+    Returns:
+        Generated response from the LLM
+    """
+    with span("llm", prompt_chars=len(prompt), max_tokens=max_tokens) as llm_span:
+        try:
+            request = _build_chat_request(prompt, system_message, temperature, max_tokens)
+            
+            # Serve repeated prompts from the response cache, if enabled
+            cache = get_llm_cache()
+            cached = cache.get(request["key"]) if cache else None
+            llm_span.set(cached=cached is not None)
+            if cached is not None:
+                return cached
+            
+            # The dispatcher and pooled async client live on their own loop, shared by all callers' loops
+            result = await run_on_client_loop(get_llm_dispatcher().dispatch(request, request["key"]))
+            
+            # Parse the response
+            content = result["choices"][0]["message"]["content"]
+            llm_span.set(completion_chars=len(content), **_usage_attributes(result))
+            if cache:
+                cache.put(request["key"], content)
+            return content
+            
+        except Exception as e:
+            llm_span.set(error=str(e))
+            # Return a fallback response once retries are exhausted or the error is permanent
+            return f"Error calling LLM: {str(e)}. Using rule-based approach instead."
+
+def _iter_sse_content(response) -> Iterator[str]:
+    """Yield content deltas from a server-sent events chat completion stream"""
+    for line in response.iter_lines():
+        if not line.startswith("data:"):
+            continue
+        payload = line[len("data:"):].strip()
+        if payload == "[DONE]":
+            break
+        chunk = json.loads(payload)
+        choices = chunk.get("choices") or [{}]
+        content = (choices[0].get("delta") or {}).get("content")
+        if content:
+            yield content
+
+def stream_deepseek_llm(prompt: str, system_message: str = "", temperature: float = 0.7, max_tokens: int = 500) -> Iterator[str]:
+    """
+    Streaming version of call_deepseek_llm that yields tokens as they arrive
+    
+    Args:
+        prompt: The user prompt
+        system_message: System message to guide the model
+        temperature: Sampling temperature (0.0 to 1.0)
+        max_tokens: Maximum number of tokens to generate
         
-        # Prepare messages
-        messages = []
-        if system_message:
-            messages.append({"role": "system", "content": system_message})
-        messages.append({"role": "user", "content": prompt})
+    Yields:
+        Response chunks; a single "Error calling LLM" chunk if the call fails before any content
         
-        # Prepare request body
-        data = {
-            "model": "deepseek-chat",  # Using DeepSeek's chat model
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens
-        }
+    Raises:
+        LLMRequestError: If the stream breaks off after content has been yielded
+    """
+    # Not made current: a generator's context is its consumer's between chunks
+    llm_span = span("llm", prompt_chars=len(prompt), max_tokens=max_tokens, stream=True)
+    chunks = []
+    try:
+        request = _build_chat_request(prompt, system_message, temperature, max_tokens)
         
-        # Make the API call
-        url = f"{llm_config['base_url']}/v1/chat/completions"
+        # A cached response is replayed as one chunk
+        cache = get_llm_cache()
+        cached = cache.get(request["key"]) if cache else None
+        llm_span.set(cached=cached is not None)
+        if cached is not None:
+            yield cached
+            return
         
-        # Using httpx for the API call
-        response = httpx.post(url, headers=headers, json=data, timeout=30.0)
-        response.raise_for_status()
+        client = get_http_client(request["base_url"], request["api_key"])
+        dispatcher = get_llm_dispatcher()
+        body = dict(request["json"], stream=True)
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            try:
+                # Streams share the dispatcher's rate limit and concurrency bound, held until the stream ends
+                with dispatcher.slot(), client.stream("POST", request["path"], json=body) as response:
+                    if response.status_code >= 400:
+                        response.read()
+                        retryable = response.status_code in RETRYABLE_STATUS_CODES
+                        error = LLMRequestError(f"LLM API returned HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+                        retry_after = response.headers.get("Retry-After")
+                    else:
+                        for content in _iter_sse_content(response):
+                            if not chunks:
+                                llm_span.set(first_chunk_seconds=time.perf_counter() - started)
+                            chunks.append(content)
+                            yield content
+                        break
+            except httpx.TransportError as e:
+                # Once content has been yielded the stream cannot be replayed
+                if chunks:
+                    raise LLMRequestError(f"LLM stream broke off after {len(chunks)} chunks: {e!r}") from e
+                error = LLMRequestError(f"LLM API transport error: {e!r}")
+                retryable, retry_after = True, None
+            
+            if not retryable or attempt >= dispatcher.config.max_retries:
+                raise error
+            time.sleep(dispatcher.backoff_delay(attempt, retry_after))
+            attempt += 1
         
-        # Parse the response
-        result = response.json()
-        return result["choices"][0]["message"]["content"]
+        llm_span.set(completion_chars=sum(len(chunk) for chunk in chunks))
+        if cache and chunks:
+            cache.put(request["key"], "".join(chunks))
         
     except Exception as e:
-        # Return a fallback response in case of API errors
-        return f"Error calling LLM: {str(e)}. Using rule-based approach instead."
+        llm_span.set(error=str(e))
+        # An error chunk after partial content would read as part of the response
+        if chunks:
+            raise
+        # Same fallback contract as call_deepseek_llm
+        yield f"Error calling LLM: {str(e)}. Using rule-based approach instead."
+    finally:
+        llm_span.finish()
 
-def generate_compression_rules(data_description: str, task_type: str) -> str:
-    """
-    Generate dynamic compression rules using LLM
-    
-    Args:
-        data_description: Description of the data structure
-        task_type: Type of task (analysis, summary, inference)
-        
-    Returns:
-        Generated compression rules
-    """
-    system_message = "You are an expert data analyst specializing in data compression for large datasets."
+def _compression_rules_messages(data_description: str, task_type: str) -> Dict[str, str]:
+    """Build the prompt used to request compression rules"""
+    system_message = "You are an expert data analyst specializing in data compression for large datasets. You reply with JSON only."
     
     prompt = f"""
-    Given the following data structure and task type, generate specific compression rules:
+    Given the following data structure and task type, generate compression rules:
     
     Data Description:
     {data_description}
     
     Task Type: {task_type}
     
-    Please provide:
-    1. Which columns or data points are most important to preserve
-    2. Which columns can be aggregated or removed
-    3. What statistical summaries should be generated
-    4. Any special handling for anomalies or outliers
+    Respond with a single JSON object using exactly this schema:
+    {COMPRESSION_RULES_SCHEMA}
     
-    Keep your response concise and focused on actionable rules.
+    Guidelines:
+    1. Keep the columns that are most important to preserve, and use them as group_by dimensions
+    2. Drop columns that carry no value for the task
+    3. Aggregate numerical columns with the statistic that best summarizes them
+    4. Bucket dates or continuous values that are only useful at a coarser granularity
+    5. Set sample.rows to bound the number of rows that remain after aggregation
+    
+    Do not include any text outside the JSON object.
     """
     
-    return call_deepseek_llm(prompt, system_message, temperature=0.5, max_tokens=300)
+    return {"prompt": prompt, "system_message": system_message}
 
-def extract_key_insights(data_summary: str, task_description: str) -> str:
+def generate_compression_rules(data_description: str, task_type: str) -> str:
     """
-    Extract key insights from data summary using LLM
+    Generate dynamic compression rules using LLM
     
     Args:
-        data_summary: Summary of the data
-        task_description: Description of the analysis task
+        data_description: Description of the data structure
+        task_type: Type of task (analysis, summary, inference)
         
     Returns:
-        Extracted key insights
+        Generated compression rules as a JSON document following COMPRESSION_RULES_SCHEMA
     """
+    messages = _compression_rules_messages(data_description, task_type)
+    return call_deepseek_llm(messages["prompt"], messages["system_message"], temperature=0.0, max_tokens=600)
+
+async def agenerate_compression_rules(data_description: str, task_type: str) -> str:
+    """Async version of generate_compression_rules"""
+    messages = _compression_rules_messages(data_description, task_type)
+    return await acall_deepseek_llm(messages["prompt"], messages["system_message"], temperature=0.0, max_tokens=600)
+
+def _key_insights_messages(data_summary: str, task_description: str) -> Dict[str, str]:
+    """Build the prompt used to extract key insights"""
     system_message = "You are an expert data analyst skilled at extracting key insights from complex datasets."
     
     prompt = f"""
@@ -152,4 +315,45 @@ def extract_key_insights(data_summary: str, task_description: str) -> str:
     Format your response as a concise list of insights.
     """
     
-    return call_deepseek_llm(prompt, system_message, temperature=0.3, max_tokens=400)
\ No newline at end of file
+    return {"prompt": prompt, "system_message": system_message}
+
+def extract_key_insights(data_summary: str, task_description: str) -> str:
+    """
+    Extract key insights from data summary using LLM
+    
+    Args:
+        data_summary: Summary of the data
+        task_description: Description of the analysis task
+        
+    Returns:
+        Extracted key insights
+    """
+    messages = _key_insights_messages(data_summary, task_description)
+    return call_deepseek_llm(messages["prompt"], messages["system_message"], temperature=0.3, max_tokens=400)
+
+async def aextract_key_insights(data_summary: str, task_description: str) -> str:
+    """Async version of extract_key_insights"""
+    messages = _key_insights_messages(data_summary, task_description)
+    return await acall_deepseek_llm(messages["prompt"], messages["system_message"], temperature=0.3, max_tokens=400)
+
+def submit_key_insights(data_summary: str, task_description: str) -> concurrent.futures.Future:
+    """
+    Start extract_key_insights in the background
+    
+    Args:
+        data_summary: Summary of the data
+        task_description: Description of the analysis task
+        
+    Returns:
+        Future resolving to the insights (or the "Error calling LLM" fallback string). Cancelling
+        it abandons the API call; left running, the response is still written to the cache.
+    """
+    messages = _key_insights_messages(data_summary, task_description)
+    return submit_to_client_loop(bind_trace(
+        acall_deepseek_llm(messages["prompt"], messages["system_message"], temperature=0.3, max_tokens=400)
+    ))
+
+def stream_key_insights(data_summary: str, task_description: str) -> Iterator[str]:
+    """Streaming version of extract_key_insights"""
+    messages = _key_insights_messages(data_summary, task_description)
+    return stream_deepseek_llm(messages["prompt"], messages["system_message"], temperature=0.3, max_tokens=400)
\ No newline at end of file
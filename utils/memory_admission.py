@@ -0,0 +1,248 @@
+"""
+Memory-aware admission control for concurrent processing jobs
+
+A job's peak memory is estimated from the workbook's probe metadata: rows and
+columns per sheet and the value types of the first rows, times the bytes a cell
+was measured to cost while it is parsed, profiled and compressed (the DataFrame,
+the {column: {row: value}} dicts and the compressed copy). The chunk-pipelined
+mode (pipeline_chunk_rows) needs roughly half of that at high intensity, where
+the aggregates are merged chunk by chunk; low and medium intensity keep every
+row until the sheet is complete, so they are estimated as a full load.
+
+A MemoryBudget admits jobs while the sum of their estimates stays under its
+limit. A job that does not fit in full but fits in chunk-pipelined mode is
+admitted in that mode; otherwise it waits, and jobs are admitted in the order
+they asked. A job larger than the whole budget is admitted once nothing else
+is running.
+"""
+
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional
+import asyncio
+import itertools
+import os
+import threading
+from config.config import ProcessingConfig
+from utils.excel_utils import ExcelParser
+
+
+# Peak bytes per cell by column type, measured on 200k-cell sheets (RSS growth of a worker)
+FULL_CELL_BYTES = {"numeric": 360, "text": 340, "datetime": 440, "other": 380}
+PIPELINED_CELL_BYTES = {"numeric": 180, "text": 140, "datetime": 210, "other": 200}
+# Per-job allocations that do not grow with the workbook (workbook handle, LLM context, output)
+JOB_BASE_BYTES = 8 * 1024 * 1024
+# Rows read below the header to guess column types
+TYPE_SAMPLE_ROWS = 20
+# Used when a workbook stores no dimensions: xlsx files take a few bytes per cell on disk,
+# so this overestimates rather than underestimates
+CELLS_PER_FILE_BYTE = 0.25
+# Rows per chunk when a job is admitted in chunk-pipelined mode
+FALLBACK_CHUNK_ROWS = 5000
+# Seconds between checks of the cancelled callback while waiting for memory
+ADMISSION_POLL_SECONDS = 0.2
+
+
+@dataclass
+class MemoryEstimate:
+    """Estimated peak memory of a job"""
+    cells: int
+    full_bytes: int
+    pipelined_bytes: int
+
+
+@dataclass
+class Admission:
+    """Memory reserved for an admitted job and the configuration to run it with"""
+    config: ProcessingConfig
+    reserved_bytes: int
+    mode: str  # "full" or "pipelined"
+
+
+def estimate_job_memory(file_path: str, config: ProcessingConfig) -> MemoryEstimate:
+    """
+    Estimate a job's peak memory from the workbook's probe metadata
+
+    Args:
+        file_path: Path to the Excel file
+        config: Processing configuration; a job already in chunk-pipelined mode is
+            estimated at the pipelined cost, which is the full cost below high intensity
+
+    Returns:
+        The estimate; zero for a file that cannot be probed (the job fails quickly)
+    """
+    try:
+        sheets = ExcelParser.probe_workbook(file_path, config.include_sheets, sample_rows=TYPE_SAMPLE_ROWS)
+    except Exception:
+        return MemoryEstimate(0, 0, 0)
+
+    cells = 0
+    full_bytes = pipelined_bytes = 0
+    for sheet in sheets:
+        # The header row is not data
+        rows = max(0, sheet["rows"] - 1)
+        for column_type in sheet["column_types"]:
+            cells += rows
+            full_bytes += rows * FULL_CELL_BYTES[column_type]
+            pipelined_bytes += rows * PIPELINED_CELL_BYTES[column_type]
+    if cells == 0 and sheets:
+        # No stored dimensions: size the job from the file instead
+        cells = int(os.path.getsize(file_path) * CELLS_PER_FILE_BYTE)
+        full_bytes = cells * max(FULL_CELL_BYTES.values())
+        pipelined_bytes = cells * max(PIPELINED_CELL_BYTES.values())
+
+    if config.compression_intensity != "high":
+        # Low and medium intensity compress the whole sheet at once, so the pipeline buffers every row
+        pipelined_bytes = full_bytes
+    if config.pipeline_chunk_rows:
+        full_bytes = pipelined_bytes
+    return MemoryEstimate(cells, JOB_BASE_BYTES + full_bytes, JOB_BASE_BYTES + pipelined_bytes)
+
+
+class MemoryBudget:
+    """Admission control that keeps the estimated memory of running jobs under a limit"""
+
+    def __init__(self, limit_bytes: int):
+        """
+        Args:
+            limit_bytes: Total estimated peak memory of the jobs admitted at once
+        """
+        self.limit_bytes = limit_bytes
+        self._reserved = 0
+        self._admitted = 0
+        self._waiting: List[int] = []
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+        # Wake-up callbacks of async waiters, which wait on their event loop rather than on the condition
+        self._async_waiters: List[Callable[[], None]] = []
+        self._stats = {"full": 0, "pipelined": 0, "waited": 0, "over_budget": 0}
+
+    def _decide(self, estimate: MemoryEstimate, config: ProcessingConfig) -> Optional[Admission]:
+        """Admission for the job if it can start now; call with the condition held"""
+        available = self.limit_bytes - self._reserved
+        if estimate.full_bytes <= available:
+            return Admission(config, estimate.full_bytes, "pipelined" if config.pipeline_chunk_rows else "full")
+        pipelined = config if config.pipeline_chunk_rows else replace(config, pipeline_chunk_rows=FALLBACK_CHUNK_ROWS)
+        if estimate.pipelined_bytes <= available:
+            return Admission(pipelined, estimate.pipelined_bytes, "pipelined")
+        if self._admitted == 0:
+            # Larger than the whole budget: run it alone, in the leaner mode
+            self._stats["over_budget"] += 1
+            return Admission(pipelined, estimate.pipelined_bytes, "pipelined")
+        return None
+
+    def _notify_all(self) -> None:
+        """Wake every waiter, threads and coroutines; call with the condition held"""
+        self._condition.notify_all()
+        for wake in self._async_waiters:
+            wake()
+
+    def _reserve(self, admission: Admission) -> Admission:
+        self._reserved += admission.reserved_bytes
+        self._admitted += 1
+        self._stats[admission.mode] += 1
+        return admission
+
+    def try_admit(self, estimate: MemoryEstimate, config: ProcessingConfig) -> Optional[Admission]:
+        """Admit the job if it can start now and no other job is waiting; None otherwise"""
+        with self._condition:
+            if self._waiting:
+                return None
+            admission = self._decide(estimate, config)
+            return self._reserve(admission) if admission is not None else None
+
+    def admit(self,
+              estimate: MemoryEstimate,
+              config: ProcessingConfig,
+              cancelled: Optional[Callable[[], bool]] = None) -> Optional[Admission]:
+        """
+        Wait until the job can start, then reserve its memory
+
+        Args:
+            estimate: The job's estimate from estimate_job_memory
+            config: The job's processing configuration
+            cancelled: Checked while waiting; the wait ends without an admission once it returns True
+
+        Returns:
+            The admission (release it when the job ends), or None if the job was cancelled
+        """
+        with self._condition:
+            ticket = next(self._tickets)
+            self._waiting.append(ticket)
+            try:
+                waited = False
+                while True:
+                    if cancelled is not None and cancelled():
+                        return None
+                    if self._waiting[0] == ticket:
+                        admission = self._decide(estimate, config)
+                        if admission is not None:
+                            if waited:
+                                self._stats["waited"] += 1
+                            return self._reserve(admission)
+                    waited = True
+                    self._condition.wait(ADMISSION_POLL_SECONDS if cancelled is not None else None)
+            finally:
+                self._waiting.remove(ticket)
+                # The next job in line may fit now
+                self._notify_all()
+
+    async def aadmit(self, estimate: MemoryEstimate, config: ProcessingConfig) -> Admission:
+        """
+        Async version of admit
+
+        Waits on the event loop instead of blocking a thread, so waiting jobs do not take the
+        executor threads the admitted jobs need. Waits in line with admit's callers; cancel
+        the coroutine to stop waiting.
+        """
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # The waiter's loop is closed
+                pass
+
+        with self._condition:
+            ticket = next(self._tickets)
+            self._waiting.append(ticket)
+            self._async_waiters.append(wake)
+        try:
+            waited = False
+            while True:
+                with self._condition:
+                    if self._waiting[0] == ticket:
+                        admission = self._decide(estimate, config)
+                        if admission is not None:
+                            if waited:
+                                self._stats["waited"] += 1
+                            return self._reserve(admission)
+                    # Cleared under the condition: a wake-up sent after this check is set after the clear
+                    wakeup.clear()
+                waited = True
+                await wakeup.wait()
+        finally:
+            with self._condition:
+                self._waiting.remove(ticket)
+                self._async_waiters.remove(wake)
+                self._notify_all()
+
+    def release(self, admission: Admission) -> None:
+        """Return an admitted job's memory to the budget"""
+        with self._condition:
+            self._reserved -= admission.reserved_bytes
+            self._admitted -= 1
+            self._notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        """Reserved bytes, admitted and waiting jobs, and admissions per mode"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                "limit_bytes": self.limit_bytes,
+                "reserved_bytes": self._reserved,
+                "admitted": self._admitted,
+                "waiting": len(self._waiting)
+            })
+            return stats
@@ -0,0 +1,301 @@
+"""
+Token-aware packing of formatted output into a length budget
+
+Sections are added line by line with a priority; every line is measured in
+tokens when it is added. pack() then fills the token and character budgets
+greedily by value per token and renders only the chosen lines in their original
+order, so nothing is cut mid-number and low-value lines are dropped before the
+important ones. Token counts use tiktoken when it is installed and a characters
+per token estimate otherwise.
+
+A streamed output cannot be packed as a whole; StreamBudget charges its chunks
+against the same budgets as they are produced, packs the sections that are
+known up front with an OutputPacker, and admits the lines of the rest only
+while they fit.
+"""
+
+from typing import Callable, Iterable, List, Optional, Dict, Any, Tuple
+import math
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+# Relative value of a line in each section; the header is effectively mandatory
+SECTION_PRIORITIES = {
+    "header": 1000.0,
+    "core_indicators": 8.0,
+    "insights": 6.0,
+    "classification": 4.0,
+    "samples": 1.0
+}
+# Each further line of a section is worth this fraction of the one before it
+ITEM_DECAY = 0.85
+# A line may only be shortened at a clause or sentence boundary, keeping at least this share of it
+MIN_TRIMMED_SHARE = 0.5
+CLAUSE_BOUNDARY = re.compile(r"[,;.!?](?=\s)|\n")
+# Estimate used when tiktoken is not available
+CHARS_PER_TOKEN = 4
+TOKEN_ENCODING = "cl100k_base"
+
+_encoding = None
+_encoding_failed = False
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens in text
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Exact token count with tiktoken, otherwise an estimate that errs on the high side
+    """
+    global _encoding, _encoding_failed
+    if tiktoken is not None and not _encoding_failed:
+        if _encoding is None:
+            try:
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception:
+                # The encoding file could not be loaded (e.g. offline); use the estimate from now on
+                _encoding_failed = True
+                return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+class OutputPacker:
+    """Collects prioritized sections and packs the most valuable lines into a budget"""
+
+    def __init__(self,
+                 max_tokens: Optional[int] = None,
+                 max_chars: Optional[int] = None,
+                 counter: Callable[[str], int] = count_tokens):
+        """
+        Args:
+            max_tokens: Token budget for the packed output (None for no token limit)
+            max_chars: Character budget for the packed output (None for no character limit)
+            counter: Function used to count tokens
+        """
+        self.max_tokens = max_tokens
+        self.max_chars = max_chars
+        self.counter = counter
+        self.dropped_lines = 0
+        self.tokens_used = 0
+        self._sections: List[Dict[str, Any]] = []
+        self._items: List[Dict[str, Any]] = []
+
+    def add_section(self,
+                    name: str,
+                    lines: Iterable[str],
+                    title: Optional[str] = None,
+                    blank_before: bool = False,
+                    priority: Optional[float] = None) -> None:
+        """
+        Add a section; its title is only emitted if at least one of its lines is
+
+        Args:
+            name: Section name, used to look up its priority in SECTION_PRIORITIES
+            lines: Lines of content; blank lines are kept as spacing before the next line, and a
+                line ending in ":" is kept together with the line that follows it
+            title: Heading line for the section
+            blank_before: Whether to separate the section from the previous output with a blank line
+            priority: Overrides the priority from SECTION_PRIORITIES
+        """
+        if priority is None:
+            priority = SECTION_PRIORITIES.get(name, 1.0)
+        section = len(self._sections)
+        overhead = [""] * blank_before + ([title] if title else [])
+        self._sections.append({
+            "name": name,
+            "overhead": overhead,
+            "tokens": sum(self._line_tokens(line) for line in overhead),
+            "chars": sum(len(line) + 1 for line in overhead)
+        })
+
+        blank_lines = 0
+        heading = None
+        index = 0
+        for line in lines:
+            if not line.strip():
+                if heading is not None:
+                    heading += "\n"
+                else:
+                    blank_lines += 1
+                continue
+            if line.rstrip().endswith(":"):
+                # A sub-heading is only useful together with the content below it
+                heading = line if heading is None else f"{heading}\n{line}"
+                continue
+            if heading is not None:
+                line = f"{heading}\n{line}"
+                heading = None
+            self._add_item(section, index, line, blank_lines, priority)
+            blank_lines = 0
+            index += 1
+
+    def _add_item(self, section: int, index: int, text: str, blank_lines: int, priority: float) -> None:
+        self._items.append({
+            "section": section,
+            "index": index,
+            "text": text,
+            # Spacing inside a section is kept, but never before its first emitted line
+            "blank_lines": blank_lines if index else 0,
+            "tokens": self._line_tokens(text),
+            "chars": len(text) + 1,
+            "value": priority * (ITEM_DECAY ** index)
+        })
+
+    def _line_tokens(self, line: str) -> int:
+        # One extra token for the line break
+        return self.counter(line) + 1
+
+    def pack(self) -> str:
+        """
+        Choose lines by value per token until the budgets are used up, then render them
+
+        Returns:
+            Packed output with lines in their original order
+        """
+        # The first line has no preceding line break
+        char_budget = self.max_chars + 1 if self.max_chars is not None else math.inf
+        token_budget = self.max_tokens if self.max_tokens is not None else math.inf
+        used_tokens = 0
+        used_chars = 0
+        opened = set()
+        chosen = []
+        skipped = []
+
+        for item in sorted(self._items, key=lambda item: item["value"] / item["tokens"], reverse=True):
+            tokens, chars = self._cost(item, opened)
+            if used_tokens + tokens <= token_budget and used_chars + chars <= char_budget:
+                chosen.append(item)
+                opened.add(item["section"])
+                used_tokens += tokens
+                used_chars += chars
+            else:
+                skipped.append(item)
+
+        # Use what is left for a shortened copy of the most valuable line that did not fit
+        for item in sorted(skipped, key=lambda item: item["value"], reverse=True):
+            trimmed = self._trim(item, opened, token_budget - used_tokens, char_budget - used_chars)
+            if trimmed is not None:
+                tokens, chars = self._cost(trimmed, opened)
+                chosen.append(trimmed)
+                opened.add(trimmed["section"])
+                used_tokens += tokens
+                used_chars += chars
+                skipped.remove(item)
+                break
+
+        self.dropped_lines = len(skipped)
+        self.tokens_used = used_tokens
+        return self._render(chosen)
+
+    def _cost(self, item: Dict[str, Any], opened: set):
+        section = self._sections[item["section"]]
+        tokens = item["tokens"] + item["blank_lines"]
+        chars = item["chars"] + item["blank_lines"]
+        if item["section"] not in opened:
+            tokens += section["tokens"]
+            chars += section["chars"]
+        return tokens, chars
+
+    def _trim(self, item: Dict[str, Any], opened: set, remaining_tokens: float, remaining_chars: float) -> Optional[Dict[str, Any]]:
+        """Shorten a line at a clause boundary, with an ellipsis, so it fits the remaining budget"""
+        text = item["text"]
+        # Longest prefix first; never cut inside a clause, so numbers keep their units
+        for match in reversed(list(CLAUSE_BOUNDARY.finditer(text))):
+            prefix = text[:match.start()].rstrip(" ,;:\n")
+            if len(prefix) < len(text) * MIN_TRIMMED_SHARE:
+                break
+            trimmed_text = prefix + "..."
+            trimmed = dict(item, text=trimmed_text, tokens=self._line_tokens(trimmed_text), chars=len(trimmed_text) + 1)
+            tokens, chars = self._cost(trimmed, opened)
+            if tokens <= remaining_tokens and chars <= remaining_chars:
+                return trimmed
+        return None
+
+    def _render(self, chosen: List[Dict[str, Any]]) -> str:
+        lines = []
+        opened = set()
+        for item in sorted(chosen, key=lambda item: (item["section"], item["index"])):
+            if item["section"] not in opened:
+                opened.add(item["section"])
+                lines.extend(self._sections[item["section"]]["overhead"])
+            else:
+                lines.extend([""] * item["blank_lines"])
+            lines.append(item["text"])
+        # A section that opens with a blank line must not start the output with one
+        while lines and not lines[0]:
+            lines.pop(0)
+        return "\n".join(lines)
+
+
+class StreamBudget:
+    """Token and character budgets shared by the chunks of a streamed output"""
+
+    def __init__(self,
+                 max_tokens: Optional[int] = None,
+                 max_chars: Optional[int] = None,
+                 counter: Callable[[str], int] = count_tokens):
+        """
+        Args:
+            max_tokens: Token budget for the whole stream (None for no token limit)
+            max_chars: Character budget for the whole stream (None for no character limit)
+            counter: Function used to count tokens
+        """
+        self.counter = counter
+        self.remaining_tokens = max_tokens if max_tokens is not None else math.inf
+        self.remaining_chars = max_chars if max_chars is not None else math.inf
+        self.tokens_used = 0
+
+    def _cost(self, lines: Tuple[str, ...]):
+        # Measured as OutputPacker does: each line with its line break
+        return sum(self.counter(line) + 1 for line in lines), sum(len(line) + 1 for line in lines)
+
+    def spend(self, *lines: str) -> None:
+        """Charge lines that are emitted regardless of the budget"""
+        tokens, chars = self._cost(lines)
+        self.remaining_tokens -= tokens
+        self.remaining_chars -= chars
+        self.tokens_used += tokens
+
+    def take(self, *lines: str) -> bool:
+        """Charge the lines if they all fit in what is left; False, charging nothing, otherwise"""
+        tokens, chars = self._cost(lines)
+        if tokens > self.remaining_tokens or chars > self.remaining_chars:
+            return False
+        self.spend(*lines)
+        return True
+
+    def pack(self, name: str, lines: Iterable[str], title: Optional[str] = None, blank_before: bool = False) -> str:
+        """
+        Pack a section into what is left of the budget with an OutputPacker, and charge for it
+
+        Args:
+            name, lines, title, blank_before: As for OutputPacker.add_section
+
+        Returns:
+            The packed lines, each ending in a line break (and after a blank line if blank_before),
+            or "" if none fit
+        """
+        if self.remaining_tokens <= 0 or self.remaining_chars <= 0:
+            return ""
+        packer = OutputPacker(
+            max_tokens=self.remaining_tokens if self.remaining_tokens != math.inf else None,
+            # The packer does not count a line break after its last line; the stream does
+            max_chars=self.remaining_chars - 1 if self.remaining_chars != math.inf else None,
+            counter=self.counter
+        )
+        packer.add_section(name, lines, title=title, blank_before=blank_before)
+        packed = packer.pack()
+        if not packed:
+            return ""
+        # The packer drops a leading blank line from its output, but has charged for it
+        text = ("\n" if blank_before else "") + packed + "\n"
+        self.remaining_tokens -= packer.tokens_used
+        self.remaining_chars -= len(text)
+        self.tokens_used += packer.tokens_used
+        return text
@@ -0,0 +1,218 @@
+"""
+On-demand profiling of workflow graph nodes
+
+When ProcessingConfig.profile_dir is set, every selected graph node (probe,
+each sheet branch, merge, format) runs under a profiler and writes its own
+profile files there:
+
+- "sampling" samples the Python stacks of all threads every profile_interval
+  seconds and writes them in collapsed-stack format (.collapsed), the input of
+  flamegraph.pl, speedscope and similar viewers. It sees work the node hands to
+  thread pools, but also any other node running at the same time; run with
+  max_parallel_sheets=1 to profile sheets in isolation. Threads blocked waiting
+  (on locks, queues or the network selector) are left out.
+- "cprofile" runs cProfile on the thread that executes the node and writes
+  .pstats files for pstats or snakeviz. It counts every call exactly, but work
+  handed to other threads shows up only as time spent waiting for it.
+
+With profile_memory, tracemalloc snapshots taken when a node starts and ends
+are compared, and the allocations the node left behind are written per source
+line (.memory.txt). Each profiled node also appends a line to profiles.jsonl
+in the directory, naming its files.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set
+import cProfile
+import itertools
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from config.config import ProcessingConfig
+from utils.instrumentation import hold_tracemalloc, release_tracemalloc
+
+PROFILERS = ("sampling", "cprofile")
+MANIFEST_NAME = "profiles.jsonl"
+# Source lines listed in a memory diff
+MEMORY_DIFF_LINES = 30
+# Innermost frames of threads that are waiting rather than running, as (file name, function)
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("connection.py", "_recv_bytes"),
+    ("socketserver.py", "serve_forever")
+}
+
+_sequence = itertools.count(1)
+_sampler_threads: Set[int] = set()
+_cprofiled_threads: Set[int] = set()
+_manifest_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace("\\", "/").split("/")
+    # Semicolons separate frames in the collapsed format
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})".replace(";", ":")
+
+
+class StackSampler:
+    """Counts the collapsed Python stacks of all running threads, sampled from a background thread"""
+
+    def __init__(self, interval: float = 0.005):
+        """
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """Stop sampling; returns the stack counts"""
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        _sampler_threads.add(threading.get_ident())
+        try:
+            while not self._stop.wait(self.interval):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self.samples += 1
+                for ident, frame in sys._current_frames().items():
+                    if ident in _sampler_threads:
+                        continue
+                    if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)).replace(";", ":"))
+                    self.stacks[";".join(reversed(stack))] += 1
+        finally:
+            _sampler_threads.discard(threading.get_ident())
+
+    def write_collapsed(self, path: str) -> None:
+        """Write "frame;frame;frame count" lines, most frequent stack first"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _write_memory_diff(path: str, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> int:
+    """Write the largest allocation differences per source line; returns the net bytes allocated"""
+    # Leave out the profilers' own allocations, including those of other nodes finishing meanwhile
+    filters = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, pstats.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        tracemalloc.Filter(False, "<unknown>")
+    )
+    stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    net = sum(stat.size_diff for stat in stats)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"Net allocated: {net} bytes\n")
+        for stat in stats[:MEMORY_DIFF_LINES]:
+            f.write(f"{stat}\n")
+    return net
+
+
+def _should_profile(config: ProcessingConfig, node: str) -> bool:
+    return bool(config.profile_dir) and (not config.profile_nodes or node in config.profile_nodes)
+
+
+@contextmanager
+def profile_node(config: ProcessingConfig, node: str, file_path: str, sheet: Optional[str] = None) -> Iterator[None]:
+    """
+    Profile a graph node if config asks for it
+
+    Args:
+        config: Processing configuration; profile_dir, profile_nodes, profiler,
+            profile_interval and profile_memory select what is recorded
+        node: Graph node name
+        file_path: Workbook being processed, used in file names
+        sheet: Sheet processed by the node, if any
+    """
+    if not _should_profile(config, node):
+        yield
+        return
+    if config.profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler {config.profiler!r}, expected one of {', '.join(PROFILERS)}")
+
+    os.makedirs(config.profile_dir, exist_ok=True)
+    parts = [os.path.splitext(os.path.basename(file_path))[0], node] + ([sheet] if sheet else [])
+    stem = re.sub(r"[^\w.-]+", "_", "-".join(parts)) + f"-{os.getpid()}-{next(_sequence)}"
+    base = os.path.join(config.profile_dir, stem)
+    files: Dict[str, str] = {}
+
+    sampler = profiler = None
+    thread = threading.get_ident()
+    if config.profiler == "sampling":
+        sampler = StackSampler(config.profile_interval)
+        sampler.start()
+    elif thread not in _cprofiled_threads:
+        # One cProfile per thread: a node awaited while another runs on the same event loop is
+        # already covered by the first node's profile
+        _cprofiled_threads.add(thread)
+        profiler = cProfile.Profile()
+    if config.profile_memory:
+        hold_tracemalloc()
+        before = tracemalloc.take_snapshot()
+
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+    finally:
+        seconds = time.perf_counter() - start
+        record: Dict[str, Any] = {"file_path": file_path, "node": node, "sheet": sheet, "seconds": seconds}
+        if sampler is not None:
+            sampler.stop()
+            files["collapsed"] = base + ".collapsed"
+            sampler.write_collapsed(files["collapsed"])
+            record["samples"] = sampler.samples
+        if profiler is not None:
+            _cprofiled_threads.discard(thread)
+            files["pstats"] = base + ".pstats"
+            profiler.dump_stats(files["pstats"])
+        if config.profile_memory:
+            after = tracemalloc.take_snapshot()
+            release_tracemalloc()
+            files["memory"] = base + ".memory.txt"
+            record["net_allocated_bytes"] = _write_memory_diff(files["memory"], before, after)
+        record["files"] = files
+        with _manifest_lock:
+            with open(os.path.join(config.profile_dir, MANIFEST_NAME), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+def read_manifest(profile_dir: str) -> List[Dict[str, Any]]:
+    """Records of the nodes profiled into a directory, oldest first"""
+    path = os.path.join(profile_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,423 @@
+"""
+End-to-end result cache for the Excel processing workflow
+
+Results are keyed by a content hash of the workbook bytes, the ProcessingConfig
+fields that can change the output and the task description, so a repeated
+request is answered without parsing or calling the LLM, while an edited
+workbook always misses.
+Entries live in one or more backends (an in-memory LRU, a directory of JSON
+files shared between processes), checked in order. Entries older than the TTL
+can still be served for a stale-while-revalidate window while a background
+thread recomputes them.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from config.config import ProcessingConfig, ResultCacheConfig
+
+# Bump when the output format changes so results of older versions are not served
+RESULT_CACHE_VERSION = 1
+# Content hashes remembered per (path, mtime, size), so repeat requests do not re-read the file
+FINGERPRINT_ENTRIES = 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+# ProcessingConfig fields left out of the key: they change how a result is computed (concurrency,
+# queueing, checkpoints, profiling, where plans are cached), not the result. Every other field is
+# keyed, including pipeline_chunk_rows, since a pipelined sheet plans from its first chunks and
+# merges float aggregates chunk by chunk, which can differ from the full load in the last digits.
+OUTPUT_NEUTRAL_FIELDS = frozenset({
+    "rules_cache_dir",
+    "max_concurrent_llm_calls",
+    "compression_workers",
+    "max_parallel_sheets",
+    "pipeline_queue_chunks",
+    "checkpoint_dir",
+    "checkpoint_min_cells",
+    "checkpoint_max_age",
+    "checkpoint_max_bytes",
+    "late_llm_result",
+    "profile_dir",
+    "profile_nodes",
+    "profiler",
+    "profile_interval",
+    "profile_memory"
+})
+
+_fingerprints: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_fingerprints_lock = threading.Lock()
+
+
+def file_fingerprint(file_path: str) -> str:
+    """
+    SHA-256 of the file's bytes
+
+    The hash is reused while the file's path, modification time and size are unchanged,
+    so only new or modified files are read.
+    """
+    stat = os.stat(file_path)
+    identity = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    with _fingerprints_lock:
+        fingerprint = _fingerprints.get(identity)
+        if fingerprint is not None:
+            _fingerprints.move_to_end(identity)
+            return fingerprint
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    fingerprint = digest.hexdigest()
+
+    with _fingerprints_lock:
+        _fingerprints[identity] = fingerprint
+        while len(_fingerprints) > FINGERPRINT_ENTRIES:
+            _fingerprints.popitem(last=False)
+    return fingerprint
+
+
+def result_cache_key(file_path: str, task_description: str, config: ProcessingConfig) -> str:
+    """
+    Cache key of a request
+
+    Args:
+        file_path: Path to the Excel file (must exist)
+        task_description: Description of the task to guide processing
+        config: Processing configuration; fields in OUTPUT_NEUTRAL_FIELDS are not part of the key
+
+    Returns:
+        Hex digest identifying the workbook content, configuration and task
+    """
+    fields = {name: value for name, value in asdict(config).items() if name not in OUTPUT_NEUTRAL_FIELDS}
+    payload = json.dumps(
+        [RESULT_CACHE_VERSION, file_fingerprint(file_path), fields, task_description],
+        sort_keys=True, default=str, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryResultBackend:
+    """In-process LRU of results"""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        """Creation time and value, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, value: Any, created_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (created_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskResultBackend:
+    """
+    Directory of JSON files, one per result, safe to share between processes
+
+    Reads touch a file's modification time, so when the directory grows past
+    max_bytes the least recently used results are removed first.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = ResultCacheConfig.max_bytes):
+        """
+        Args:
+            directory: Directory of the result files, created if missing
+            max_bytes: Total size of the result files kept at most, 0 for no limit
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        """Creation time and value, or None if missing or unreadable"""
+        try:
+            path = self._path(key)
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if self.max_bytes > 0:
+                os.utime(path)
+            return entry["created_at"], entry["value"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, value: Any, created_at: float) -> None:
+        # Write to a temporary file first so concurrent readers never see partial JSON
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": created_at, "value": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        if self.max_bytes > 0:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove the least recently used results until the directory fits in max_bytes"""
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                # Removed by another process in the meantime
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self.delete(name[:-len(".json")])
+            total -= size
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                self.delete(name[:-len(".json")])
+
+
+class ResultCache:
+    """Result cache over tiered backends with TTL, stale-while-revalidate and single-flight misses"""
+
+    def __init__(self, backends: List[Any], ttl: float = ResultCacheConfig.ttl, stale_while_revalidate: float = 0.0):
+        """
+        Args:
+            backends: Backends checked in order; a hit in a later one is copied to the earlier ones
+            ttl: Seconds a result is served as fresh
+            stale_while_revalidate: Seconds after the TTL during which the old result is still
+                served while it is recomputed in the background
+        """
+        self.backends = backends
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self._pending: Dict[str, Future] = {}
+        self._revalidating: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "shared": 0, "writes": 0, "revalidations": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def lookup(self, key: str) -> Tuple[Optional[Any], str]:
+        """
+        Look up a result
+
+        Returns:
+            The value (None on a miss) and "hit", "stale" (past the TTL but within the
+            stale-while-revalidate window) or "miss"
+        """
+        now = time.time()
+        for i, backend in enumerate(self.backends):
+            entry = backend.get(key)
+            if entry is None:
+                continue
+            created_at, value = entry
+            age = now - created_at
+            if age > self.ttl + self.stale_while_revalidate:
+                backend.delete(key)
+                continue
+            for earlier in self.backends[:i]:
+                earlier.put(key, value, created_at)
+            if age > self.ttl:
+                self._count("stale_hits")
+                return value, "stale"
+            self._count("hits")
+            return value, "hit"
+        self._count("misses")
+        return None, "miss"
+
+    def put(self, key: str, value: Any) -> None:
+        created_at = time.time()
+        for backend in self.backends:
+            backend.put(key, value, created_at)
+        self._count("writes")
+
+    def revalidate(self, key: str, compute: Callable[[], Any], cacheable: Callable[[Any], bool]) -> None:
+        """Recompute a stale result on a background thread, unless that is already in progress"""
+        def refresh():
+            try:
+                value = compute()
+                if cacheable(value):
+                    self.put(key, value)
+            except Exception:
+                # The stale entry keeps being served until it expires; the next miss recomputes it
+                pass
+            finally:
+                with self._lock:
+                    self._revalidating.pop(key, None)
+
+        with self._lock:
+            if key in self._revalidating:
+                return
+            thread = self._revalidating[key] = threading.Thread(target=refresh, name="result-cache-revalidate", daemon=True)
+            self._stats["revalidations"] += 1
+        thread.start()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], cacheable: Callable[[Any], bool] = lambda value: True) -> Tuple[Any, str]:
+        """
+        Cached result for the key, computing and storing it on a miss
+
+        Concurrent misses for the same key wait for a single computation.
+
+        Args:
+            key: Key from result_cache_key
+            compute: Produces the result
+            cacheable: Whether a computed result may be stored (e.g. False for errors)
+
+        Returns:
+            The result and how it was obtained: "hit", "stale", "miss" or "shared" (another
+            caller's computation)
+        """
+        value, status = self.lookup(key)
+        if status == "stale":
+            self.revalidate(key, compute, cacheable)
+        if value is not None:
+            return value, status
+
+        with self._lock:
+            pending = self._pending.get(key)
+            computing = pending is None
+            if computing:
+                pending = self._pending[key] = Future()
+        if not computing:
+            self._count("shared")
+            return pending.result(), "shared"
+
+        try:
+            value = compute()
+            if cacheable(value):
+                self.put(key, value)
+            pending.set_result(value)
+            return value, "miss"
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    async def aget_or_compute(self,
+                              key: str,
+                              acompute: Callable[[], Awaitable[Any]],
+                              compute: Callable[[], Any],
+                              cacheable: Callable[[Any], bool] = lambda value: True) -> Tuple[Any, str]:
+        """
+        Async version of get_or_compute
+
+        Concurrent misses for the same key, from coroutines or threads, wait for a single
+        computation.
+
+        Args:
+            key: Key from result_cache_key
+            acompute: Produces the result on a miss
+            compute: Synchronous equivalent, used to revalidate stale results in the background
+                independently of the caller's event loop
+            cacheable: Whether a computed result may be stored
+        """
+        value, status = self.lookup(key)
+        if status == "stale":
+            self.revalidate(key, compute, cacheable)
+        if value is not None:
+            return value, status
+
+        with self._lock:
+            pending = self._pending.get(key)
+            computing = pending is None
+            if computing:
+                pending = self._pending[key] = Future()
+        if not computing:
+            self._count("shared")
+            return await asyncio.wrap_future(pending), "shared"
+
+        try:
+            value = await acompute()
+            if cacheable(value):
+                self.put(key, value)
+            pending.set_result(value)
+            return value, "miss"
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def clear(self) -> None:
+        for backend in self.backends:
+            backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Lookup counters for this process"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        return stats
+
+_cache_lock = threading.Lock()
+_cache: Optional[ResultCache] = None
+_cache_configured = False
+
+def configure_result_cache(config: Optional[ResultCacheConfig]) -> Optional[ResultCache]:
+    """
+    Replace the process-wide result cache
+
+    Args:
+        config: Cache settings; None, or a config with neither memory entries nor a directory,
+            disables caching
+
+    Returns:
+        The new cache, or None when disabled
+    """
+    global _cache, _cache_configured
+    with _cache_lock:
+        _cache = None
+        if config is not None:
+            backends = []
+            if config.memory_entries > 0:
+                backends.append(MemoryResultBackend(config.memory_entries))
+            if config.directory:
+                backends.append(DiskResultBackend(config.directory, config.max_bytes))
+            if backends:
+                _cache = ResultCache(backends, config.ttl, config.stale_while_revalidate)
+        _cache_configured = True
+        return _cache
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Process-wide result cache, configured from the environment on first use"""
+    if not _cache_configured:
+        configure_result_cache(ResultCacheConfig.from_env())
+    return _cache
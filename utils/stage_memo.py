@@ -0,0 +1,149 @@
+"""
+Memoization of pipeline stage outputs for feedback-driven re-runs
+
+Each stage (parse, compress, insights) stores its output under a key built from
+the inputs that stage actually reads: the file identity, the upstream stage key
+and the configuration fields it uses. A re-run after feedback therefore only
+recomputes the stages whose inputs changed; changing max_output_length only
+repacks the output, and changing compression_intensity reuses the parse.
+
+The store is bounded by the estimated size of its outputs as well as their
+number, and outputs of very large workbooks are not stored at all, so a
+long-lived agent does not keep their sheet data alive.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+import os
+import threading
+from config.config import ProcessingConfig
+
+# Configuration fields read by each stage; fields not listed do not invalidate that stage
+PARSE_FIELDS = ("include_sheets",)
+COMPRESS_FIELDS = ("compression_intensity", "task_type", "exclude_columns", "rules_cache_dir")
+INSIGHTS_FIELDS = ("context_format", "significant_digits", "llm_latency_budget", "late_llm_result")
+STAGES = ("parse", "compress", "insights")
+# Bytes per cell of sheet data held as {column: {row: value}} dicts, measured on complex_sample_data.xlsx
+MEMO_CELL_BYTES = 100
+# Estimate for values that are neither containers nor strings
+MEMO_VALUE_BYTES = 32
+
+
+def _freeze(value: Any) -> Hashable:
+    """Make configuration values such as column lists usable in a key"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def estimate_bytes(value: Any) -> int:
+    """
+    Rough memory size of a stage output
+
+    Sheet data is sized from the sheet's shape rather than walked cell by cell.
+    """
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        if "data" in value and isinstance(value.get("shape"), (list, tuple)) and len(value["shape"]) == 2:
+            rows, columns = value["shape"]
+            others = {key: item for key, item in value.items() if key != "data"}
+            return int(rows) * int(columns) * MEMO_CELL_BYTES + estimate_bytes(others)
+        return sum(estimate_bytes(key) + estimate_bytes(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(estimate_bytes(item) for item in value)
+    return MEMO_VALUE_BYTES
+
+
+def file_identity(file_path: str) -> Tuple[str, int, int]:
+    """Absolute path, modification time and size, so an edited file misses the memo"""
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+
+def stage_keys(file_path: str, task_description: str, config: ProcessingConfig) -> Dict[str, Hashable]:
+    """
+    Memo key of every stage for one run
+
+    Args:
+        file_path: Path to the Excel file (must exist)
+        task_description: Description of the task to guide processing
+        config: Processing configuration
+
+    Returns:
+        Key per stage name; each key includes the key of the stage before it
+    """
+    parse_key = ("parse", file_identity(file_path)) + tuple(_freeze(getattr(config, name)) for name in PARSE_FIELDS)
+    compress_key = ("compress", parse_key) + tuple(_freeze(getattr(config, name)) for name in COMPRESS_FIELDS)
+    insights_key = ("insights", compress_key, task_description) + tuple(_freeze(getattr(config, name)) for name in INSIGHTS_FIELDS)
+    return {"parse": parse_key, "compress": compress_key, "insights": insights_key}
+
+
+class StageMemo:
+    """Thread-safe, size-bounded LRU store of stage outputs"""
+
+    def __init__(self, max_entries: int = 32, max_bytes: Optional[int] = None, max_entry_bytes: Optional[int] = None):
+        """
+        Args:
+            max_entries: Outputs kept at most
+            max_bytes: Estimated size of all outputs kept at most, None for no limit
+            max_entry_bytes: Outputs estimated larger than this are not stored, None for no limit
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Stored output for the key, or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> bool:
+        """
+        Store an output, evicting the least recently used entries above max_entries or max_bytes
+
+        Returns:
+            Whether the output was stored; outputs above max_entry_bytes or max_bytes are not
+        """
+        size = estimate_bytes(value)
+        limits = [limit for limit in (self.max_entry_bytes, self.max_bytes) if limit is not None]
+        with self._lock:
+            self._discard(key)
+            if limits and size > min(limits):
+                return False
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._discard(next(iter(self._entries)))
+            return True
+
+    def _discard(self, key: Hashable) -> None:
+        if key in self._entries:
+            del self._entries[key]
+            self._bytes -= self._sizes.pop(key)
+
+    @property
+    def bytes(self) -> int:
+        """Estimated size of the stored outputs"""
+        with self._lock:
+            return self._bytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,96 @@
+"""
+Dependency-free probe of .xlsx workbooks
+
+Reads the sheet list and every sheet's stored dimension straight from the
+workbook's XML parts with the standard library, without importing openpyxl or
+pandas, so command-line tools can report workbook sizes in milliseconds. Sizes
+follow ExcelParser.probe_workbook: they come from the stored sheet dimensions
+and are 0 when a sheet stores none.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import posixpath
+import re
+import zipfile
+from xml.etree import ElementTree
+
+OFFICE_DOCUMENT_REL = "/officeDocument"
+_CELL_REFERENCE = re.compile(r"\$?([A-Za-z]{1,3})\$?(\d+)$")
+
+
+def _local_name(tag: str) -> str:
+    """Tag without its namespace, so transitional and strict OOXML parse alike"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _relationships(archive: zipfile.ZipFile, part: str) -> Dict[str, Tuple[str, str]]:
+    """Relationship id -> (type, target part) of a part, with targets resolved against the part's folder"""
+    folder, name = posixpath.split(part)
+    rels_part = posixpath.join(folder, "_rels", f"{name}.rels")
+    relationships = {}
+    with archive.open(rels_part) as f:
+        for element in ElementTree.parse(f).getroot():
+            target = element.get("Target", "")
+            target = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+            relationships[element.get("Id")] = (element.get("Type", ""), target)
+    return relationships
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index
+
+
+def _sheet_dimension(archive: zipfile.ZipFile, part: str) -> Tuple[int, int]:
+    """Rows and columns from a sheet's <dimension> element, which precedes its cell data"""
+    with archive.open(part) as f:
+        for _, element in ElementTree.iterparse(f, events=("start",)):
+            name = _local_name(element.tag)
+            if name == "dimension":
+                match = _CELL_REFERENCE.match(element.get("ref", "").split(":")[-1])
+                return (int(match.group(2)), _column_index(match.group(1))) if match else (0, 0)
+            if name == "sheetData":
+                break
+    return 0, 0
+
+
+def probe_xlsx(file_path: str, include_sheets: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    List the sheets of an .xlsx workbook with their size
+
+    Args:
+        file_path: Path to the Excel file
+        include_sheets: List of sheet names to include (None for all)
+
+    Returns:
+        One dict per sheet with "name", "rows" and "columns", in the order the sheets
+        would be parsed
+
+    Raises:
+        ValueError: The file is not a readable .xlsx workbook
+    """
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            root_relationships = _relationships(archive, "")
+            workbook_part = next(target for rel_type, target in root_relationships.values()
+                                 if rel_type.endswith(OFFICE_DOCUMENT_REL))
+            workbook_relationships = _relationships(archive, workbook_part)
+            with archive.open(workbook_part) as f:
+                workbook = ElementTree.parse(f).getroot()
+
+            sheet_parts = {}
+            for element in workbook.iter():
+                if _local_name(element.tag) == "sheet":
+                    relationship_id = next(value for key, value in element.attrib.items() if _local_name(key) == "id")
+                    sheet_parts[element.get("name")] = workbook_relationships[relationship_id][1]
+
+            sheets = []
+            for name in (include_sheets if include_sheets else list(sheet_parts)):
+                if name in sheet_parts:
+                    rows, columns = _sheet_dimension(archive, sheet_parts[name])
+                    sheets.append({"name": name, "rows": rows, "columns": columns})
+            return sheets
+    except (OSError, KeyError, StopIteration, zipfile.BadZipFile, ElementTree.ParseError) as e:
+        raise ValueError(f"Error probing Excel file: {str(e) or type(e).__name__}")